@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Fila durável de ingestão de PDFs.
+
+Produtores enfileiram URLs; workers (em um ou vários processos/máquinas)
+reivindicam jobs com um lease de tempo limitado, renovado por heartbeat.
+Um job cujo lease expira (worker morto, máquina caiu) volta a ficar
+disponível. Falhas são repetidas com backoff exponencial até
+`max_attempts`; depois disso o job vai para a fila de mortos (dead letter),
+de onde pode ser reenfileirado.
+
+Backends (INGEST_QUEUE_URL):
+- `sqlite:///caminho/fila.db`: um host, vários processos (padrão:
+  indexing/assets/ingest_queue.db)
+- `memory://`: em memória, um processo (testes e benchmarks)
+- outros esquemas podem ser registrados com `register_queue_backend`
+  (ex.: um broker compartilhado entre máquinas)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+_INDEXING_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_QUEUE_URL = f"sqlite:///{os.path.join(_INDEXING_DIR, 'assets', 'ingest_queue.db')}"
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+STATUSES = (PENDING, LEASED, DONE, DEAD)
+
+
+@dataclass
+class Job:
+    """Um PDF a ingerir e o estado da sua execução."""
+
+    id: str
+    pdf_url: str
+    doc_name: str | None = None
+    status: str = PENDING
+    attempts: int = 0
+    max_attempts: int = 3
+    available_at: float = 0.0
+    lease_owner: str | None = None
+    lease_expires: float | None = None
+    last_error: str | None = None
+    result: dict[str, Any] | None = None
+    enqueued_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+
+def retry_delay(attempts: int, base: float | None = None, maximum: float | None = None) -> float:
+    """Espera antes da próxima tentativa: base * 2^(tentativas-1), limitada."""
+    base = base if base is not None else float(os.getenv("INGEST_RETRY_BASE_DELAY", "30"))
+    maximum = maximum if maximum is not None else float(os.getenv("INGEST_RETRY_MAX_DELAY", "900"))
+    return min(base * (2 ** max(attempts - 1, 0)), maximum)
+
+
+class JobQueue:
+    """
+    Interface comum dos backends da fila.
+
+    Todas as transições conferem o dono do lease: um worker que perdeu o
+    lease (expirou e outro worker reivindicou o job) não consegue concluir
+    nem falhar o job.
+    """
+
+    def enqueue(
+        self, pdf_url: str, doc_name: str | None = None, max_attempts: int | None = None
+    ) -> str:
+        """Enfileira um PDF; se o documento já tem job pendente/ativo, devolve o id dele."""
+        raise NotImplementedError
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Job | None:
+        """Reivindica o próximo job disponível (ou com lease expirado)."""
+        raise NotImplementedError
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Renova o lease; False se o worker não é mais o dono do job."""
+        raise NotImplementedError
+
+    def complete(self, job_id: str, worker_id: str, result: dict[str, Any] | None = None) -> bool:
+        raise NotImplementedError
+
+    def fail(self, job_id: str, worker_id: str, error: str, delay: float | None = None) -> bool:
+        """Registra a falha: reagenda com backoff ou, sem tentativas, manda para os mortos."""
+        raise NotImplementedError
+
+    def requeue_dead(self, job_id: str | None = None) -> int:
+        """Devolve jobs mortos (um ou todos) à fila, com as tentativas zeradas."""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Job | None:
+        raise NotImplementedError
+
+    def list_jobs(self, status: str | None = None, limit: int = 100) -> list[Job]:
+        raise NotImplementedError
+
+    def stats(self) -> dict[str, int]:
+        """Quantidade de jobs por status."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _default_attempts(max_attempts: int | None) -> int:
+        return max_attempts or int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+
+
+# =============================================
+# BACKEND EM MEMÓRIA
+# =============================================
+
+
+class InMemoryJobQueue(JobQueue):
+    """Fila em memória com a mesma semântica do SQLite (um processo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Job] = {}
+
+    def enqueue(
+        self, pdf_url: str, doc_name: str | None = None, max_attempts: int | None = None
+    ) -> str:
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status in (PENDING, LEASED) and (job.doc_name, job.pdf_url) == (
+                    doc_name,
+                    pdf_url,
+                ):
+                    return job.id
+            job = Job(
+                id=uuid.uuid4().hex,
+                pdf_url=pdf_url,
+                doc_name=doc_name,
+                max_attempts=self._default_attempts(max_attempts),
+            )
+            self._jobs[job.id] = job
+            return job.id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Job | None:
+        now = time.time()
+        with self._lock:
+            self._expire_leases(now)
+            candidates = [
+                job
+                for job in self._jobs.values()
+                if job.status == PENDING and job.available_at <= now
+            ]
+            if not candidates:
+                return None
+            job = min(candidates, key=lambda j: (j.available_at, j.enqueued_at))
+            job.status = LEASED
+            job.attempts += 1
+            job.lease_owner = worker_id
+            job.lease_expires = now + lease_seconds
+            job.updated_at = now
+            return Job(**asdict(job))
+
+    def _expire_leases(self, now: float) -> None:
+        for job in self._jobs.values():
+            if job.status == LEASED and job.lease_expires is not None and job.lease_expires < now:
+                job.last_error = job.last_error or "lease expirado"
+                job.status = DEAD if job.attempts >= job.max_attempts else PENDING
+                job.lease_owner = job.lease_expires = None
+                job.updated_at = now
+
+    def _owned(self, job_id: str, worker_id: str) -> Job | None:
+        job = self._jobs.get(job_id)
+        if job is None or job.status != LEASED or job.lease_owner != worker_id:
+            return None
+        return job
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            if job is None:
+                return False
+            job.lease_expires = time.time() + lease_seconds
+            return True
+
+    def complete(self, job_id: str, worker_id: str, result: dict[str, Any] | None = None) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            if job is None:
+                return False
+            job.status, job.result = DONE, result
+            job.lease_owner = job.lease_expires = None
+            job.updated_at = time.time()
+            return True
+
+    def fail(self, job_id: str, worker_id: str, error: str, delay: float | None = None) -> bool:
+        with self._lock:
+            job = self._owned(job_id, worker_id)
+            if job is None:
+                return False
+            now = time.time()
+            job.last_error = error
+            job.lease_owner = job.lease_expires = None
+            job.updated_at = now
+            if job.attempts >= job.max_attempts:
+                job.status = DEAD
+            else:
+                job.status = PENDING
+                job.available_at = now + (delay if delay is not None else retry_delay(job.attempts))
+            return True
+
+    def requeue_dead(self, job_id: str | None = None) -> int:
+        with self._lock:
+            count = 0
+            for job in self._jobs.values():
+                if job.status == DEAD and (job_id is None or job.id == job_id):
+                    job.status, job.attempts, job.available_at = PENDING, 0, 0.0
+                    job.updated_at = time.time()
+                    count += 1
+            return count
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return Job(**asdict(job)) if job else None
+
+    def list_jobs(self, status: str | None = None, limit: int = 100) -> list[Job]:
+        with self._lock:
+            self._expire_leases(time.time())
+            jobs = [j for j in self._jobs.values() if status is None or j.status == status]
+            jobs.sort(key=lambda j: j.enqueued_at)
+            return [Job(**asdict(j)) for j in jobs[:limit]]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            self._expire_leases(time.time())
+            counts = dict.fromkeys(STATUSES, 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+# =============================================
+# BACKEND SQLITE
+# =============================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    pdf_url TEXT NOT NULL,
+    doc_name TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    result TEXT,
+    enqueued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, available_at, enqueued_at);
+"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Fila em SQLite (modo WAL), compartilhada pelos processos de um host.
+
+    A reivindicação roda em `BEGIN IMMEDIATE`: só um processo por vez
+    escolhe e marca o próximo job, então dois workers nunca pegam o mesmo.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    class _Transaction:
+        def __init__(self, conn: sqlite3.Connection):
+            self.conn = conn
+
+        def __enter__(self) -> sqlite3.Connection:
+            self.conn.execute("BEGIN IMMEDIATE")
+            return self.conn
+
+        def __exit__(self, exc_type, exc, tb) -> None:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+    def _transaction(self) -> "_Transaction":
+        return self._Transaction(self._connect())
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data["result"] = json.loads(data["result"]) if data["result"] else None
+        return Job(**data)
+
+    @staticmethod
+    def _expire_leases(conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(
+            """
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'pending' END,
+                last_error = COALESCE(last_error, 'lease expirado'),
+                lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE status = 'leased' AND lease_expires < ?
+            """,
+            (now, now),
+        )
+
+    def enqueue(
+        self, pdf_url: str, doc_name: str | None = None, max_attempts: int | None = None
+    ) -> str:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                """
+                SELECT id FROM jobs WHERE status IN ('pending', 'leased')
+                AND pdf_url = ? AND doc_name IS ?
+                """,
+                (pdf_url, doc_name),
+            ).fetchone()
+            if row:
+                return row["id"]
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                """
+                INSERT INTO jobs
+                    (id, pdf_url, doc_name, status, max_attempts, enqueued_at, updated_at)
+                VALUES (?, ?, ?, 'pending', ?, ?, ?)
+                """,
+                (job_id, pdf_url, doc_name, self._default_attempts(max_attempts), now, now),
+            )
+            return job_id
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Job | None:
+        now = time.time()
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                """
+                SELECT id FROM jobs WHERE status = 'pending' AND available_at <= ?
+                ORDER BY available_at, enqueued_at LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'leased', attempts = attempts + 1,
+                    lease_owner = ?, lease_expires = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (worker_id, now + lease_seconds, now, row["id"]),
+            )
+            return self._to_job(
+                conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            )
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET lease_expires = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (time.time() + lease_seconds, job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: dict[str, Any] | None = None) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL,
+                    lease_expires = NULL, updated_at = ?
+                WHERE id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (
+                    json.dumps(result, ensure_ascii=False, default=str) if result else None,
+                    time.time(),
+                    job_id,
+                    worker_id,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, delay: float | None = None) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs"
+                " WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (job_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return False
+            dead = row["attempts"] >= row["max_attempts"]
+            wait = delay if delay is not None else retry_delay(row["attempts"])
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, last_error = ?, available_at = ?,
+                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                WHERE id = ?
+                """,
+                (DEAD if dead else PENDING, error, now if dead else now + wait, now, job_id),
+            )
+            return True
+
+    def requeue_dead(self, job_id: str | None = None) -> int:
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, updated_at = ?
+                WHERE status = 'dead' AND (? IS NULL OR id = ?)
+                """,
+                (time.time(), job_id, job_id),
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: str) -> Job | None:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list_jobs(self, status: str | None = None, limit: int = 100) -> list[Job]:
+        with self._transaction() as conn:
+            self._expire_leases(conn, time.time())
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE ? IS NULL OR status = ? ORDER BY enqueued_at LIMIT ?",
+                (status, status, limit),
+            ).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def stats(self) -> dict[str, int]:
+        with self._transaction() as conn:
+            self._expire_leases(conn, time.time())
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+
+# =============================================
+# SELEÇÃO DO BACKEND
+# =============================================
+
+
+def _sqlite_queue(url: str) -> JobQueue:
+    # sqlite:///relativo.db ou sqlite:////caminho/absoluto.db
+    return SQLiteJobQueue(url.split("://", 1)[1][1:])
+
+
+_BACKENDS: dict[str, Callable[[str], JobQueue]] = {
+    "sqlite": _sqlite_queue,
+    "memory": lambda url: InMemoryJobQueue(),
+}
+
+
+def register_queue_backend(scheme: str, factory: Callable[[str], JobQueue]) -> None:
+    """Registra um broker (ex.: Redis, SQS) para URLs `scheme://...`."""
+    _BACKENDS[scheme] = factory
+
+
+def open_queue(url: str | None = None) -> JobQueue:
+    """Abre a fila de INGEST_QUEUE_URL (padrão: SQLite em indexing/assets)."""
+    url = url or os.getenv("INGEST_QUEUE_URL") or DEFAULT_QUEUE_URL
+    scheme = url.split("://", 1)[0] if "://" in url else "sqlite"
+    if "://" not in url:
+        url = f"sqlite:///{url}"
+    factory = _BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(
+            f"INGEST_QUEUE_URL com esquema desconhecido '{scheme}'. "
+            f"Registrados: {', '.join(sorted(_BACKENDS))}"
+        )
+    return factory(url)
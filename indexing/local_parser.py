@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Parser local para PDFs com camada de texto (born-digital).
+
+Extrai o texto e uma imagem JPEG por página sem passar pela LlamaParse,
+produzindo os mesmos registros de página do caminho remoto. Um
+classificador por documento decide o backend no modo `auto`: PDFs
+escaneados (páginas sem texto) ou complexos (muitas imagens por página)
+continuam indo para a LlamaParse; o resto é parseado aqui em milissegundos.
+
+Backends de PDF (opcionais, o primeiro disponível é usado):
+- `pypdfium2`: texto, contagem de imagens e renderização da página
+- `pypdf`: texto e a primeira imagem embutida da página (via Pillow)
+
+As páginas são distribuídas num pool de processos; documentos pequenos
+são parseados no próprio processo, onde o pool custaria mais que o parse.
+
+`page_fingerprints` calcula uma impressão digital por página do PDF de
+origem, usada pela ingestão incremental para parsear só as páginas novas
+ou alteradas.
+
+Todas as funções aceitam o PDF em bytes ou o caminho do arquivo em disco;
+com o caminho, o documento é lido pelo backend sem ficar inteiro em memória.
+"""
+
+import hashlib
+import importlib.util
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Union
+
+PDFIUM_AVAILABLE = importlib.util.find_spec("pypdfium2") is not None
+PYPDF_AVAILABLE = importlib.util.find_spec("pypdf") is not None
+
+PARSER_BACKENDS = ("llama", "local", "auto")
+
+NATIVE = "native"
+SCANNED = "scanned"
+COMPLEX = "complex"
+
+# Conteúdo do PDF ou caminho do arquivo em disco
+PdfData = Union[bytes, str, "os.PathLike[str]"]
+
+
+class LocalParserConfig:
+    def __init__(self):
+        # llama: sempre LlamaParse | local: sempre local | auto: classificador decide
+        self.backend = os.getenv("PARSER_BACKEND", "llama").lower()
+        if self.backend not in PARSER_BACKENDS:
+            raise ValueError(
+                f"PARSER_BACKEND inválido '{self.backend}'. Use um de: {', '.join(PARSER_BACKENDS)}"
+            )
+        self.workers = int(os.getenv("LOCAL_PARSER_WORKERS") or os.cpu_count() or 1)
+        # Abaixo disso o parse roda no próprio processo
+        self.min_pool_pages = int(os.getenv("LOCAL_PARSER_MIN_POOL_PAGES", "16"))
+        # Classificador
+        self.sample_pages = int(os.getenv("LOCAL_PARSER_SAMPLE_PAGES", "12"))
+        self.min_chars_per_page = int(os.getenv("LOCAL_PARSER_MIN_CHARS", "200"))
+        self.max_low_text_fraction = float(os.getenv("LOCAL_PARSER_MAX_LOW_TEXT_FRACTION", "0.3"))
+        self.max_images_per_page = float(os.getenv("LOCAL_PARSER_MAX_IMAGES_PER_PAGE", "4"))
+        # Renderização (1.0 = 72 dpi)
+        self.render_scale = float(os.getenv("LOCAL_PARSER_RENDER_SCALE", "1.5"))
+        self.jpeg_quality = int(os.getenv("LOCAL_PARSER_JPEG_QUALITY", "85"))
+        # Miniatura usada na impressão digital das páginas (só com pdfium)
+        self.fingerprint_scale = float(os.getenv("LOCAL_PARSER_FINGERPRINT_SCALE", "0.25"))
+
+
+def local_parser_available() -> bool:
+    return PDFIUM_AVAILABLE or PYPDF_AVAILABLE
+
+
+@dataclass
+class PdfClassification:
+    """Decisão do classificador para um documento."""
+
+    kind: str
+    pages: int
+    sampled: int = 0
+    low_text_pages: int = 0
+    images_per_page: float = 0.0
+    reason: str = ""
+
+    @property
+    def use_local(self) -> bool:
+        return self.kind == NATIVE
+
+
+@dataclass
+class ParsedPage:
+    """Uma página parseada: número (1-based), texto e imagem JPEG opcional."""
+
+    page: int
+    text: str
+    image: bytes | None = None
+    image_count: int = 0
+
+
+# =============================================
+# ACESSO AO PDF (pypdfium2 ou pypdf)
+# =============================================
+
+
+class _Document:
+    """Documento aberto com o backend disponível."""
+
+    def __init__(self, data: PdfData):
+        if not isinstance(data, bytes):
+            data = os.fspath(data)
+        if PDFIUM_AVAILABLE:
+            import pypdfium2 as pdfium
+
+            self.kind = "pdfium"
+            self.doc = pdfium.PdfDocument(data)
+        elif PYPDF_AVAILABLE:
+            from pypdf import PdfReader
+
+            self.kind = "pypdf"
+            self.doc = PdfReader(io.BytesIO(data) if isinstance(data, bytes) else data)
+            if self.doc.is_encrypted:
+                self.doc.decrypt("")
+        else:
+            raise ImportError(
+                "O parser local precisa de 'pypdfium2' ou 'pypdf'. Instale com: uv add pypdfium2"
+            )
+
+    def __len__(self) -> int:
+        return len(self.doc) if self.kind == "pdfium" else len(self.doc.pages)
+
+    def text(self, index: int) -> str:
+        if self.kind == "pdfium":
+            page = self.doc[index]
+            textpage = page.get_textpage()
+            try:
+                return textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+        return self.doc.pages[index].extract_text() or ""
+
+    def image_count(self, index: int) -> int:
+        if self.kind == "pdfium":
+            import pypdfium2.raw as pdfium_c
+
+            page = self.doc[index]
+            try:
+                return sum(1 for _ in page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_IMAGE]))
+            finally:
+                page.close()
+        return len(self.doc.pages[index].images)
+
+    def image(self, index: int, scale: float, quality: int) -> bytes | None:
+        """JPEG da página renderizada (pdfium) ou da primeira imagem embutida (pypdf)."""
+        if self.kind == "pdfium":
+            page = self.doc[index]
+            try:
+                picture = page.render(scale=scale).to_pil()
+            finally:
+                page.close()
+        else:
+            images = self.doc.pages[index].images
+            if not images:
+                return None
+            picture = images[0].image
+        buffer = io.BytesIO()
+        picture.convert("RGB").save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+
+    def fingerprint(self, index: int, scale: float) -> str:
+        """
+        Hash do conteúdo da página: texto, tamanho e uma miniatura
+        renderizada (pdfium) ou o fluxo de conteúdo e as imagens (pypdf).
+        """
+        digest = hashlib.sha256()
+        if self.kind == "pdfium":
+            page = self.doc[index]
+            try:
+                width, height = page.get_size()
+                digest.update(f"{width:.2f}x{height:.2f}".encode())
+                textpage = page.get_textpage()
+                try:
+                    digest.update(textpage.get_text_range().encode("utf-8", "replace"))
+                finally:
+                    textpage.close()
+                bitmap = page.render(scale=scale)
+                digest.update(bytes(bitmap.buffer))
+            finally:
+                page.close()
+        else:
+            page = self.doc.pages[index]
+            digest.update(repr([float(v) for v in page.mediabox]).encode())
+            contents = page.get_contents()
+            if contents is not None:
+                digest.update(contents.get_data())
+            for image in page.images:
+                digest.update(image.data)
+        return digest.hexdigest()
+
+
+def _clean_text(text: str) -> str:
+    """Junta palavras hifenizadas na quebra de linha e normaliza espaços."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+# =============================================
+# CLASSIFICADOR
+# =============================================
+
+
+def classify_pdf(data: PdfData, config: LocalParserConfig | None = None) -> PdfClassification:
+    """
+    Decide se o PDF pode ser parseado localmente.
+
+    Amostra até `sample_pages` páginas espaçadas: se muitas têm pouco texto
+    extraível, o PDF é tratado como escaneado; se a média de imagens por
+    página é alta, como complexo (figuras e diagramas que a LlamaParse
+    descreve melhor). Falhas ao abrir o PDF também mandam para a LlamaParse.
+    """
+    config = config or LocalParserConfig()
+    if not local_parser_available():
+        raise ImportError("O parser local precisa de 'pypdfium2' ou 'pypdf'")
+    try:
+        document = _Document(data)
+        total = len(document)
+    except Exception as e:
+        return PdfClassification(COMPLEX, 0, reason=f"não foi possível abrir localmente: {e}")
+    if total == 0:
+        return PdfClassification(COMPLEX, 0, reason="PDF sem páginas")
+
+    count = min(config.sample_pages, total)
+    indices = sorted({round(i * (total - 1) / max(count - 1, 1)) for i in range(count)})
+    low_text = 0
+    images = 0
+    for index in indices:
+        if len(_clean_text(document.text(index))) < config.min_chars_per_page:
+            low_text += 1
+        images += document.image_count(index)
+
+    low_text_fraction = low_text / len(indices)
+    images_per_page = images / len(indices)
+    result = PdfClassification(
+        NATIVE, total, len(indices), low_text, round(images_per_page, 2), "camada de texto completa"
+    )
+    if low_text_fraction > config.max_low_text_fraction:
+        result.kind = SCANNED
+        result.reason = f"{low_text}/{len(indices)} páginas amostradas sem texto suficiente"
+    elif images_per_page > config.max_images_per_page:
+        result.kind = COMPLEX
+        result.reason = f"{images_per_page:.1f} imagens por página"
+    return result
+
+
+# =============================================
+# PARSE POR PÁGINA (pool de processos)
+# =============================================
+
+# Estado de cada processo do pool: o PDF é aberto uma vez no initializer
+_worker_document: _Document | None = None
+_worker_options: tuple[float, int] = (1.5, 85)
+
+
+def _init_worker(data: PdfData, scale: float, quality: int) -> None:
+    global _worker_document, _worker_options
+    _worker_document = _Document(data)
+    _worker_options = (scale, quality)
+
+
+def _parse_pages(indices: list[int]) -> list[ParsedPage]:
+    document = _worker_document
+    scale, quality = _worker_options
+    pages = []
+    for index in indices:
+        image_count = document.image_count(index)
+        image = document.image(index, scale, quality) if image_count else None
+        pages.append(
+            ParsedPage(
+                page=index + 1,
+                text=_clean_text(document.text(index)),
+                image=image,
+                image_count=image_count,
+            )
+        )
+    return pages
+
+
+def parse_pdf(
+    data: PdfData, config: LocalParserConfig | None = None, pages: list[int] | None = None
+) -> list[ParsedPage]:
+    """
+    Extrai texto e imagem de cada página, em ordem.
+
+    Páginas com imagens recebem um JPEG da página renderizada (com pdfium)
+    ou da primeira imagem embutida (com pypdf), como a LlamaParse faz com
+    as capturas de página. `pages` (1-based) restringe o parse a essas páginas.
+    """
+    config = config or LocalParserConfig()
+    document_pages = len(_Document(data))
+    if pages is None:
+        indices = list(range(document_pages))
+    else:
+        indices = sorted({page - 1 for page in pages if 1 <= page <= document_pages})
+    total = len(indices)
+    workers = max(1, min(config.workers, total))
+    if total < config.min_pool_pages or workers == 1:
+        _init_worker(data, config.render_scale, config.jpeg_quality)
+        return _parse_pages(indices)
+
+    # Blocos contíguos: cada processo reaproveita o documento aberto
+    chunk = max(1, -(-total // (workers * 4)))
+    chunks = [indices[start : start + chunk] for start in range(0, total, chunk)]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(data, config.render_scale, config.jpeg_quality),
+    ) as executor:
+        return [page for pages in executor.map(_parse_pages, chunks) for page in pages]
+
+
+# =============================================
+# IMPRESSÃO DIGITAL POR PÁGINA
+# =============================================
+
+
+def page_fingerprints(
+    data: PdfData, config: LocalParserConfig | None = None
+) -> tuple[str, list[str]]:
+    """
+    Impressão digital de cada página, em ordem, e o backend que a calculou.
+
+    Impressões de backends diferentes não são comparáveis: quem compara
+    deve conferir o backend antes.
+    """
+    config = config or LocalParserConfig()
+    document = _Document(data)
+    return document.kind, [
+        document.fingerprint(index, config.fingerprint_scale) for index in range(len(document))
+    ]
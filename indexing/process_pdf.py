@@ -2,20 +2,63 @@
 """
 Processador End-to-End para PDFs
 Arquivo único que processa PDFs completos: Parse → Embeddings → Vector DB
-Não depende de outras configurações ou importações externas.
+Reutiliza apenas os serviços compartilhados de src/services (ex.: índice BM25).
 """
 
 import base64
+import contextlib
 import glob
+import hashlib
+import io
 import json
 import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
 import time
-from typing import Any, TypedDict
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Iterator, TypedDict, Union
 
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from upstash_vector import Index, Vector
 
+# Permite importar os serviços compartilhados com a busca (src/services)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from indexing.local_parser import (  # noqa: E402
+    LocalParserConfig,
+    classify_pdf,
+    local_parser_available,
+    page_fingerprints,
+    parse_pdf,
+)
+from services import metrics  # noqa: E402
+from services.embeddings.providers import (  # noqa: E402
+    LEGACY_MODEL,
+    METADATA_FIELD,
+    EmbeddingProvider,
+    ensure_index_model,
+    get_embedding_provider,
+)
+from services.metering import get_usage_meter  # noqa: E402
+from services.vector.bm25_index import BM25Index, default_index_path  # noqa: E402
+from services.vector.quantized_index import (  # noqa: E402
+    QuantizedIndex,
+    local_index_from_env,
+    vector_backend_from_env,
+)
+from services.vector.sharding import (  # noqa: E402
+    ShardedIndex,
+    build_sharded_index,
+    shard_urls_from_env,
+)
+
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
@@ -89,6 +132,46 @@ class UpstashConfig:
             "UPSTASH_VECTOR_TOKEN", ""
         )
         self.max_image_size = int(os.getenv("UPSTASH_MAX_IMAGE_SIZE", "1048576"))
+        # upstash (padrão) | local: índice quantizado em disco, sem rede
+        self.vector_backend = vector_backend_from_env()
+        # Índice léxico local (BM25) atualizado junto com os vetores
+        self.bm25_index_path = default_index_path()
+
+
+class VisionConfig:
+    def __init__(self):
+        # Etapa opcional: descreve cada imagem uma vez na indexação
+        self.enabled = os.getenv("VISION_DESCRIBE_IMAGES", "false").lower() == "true"
+        # Qualquer endpoint compatível com OpenAI (/chat/completions), inclusive modelos locais
+        self.base_url = os.getenv("VISION_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+        self.token = os.getenv("VISION_API_KEY") or os.getenv("OPENAI_API_KEY", "")
+        self.default_model = os.getenv("VISION_MODEL_NAME", "gpt-4.1-mini")
+        self.max_workers = int(os.getenv("VISION_MAX_WORKERS", "4"))
+        self.timeout = int(os.getenv("VISION_TIMEOUT", "120"))
+
+        # Diretórios
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.descriptions_dir = os.getenv(
+            "VISION_DESCRIPTIONS_DIR", os.path.join(base_dir, "assets", "image_descriptions")
+        )
+
+        # Headers
+        self.headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+        }
+
+
+class IncrementalConfig:
+    def __init__(self):
+        # Reingestão parseia, embeda e insere só as páginas novas ou alteradas
+        self.enabled = os.getenv("INGEST_INCREMENTAL", "true").lower() == "true"
+
+        # Diretórios
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        self.manifests_dir = os.getenv(
+            "INGEST_MANIFEST_DIR", os.path.join(base_dir, "assets", "vector_manifests")
+        )
 
 
 # =============================================
@@ -125,23 +208,195 @@ class Constants:
     MULTIMODAL_3_DIMENSIONS = 1024
     VOYAGE_DEFAULT_MODEL = "voyage-multimodal-3"
 
+    # Upload em streaming
+    PDF_CONTENT_TYPE = "application/pdf"
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+    # Campos do payload enviados à VoyageAI (o resto é metadado local)
+    VOYAGE_PAYLOAD_FIELDS = ("inputs", "model", "truncation")
+
 
 # =============================================
 # TIPOS
 # =============================================
 
 
+class ImageDescription(TypedDict):
+    description: str
+    ocr: str
+
+
+# Recebe a imagem como data URL (data:image/...;base64,...) e devolve descrição + OCR
+ImageDescriber = Callable[[str], ImageDescription]
+
+
+# URL http(s), caminho local ou arquivo aberto em modo binário
+PdfSource = Union[str, "os.PathLike[str]", BinaryIO]
+
+
+@dataclass
+class PageUpdatePlan:
+    """Páginas a parsear e páginas reaproveitadas da ingestão anterior"""
+
+    total_pages: int
+    previous_pages: int
+    parse: list[int]
+    # Página atual → página da ingestão anterior com a mesma impressão digital
+    reuse: dict[int, int]
+
+    @property
+    def unchanged(self) -> bool:
+        return (
+            not self.parse
+            and self.total_pages == self.previous_pages
+            and all(page == previous for page, previous in self.reuse.items())
+        )
+
+
+def plan_page_update(previous: list[str], current: list[str]) -> PageUpdatePlan:
+    """
+    Compara as impressões digitais por página das duas versões do PDF.
+
+    Uma página igual à da mesma posição é reaproveitada; senão, qualquer
+    página anterior com o mesmo conteúdo serve (páginas inseridas no meio
+    só deslocam as seguintes). O resto vai para o parser.
+    """
+    positions: dict[str, int] = {}
+    for page, fingerprint in enumerate(previous, start=1):
+        positions.setdefault(fingerprint, page)
+
+    parse: list[int] = []
+    reuse: dict[int, int] = {}
+    for page, fingerprint in enumerate(current, start=1):
+        if page <= len(previous) and previous[page - 1] == fingerprint:
+            reuse[page] = page
+        elif fingerprint in positions:
+            reuse[page] = positions[fingerprint]
+        else:
+            parse.append(page)
+    return PageUpdatePlan(len(current), len(previous), parse, reuse)
+
+
 class ProcessingResult(TypedDict):
     success: bool
     pdf_url: str | None
     doc_name: str | None
     llama_result: dict[str, Any] | None
+    vision_result: dict[str, Any] | None
     voyage_result: dict[str, Any] | None
     upstash_result: dict[str, Any] | None
     total_time: float
     error: str | None
 
 
+# =============================================
+# HTTP: SESSÃO COMPARTILHADA E UPLOAD EM STREAMING
+# =============================================
+
+_http_session: requests.Session | None = None
+_http_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Sessão keep-alive compartilhada por todos os PDFProcessor do processo.
+
+    Uploads, polls e downloads concorrentes (ex.: vários jobs no mesmo
+    worker) reaproveitam as conexões TLS do pool em vez de abrir uma
+    conexão por requisição.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_lock:
+            if _http_session is None:
+                pool_size = int(os.getenv("HTTP_POOL_SIZE", "16"))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
+
+
+def _is_url(source: Any) -> bool:
+    return isinstance(source, str) and source.startswith(("http://", "https://"))
+
+
+def _remaining_size(fileobj: BinaryIO) -> int | None:
+    """Bytes que faltam ler do arquivo, ou None se não dá para saber sem ler"""
+    try:
+        return os.fstat(fileobj.fileno()).st_size - fileobj.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass
+    try:
+        if fileobj.seekable():
+            position = fileobj.tell()
+            end = fileobj.seek(0, io.SEEK_END)
+            fileobj.seek(position)
+            return end - position
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+class MultipartStream:
+    """
+    Corpo multipart/form-data lido sob demanda.
+
+    O arquivo é lido em blocos enquanto a requisição é enviada, sem nunca
+    ficar inteiro em memória. Com tamanho conhecido (arquivo em disco ou
+    seekable), `len` vira o Content-Length; sem tamanho, o requests envia
+    o corpo iterando os blocos com Transfer-Encoding: chunked.
+    """
+
+    def __init__(
+        self,
+        fields: dict[str, Any],
+        file_field: str,
+        filename: str,
+        fileobj: BinaryIO,
+        content_type: str = Constants.PDF_CONTENT_TYPE,
+        chunk_size: int = Constants.UPLOAD_CHUNK_SIZE,
+    ):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        head = b"".join(
+            (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            ).encode()
+            for name, value in fields.items()
+        )
+        filename = filename.replace('"', "%22")
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+            f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'
+        ).encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._parts: list[BinaryIO] = [io.BytesIO(head), fileobj, io.BytesIO(tail)]
+
+        file_size = _remaining_size(fileobj)
+        self.len = None if file_size is None else len(head) + file_size + len(tail)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def read(self, size: int = -1) -> bytes:
+        out = bytearray()
+        while self._parts and (size < 0 or len(out) < size):
+            chunk = self._parts[0].read(-1 if size < 0 else size - len(out))
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            out += chunk
+        return bytes(out)
+
+    def __iter__(self) -> Iterator[bytes]:
+        while chunk := self.read(self.chunk_size):
+            yield chunk
+
+
 # =============================================
 # PROCESSADOR PRINCIPAL
 # =============================================
@@ -150,20 +405,37 @@ class ProcessingResult(TypedDict):
 class PDFProcessor:
     """Processador End-to-End completo para PDFs"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        image_describer: ImageDescriber | None = None,
+        embedding_provider: EmbeddingProvider | None = None,
+    ):
         self.llama_config = LlamaConfig()
         self.voyage_config = VoyageConfig()
         self.upstash_config = UpstashConfig()
+        self.vision_config = VisionConfig()
+        self.parser_config = LocalParserConfig()
+        self.incremental_config = IncrementalConfig()
+        self.http = get_http_session()
 
-        # Inicializa o índice Upstash
-        self.upstash_index = Index(
-            url=self.upstash_config.vector_url, token=self.upstash_config.vector_token
-        )
+        # Modelo de visão da etapa opcional de descrição (padrão: endpoint OpenAI-compatível)
+        self.image_describer = image_describer or self._describe_image_remote
+
+        # Provedor de embedding compartilhado com a busca (EMBEDDING_PROVIDER)
+        self.embedding_provider = embedding_provider or get_embedding_provider()
+
+        # O índice Upstash é criado sob demanda (ver propriedade upstash_index)
+        self._upstash_index: Index | ShardedIndex | QuantizedIndex | None = None
+
+        # Índice léxico local usado pela busca híbrida
+        self.bm25_index = BM25Index(path=self.upstash_config.bm25_index_path)
 
         # Cria diretórios necessários
         os.makedirs(self.llama_config.images_dir, exist_ok=True)
         os.makedirs(self.llama_config.payload_dir, exist_ok=True)
         os.makedirs(self.voyage_config.embeddings_dir, exist_ok=True)
+        os.makedirs(self.vision_config.descriptions_dir, exist_ok=True)
+        os.makedirs(self.incremental_config.manifests_dir, exist_ok=True)
 
         self.verbose = self.llama_config.verbose
 
@@ -173,14 +445,39 @@ class PDFProcessor:
             print(f"📁 Diretório de payloads: {self.llama_config.payload_dir}")
             print(f"📁 Diretório de embeddings: {self.voyage_config.embeddings_dir}")
 
+    @property
+    def upstash_index(self) -> Index | ShardedIndex | QuantizedIndex:
+        """
+        Cliente Upstash criado no primeiro uso (sharded se UPSTASH_VECTOR_SHARD_URLS)
+
+        Com VECTOR_BACKEND=local, os vetores vão para o índice quantizado local.
+        """
+        if self._upstash_index is None:
+            shard_urls = shard_urls_from_env()
+            if self.upstash_config.vector_backend == "local":
+                self._upstash_index = local_index_from_env()
+            elif shard_urls:
+                self._upstash_index = build_sharded_index(shard_urls)
+            else:
+                self._upstash_index = Index(
+                    url=self.upstash_config.vector_url, token=self.upstash_config.vector_token
+                )
+        return self._upstash_index
+
+    @upstash_index.setter
+    def upstash_index(self, index: Index | ShardedIndex | QuantizedIndex) -> None:
+        self._upstash_index = index
+
     # =============================================
     # MÉTODOS LLAMA PARSE
     # =============================================
 
-    def _extract_pdf_name(self, pdf_url: str) -> str:
-        """Extrai o nome do arquivo PDF da URL"""
+    def _extract_pdf_name(self, pdf_url: PdfSource) -> str:
+        """Extrai o nome do arquivo PDF da URL, do caminho ou do `name` do arquivo aberto"""
         try:
-            filename = pdf_url.split("/")[-1]
+            if not isinstance(pdf_url, (str, os.PathLike)):
+                pdf_url = getattr(pdf_url, "name", "")
+            filename = os.fspath(pdf_url).replace(os.sep, "/").split("/")[-1]
             filename = filename.split("?")[0]
             if filename.lower().endswith(Constants.PDF_EXTENSION):
                 filename = filename[: -Constants.PDF_EXTENSION_LENGTH]
@@ -233,8 +530,25 @@ class PDFProcessor:
         if files_removed > 0:
             print(f"✅ {files_removed} arquivos removidos com sucesso")
 
-    def _upload_pdf(self, pdf_url: str) -> dict[str, Any]:
-        """Envia PDF para processamento na LlamaIndex Cloud"""
+    @contextlib.contextmanager
+    def _open_source(self, pdf_source: PdfSource) -> Iterator[BinaryIO]:
+        """Abre um caminho local; arquivos já abertos são usados como estão"""
+        if isinstance(pdf_source, (str, os.PathLike)):
+            with open(pdf_source, "rb") as f:
+                yield f
+        else:
+            yield pdf_source
+
+    def _upload_pdf(
+        self, pdf_url: PdfSource, pdf_name: str | None = None, pages: list[int] | None = None
+    ) -> dict[str, Any]:
+        """
+        Envia PDF para processamento na LlamaIndex Cloud
+
+        URLs vão como `input_url`; caminhos locais e arquivos abertos são
+        enviados como multipart em streaming, bloco a bloco. `pages`
+        (1-based) restringe o parse a essas páginas.
+        """
         url = f"{self.llama_config.base_url}/upload"
 
         data = {
@@ -242,20 +556,38 @@ class PDFProcessor:
                 self.llama_config.default_multimodal
             ).lower(),
             "vendor_multimodal_model_name": self.llama_config.default_model,
-            "input_url": pdf_url,
             "num_workers": self.llama_config.num_workers,
         }
+        if pages is not None:
+            # target_pages é 0-based
+            data["target_pages"] = ",".join(str(page - 1) for page in pages)
 
         if self.verbose:
-            print(f"📤 Enviando PDF: {pdf_url}")
+            print(f"📤 Enviando PDF: {self._source_label(pdf_url)}")
 
         # Try form data instead of JSON
         headers_without_content_type = {
             "Authorization": f"Bearer {self.llama_config.token}",
         }
-        response = requests.post(
-            url, data=data, headers=headers_without_content_type, timeout=30
-        )
+        if _is_url(pdf_url):
+            data["input_url"] = pdf_url
+            with metrics.span("llama.upload"):
+                response = self.http.post(
+                    url, data=data, headers=headers_without_content_type, timeout=30
+                )
+        else:
+            filename = f"{pdf_name or self._extract_pdf_name(pdf_url)}{Constants.PDF_EXTENSION}"
+            with self._open_source(pdf_url) as fileobj, metrics.span("llama.upload", streamed=True):
+                body = MultipartStream(data, "file", filename, fileobj)
+                if body.len is not None:
+                    metrics.inc("ingest_bytes_total", body.len, kind="pdf_upload")
+                response = self.http.post(
+                    url,
+                    data=body,
+                    headers={**headers_without_content_type, "Content-Type": body.content_type},
+                    # Timeout de leitura entre blocos, não do upload inteiro
+                    timeout=(30, 300),
+                )
 
         if response.status_code == Constants.HTTP_OK:
             result = response.json()
@@ -273,7 +605,8 @@ class PDFProcessor:
     def _get_job_status(self, job_id: str) -> dict[str, Any]:
         """Consulta o status de um job"""
         url = f"{self.llama_config.base_url}/job/{job_id}"
-        response = requests.get(url, headers=self.llama_config.headers, timeout=30)
+        with metrics.span("llama.poll"):
+            response = self.http.get(url, headers=self.llama_config.headers, timeout=30)
 
         if response.status_code == Constants.HTTP_OK:
             result = response.json()
@@ -327,14 +660,22 @@ class PDFProcessor:
             print(f"⏰ Timeout atingido em {self.llama_config.max_wait_time} segundos")
         return self._get_job_status(job_id)
 
-    def _get_structured_output(self, job_id: str, pdf_name: str) -> dict[str, Any]:
-        """Extrai dados estruturados, texto e imagens do PDF processado"""
+    def _get_structured_output(
+        self, job_id: str, pdf_name: str, pages: list[int] | None = None
+    ) -> tuple[dict[int, dict[str, Any]], dict[str, Any]]:
+        """
+        Extrai texto e imagens do PDF processado, por número de página
+
+        Devolve as entradas do payload (só páginas com conteúdo) e o JSON
+        original da LlamaParse.
+        """
         json_url = f"{self.llama_config.base_url}/job/{job_id}/result/json"
 
         if self.verbose:
             print(f"📊 Extraindo dados estruturados do job {job_id}...")
 
-        response = requests.get(json_url, headers=self.llama_config.headers, timeout=60)
+        with metrics.span("llama.result_json"):
+            response = self.http.get(json_url, headers=self.llama_config.headers, timeout=60)
 
         if response.status_code != Constants.HTTP_OK:
             if self.verbose:
@@ -344,14 +685,17 @@ class PDFProcessor:
             response.raise_for_status()
 
         result = response.json()
-        voyage_inputs = []
-        total_images_saved = 0
+        result_pages = result.get("pages", [])
+        entries: dict[int, dict[str, Any]] = {}
 
         if self.verbose:
-            print(f"📄 Processando {len(result.get('pages', []))} páginas")
+            print(f"📄 Processando {len(result_pages)} páginas")
 
-        for page in result.get("pages", []):
-            page_number = page.get("page")
+        page_numbers = [page.get("page") for page in result_pages]
+        if pages is not None:
+            page_numbers = self._target_page_numbers(page_numbers, pages)
+
+        for page_number, page in zip(page_numbers, result_pages):
             content_blocks = []
 
             # Extrai o markdown da página
@@ -365,7 +709,9 @@ class PDFProcessor:
                 image_extension = original_image_name.split(".")[-1]
                 new_image_name = f"{pdf_name}_page_{page_number}.{image_extension}"
 
-                img_url = f"{self.llama_config.base_url}/job/{job_id}/result/image/{original_image_name}"
+                img_url = (
+                    f"{self.llama_config.base_url}/job/{job_id}/result/image/{original_image_name}"
+                )
                 img_headers = {
                     "Accept": Constants.ACCEPT_IMAGE_JPEG,
                     "Authorization": f"Bearer {self.llama_config.token}",
@@ -377,36 +723,13 @@ class PDFProcessor:
                             f"📸 Baixando imagem: {original_image_name} -> {new_image_name}"
                         )
 
-                    img_response = requests.get(
-                        img_url, headers=img_headers, timeout=30
-                    )
-                    img_response.raise_for_status()
-
-                    img_data = img_response.content
-                    img_b64 = base64.b64encode(img_data).decode("utf-8")
-                    img_path = os.path.join(
-                        self.llama_config.images_dir, new_image_name
-                    )
-
-                    # Salva a imagem em disco
-                    with open(img_path, "wb") as f:
-                        f.write(img_data)
-
-                    if os.path.exists(img_path):
-                        file_size = os.path.getsize(img_path)
-                        if self.verbose:
-                            print(
-                                f"✅ Imagem salva: {new_image_name} ({file_size} bytes)"
-                            )
-                        total_images_saved += 1
+                    with metrics.span("llama.image_fetch"):
+                        img_response = self.http.get(
+                            img_url, headers=img_headers, timeout=30
+                        )
+                        img_response.raise_for_status()
 
-                    # Adiciona a imagem como base64 no bloco de conteúdo
-                    content_blocks.append(
-                        {
-                            "type": "image_base64",
-                            "image_base64": f"data:image/jpeg;base64,{img_b64}",
-                        }
-                    )
+                    content_blocks.append(self._image_block(new_image_name, img_response.content))
 
                 except Exception as e:
                     if self.verbose:
@@ -414,14 +737,88 @@ class PDFProcessor:
 
             # Só adiciona se houver conteúdo
             if content_blocks:
-                voyage_inputs.append({"content": content_blocks})
+                entries[page_number] = {"content": content_blocks}
+
+        return entries, result
+
+    @staticmethod
+    def _target_page_numbers(numbers: list[Any], pages: list[int]) -> list[int]:
+        """
+        Números de página do documento para o resultado de um parse com target_pages
+
+        A LlamaParse pode numerar as páginas pelo documento (os números pedidos)
+        ou pela posição entre as pedidas (1..n). Números que são todos páginas
+        pedidas ficam como estão; números dentro de 1..n viram a n-ésima página
+        pedida. Qualquer outro resultado não corresponde ao pedido e é recusado,
+        em vez de gravar o conteúdo na página errada.
+        """
+        target = sorted(pages)
+        if all(number in target for number in numbers):
+            return list(numbers)
+        if all(isinstance(number, int) and 1 <= number <= len(target) for number in numbers):
+            return [target[number - 1] for number in numbers]
+        raise ValueError(f"LlamaParse devolveu as páginas {numbers} para target_pages {target}")
+
+    def _write_image(self, image_name: str, img_data: bytes) -> None:
+        img_path = os.path.join(self.llama_config.images_dir, image_name)
+        with open(img_path, "wb") as f:
+            f.write(img_data)
+
+    def _image_block(self, image_name: str, img_data: bytes) -> dict[str, str]:
+        """Salva a imagem da página em disco e devolve o bloco base64 do payload"""
+        metrics.inc("ingest_bytes_total", len(img_data), kind="image")
+        self._write_image(image_name, img_data)
+        if self.verbose:
+            print(f"✅ Imagem salva: {image_name} ({len(img_data)} bytes)")
+
+        img_b64 = base64.b64encode(img_data).decode("utf-8")
+        return {"type": "image_base64", "image_base64": f"data:image/jpeg;base64,{img_b64}"}
+
+    @staticmethod
+    def _count_images(entries: dict[int, dict[str, Any]]) -> int:
+        return sum(
+            1
+            for entry in entries.values()
+            for item in entry.get("content", [])
+            if item.get("type") == "image_base64"
+        )
+
+    def _save_payload(
+        self,
+        pdf_name: str,
+        entries: dict[int, dict[str, Any]],
+        original_result: dict[str, Any],
+        parser: str,
+        update: dict[str, Any],
+        fingerprints: tuple[str, list[str]] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Grava o payload da VoyageAI e registra páginas/imagens parseadas
+
+        Além dos campos da VoyageAI, o payload guarda o número da página de
+        cada entrada e a impressão digital de cada página do PDF, usadas na
+        próxima ingestão para reaproveitar o que não mudou.
+        """
+        parsed = {page: entries[page] for page in update["parsed_pages"] if page in entries}
+        metrics.inc("ingest_pages_total", len(parsed))
+        metrics.inc("ingest_images_total", self._count_images(parsed))
+        get_usage_meter().record(document=pdf_name, parse_pages=len(parsed))
+
+        page_numbers = sorted(entries)
+        voyage_inputs = [entries[page] for page in page_numbers]
+        total_images_saved = self._count_images(entries)
 
         # Salva o payload para VoyageAI
-        payload = {
+        payload: dict[str, Any] = {
             "inputs": voyage_inputs,
             "model": Constants.VOYAGE_DEFAULT_MODEL,
             "truncation": False,
+            "page_numbers": page_numbers,
+            "parser": parser,
         }
+        if fingerprints is not None:
+            backend, pages = fingerprints
+            payload["page_fingerprints"] = {"backend": backend, "pages": pages}
 
         payload_filename = f"{pdf_name}.json"
         payload_path = os.path.join(self.llama_config.payload_dir, payload_filename)
@@ -432,29 +829,25 @@ class PDFProcessor:
         if self.verbose:
             print(f"💾 Payload salvo: {payload_path}")
             print("✅ Processamento concluído!")
-            print(f"📄 Páginas processadas: {len(voyage_inputs)}")
+            print(f"📄 Páginas processadas: {len(parsed)} de {len(voyage_inputs)}")
             print(f"🖼️ Imagens salvas: {total_images_saved}")
 
         return {
-            "original_result": result,
+            "original_result": original_result,
+            "parser": parser,
+            "update": update,
             "voyage_inputs": voyage_inputs,
+            "page_numbers": page_numbers,
             "total_images": total_images_saved,
             "payload_path": payload_path,
             "pdf_name": pdf_name,
         }
 
-    def process_llama(self, pdf_url: str) -> dict[str, Any]:
-        """Processa PDF completo com LlamaIndex"""
-        pdf_name = self._extract_pdf_name(pdf_url)
-
-        if self.verbose:
-            print("🚀 Iniciando processamento LlamaIndex")
-            print(f"🗂️ Verificando arquivos existentes para: {pdf_name}")
-
-        self._clean_existing_files(pdf_name)
-
-        # Upload
-        upload_result = self._upload_pdf(pdf_url)
+    def _parse_llama(
+        self, pdf_url: PdfSource, pdf_name: str, pages: list[int] | None = None
+    ) -> tuple[dict[int, dict[str, Any]], dict[str, Any]]:
+        """Upload, espera e extração de um job da LlamaParse"""
+        upload_result = self._upload_pdf(pdf_url, pdf_name, pages)
         job_id = upload_result.get("id")
 
         if not job_id:
@@ -468,14 +861,370 @@ class PDFProcessor:
             )
 
         # Extrai dados estruturados
-        return self._get_structured_output(job_id, pdf_name)
+        return self._get_structured_output(job_id, pdf_name, pages)
+
+    @metrics.timed("stage.llama")
+    def process_llama(self, pdf_url: PdfSource, pdf_name: str | None = None) -> dict[str, Any]:
+        """
+        Processa PDF completo com LlamaIndex (URL, caminho local ou arquivo aberto)
+
+        Com INGEST_INCREMENTAL (padrão), as páginas cuja impressão digital já
+        está no payload anterior são reaproveitadas e só as novas ou
+        alteradas vão para o parser.
+        """
+        pdf_name = pdf_name or self._extract_pdf_name(pdf_url)
+
+        if self.verbose:
+            print("🚀 Iniciando processamento LlamaIndex")
+            print(f"🗂️ Verificando arquivos existentes para: {pdf_name}")
+
+        # O PDF vai para um arquivo em disco para o parser local e as impressões digitais
+        local_backend = self.parser_config.backend != "llama"
+        needs_data = local_parser_available() and (
+            local_backend or self.incremental_config.enabled
+        )
+        unseekable = not isinstance(pdf_url, (str, os.PathLike)) and not pdf_url.seekable()
+        with contextlib.ExitStack() as stack:
+            pdf_path = None
+            try:
+                if needs_data:
+                    pdf_path = stack.enter_context(self._pdf_on_disk(pdf_url))
+            except Exception as e:
+                if local_backend or unseekable:
+                    raise
+                # Só as impressões digitais dependiam do PDF: segue com o parse completo
+                if self.verbose:
+                    print(f"⚠️ PDF indisponível localmente ({e}); parse completo")
+            if pdf_path is not None and unseekable:
+                # Sem seek, o upload usa a cópia em disco
+                pdf_url = pdf_path
+            return self._parse_and_save(pdf_url, pdf_name, pdf_path)
+
+    def _parse_and_save(
+        self, pdf_url: PdfSource, pdf_name: str, pdf_path: str | None
+    ) -> dict[str, Any]:
+        """Parse completo ou só das páginas alteradas (com o PDF em disco) e gravação do payload"""
+        fingerprints = None
+        plan = None
+        previous = None
+        if pdf_path is not None and self.incremental_config.enabled:
+            try:
+                with metrics.span("pdf.fingerprint"):
+                    fingerprints = page_fingerprints(pdf_path, self.parser_config)
+                previous = self._load_payload(pdf_name)
+                plan = self._plan_update(previous, fingerprints)
+            except Exception as e:
+                fingerprints = None
+                if self.verbose:
+                    print(f"⚠️ Impressões digitais indisponíveis ({e}); parse completo")
+
+        if plan is None:
+            self._clean_existing_files(pdf_name)
+        elif plan.unchanged:
+            if self.verbose:
+                print(f"♻️ Nenhuma página mudou desde a última ingestão de {pdf_name}")
+            update = {"mode": "unchanged", "parsed_pages": [], "reused_pages": plan.total_pages}
+            entries = dict(zip(self._page_numbers(previous), previous["inputs"]))
+            return self._save_payload(
+                pdf_name, entries, {}, previous.get("parser", "llama"), update, fingerprints
+            )
+        elif self.verbose:
+            print(
+                f"🧩 Atualização parcial: {len(plan.parse)} página(s) para parsear, "
+                f"{len(plan.reuse)} reaproveitada(s) de {plan.previous_pages}"
+            )
+
+        pages = plan.parse if plan else None
+        entries: dict[int, dict[str, Any]] = {}
+        original_result: dict[str, Any] = {}
+        parser = previous.get("parser", "llama") if previous else "llama"
+        if pages is None or pages:
+            # PDFs com camada de texto podem ser parseados localmente (PARSER_BACKEND)
+            if self._use_local_parser(pdf_path):
+                parser = "local"
+                entries, original_result = self._parse_local(pdf_path, pdf_name, pages)
+            else:
+                parser = "llama"
+                entries, original_result = self._parse_llama(pdf_url, pdf_name, pages)
+
+        parsed_pages = sorted(entries)
+        if plan is not None:
+            entries = self._merge_pages(pdf_name, previous, plan, entries)
+            update = {
+                "mode": "partial",
+                "parsed_pages": parsed_pages,
+                "reused_pages": len(plan.reuse),
+            }
+        else:
+            update = {"mode": "full", "parsed_pages": parsed_pages, "reused_pages": 0}
+        return self._save_payload(pdf_name, entries, original_result, parser, update, fingerprints)
+
+    # =============================================
+    # ATUALIZAÇÃO INCREMENTAL
+    # =============================================
+
+    def _load_payload(self, pdf_name: str) -> dict[str, Any] | None:
+        path = os.path.join(self.llama_config.payload_dir, f"{pdf_name}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _page_numbers(payload: dict[str, Any]) -> list[int]:
+        """Número da página de cada entrada do payload (payloads antigos: a posição)"""
+        inputs = payload.get("inputs", [])
+        page_numbers = payload.get("page_numbers")
+        if page_numbers and len(page_numbers) == len(inputs):
+            return page_numbers
+        return list(range(1, len(inputs) + 1))
+
+    def _plan_update(
+        self, previous: dict[str, Any] | None, fingerprints: tuple[str, list[str]]
+    ) -> PageUpdatePlan | None:
+        """Plano de atualização parcial; None quando o documento precisa de parse completo"""
+        if previous is None:
+            return None
+        stored = previous.get("page_fingerprints") or {}
+        backend, pages = fingerprints
+        if stored.get("backend") != backend or not stored.get("pages"):
+            return None
+        if len(previous.get("page_numbers") or []) != len(previous.get("inputs", [])):
+            return None
+        return plan_page_update(stored["pages"], pages)
+
+    def _merge_pages(
+        self,
+        pdf_name: str,
+        previous: dict[str, Any],
+        plan: PageUpdatePlan,
+        parsed: dict[int, dict[str, Any]],
+    ) -> dict[int, dict[str, Any]]:
+        """Junta as páginas recém-parseadas às reaproveitadas do payload anterior"""
+        previous_entries = dict(zip(self._page_numbers(previous), previous["inputs"]))
+        entries: dict[int, dict[str, Any]] = {}
+        for page, previous_page in plan.reuse.items():
+            entry = previous_entries.get(previous_page)
+            if entry is None:
+                # A página não tinha conteúdo
+                continue
+            if page != previous_page:
+                # Página deslocada: a imagem passa a ter o nome da nova posição
+                for item in entry.get("content", []):
+                    if item.get("type") == "image_base64":
+                        img_b64 = item["image_base64"].split(",", 1)[-1]
+                        self._write_image(f"{pdf_name}_page_{page}.jpg", base64.b64decode(img_b64))
+            entries[page] = entry
+        entries.update(parsed)
+
+        # Remove imagens de páginas que deixaram de existir ou de ter imagem
+        with_images = {
+            page
+            for page, entry in entries.items()
+            if any(item.get("type") == "image_base64" for item in entry.get("content", []))
+        }
+        pattern = re.compile(rf"^{re.escape(pdf_name)}_page_(\d+)\.\w+$")
+        for img_file in glob.glob(os.path.join(self.llama_config.images_dir, f"{pdf_name}_page_*")):
+            match = pattern.match(os.path.basename(img_file))
+            if match and int(match.group(1)) not in with_images:
+                os.remove(img_file)
+        return entries
+
+    # =============================================
+    # PARSER LOCAL
+    # =============================================
+
+    def _source_label(self, pdf_source: PdfSource) -> str:
+        """Descrição legível da origem do PDF (para logs e resultados)"""
+        if isinstance(pdf_source, (str, os.PathLike)):
+            return os.fspath(pdf_source)
+        name = getattr(pdf_source, "name", None)
+        return name if isinstance(name, str) else "<arquivo em memória>"
+
+    @contextlib.contextmanager
+    def _pdf_on_disk(self, pdf_url: PdfSource) -> Iterator[str]:
+        """
+        Caminho do PDF em disco, sem ler o documento inteiro em memória
+
+        Caminhos locais são usados como estão. URLs e arquivos abertos são
+        copiados em blocos para um arquivo temporário, apagado na saída;
+        arquivos com seek voltam à posição inicial para o upload.
+        """
+        if isinstance(pdf_url, (str, os.PathLike)) and not _is_url(pdf_url):
+            yield os.fspath(pdf_url)
+            return
+        fd, path = tempfile.mkstemp(suffix=Constants.PDF_EXTENSION)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                if _is_url(pdf_url):
+                    with metrics.span("pdf.download"), self.http.get(
+                        pdf_url, timeout=60, stream=True
+                    ) as response:
+                        response.raise_for_status()
+                        for chunk in response.iter_content(Constants.UPLOAD_CHUNK_SIZE):
+                            out.write(chunk)
+                    metrics.inc("ingest_bytes_total", out.tell(), kind="pdf")
+                else:
+                    start = pdf_url.tell() if pdf_url.seekable() else None
+                    shutil.copyfileobj(pdf_url, out, Constants.UPLOAD_CHUNK_SIZE)
+                    if start is not None:
+                        pdf_url.seek(start)
+            yield path
+        finally:
+            os.remove(path)
+
+    def _use_local_parser(self, pdf_path: str | None) -> bool:
+        """
+        Decide entre o parser local e a LlamaParse, conforme o PARSER_BACKEND.
+
+        No modo `auto`, o classificador manda PDFs escaneados ou complexos
+        para a LlamaParse; no modo `local`, todo PDF é parseado aqui.
+        """
+        backend = self.parser_config.backend
+        if backend == "llama":
+            return False
+        if pdf_path is None or not local_parser_available():
+            if backend == "local":
+                raise ImportError(
+                    "PARSER_BACKEND=local precisa de 'pypdfium2' ou 'pypdf'. "
+                    "Instale com: uv add pypdfium2"
+                )
+            if self.verbose:
+                print("⚠️ Parser local indisponível (pypdfium2/pypdf ausentes); usando LlamaParse")
+            return False
+
+        if backend == "auto":
+            with metrics.span("local.classify"):
+                classification = classify_pdf(pdf_path, self.parser_config)
+            if self.verbose:
+                print(
+                    f"🔎 Classificação: {classification.kind} ({classification.reason}) "
+                    f"→ {'parser local' if classification.use_local else 'LlamaParse'}"
+                )
+            return classification.use_local
+        return True
+
+    def _parse_local(
+        self, pdf_path: str, pdf_name: str, pages: list[int] | None = None
+    ) -> tuple[dict[int, dict[str, Any]], dict[str, Any]]:
+        """Parse local: mesmas entradas por página (texto + imagem) da LlamaParse"""
+        if self.verbose:
+            print(f"⚡ Parse local de {pdf_name}")
+
+        with metrics.span("local.parse"):
+            parsed_pages = parse_pdf(pdf_path, self.parser_config, pages)
+
+        entries: dict[int, dict[str, Any]] = {}
+        for page in parsed_pages:
+            content_blocks: list[dict[str, str]] = []
+            if page.text:
+                content_blocks.append({"type": "text", "text": page.text})
+            if page.image:
+                image_name = f"{pdf_name}_page_{page.page}.jpg"
+                content_blocks.append(self._image_block(image_name, page.image))
+            # Só adiciona se houver conteúdo (como no caminho da LlamaParse)
+            if content_blocks:
+                entries[page.page] = {"content": content_blocks}
+
+        original_result = {
+            "pages": [
+                {"page": page.page, "md": page.text, "images": page.image_count}
+                for page in parsed_pages
+            ]
+        }
+        return entries, original_result
 
     # =============================================
     # MÉTODOS VOYAGE AI
     # =============================================
 
+    @staticmethod
+    def _input_hash(entry: dict[str, Any]) -> str:
+        """Hash do conteúdo de uma entrada (o embedding depende só dele e do modelo)"""
+        return hashlib.sha256(
+            json.dumps(entry, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+
+    def _load_cached_embeddings(
+        self, output_file: str, model: str | None
+    ) -> dict[str, list[float]]:
+        """Embeddings já gerados para o documento, por hash da entrada"""
+        if not os.path.exists(output_file):
+            return {}
+        with open(output_file, encoding="utf-8") as f:
+            previous = json.load(f)
+        hashes = previous.get("input_hashes") or []
+        data = previous.get("data", [])
+        if previous.get("model") != model or len(hashes) != len(data):
+            return {}
+        return {digest: item.get("embedding", []) for digest, item in zip(hashes, data)}
+
+    def _embed_voyage(
+        self, payload: dict[str, Any], entries: list[dict[str, Any]]
+    ) -> tuple[list[list[float]], dict[str, Any]]:
+        """
+        Embeddings das entradas pela API multimodal da VoyageAI, em lotes
+
+        Usa a sessão HTTP compartilhada (retries e keep-alive) e devolve os
+        embeddings na ordem das entradas e o uso somado dos lotes.
+        """
+        provider = self.embedding_provider
+        request = {key: payload[key] for key in Constants.VOYAGE_PAYLOAD_FIELDS if key in payload}
+        request["model"] = provider.model
+        if provider.dimension:
+            request["output_dimension"] = provider.dimension
+        if provider.dtype != "float":
+            request["output_dtype"] = provider.dtype
+
+        embeddings: list[list[float]] = []
+        usage: dict[str, Any] = {}
+        for start in range(0, len(entries), provider.batch_size):
+            request["inputs"] = entries[start : start + provider.batch_size]
+            response = self.http.post(
+                self.voyage_config.base_url,
+                headers=self.voyage_config.headers,
+                json=request,
+                timeout=60,
+            )
+            metrics.inc(
+                "ingest_bytes_total", len(response.request.body or b""), kind="embed_request"
+            )
+
+            if response.status_code != Constants.HTTP_OK:
+                if self.verbose:
+                    print(f"❌ Erro na API: {response.status_code}")
+                    print(f"📄 Resposta: {response.text}")
+                response.raise_for_status()
+
+            result = response.json()
+            for key, value in (result.get("usage") or {}).items():
+                usage[key] = usage.get(key, 0) + value
+            generated = sorted(result.get("data", []), key=lambda item: item.get("index", 0))
+            embeddings.extend(item.get("embedding", []) for item in generated)
+        return embeddings, usage
+
+    @staticmethod
+    def _entry_parts(entry: dict[str, Any]) -> list[Any]:
+        """Entrada do payload (formato VoyageAI) como lista de textos e imagens PIL"""
+        from PIL import Image
+
+        parts: list[Any] = []
+        for item in entry.get("content", []):
+            if item.get("type") == "text":
+                parts.append(item.get("text", ""))
+            elif item.get("type") == "image_base64":
+                encoded = item.get("image_base64", "").split(",", 1)[-1]
+                parts.append(Image.open(io.BytesIO(base64.b64decode(encoded))))
+        return parts
+
     def _get_embeddings(self, payload_path: str, pdf_name: str) -> dict[str, Any]:
-        """Gera embeddings a partir de um arquivo payload"""
+        """
+        Gera embeddings a partir de um arquivo payload
+
+        Só as entradas que ainda não têm embedding (pelo hash do conteúdo)
+        são enviadas ao provedor; as demais vêm do arquivo de embeddings
+        anterior, desde que geradas pelo mesmo modelo.
+        """
         if not os.path.exists(payload_path):
             raise FileNotFoundError(f"Arquivo payload não encontrado: {payload_path}")
 
@@ -485,58 +1234,93 @@ class PDFProcessor:
         with open(payload_path, encoding="utf-8") as f:
             payload = json.load(f)
 
+        inputs = payload.get("inputs", [])
+        provider = self.embedding_provider
+        model = provider.model_id
+        output_file = os.path.join(self.voyage_config.embeddings_dir, f"{pdf_name}.json")
+        input_hashes = [self._input_hash(entry) for entry in inputs]
+        cached = self._load_cached_embeddings(output_file, model)
+        missing = [i for i, digest in enumerate(input_hashes) if digest not in cached]
+
         if self.verbose:
             print("🔧 Gerando embeddings...")
-            print(f"📊 Processando {len(payload.get('inputs', []))} entradas")
-
-        response = requests.post(
-            self.voyage_config.base_url,
-            headers=self.voyage_config.headers,
-            json=payload,
-            timeout=60,
-        )
-
-        if response.status_code == Constants.HTTP_OK:
-            result = response.json()
-            if self.verbose:
-                print("✅ Embeddings gerados com sucesso!")
-
-            # Salva a resposta
-            output_file = os.path.join(
-                self.voyage_config.embeddings_dir, f"{pdf_name}.json"
+            print(
+                f"📊 {len(inputs)} entradas | reaproveitadas: {len(inputs) - len(missing)} "
+                f"| a gerar: {len(missing)}"
             )
-            with open(output_file, "w", encoding="utf-8") as f:
-                json.dump(result, f, indent=2, ensure_ascii=False)
 
+        result: dict[str, Any] = {"object": "list"}
+        usage: dict[str, Any] = {}
+        if missing:
+            pending = [inputs[i] for i in missing]
+            with metrics.span(f"{provider.kind}.embed", inputs=len(missing)):
+                if provider.kind == "voyage":
+                    generated, usage = self._embed_voyage(payload, pending)
+                else:
+                    generated = provider.embed_documents(
+                        [self._entry_parts(entry) for entry in pending]
+                    )
             if self.verbose:
-                print(f"💾 Embeddings salvos: {output_file}")
+                print("✅ Embeddings gerados com sucesso!")
+            for i, embedding in zip(missing, generated):
+                cached[input_hashes[i]] = embedding
+
+        # Salva a resposta (com os embeddings reaproveitados, na ordem do payload)
+        result["model"] = model
+        if usage:
+            result["usage"] = usage
+        result["data"] = [
+            {"object": "embedding", "embedding": cached[digest], "index": i}
+            for i, digest in enumerate(input_hashes)
+            if digest in cached
+        ]
+        result["input_hashes"] = input_hashes
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
 
-            # Estatísticas
-            embeddings_data = result.get("data", [])
-            if self.verbose:
-                print(f"📈 Total de embeddings: {len(embeddings_data)}")
-                if embeddings_data:
-                    embedding_dim = len(embeddings_data[0].get("embedding", []))
-                    print(f"📏 Dimensão dos embeddings: {embedding_dim}")
+        if self.verbose:
+            print(f"💾 Embeddings salvos: {output_file}")
 
-                    if embedding_dim != Constants.MULTIMODAL_3_DIMENSIONS:
-                        print(
-                            f"⚠️ Dimensão inesperada! Esperado: {Constants.MULTIMODAL_3_DIMENSIONS}, Atual: {embedding_dim}"
-                        )
+        # Estatísticas
+        embeddings_data = result["data"]
+        if len(embeddings_data) != len(inputs):
+            raise ValueError(
+                f"VoyageAI devolveu {len(embeddings_data)} embeddings para {len(inputs)} entradas"
+            )
+        metrics.inc("ingest_embeddings_total", len(missing))
+        get_usage_meter().record(
+            document=pdf_name,
+            embed_tokens=usage.get("total_tokens", 0),
+            embed_text_tokens=usage.get("text_tokens", 0),
+            embed_image_pixels=usage.get("image_pixels", 0),
+        )
+        if self.verbose:
+            print(f"📈 Total de embeddings: {len(embeddings_data)}")
+            if embeddings_data:
+                embedding_dim = len(embeddings_data[0].get("embedding", []))
+                print(f"📏 Dimensão dos embeddings: {embedding_dim}")
+
+                expected_dim = provider.dimension or (
+                    Constants.MULTIMODAL_3_DIMENSIONS
+                    if provider.model == Constants.VOYAGE_DEFAULT_MODEL
+                    else None
+                )
+                if expected_dim and embedding_dim != expected_dim:
+                    print(
+                        f"⚠️ Dimensão inesperada! Esperado: {expected_dim}, "
+                        f"Atual: {embedding_dim}"
+                    )
 
-            return {
-                "response": result,
-                "output_file": output_file,
-                "total_embeddings": len(embeddings_data),
-                "pdf_name": pdf_name,
-            }
-        else:
-            if self.verbose:
-                print(f"❌ Erro na API: {response.status_code}")
-                print(f"📄 Resposta: {response.text}")
-            response.raise_for_status()
-            return {}  # This line satisfies mypy
+        return {
+            "response": result,
+            "output_file": output_file,
+            "total_embeddings": len(embeddings_data),
+            "generated_embeddings": len(missing),
+            "reused_embeddings": len(inputs) - len(missing),
+            "pdf_name": pdf_name,
+        }
 
+    @metrics.timed("stage.voyage")
     def process_voyage(self, pdf_name: str) -> dict[str, Any]:
         """Processa embeddings a partir de um payload gerado pelo LlamaIndex"""
         payload_file = os.path.join(self.llama_config.payload_dir, f"{pdf_name}.json")
@@ -549,6 +1333,147 @@ class PDFProcessor:
 
         return self._get_embeddings(payload_file, pdf_name)
 
+    # =============================================
+    # MÉTODOS DE VISÃO (DESCRIÇÃO DE IMAGENS)
+    # =============================================
+
+    def _describe_image_remote(self, image_url: str) -> ImageDescription:
+        """Descreve uma imagem com um modelo de visão via API compatível com OpenAI"""
+        prompt = (
+            "Descreva esta página/imagem para busca e análise posterior. "
+            'Responda apenas com JSON: {"description": descrição estruturada do '
+            "conteúdo visual (diagramas, gráficos, tabelas, layout, cores), "
+            '"ocr": todo o texto legível na imagem}'
+        )
+        with metrics.span("vision.describe"):
+            response = self.http.post(
+                f"{self.vision_config.base_url}/chat/completions",
+                headers=self.vision_config.headers,
+                json={
+                    "model": self.vision_config.default_model,
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": prompt},
+                                {"type": "image_url", "image_url": {"url": image_url}},
+                            ],
+                        }
+                    ],
+                    "response_format": {"type": "json_object"},
+                    "temperature": 0,
+                },
+                timeout=self.vision_config.timeout,
+            )
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+        try:
+            parsed = json.loads(content)
+        except (TypeError, ValueError):
+            # Modelos locais nem sempre respeitam response_format
+            parsed = {"description": content, "ocr": ""}
+        return {
+            "description": str(parsed.get("description", "")),
+            "ocr": str(parsed.get("ocr", "")),
+        }
+
+    def _load_image_descriptions(self, doc_source: str) -> dict[str, Any]:
+        """Carrega as descrições salvas de um documento (vazio se não houver)"""
+        path = os.path.join(self.vision_config.descriptions_dir, f"{doc_source}.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    @metrics.timed("stage.vision")
+    def process_vision(self, doc_source: str) -> dict[str, Any]:
+        """
+        Gera descrição estruturada e OCR de cada imagem do payload, uma única vez.
+
+        As descrições ficam em assets/image_descriptions/{doc}.json, indexadas
+        pelo número da página e pelo hash da imagem: imagens já descritas com o
+        mesmo modelo não são enviadas de novo, mesmo que a página tenha mudado
+        de posição, e uma imagem repetida em várias páginas é descrita uma vez.
+        Falhas ficam em `errors` sem interromper as demais imagens. A etapa de
+        inserção copia as descrições para os metadados de cada vetor.
+        """
+        payload_path = os.path.join(self.llama_config.payload_dir, f"{doc_source}.json")
+        if not os.path.exists(payload_path):
+            raise FileNotFoundError(f"❌ Arquivo não encontrado: {payload_path}")
+
+        with open(payload_path, encoding="utf-8") as f:
+            payload = json.load(f)
+
+        model = self.vision_config.default_model
+        existing = self._load_image_descriptions(doc_source)
+        previous_pages = existing.get("pages", {}) if existing.get("model") == model else {}
+
+        by_digest = {page.get("sha256"): page for page in previous_pages.values()}
+
+        # Uma imagem por página (mesma convenção de _prepare_vectors_from_data)
+        # Imagens ainda não descritas, por hash: repetidas em várias páginas vão uma vez
+        pending: dict[str, tuple[str, list[str]]] = {}
+        pages: dict[str, Any] = {}
+        for page_number, entry in zip(self._page_numbers(payload), payload.get("inputs", [])):
+            for content_item in entry.get("content", []):
+                if content_item.get("type") != "image_base64":
+                    continue
+                page_key = str(page_number)
+                image_url = content_item.get("image_base64", "")
+                digest = hashlib.sha256(image_url.encode("utf-8")).hexdigest()
+                cached = by_digest.get(digest)
+                if cached:
+                    pages[page_key] = cached
+                else:
+                    pending.setdefault(digest, (image_url, []))[1].append(page_key)
+
+        total_reused = len(pages)
+        if self.verbose:
+            print(
+                f"👁️ Imagens: {total_reused + len(pending)} | já descritas: {total_reused} "
+                f"| a descrever: {len(pending)}"
+            )
+
+        errors: dict[str, str] = {}
+
+        def describe(item: tuple[str, tuple[str, list[str]]]) -> None:
+            digest, (image_url, page_keys) = item
+            try:
+                described = self.image_describer(image_url)
+                for page_key in page_keys:
+                    pages[page_key] = {"sha256": digest, **described}
+                if self.verbose:
+                    print(f"✅ Página(s) {', '.join(page_keys)} descrita(s)")
+            except Exception as e:
+                for page_key in page_keys:
+                    errors[page_key] = str(e)
+                if self.verbose:
+                    print(f"❌ Erro ao descrever página(s) {', '.join(page_keys)}: {e}")
+
+        with ThreadPoolExecutor(max_workers=max(self.vision_config.max_workers, 1)) as executor:
+            list(executor.map(describe, pending.items()))
+        total_described = sum(1 for _, page_keys in pending.values() if page_keys[0] not in errors)
+        get_usage_meter().record(document=doc_source, vision_images=total_described)
+
+        output_file = os.path.join(self.vision_config.descriptions_dir, f"{doc_source}.json")
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(
+                {"model": model, "pages": dict(sorted(pages.items(), key=lambda kv: int(kv[0])))},
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+
+        if self.verbose:
+            print(f"💾 Descrições salvas: {output_file}")
+
+        return {
+            "output_file": output_file,
+            "total_described": total_described,
+            "total_reused": total_reused,
+            "errors": errors,
+        }
+
     # =============================================
     # MÉTODOS UPSTASH
     # =============================================
@@ -559,13 +1484,20 @@ class PDFProcessor:
             if self.verbose:
                 print("🔍 Verificando vetores existentes...")
 
-            result = self.upstash_index.range(
-                cursor=Constants.EMPTY_CURSOR,
-                limit=Constants.RANGE_LIMIT,
-                include_vectors=False,
-                include_metadata=True,
-                include_data=False,
-            )
+            # Com shards, os vetores do documento ficam todos no shard dono dele
+            index = self.upstash_index
+            if isinstance(index, ShardedIndex):
+                index = index.shard_for(doc_source)
+
+            with metrics.span("upstash.range"):
+                result = index.range(
+                    cursor=Constants.EMPTY_CURSOR,
+                    limit=Constants.RANGE_LIMIT,
+                    include_vectors=False,
+                    include_metadata=True,
+                    include_data=False,
+                )
+            metrics.inc("ingest_vectors_total", len(result.vectors), op="scan")
 
             existing_ids = []
 
@@ -576,13 +1508,15 @@ class PDFProcessor:
 
             # Continua se houver mais páginas
             while result.next_cursor and result.next_cursor != Constants.EMPTY_CURSOR:
-                result = self.upstash_index.range(
-                    cursor=result.next_cursor,
-                    limit=Constants.RANGE_LIMIT,
-                    include_vectors=False,
-                    include_metadata=True,
-                    include_data=False,
-                )
+                with metrics.span("upstash.range"):
+                    result = index.range(
+                        cursor=result.next_cursor,
+                        limit=Constants.RANGE_LIMIT,
+                        include_vectors=False,
+                        include_metadata=True,
+                        include_data=False,
+                    )
+                metrics.inc("ingest_vectors_total", len(result.vectors), op="scan")
 
                 for vector in result.vectors:
                     if (
@@ -620,8 +1554,10 @@ class PDFProcessor:
 
             for i in range(0, len(vector_ids), batch_size):
                 batch = vector_ids[i : i + batch_size]
-                result = self.upstash_index.delete(ids=batch)
+                with metrics.span("upstash.delete", vectors=len(batch)):
+                    result = self.upstash_index.delete(ids=batch)
                 total_deleted += result.deleted
+                metrics.inc("ingest_vectors_total", result.deleted, op="delete")
 
             if self.verbose:
                 print(f"✅ {total_deleted} vetores removidos com sucesso")
@@ -642,12 +1578,16 @@ class PDFProcessor:
         vectors = []
         data_list = embeddings_data.get("data", [])
         inputs = payload_data.get("inputs", [])
+        page_numbers = self._page_numbers(payload_data)
+        descriptions = self._load_image_descriptions(doc_source).get("pages", {})
 
         if self.verbose:
             print(f"📊 Processando {len(data_list)} entradas")
 
         for i, item in enumerate(data_list):
-            vector_id = f"{doc_source}_{i}"
+            page_number = page_numbers[i] if i < len(page_numbers) else i + 1
+            # ID estável pela página: uma atualização parcial regrava só as páginas alteradas
+            vector_id = f"{doc_source}_{page_number - 1}"
             embedding = item.get("embedding", [])
 
             # Extrai dados do payload correspondente
@@ -662,7 +1602,7 @@ class PDFProcessor:
                         text_content = content_item.get("text", "")
                     elif content_item.get("type") == "image_base64":
                         # Sempre usa referência de imagem para evitar problemas de tamanho
-                        image_filename = f"{doc_source}_page_{i + 1}.jpg"
+                        image_filename = f"{doc_source}_page_{page_number}.jpg"
                         image_path = os.path.join(
                             self.llama_config.images_dir, image_filename
                         )
@@ -671,14 +1611,20 @@ class PDFProcessor:
                             "image_reference": image_filename,
                             "image_path": image_path,
                         }
+                        # Descrição pré-computada (etapa de visão), sem nova chamada de visão
+                        described = descriptions.get(str(page_number))
+                        if described:
+                            image_data["image_description"] = described.get("description", "")
+                            image_data["image_ocr"] = described.get("ocr", "")
                         if self.verbose:
                             print(f"🖼️ Usando referência de imagem: {image_filename}")
 
             # Prepara metadados completos
             metadata = {
                 "doc_source": doc_source,
-                "page_number": i + 1,
+                "page_number": page_number,
                 "text": text_content,
+                METADATA_FIELD: embeddings_data.get("model") or LEGACY_MODEL,
                 **image_data,
             }
 
@@ -688,8 +1634,80 @@ class PDFProcessor:
 
         return vectors
 
+    def _update_bm25_index(self, doc_source: str, vectors: list[Vector]) -> int:
+        """Substitui as entradas do documento no índice BM25 local"""
+        pages = []
+        for vector in vectors:
+            metadata = vector.metadata or {}
+            # Descrição e OCR das imagens também tornam a página encontrável por termos exatos
+            text = " ".join(
+                part
+                for part in (
+                    metadata.get("text", ""),
+                    metadata.get("image_description", ""),
+                    metadata.get("image_ocr", ""),
+                )
+                if part
+            )
+            pages.append({"id": vector.id, "text": text, "metadata": metadata})
+        total_indexed = self.bm25_index.update_document(doc_source, pages)
+
+        if self.verbose:
+            print(f"🔤 {total_indexed} páginas indexadas no BM25: {self.bm25_index.path}")
+
+        return total_indexed
+
+    def _vector_target(self) -> str:
+        """Identifica o índice de destino (um manifesto só vale para o mesmo índice)"""
+        if self.upstash_config.vector_backend == "local":
+            return self.upstash_index.name
+        shard_urls = shard_urls_from_env()
+        return ",".join(shard_urls) if shard_urls else self.upstash_config.vector_url
+
+    @staticmethod
+    def _vector_hash(vector: Vector) -> str:
+        return hashlib.sha256(
+            json.dumps([vector.vector, vector.metadata], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+    def _vector_manifest_path(self, doc_source: str) -> str:
+        return os.path.join(self.incremental_config.manifests_dir, f"{doc_source}.json")
+
+    def _load_vector_manifest(self, doc_source: str) -> dict[str, str] | None:
+        """Hash de cada vetor inserido na última ingestão do documento (None: desconhecido)"""
+        path = self._vector_manifest_path(doc_source)
+        if not self.incremental_config.enabled or not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("target") != self._vector_target():
+            return None
+        return manifest.get("vectors", {})
+
+    def _missing_vector_ids(self, vector_ids: list[str]) -> set[str]:
+        """IDs que não estão no índice (índice resetado ou manifesto vindo de outro host)"""
+        missing: set[str] = set()
+        batch_size = Constants.BATCH_SIZE
+        for i in range(0, len(vector_ids), batch_size):
+            batch = vector_ids[i : i + batch_size]
+            with metrics.span("upstash.fetch", vectors=len(batch)):
+                found = self.upstash_index.fetch(ids=batch)
+            missing.update(vector_id for vector_id, record in zip(batch, found) if record is None)
+        return missing
+
+    def _save_vector_manifest(self, doc_source: str, hashes: dict[str, str]) -> None:
+        with open(self._vector_manifest_path(doc_source), "w", encoding="utf-8") as f:
+            json.dump({"target": self._vector_target(), "vectors": hashes}, f, indent=2)
+
+    @metrics.timed("stage.upstash")
     def process_upstash(self, doc_source: str) -> dict[str, Any]:
-        """Insere vetores no banco para um documento específico"""
+        """
+        Insere vetores no banco para um documento específico
+
+        Com o manifesto da ingestão anterior, só os vetores alterados são
+        regravados e só os de páginas que deixaram de existir são removidos;
+        sem ele, os vetores do documento são localizados e substituídos.
+        """
         if self.verbose:
             print("🚀 Iniciando processamento de vetores")
             print("📋 Verificando pré-requisitos...")
@@ -712,11 +1730,6 @@ class PDFProcessor:
                 print(f"❌ {error_msg}")
             return {"success": False, "error": error_msg}
 
-        # Remove vetores existentes se houver
-        existing_ids = self._check_existing_vectors(doc_source)
-        if existing_ids:
-            self._delete_existing_vectors(existing_ids)
-
         # Carrega dados
         if self.verbose:
             print(f"📂 Carregando arquivo de embeddings: {embeddings_path}")
@@ -735,26 +1748,63 @@ class PDFProcessor:
         if not vectors:
             raise ValueError("Nenhum vetor foi preparado")
 
+        # Vetores de modelos diferentes não são comparáveis: não mistura no mesmo índice
+        ensure_index_model(self.upstash_index, vectors[0].metadata[METADATA_FIELD])
+
+        hashes = {vector.id: self._vector_hash(vector) for vector in vectors}
+        previous = self._load_vector_manifest(doc_source)
+        if previous is None:
+            # Remove vetores existentes se houver
+            stale_ids = self._check_existing_vectors(doc_source)
+            pending = vectors
+        else:
+            stale_ids = [vector_id for vector_id in previous if vector_id not in hashes]
+            pending = [vector for vector in vectors if previous.get(vector.id) != hashes[vector.id]]
+            # O manifesto é local: confirma que os vetores "iguais" ainda estão no índice
+            changed_ids = {vector.id for vector in pending}
+            unchanged = [vector for vector in vectors if vector.id not in changed_ids]
+            missing = self._missing_vector_ids([vector.id for vector in unchanged])
+            pending += [vector for vector in unchanged if vector.id in missing]
+            if self.verbose:
+                print(
+                    f"🧩 Vetores: {len(pending) - len(missing)} alterados, "
+                    f"{len(missing)} ausentes do índice, {len(vectors) - len(pending)} iguais, "
+                    f"{len(stale_ids)} removidos"
+                )
+        if stale_ids and not self._delete_existing_vectors(stale_ids) and previous is not None:
+            raise RuntimeError("Falha ao remover os vetores de páginas que deixaram de existir")
+
         try:
             # Insere vetores
             if self.verbose:
-                print(f"📤 Inserindo {len(vectors)} vetores no banco")
+                print(f"📤 Inserindo {len(pending)} vetores no banco")
 
             batch_size = Constants.BATCH_SIZE
             total_upserted = 0
 
-            for i in range(0, len(vectors), batch_size):
-                batch = vectors[i : i + batch_size]
-                self.upstash_index.upsert(vectors=batch)
+            for i in range(0, len(pending), batch_size):
+                batch = pending[i : i + batch_size]
+                with metrics.span("upstash.upsert", vectors=len(batch)):
+                    self.upstash_index.upsert(vectors=batch)
                 total_upserted += len(batch)
+                metrics.inc("ingest_vectors_total", len(batch), op="upsert")
 
             if self.verbose:
                 print(f"✅ {total_upserted} vetores inseridos com sucesso")
+            self._save_vector_manifest(doc_source, hashes)
+
+            # Atualiza o índice léxico apenas para este documento
+            total_indexed = self._update_bm25_index(doc_source, vectors)
+
+            if self.verbose:
                 print("✅ PROCESSAMENTO DE VETORES CONCLUÍDO!")
 
             return {
                 "doc_source": doc_source,
                 "total_vectors": total_upserted,
+                "unchanged_vectors": len(vectors) - total_upserted,
+                "deleted_vectors": len(stale_ids),
+                "total_lexical_pages": total_indexed,
                 "embeddings_file": embeddings_path,
                 "payload_file": payload_path,
                 "success": True,
@@ -769,14 +1819,16 @@ class PDFProcessor:
     # MÉTODO PRINCIPAL END-TO-END
     # =============================================
 
+    @metrics.timed("ingest.document")
     def process_pdf_complete(
-        self, pdf_url: str, doc_name: str | None = None
+        self, pdf_url: PdfSource, doc_name: str | None = None
     ) -> ProcessingResult:
         """
         Processa PDF completo: LlamaIndex → VoyageAI → Upstash
 
         Args:
-            pdf_url: URL do PDF para processar
+            pdf_url: URL do PDF, caminho local ou arquivo aberto em modo binário
+                (os dois últimos são enviados em streaming, sem hospedar o PDF)
             doc_name: Nome personalizado para o documento (opcional)
 
         Returns:
@@ -786,16 +1838,17 @@ class PDFProcessor:
 
         if self.verbose:
             print("🚀 INICIANDO PROCESSAMENTO COMPLETO END-TO-END")
-            print(f"📄 PDF URL: {pdf_url}")
+            print(f"📄 PDF: {self._source_label(pdf_url)}")
             if doc_name:
                 print(f"📝 Nome do documento: {doc_name}")
             print("=" * 80)
 
         result: ProcessingResult = {
             "success": False,
-            "pdf_url": pdf_url,
+            "pdf_url": self._source_label(pdf_url),
             "doc_name": doc_name,
             "llama_result": None,
+            "vision_result": None,
             "voyage_result": None,
             "upstash_result": None,
             "total_time": 0,
@@ -809,7 +1862,7 @@ class PDFProcessor:
                 print("=" * 60)
 
             try:
-                llama_result = self.process_llama(pdf_url)
+                llama_result = self.process_llama(pdf_url, doc_name)
                 result["llama_result"] = llama_result
                 result["doc_name"] = llama_result.get("pdf_name", doc_name)
 
@@ -825,6 +1878,28 @@ class PDFProcessor:
                 result["error"] = f"Etapa 1 (LlamaIndex): {error_msg}"
                 return result
 
+            # ============ ETAPA OPCIONAL: DESCRIÇÃO DE IMAGENS ============
+            if self.vision_config.enabled:
+                if self.verbose:
+                    print("\n📋 ETAPA OPCIONAL: Descrição de Imagens (Visão)")
+                    print("=" * 60)
+
+                try:
+                    doc_name = result["doc_name"]
+                    if not doc_name:
+                        raise ValueError("Nome do documento não encontrado")
+                    result["vision_result"] = self.process_vision(doc_name)
+
+                    if self.verbose:
+                        print("✅ ETAPA OPCIONAL CONCLUÍDA")
+                        print("-" * 30)
+
+                except Exception as e:
+                    # Sem descrições a busca continua funcionando (visão ao vivo na consulta)
+                    if self.verbose:
+                        print(f"⚠️ ETAPA OPCIONAL FALHOU, seguindo sem descrições: {e}")
+                        print("-" * 30)
+
             # ============ ETAPA 2: VOYAGE AI ============
             if self.verbose:
                 print("\n📋 ETAPA 2/3: Geração de Embeddings (VoyageAI)")
@@ -907,16 +1982,30 @@ class PDFProcessor:
             pages = len(result["llama_result"].get("voyage_inputs", []))
             images = result["llama_result"].get("total_images", 0)
             print(f"  1️⃣ LlamaIndex: ✅ {pages} páginas, {images} imagens")
+            update = result["llama_result"].get("update") or {}
+            if update.get("mode") in ("partial", "unchanged"):
+                print(
+                    f"     ♻️ {len(update['parsed_pages'])} páginas parseadas, "
+                    f"{update['reused_pages']} reaproveitadas"
+                )
+
+        # Etapa opcional
+        if result["vision_result"]:
+            described = result["vision_result"].get("total_described", 0)
+            reused = result["vision_result"].get("total_reused", 0)
+            print(f"  👁️ Visão: ✅ {described} imagens descritas, {reused} reaproveitadas")
 
         # Etapa 2
         if result["voyage_result"]:
             embeddings = result["voyage_result"].get("total_embeddings", 0)
-            print(f"  2️⃣ VoyageAI: ✅ {embeddings} embeddings gerados")
+            reused = result["voyage_result"].get("reused_embeddings", 0)
+            print(f"  2️⃣ VoyageAI: ✅ {embeddings} embeddings ({reused} reaproveitados)")
 
         # Etapa 3
         if result["upstash_result"]:
             vectors = result["upstash_result"].get("total_vectors", 0)
-            print(f"  3️⃣ Upstash: ✅ {vectors} vetores inseridos")
+            unchanged = result["upstash_result"].get("unchanged_vectors", 0)
+            print(f"  3️⃣ Upstash: ✅ {vectors} vetores inseridos ({unchanged} inalterados)")
 
         print("\n✅ PROCESSAMENTO CONCLUÍDO!")
 
@@ -927,42 +2016,55 @@ class PDFProcessor:
 
 
 def process_pdf_from_url(
-    pdf_url: str, doc_name: str | None = None, verbose: bool = True
+    pdf_url: PdfSource,
+    doc_name: str | None = None,
+    verbose: bool = True,
+    image_describer: ImageDescriber | None = None,
 ) -> ProcessingResult:
     """
     Função de conveniência para processar um PDF a partir da URL
 
     Args:
-        pdf_url: URL do PDF para processar
+        pdf_url: URL do PDF, caminho local ou arquivo aberto em modo binário
         doc_name: Nome personalizado para o documento (opcional)
         verbose: Se deve exibir logs detalhados
+        image_describer: Modelo de visão alternativo para a etapa de descrição (opcional)
 
     Returns:
         Resultado completo do processamento
     """
-    processor = PDFProcessor()
+    processor = PDFProcessor(image_describer=image_describer)
     processor.verbose = verbose
     return processor.process_pdf_complete(pdf_url, doc_name)
 
 
 def process_existing_document(
-    doc_name: str, step: str = "all", verbose: bool = True
+    doc_name: str,
+    step: str = "all",
+    verbose: bool = True,
+    image_describer: ImageDescriber | None = None,
 ) -> dict[str, Any]:
     """
     Função de conveniência para processar documento já existente
 
     Args:
         doc_name: Nome do documento (sem extensão)
-        step: Etapa a executar ("voyage", "upstash", ou "all" para voyage+upstash)
+        step: Etapa a executar ("vision", "voyage", "upstash", ou "all" para
+            voyage+upstash, precedidos de vision se VISION_DESCRIBE_IMAGES=true)
         verbose: Se deve exibir logs detalhados
+        image_describer: Modelo de visão alternativo para a etapa de descrição (opcional)
 
     Returns:
         Resultado do processamento
     """
-    processor = PDFProcessor()
+    processor = PDFProcessor(image_describer=image_describer)
     processor.verbose = verbose
 
-    if step == "voyage":
+    if step == "vision":
+        result = processor.process_vision(doc_name)
+        result["success"] = not result["errors"]
+        return result
+    elif step == "voyage":
         result = processor.process_voyage(doc_name)
         result["success"] = True  # Se chegou aqui, foi bem-sucedido
         return result
@@ -970,10 +2072,14 @@ def process_existing_document(
         return processor.process_upstash(doc_name)
     elif step == "all":
         try:
+            vision_result = (
+                processor.process_vision(doc_name) if processor.vision_config.enabled else None
+            )
             voyage_result = processor.process_voyage(doc_name)
             upstash_result = processor.process_upstash(doc_name)
             return {
                 "success": True,
+                "vision_result": vision_result,
                 "voyage_result": voyage_result,
                 "upstash_result": upstash_result,
             }
@@ -983,7 +2089,7 @@ def process_existing_document(
                 "error": str(e),
             }
     else:
-        raise ValueError("step deve ser 'voyage', 'upstash' ou 'all'")
+        raise ValueError("step deve ser 'vision', 'voyage', 'upstash' ou 'all'")
 
 
 # =============================================
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Workers de ingestão alimentados pela fila durável (indexing/job_queue.py).
+
+Cada worker reivindica um job com lease, roda as etapas do `PDFProcessor`
+(`process_pdf_complete`) e renova o lease por heartbeat numa thread
+enquanto processa. Falhas voltam à fila com backoff; depois de
+INGEST_MAX_ATTEMPTS tentativas o job vai para os mortos. Vários processos,
+em uma ou várias máquinas apontando para a mesma fila, escalam a ingestão
+horizontalmente.
+
+Uso:
+    python indexing/worker.py enqueue https://exemplo.com/a.pdf https://exemplo.com/b.pdf
+    python indexing/worker.py run --processes 4
+    python indexing/worker.py status
+    python indexing/worker.py dead
+    python indexing/worker.py requeue-dead [JOB_ID]
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from indexing.job_queue import DEAD, Job, JobQueue, open_queue  # noqa: E402
+from services import metrics  # noqa: E402
+
+
+def summarize_result(result: dict[str, Any]) -> dict[str, Any]:
+    """Resumo do `ProcessingResult` guardado no job (sem payloads nem embeddings)."""
+    llama = result.get("llama_result") or {}
+    upstash = result.get("upstash_result") or {}
+    return {
+        "doc_name": result.get("doc_name"),
+        "pages": len(llama.get("voyage_inputs", [])),
+        "parsed_pages": len((llama.get("update") or {}).get("parsed_pages", [])),
+        "images": llama.get("total_images", 0),
+        "vectors": upstash.get("total_vectors", 0),
+        "total_time": round(result.get("total_time", 0.0), 3),
+    }
+
+
+class IngestionWorker:
+    """
+    Consome a fila de ingestão até ser parado (ou até a fila esvaziar).
+
+    Args:
+        queue: Fila de onde os jobs são reivindicados
+        processor_factory: Cria o `PDFProcessor` (reaproveitado entre jobs)
+        worker_id: Identificador do dono dos leases (padrão: host-pid-aleatório)
+        lease_seconds: Duração do lease; renovado a cada `heartbeat_interval`
+        heartbeat_interval: Intervalo entre heartbeats (padrão: lease/3)
+        poll_interval: Espera quando não há job disponível
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        processor_factory: Callable[[], Any] | None = None,
+        worker_id: str | None = None,
+        lease_seconds: float | None = None,
+        heartbeat_interval: float | None = None,
+        poll_interval: float | None = None,
+    ):
+        self.queue = queue
+        self.processor_factory = processor_factory or _default_processor
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds or float(os.getenv("INGEST_LEASE_SECONDS", "300"))
+        self.heartbeat_interval = heartbeat_interval or self.lease_seconds / 3
+        self.poll_interval = poll_interval or float(os.getenv("INGEST_POLL_INTERVAL", "2"))
+        self.stats = {"completed": 0, "failed": 0, "lost_leases": 0}
+
+        self._processor: Any = None
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Termina depois do job em andamento."""
+        self._stop.set()
+
+    def _heartbeat(self, job: Job, done: threading.Event, lost: threading.Event) -> None:
+        while not done.wait(self.heartbeat_interval):
+            if not self.queue.heartbeat(job.id, self.worker_id, self.lease_seconds):
+                lost.set()
+                return
+
+    def process(self, job: Job) -> bool:
+        """Executa um job já reivindicado; True se concluído."""
+        if self._processor is None:
+            self._processor = self.processor_factory()
+
+        done, lost = threading.Event(), threading.Event()
+        beater = threading.Thread(target=self._heartbeat, args=(job, done, lost), daemon=True)
+        beater.start()
+        try:
+            result = self._processor.process_pdf_complete(job.pdf_url, job.doc_name)
+            error = None if result.get("success") else (result.get("error") or "falha sem mensagem")
+        except Exception as e:
+            result, error = {}, f"{type(e).__name__}: {e}"
+        finally:
+            done.set()
+            beater.join()
+
+        if error is None:
+            recorded = self.queue.complete(job.id, self.worker_id, summarize_result(result))
+        else:
+            recorded = self.queue.fail(job.id, self.worker_id, error)
+
+        if not recorded or lost.is_set():
+            # Outro worker assumiu o job depois que o lease expirou; o resultado dele vale
+            self.stats["lost_leases"] += 1
+            print(f"⚠️ [{self.worker_id}] lease perdido para o job {job.id}")
+            return False
+        if error is None:
+            self.stats["completed"] += 1
+            print(f"✅ [{self.worker_id}] {job.doc_name or job.pdf_url} (tentativa {job.attempts})")
+            return True
+        self.stats["failed"] += 1
+        final = " — enviado para os mortos" if job.attempts >= job.max_attempts else ""
+        print(
+            f"❌ [{self.worker_id}] {job.pdf_url} "
+            f"(tentativa {job.attempts}/{job.max_attempts}): {error}{final}"
+        )
+        return False
+
+    def run(self, max_jobs: int | None = None, stop_when_empty: bool = False) -> dict[str, int]:
+        """Loop principal: reivindica, processa e repete."""
+        handled = 0
+        while not self._stop.is_set() and (max_jobs is None or handled < max_jobs):
+            job = self.queue.claim(self.worker_id, self.lease_seconds)
+            if job is None:
+                if stop_when_empty:
+                    break
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process(job)
+            handled += 1
+            # Filhos de multiprocessing saem sem atexit: grava as métricas a cada job
+            metrics.flush()
+        return self.stats
+
+
+def _default_processor() -> Any:
+    from indexing.process_pdf import PDFProcessor
+
+    return PDFProcessor()
+
+
+def _run_worker_process(queue_url: str | None, stop_when_empty: bool) -> None:
+    worker = IngestionWorker(open_queue(queue_url))
+    # SIGTERM/SIGINT: termina o job atual e sai (o lease não fica órfão)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run(stop_when_empty=stop_when_empty)
+
+
+# =============================================
+# CLI
+# =============================================
+
+
+def _print_job(job: Job) -> None:
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job.updated_at))
+    print(
+        f"{job.id}  {job.status:<7} {job.attempts}/{job.max_attempts}  {when}  "
+        f"{job.doc_name or job.pdf_url}"
+    )
+    if job.last_error:
+        print(f"    └─ {job.last_error}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fila e workers de ingestão de PDFs")
+    parser.add_argument("--queue", default=None, help="URL da fila (padrão: INGEST_QUEUE_URL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Enfileira URLs de PDF")
+    enqueue.add_argument("urls", nargs="+")
+    enqueue.add_argument("--doc-name", default=None, help="Nome do documento (só com uma URL)")
+    enqueue.add_argument("--max-attempts", type=int, default=None)
+
+    run = commands.add_parser("run", help="Roda workers até serem interrompidos")
+    run.add_argument("--processes", type=int, default=int(os.getenv("INGEST_WORKERS", "1")))
+    run.add_argument(
+        "--until-empty", action="store_true", help="Sai quando não houver job disponível"
+    )
+
+    commands.add_parser("status", help="Jobs por status")
+    commands.add_parser("dead", help="Lista os jobs mortos")
+    requeue = commands.add_parser("requeue-dead", help="Devolve jobs mortos à fila")
+    requeue.add_argument("job_id", nargs="?", default=None)
+
+    args = parser.parse_args()
+    queue = open_queue(args.queue)
+
+    if args.command == "enqueue":
+        if args.doc_name and len(args.urls) > 1:
+            parser.error("--doc-name só pode ser usado com uma URL")
+        for url in args.urls:
+            job_id = queue.enqueue(url, args.doc_name, args.max_attempts)
+            print(f"📥 {job_id}  {url}")
+    elif args.command == "run":
+        if args.processes <= 1:
+            _run_worker_process(args.queue, args.until_empty)
+            return 0
+        workers = [
+            multiprocessing.Process(target=_run_worker_process, args=(args.queue, args.until_empty))
+            for _ in range(args.processes)
+        ]
+        for process in workers:
+            process.start()
+        try:
+            for process in workers:
+                process.join()
+        except KeyboardInterrupt:
+            # Os filhos também receberam o SIGINT e terminam o job em andamento
+            print("⏳ Aguardando os jobs em andamento...")
+            for process in workers:
+                process.join()
+    elif args.command == "status":
+        for status, count in queue.stats().items():
+            print(f"{status:<8} {count}")
+    elif args.command == "dead":
+        for job in queue.list_jobs(DEAD, limit=1000):
+            _print_job(job)
+    elif args.command == "requeue-dead":
+        print(f"🔁 {queue.requeue_dead(args.job_id)} job(s) reenfileirado(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+# crew_factory_benchmark.py
+"""
+Benchmark de alocação por query: crew reconstruída vs. fábrica com template.
+
+Compara o custo de montar uma crew por query da forma antiga
+(`MultimodalAnalysisCrew().crew()`, que relê os YAMLs e recria agentes,
+ferramentas e clientes LLM) com `CrewFactory.create()` (cópia leve do
+template). Nenhuma crew é executada; nenhuma chamada de rede é feita.
+
+Uso:
+    python scripts/crew_factory_benchmark.py --queries 200
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# Credenciais fictícias: a montagem das crews não acessa a rede
+for key, value in {
+    "UPSTASH_VECTOR_REST_URL": "https://example.upstash.io",
+    "UPSTASH_VECTOR_REST_TOKEN": "dummy",
+    "VOYAGE_API_KEY": "dummy",
+    "OPENAI_API_KEY": "sk-dummy",
+}.items():
+    os.environ.setdefault(key, value)
+
+from crew import MultimodalAnalysisCrew  # noqa: E402
+from crew_factory import CrewFactory  # noqa: E402
+
+
+def measure(label: str, build, queries: int) -> dict:
+    """Executa `build` `queries` vezes medindo tempo e memória alocada"""
+    gc.collect()
+    tracemalloc.start()
+    start_snapshot = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+
+    for _ in range(queries):
+        build()
+
+    elapsed = time.perf_counter() - start
+    end_snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    allocated = sum(
+        stat.size_diff
+        for stat in end_snapshot.compare_to(start_snapshot, "filename")
+        if stat.size_diff > 0
+    )
+    result = {
+        "label": label,
+        "ms_per_query": elapsed / queries * 1000,
+        "retained_kib_per_query": allocated / queries / 1024,
+        "peak_kib": peak / 1024,
+        "queries_per_sec": queries / elapsed if elapsed else float("inf"),
+    }
+    print(
+        f"{label:<28} {result['ms_per_query']:9.2f} ms/query  "
+        f"{result['retained_kib_per_query']:9.1f} KiB retidos/query  "
+        f"pico {result['peak_kib']:10.1f} KiB  "
+        f"{result['queries_per_sec']:8.1f} crews/s"
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de montagem de crews por query")
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    # As crews de cada rodada ficam vivas até o fim, como em um gather com N queries
+    rebuilt = []
+    baseline = measure(
+        "MultimodalAnalysisCrew()",
+        lambda: rebuilt.append(MultimodalAnalysisCrew().crew()),
+        args.queries,
+    )
+    rebuilt.clear()
+
+    factory = CrewFactory()
+    start = time.perf_counter()
+    factory.warm_up()
+    print(f"{'template (uma vez)':<28} {(time.perf_counter() - start) * 1000:9.2f} ms")
+
+    copies = []
+    fast = measure("CrewFactory.create()", lambda: copies.append(factory.create()), args.queries)
+
+    if fast["ms_per_query"]:
+        print(
+            f"\n⚡ Ganho de tempo por query: {baseline['ms_per_query'] / fast['ms_per_query']:.1f}x"
+        )
+    if fast["retained_kib_per_query"]:
+        ratio = baseline["retained_kib_per_query"] / fast["retained_kib_per_query"]
+        print(f"💾 Redução de memória por query: {ratio:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
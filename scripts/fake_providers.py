@@ -0,0 +1,626 @@
+# fake_providers.py
+"""
+Substitutos locais das APIs usadas na ingestão: LlamaParse, Voyage, Upstash Vector
+e um endpoint de visão compatível com OpenAI.
+
+Um único servidor HTTP (por padrão em 127.0.0.1, porta livre) responde nos
+prefixos /llama, /voyage, /upstash e /vision com o mesmo formato das APIs
+reais, o suficiente para o `PDFProcessor` e o SDK `upstash_vector` rodarem
+sem rede. Cada provedor tem latência, limite de requisições por segundo
+(429) e taxa de erros (500) configuráveis.
+
+Os documentos são sintéticos: a URL do PDF descreve o corpus, por exemplo
+`http://host/pdf/relatorio.pdf?pages=20&image_ratio=1&image_kb=120&text_chars=1500&parse_s=0.5`.
+
+Uso:
+    python scripts/fake_providers.py --port 8787 --latency-ms 40 --error-rate 0.01
+    python scripts/fake_providers.py --set llama.latency_ms=300 --set voyage.rate_limit=5
+
+    # Em código
+    with FakeProviders() as providers:
+        os.environ.update(providers.env())
+        url = providers.pdf_url("doc", pages=10)
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import numpy as np
+from PIL import Image
+
+PROVIDERS = ("llama", "voyage", "upstash", "vision")
+EMBEDDING_DIMENSIONS = 1024
+
+_LOREM = (
+    "O relatório descreve indicadores de desempenho, metas trimestrais e riscos "
+    "operacionais. A tabela consolida receitas por região e o diagrama mostra o "
+    "fluxo de aprovação entre as áreas. "
+)
+
+
+@dataclass
+class ProviderBehavior:
+    """Comportamento simulado de um provedor."""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    rate_limit: float = 0.0  # requisições por segundo (0 = sem limite)
+    error_rate: float = 0.0  # fração de requisições que falham com HTTP 500
+
+
+@dataclass
+class SyntheticDocument:
+    """Corpus descrito pela URL do PDF."""
+
+    name: str
+    pages: int = 10
+    image_ratio: float = 1.0  # fração das páginas com imagem
+    image_kb: int = 100
+    text_chars: int = 1500
+    parse_s: float = 0.0  # tempo simulado do job de parse
+
+    @classmethod
+    def from_url(cls, pdf_url: str) -> "SyntheticDocument":
+        parsed = urlparse(pdf_url)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        name = parsed.path.rsplit("/", 1)[-1].rsplit(".", 1)[0] or "document"
+        return cls(
+            name=name,
+            pages=int(query.get("pages", cls.pages)),
+            image_ratio=float(query.get("image_ratio", cls.image_ratio)),
+            image_kb=int(query.get("image_kb", cls.image_kb)),
+            text_chars=int(query.get("text_chars", cls.text_chars)),
+            parse_s=float(query.get("parse_s", cls.parse_s)),
+        )
+
+    def has_image(self, page: int) -> bool:
+        # Distribui as imagens de forma regular ao longo do documento
+        return math.floor(page * self.image_ratio) > math.floor((page - 1) * self.image_ratio)
+
+
+@dataclass
+class ProviderStats:
+    requests: int = 0
+    throttled: int = 0
+    errors: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+
+class _TokenBucket:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = max(rate, 1.0)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+@dataclass
+class _Job:
+    document: SyntheticDocument
+    created_at: float
+    target_pages: Optional[List[int]] = None  # 1-based; None = todas
+
+
+class FakeProviderState:
+    """Estado compartilhado pelos handlers: jobs, vetores, imagens e estatísticas."""
+
+    def __init__(self, behaviors: Dict[str, ProviderBehavior], seed: int = 0):
+        self.behaviors = behaviors
+        self.random = random.Random(seed)
+        self.jobs: Dict[str, _Job] = {}
+        self.namespaces: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.stats: Dict[str, ProviderStats] = {name: ProviderStats() for name in PROVIDERS}
+        self._buckets = {name: _TokenBucket(b.rate_limit) for name, b in behaviors.items()}
+        self._images: Dict[Tuple[str, int, int], bytes] = {}
+        self.lock = threading.Lock()
+
+    def admit(self, provider: str) -> Optional[int]:
+        """Aplica latência, limite e erros; retorna o status de falha, se houver."""
+        behavior = self.behaviors[provider]
+        delay = behavior.latency_ms + behavior.jitter_ms * self.random.random()
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if not self._buckets[provider].take():
+            with self.lock:
+                self.stats[provider].throttled += 1
+            return 429
+        if behavior.error_rate and self.random.random() < behavior.error_rate:
+            with self.lock:
+                self.stats[provider].errors += 1
+            return 500
+        return None
+
+    def image(self, document: SyntheticDocument, page: int) -> bytes:
+        """JPEG determinístico de ~image_kb por página (ruído não comprime)."""
+        key = (document.name, page, document.image_kb)
+        with self.lock:
+            cached = self._images.get(key)
+        if cached is not None:
+            return cached
+        # JPEG de ruído em qualidade 75 ocupa ~1,6 byte por pixel
+        side = max(16, int(math.sqrt(document.image_kb * 1024 / 1.6)))
+        seed = int.from_bytes(
+            hashlib.sha256(f"{document.name}:{page}".encode()).digest()[:4], "big"
+        )
+        pixels = np.random.default_rng(seed).integers(0, 256, (side, side, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, "RGB").save(buffer, format="JPEG", quality=75)
+        data = buffer.getvalue()
+        with self.lock:
+            self._images[key] = data
+        return data
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.stats = {name: ProviderStats() for name in PROVIDERS}
+
+
+def _embedding_for(content: Any) -> List[float]:
+    """Vetor unitário determinístico derivado do conteúdo da entrada."""
+    digest = hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).digest()
+    vector = np.random.default_rng(int.from_bytes(digest[:8], "big")).standard_normal(
+        EMBEDDING_DIMENSIONS
+    )
+    return (vector / np.linalg.norm(vector)).round(6).tolist()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeProviders/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> FakeProviderState:
+        return self.server.state  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass  # silencioso: o benchmark mede, não registra
+
+    # ------------------------------------------------------------------
+    # Infraestrutura
+    # ------------------------------------------------------------------
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                chunk = self.rfile.read(size)
+                self.rfile.readline()  # CRLF depois de cada bloco
+                if size == 0:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, provider: Optional[str], status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+        if provider:
+            with self.state.lock:
+                self.state.stats[provider].bytes_out += len(body)
+
+    def _json(self, provider: Optional[str], payload: Any, status: int = 200) -> None:
+        self._send(provider, status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _dispatch(self, method: str) -> None:
+        parsed = urlparse(self.path)
+        body = self._read_body()
+        parts = [p for p in parsed.path.split("/") if p]
+        provider = parts[0] if parts else ""
+
+        if provider == "_stats":
+            self._json(None, {name: asdict(s) for name, s in self.state.stats.items()})
+            return
+        if provider not in PROVIDERS:
+            self._json(None, {"error": f"rota desconhecida: {parsed.path}"}, 404)
+            return
+
+        with self.state.lock:
+            stats = self.state.stats[provider]
+            stats.requests += 1
+            stats.bytes_in += len(body)
+
+        failure = self.state.admit(provider)
+        if failure is not None:
+            message = "rate limit exceeded" if failure == 429 else "internal server error"
+            if provider == "upstash":
+                # O SDK do Upstash lê o campo "error" do corpo
+                self._json(provider, {"error": message, "status": failure}, failure)
+            else:
+                self._json(provider, {"detail": message}, failure)
+            return
+
+        handler = getattr(self, f"_{provider}")
+        try:
+            handler(method, parts[1:], body)
+        except Exception as e:  # erro do próprio fake: visível para quem chama
+            self._json(provider, {"error": f"{type(e).__name__}: {e}"}, 500)
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    # ------------------------------------------------------------------
+    # LlamaParse
+    # ------------------------------------------------------------------
+
+    def _llama(self, method: str, parts: List[str], body: bytes) -> None:
+        if method == "POST" and parts == ["upload"]:
+            if self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+                # Upload de arquivo: o documento sintético vem do nome do arquivo
+                match = re.search(rb'name="file"; filename="([^"]*)"', body)
+                pdf_url = match.group(1).decode("utf-8") if match else None
+                match = re.search(rb'name="target_pages"\r\n\r\n([^\r]*)\r\n', body)
+                target = match.group(1).decode("utf-8") if match else ""
+            else:
+                form = {key: values[-1] for key, values in parse_qs(body.decode("utf-8")).items()}
+                pdf_url = form.get("input_url")
+                target = form.get("target_pages", "")
+            if not pdf_url:
+                self._json("llama", {"detail": "input_url ou file obrigatório"}, 400)
+                return
+            job_id = str(uuid.uuid4())
+            with self.state.lock:
+                self.state.jobs[job_id] = _Job(
+                    SyntheticDocument.from_url(pdf_url),
+                    time.monotonic(),
+                    [int(page) + 1 for page in target.split(",") if page.strip()] or None,
+                )
+            self._json("llama", {"id": job_id, "status": "PENDING"})
+            return
+
+        if len(parts) < 2 or parts[0] != "job" or parts[1] not in self.state.jobs:
+            self._json("llama", {"detail": "job não encontrado"}, 404)
+            return
+        job = self.state.jobs[parts[1]]
+        document = job.document
+        done = time.monotonic() - job.created_at >= document.parse_s
+
+        if len(parts) == 2:
+            self._json("llama", {"id": parts[1], "status": "SUCCESS" if done else "PENDING"})
+        elif parts[2:] == ["result", "json"]:
+            self._json("llama", self._llama_result(document, job.target_pages))
+        elif parts[2:4] == ["result", "image"] and len(parts) == 5:
+            match = re.match(r"page_(\d+)\.jpg$", parts[4])
+            if not match:
+                self._json("llama", {"detail": "imagem não encontrada"}, 404)
+                return
+            self._send("llama", 200, self.state.image(document, int(match.group(1))), "image/jpeg")
+        else:
+            self._json("llama", {"detail": "rota desconhecida"}, 404)
+
+    @staticmethod
+    def _llama_result(
+        document: SyntheticDocument, target_pages: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        pages = []
+        for page in target_pages or range(1, document.pages + 1):
+            if not 1 <= page <= document.pages:
+                continue
+            text = f"# {document.name} — página {page}\n\n"
+            text += (_LOREM * (document.text_chars // len(_LOREM) + 1))[: document.text_chars]
+            images = [{"name": f"page_{page}.jpg"}] if document.has_image(page) else []
+            pages.append({"page": page, "md": text, "images": images})
+        return {"pages": pages, "job_metadata": {"job_pages": len(pages)}}
+
+    # ------------------------------------------------------------------
+    # Voyage (multimodal embeddings)
+    # ------------------------------------------------------------------
+
+    def _voyage(self, method: str, parts: List[str], body: bytes) -> None:
+        payload = json.loads(body or b"{}")
+        inputs = payload.get("inputs", [])
+        text_tokens, image_pixels = 0, 0
+        data = []
+        for i, entry in enumerate(inputs):
+            for item in entry.get("content", []):
+                if item.get("type") == "text":
+                    text_tokens += len(item.get("text", "").split())
+                elif item.get("type") in ("image_base64", "image_url"):
+                    image_pixels += 560 * 560  # a Voyage cobra por pixels após redimensionar
+            data.append({"object": "embedding", "embedding": _embedding_for(entry), "index": i})
+        self._json(
+            "voyage",
+            {
+                "object": "list",
+                "data": data,
+                "model": payload.get("model"),
+                "usage": {
+                    "text_tokens": text_tokens,
+                    "image_pixels": image_pixels,
+                    "total_tokens": text_tokens + image_pixels // 560,
+                },
+            },
+        )
+
+    # ------------------------------------------------------------------
+    # Upstash Vector (REST)
+    # ------------------------------------------------------------------
+
+    def _upstash(self, method: str, parts: List[str], body: bytes) -> None:
+        command = parts[0] if parts else ""
+        namespace = parts[1] if len(parts) > 1 else ""
+        payload = json.loads(body) if body else None
+        state = self.state
+        with state.lock:
+            vectors = state.namespaces.setdefault(namespace, {})
+
+            if command == "upsert":
+                items = payload if isinstance(payload, list) else [payload]
+                for item in items:
+                    vectors[item["id"]] = item
+                result: Any = "Success"
+            elif command == "delete":
+                ids = payload.get("ids", []) if isinstance(payload, dict) else payload
+                deleted = sum(1 for vector_id in ids if vectors.pop(vector_id, None) is not None)
+                result = {"deleted": deleted}
+            elif command == "range":
+                ordered = sorted(vectors)
+                if payload.get("prefix"):
+                    ordered = [i for i in ordered if i.startswith(payload["prefix"])]
+                start = int(payload.get("cursor") or 0)
+                end = start + int(payload.get("limit", 1))
+                result = {
+                    "nextCursor": str(end) if end < len(ordered) else "",
+                    "vectors": [self._project(vectors[i], payload) for i in ordered[start:end]],
+                }
+            elif command == "fetch":
+                result = [
+                    self._project(vectors[i], payload) if i in vectors else None
+                    for i in payload.get("ids", [])
+                ]
+            elif command == "query":
+                result = self._query(vectors, payload)
+            elif command == "info":
+                total = sum(len(v) for v in state.namespaces.values())
+                result = {
+                    "vectorCount": total,
+                    "pendingVectorCount": 0,
+                    "indexSize": total * EMBEDDING_DIMENSIONS * 4,
+                    "dimension": EMBEDDING_DIMENSIONS,
+                    "similarityFunction": "COSINE",
+                    "namespaces": {
+                        name: {"vectorCount": len(v), "pendingVectorCount": 0}
+                        for name, v in state.namespaces.items()
+                    },
+                }
+            elif command == "reset":
+                vectors.clear()
+                result = "Success"
+            else:
+                self._json("upstash", {"error": f"comando não suportado: {command}"}, 400)
+                return
+        self._json("upstash", {"result": result})
+
+    @staticmethod
+    def _project(item: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+        projected = {"id": item["id"]}
+        if payload.get("includeVectors"):
+            projected["vector"] = item.get("vector")
+        if payload.get("includeMetadata") and item.get("metadata") is not None:
+            projected["metadata"] = item["metadata"]
+        if payload.get("includeData") and item.get("data") is not None:
+            projected["data"] = item["data"]
+        return projected
+
+    def _query(self, vectors: Dict[str, Dict[str, Any]], payload: Dict[str, Any]) -> List[Any]:
+        # Filtros de metadados não são simulados: a consulta considera todo o namespace
+        if not vectors or "vector" not in payload:
+            return []
+        ids = list(vectors)
+        matrix = np.array([vectors[i]["vector"] for i in ids], dtype=np.float32)
+        query = np.asarray(payload["vector"], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        # Score no formato do Upstash para COSINE: (1 + cos) / 2
+        scores = (1 + (matrix @ query) / np.where(norms == 0, 1, norms)) / 2
+        top = np.argsort(-scores)[: int(payload.get("topK", 10))]
+        return [{**self._project(vectors[ids[i]], payload), "score": float(scores[i])} for i in top]
+
+    # ------------------------------------------------------------------
+    # Visão (chat/completions compatível com OpenAI)
+    # ------------------------------------------------------------------
+
+    def _vision(self, method: str, parts: List[str], body: bytes) -> None:
+        payload = json.loads(body or b"{}")
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        content = json.dumps(
+            {
+                "description": f"Diagrama sintético {digest} com tabela e gráfico de barras.",
+                "ocr": f"Figura {digest} Receita Custos Margem",
+            },
+            ensure_ascii=False,
+        )
+        self._json(
+            "vision",
+            {
+                "id": f"chatcmpl-{digest}",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {"prompt_tokens": 850, "completion_tokens": 60, "total_tokens": 910},
+            },
+        )
+
+
+class FakeProviders:
+    """
+    Servidor local com os quatro provedores simulados.
+
+    Args:
+        behaviors: Comportamento por provedor (padrão: sem latência, sem limite, sem erros)
+        host: Endereço de escuta
+        port: Porta (0 = escolhe uma livre)
+        seed: Semente dos erros e da latência aleatória
+    """
+
+    def __init__(
+        self,
+        behaviors: Optional[Dict[str, ProviderBehavior]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 0,
+    ):
+        behaviors = {name: (behaviors or {}).get(name, ProviderBehavior()) for name in PROVIDERS}
+        self.state = FakeProviderState(behaviors, seed=seed)
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.state = self.state  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeProviders":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-providers", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeProviders":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def env(self) -> Dict[str, str]:
+        """Variáveis de ambiente que apontam o `PDFProcessor` para os fakes."""
+        return {
+            "LLAMA_BASE_URL": f"{self.base_url}/llama",
+            "LLAMA_API_TOKEN": "fake",
+            "VOYAGE_BASE_URL": f"{self.base_url}/voyage/multimodalembeddings",
+            "VOYAGE_API_KEY": "fake",
+            "UPSTASH_VECTOR_REST_URL": f"{self.base_url}/upstash",
+            "UPSTASH_VECTOR_REST_TOKEN": "fake",
+            "VISION_BASE_URL": f"{self.base_url}/vision",
+            "VISION_API_KEY": "fake",
+        }
+
+    def pdf_url(self, name: str, **spec: Any) -> str:
+        """URL de um PDF sintético (pages, image_ratio, image_kb, text_chars, parse_s)."""
+        query = f"?{urlencode(spec)}" if spec else ""
+        return f"{self.base_url}/pdf/{name}.pdf{query}"
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self.state.lock:
+            return {name: asdict(s) for name, s in self.state.stats.items()}
+
+    def reset_stats(self) -> None:
+        self.state.reset_stats()
+
+    def vector_count(self) -> int:
+        with self.state.lock:
+            return sum(len(v) for v in self.state.namespaces.values())
+
+
+def parse_behaviors(
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    rate_limit: float = 0.0,
+    error_rate: float = 0.0,
+    overrides: Optional[List[str]] = None,
+) -> Dict[str, ProviderBehavior]:
+    """Monta o comportamento de cada provedor: valores globais + `provedor.campo=valor`."""
+    behaviors = {
+        name: ProviderBehavior(latency_ms, jitter_ms, rate_limit, error_rate) for name in PROVIDERS
+    }
+    for override in overrides or []:
+        try:
+            target, value = override.split("=", 1)
+            provider, field_name = target.split(".", 1)
+            setattr(behaviors[provider], field_name, float(value))
+        except (ValueError, KeyError) as e:
+            raise ValueError(
+                f"override inválido '{override}': use provedor.campo=valor "
+                f"(provedores: {', '.join(PROVIDERS)})"
+            ) from e
+    return behaviors
+
+
+def add_behavior_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latência por requisição")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="latência extra aleatória")
+    parser.add_argument(
+        "--rate-limit", type=float, default=0.0, help="req/s por provedor (0 = sem)"
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 500")
+    parser.add_argument(
+        "--set",
+        dest="overrides",
+        action="append",
+        default=[],
+        metavar="PROVEDOR.CAMPO=VALOR",
+        help="ajuste por provedor, ex.: llama.latency_ms=300 ou upstash.error_rate=0.05",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Provedores falsos para testes de ingestão")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--seed", type=int, default=0)
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    behaviors = parse_behaviors(
+        args.latency_ms, args.jitter_ms, args.rate_limit, args.error_rate, args.overrides
+    )
+    providers = FakeProviders(behaviors, host=args.host, port=args.port, seed=args.seed)
+    print(f"🧪 Provedores falsos em {providers.base_url}")
+    for key, value in providers.env().items():
+        print(f"export {key}={value}")
+    print(f"📄 PDF de exemplo: {providers.pdf_url('exemplo', pages=10, image_kb=100)}")
+    try:
+        providers._server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Encerrando")
+    finally:
+        providers._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+# ingestion_benchmark.py
+"""
+Benchmark offline da ingestão de PDFs.
+
+Sobe os provedores falsos (scripts/fake_providers.py) com a latência, o
+limite de requisições e a taxa de erros escolhidos e roda o `PDFProcessor`
+sobre corpora sintéticos, sem rede e sem credenciais:
+
+- `complete`: `process_pdf_complete` para cada documento (parse → embeddings → vetores)
+- `existing`: `process_existing_document(step="all")` sobre os payloads já gerados
+
+Cada cenário roda num processo novo (pico de RSS isolado) e reporta
+páginas/s, bytes/s, pico de RSS e percentis de latência por etapa e por
+chamada HTTP (os spans de `services/metrics.py`). O resultado vai para um
+JSON estável (fácil de comparar entre versões) e é anexado a um histórico
+JSONL.
+
+Uso:
+    python scripts/ingestion_benchmark.py
+    python scripts/ingestion_benchmark.py --corpora mixed large --latency-ms 30 --jitter-ms 20
+    python scripts/ingestion_benchmark.py --set voyage.rate_limit=2 --set upstash.error_rate=0.05
+    python scripts/ingestion_benchmark.py --compare benchmarks/ingestion_baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_providers import (  # noqa: E402
+    FakeProviders,
+    add_behavior_arguments,
+    parse_behaviors,
+)
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "ingestion_latest.json")
+DEFAULT_HISTORY = os.path.join(ROOT, "benchmarks", "ingestion_history.jsonl")
+
+# Corpora sintéticos: documentos × páginas, fração de páginas com imagem e tamanhos
+CORPORA: Dict[str, Dict[str, Any]] = {
+    "small": {"docs": 3, "pages": 5, "image_ratio": 1.0, "image_kb": 60, "text_chars": 1200},
+    "text": {"docs": 5, "pages": 20, "image_ratio": 0.0, "image_kb": 0, "text_chars": 3000},
+    "mixed": {"docs": 4, "pages": 20, "image_ratio": 0.5, "image_kb": 150, "text_chars": 2000},
+    "large": {"docs": 2, "pages": 100, "image_ratio": 1.0, "image_kb": 250, "text_chars": 2500},
+}
+MODES = ("complete", "existing")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por posição mais próxima (valores já em ms)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize_stage(samples: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p90_ms": round(percentile(samples, 90), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "max_ms": round(max(samples, default=0.0), 3),
+        "total_ms": round(sum(samples), 3),
+    }
+
+
+# =============================================
+# PROCESSO DO CENÁRIO
+# =============================================
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KiB; macOS, bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Executa um cenário (chamado no processo filho)."""
+    sys.path.insert(0, ROOT)
+    from indexing import process_pdf
+    from services import metrics
+
+    # Percentis exatos a partir dos spans da instrumentação do pipeline
+    samples: Dict[str, List[float]] = {}
+    registry = metrics.configure(
+        enabled=True, path=os.path.join(config["work_dir"], f"{config['mode']}_metrics.prom")
+    )
+    registry.add_span_listener(
+        lambda record: samples.setdefault(record.name, []).append(record.duration * 1000)
+    )
+
+    pages, images, failures = 0, 0, []
+    start = time.perf_counter()
+    for doc in config["documents"]:
+        if config["mode"] == "complete":
+            processor = process_pdf.PDFProcessor()
+            processor.verbose = False
+            processor.llama_config.check_interval = config["poll_interval"]
+            result = processor.process_pdf_complete(doc["url"])
+            llama_result = result.get("llama_result") or {}
+            pages += len(llama_result.get("voyage_inputs", []))
+            images += llama_result.get("total_images", 0)
+        else:
+            result = process_pdf.process_existing_document(doc["name"], step="all", verbose=False)
+            if result.get("voyage_result"):
+                pages += result["voyage_result"].get("total_embeddings", 0)
+        if not result.get("success"):
+            failures.append({"document": doc["name"], "error": str(result.get("error"))})
+    wall = time.perf_counter() - start
+
+    return {
+        "wall_s": wall,
+        "pages": pages,
+        "images": images,
+        "failures": failures,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "stages": {stage: summarize_stage(values) for stage, values in sorted(samples.items())},
+    }
+
+
+# =============================================
+# ORQUESTRAÇÃO
+# =============================================
+
+
+def run_scenario(
+    providers: FakeProviders,
+    corpus: str,
+    mode: str,
+    work_dir: str,
+    args: argparse.Namespace,
+) -> Dict[str, Any]:
+    spec = CORPORA[corpus]
+    documents = [
+        {
+            "name": f"{corpus}_{i}",
+            "url": providers.pdf_url(
+                f"{corpus}_{i}",
+                pages=spec["pages"],
+                image_ratio=spec["image_ratio"],
+                image_kb=spec["image_kb"],
+                text_chars=spec["text_chars"],
+                parse_s=args.parse_s,
+            ),
+        }
+        for i in range(spec["docs"])
+    ]
+    config = {
+        "mode": mode,
+        "documents": documents,
+        "poll_interval": args.poll_interval,
+        "work_dir": work_dir,
+    }
+
+    env = {
+        **os.environ,
+        **providers.env(),
+        "LLAMA_VERBOSE": "false",
+        "LLAMA_IMAGES_DIR": os.path.join(work_dir, "images"),
+        "LLAMA_PAYLOAD_DIR": os.path.join(work_dir, "payloads"),
+        "VOYAGE_EMBEDDINGS_DIR": os.path.join(work_dir, "embeddings"),
+        "VISION_DESCRIPTIONS_DIR": os.path.join(work_dir, "image_descriptions"),
+        "VISION_DESCRIBE_IMAGES": "true" if args.vision else "false",
+        "BM25_INDEX_PATH": os.path.join(work_dir, "bm25_index.json"),
+        # Manifestos, livro-razão de uso, fila e métricas também ficam no diretório temporário:
+        # o benchmark não pode alterar o estado real (nem ser afetado por ele)
+        "INGEST_MANIFEST_DIR": os.path.join(work_dir, "vector_manifests"),
+        "USAGE_PATH": os.path.join(work_dir, "usage.jsonl"),
+        "INGEST_QUEUE_URL": "sqlite:///" + os.path.join(work_dir, "queue.db"),
+        "METRICS_PATH": os.path.join(work_dir, "metrics.prom"),
+    }
+    config_path = os.path.join(work_dir, f"{mode}_config.json")
+    result_path = os.path.join(work_dir, f"{mode}_result.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    providers.reset_stats()
+    proc = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--worker",
+            config_path,
+            "--result",
+            result_path,
+        ],
+        env=env,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ""
+        raise RuntimeError(f"cenário {corpus}/{mode} falhou: {last_line}")
+    with open(result_path, encoding="utf-8") as f:
+        worker = json.load(f)
+
+    provider_stats = providers.stats()
+    transferred = sum(s["bytes_in"] + s["bytes_out"] for s in provider_stats.values())
+    wall = worker["wall_s"] or 1e-9
+    return {
+        "corpus": corpus,
+        "mode": mode,
+        "documents": len(documents),
+        "pages": worker["pages"],
+        "images": worker["images"],
+        "failures": worker["failures"],
+        "wall_s": round(wall, 4),
+        "pages_per_s": round(worker["pages"] / wall, 3),
+        "bytes": transferred,
+        "bytes_per_s": round(transferred / wall, 1),
+        "peak_rss_mb": worker["peak_rss_mb"],
+        "stages": worker["stages"],
+        "providers": provider_stats,
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_previous(history_path: str) -> dict | None:
+    if not os.path.exists(history_path):
+        return None
+    with open(history_path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def _print_result(result: Dict[str, Any], baseline: Dict[str, Any] | None, label: str) -> None:
+    delta = ""
+    if baseline:
+        before = baseline["pages_per_s"] or 1e-9
+        delta = f" ({(result['pages_per_s'] / before - 1) * 100:+.1f}% vs {label})"
+    print(
+        f"\n📦 {result['corpus']} / {result['mode']}: "
+        f"{result['documents']} docs, {result['pages']} páginas"
+    )
+    print(f"   ⏱️ {result['wall_s']:.2f}s | {result['pages_per_s']:.2f} páginas/s{delta}")
+    print(
+        f"   📶 {result['bytes_per_s'] / 1024 / 1024:.2f} MiB/s "
+        f"| 🧠 pico RSS {result['peak_rss_mb']:.0f} MiB"
+    )
+    for stage, summary in result["stages"].items():
+        print(
+            f"   {stage:22} n={summary['count']:<4} p50 {summary['p50_ms']:9.1f} ms"
+            f"  p90 {summary['p90_ms']:9.1f} ms  p99 {summary['p99_ms']:9.1f} ms"
+        )
+    throttled = {n: s["throttled"] for n, s in result["providers"].items() if s["throttled"]}
+    errors = {n: s["errors"] for n, s in result["providers"].items() if s["errors"]}
+    if throttled or errors:
+        print(f"   ⚠️ 429: {throttled or '-'} | 500: {errors or '-'}")
+    for failure in result["failures"]:
+        print(f"   ❌ {failure['document']}: {failure['error']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark offline da ingestão de PDFs")
+    parser.add_argument("--corpora", nargs="+", default=["small", "mixed"], choices=sorted(CORPORA))
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument(
+        "--vision", action="store_true", help="inclui a etapa de descrição de imagens"
+    )
+    parser.add_argument(
+        "--parse-s", type=float, default=0.2, help="duração simulada do job de parse"
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=0.05, help="intervalo de polling (s)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON do resultado (para diff)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--no-save", action="store_true", help="não grava resultado nem histórico")
+    add_behavior_arguments(parser)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker, encoding="utf-8") as f:
+            config = json.load(f)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(run_worker(config), f)
+        return
+
+    behaviors = parse_behaviors(
+        args.latency_ms, args.jitter_ms, args.rate_limit, args.error_rate, args.overrides
+    )
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline_record, baseline_label = json.load(f), args.compare
+    else:
+        baseline_record = _load_previous(args.history)
+        baseline_label = (baseline_record or {}).get("git_revision") or "anterior"
+    baseline = {(r["corpus"], r["mode"]): r for r in (baseline_record or {}).get("results", [])}
+
+    results = []
+    with FakeProviders(behaviors, seed=args.seed) as providers:
+        print(f"🧪 Provedores falsos em {providers.base_url}")
+        for corpus in args.corpora:
+            # Os modos do mesmo corpus compartilham diretórios e índice: `existing` reindexa
+            with tempfile.TemporaryDirectory(prefix=f"ingestion_{corpus}_") as work_dir:
+                for mode in args.modes:
+                    try:
+                        result = run_scenario(providers, corpus, mode, work_dir, args)
+                    except RuntimeError as e:
+                        print(f"❌ {e}")
+                        continue
+                    results.append(result)
+                    _print_result(result, baseline.get((corpus, mode)), baseline_label)
+
+    if args.no_save or not results:
+        return
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "providers": {name: asdict(b) for name, b in behaviors.items()},
+        "vision": args.vision,
+        "parse_s": args.parse_s,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + "\n")
+    print(f"\n💾 Resultado: {args.output}")
+    print(f"💾 Histórico atualizado: {args.history}")
+
+
+if __name__ == "__main__":
+    main()
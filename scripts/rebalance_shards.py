@@ -0,0 +1,90 @@
+# rebalance_shards.py
+"""
+Rebalanceia os vetores entre os shards do Upstash Vector.
+
+Depois de mudar UPSTASH_VECTOR_SHARD_URLS (shard novo ou removido), os
+documentos que passaram a pertencer a outro shard são copiados para o dono
+e removidos do shard antigo. Com rendezvous hashing, adicionar um shard
+move só os documentos que passam a cair nele.
+
+Shards sendo desativados entram em --drain: todos os vetores deles vão
+para os shards atuais. Rodar de novo é seguro; uma execução interrompida
+deixa no máximo cópias duplicadas, removidas na próxima.
+
+Uso:
+    python scripts/rebalance_shards.py --dry-run
+    python scripts/rebalance_shards.py
+    python scripts/rebalance_shards.py --drain https://antigo.upstash.io --drain-token TOKEN
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from services.vector.sharding import (  # noqa: E402
+    build_sharded_index,
+    rebalance,
+    shard_urls_from_env,
+)
+
+
+def main() -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Move vetores para o shard dono de cada documento")
+    parser.add_argument(
+        "--shard-urls",
+        default=None,
+        help="URLs dos shards, separadas por vírgula (padrão: UPSTASH_VECTOR_SHARD_URLS)",
+    )
+    parser.add_argument(
+        "--drain", action="append", default=[], help="URL de um shard sendo removido (repetível)"
+    )
+    parser.add_argument(
+        "--drain-token",
+        default=None,
+        help="Token dos shards em --drain (padrão: o mesmo dos shards atuais)",
+    )
+    parser.add_argument("--namespace", default="")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="Só conta o que seria movido")
+    args = parser.parse_args()
+
+    urls = (
+        [u.strip() for u in args.shard_urls.split(",") if u.strip()]
+        if args.shard_urls
+        else shard_urls_from_env()
+    )
+    if not urls:
+        print("❌ Nenhum shard configurado: defina UPSTASH_VECTOR_SHARD_URLS ou use --shard-urls")
+        return 1
+
+    target = build_sharded_index(urls)
+    drain = []
+    if args.drain:
+        drained = build_sharded_index(args.drain, tokens=args.drain_token)
+        drain = list(zip(drained.names, drained.shards))
+
+    print(f"🧩 {len(urls)} shard(s) de destino, {len(drain)} para esvaziar")
+    start = time.perf_counter()
+    report = rebalance(
+        target,
+        drain=drain,
+        namespace=args.namespace,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+    )
+    elapsed = time.perf_counter() - start
+
+    verb = "seriam movidos" if args.dry_run else "movidos"
+    for (source, destination), count in sorted(report.moves.items()):
+        print(f"   {source} → {destination}: {count}")
+    print(f"✅ {report.scanned} vetores verificados, {report.moved} {verb} em {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
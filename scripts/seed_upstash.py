@@ -1,29 +1,450 @@
 # seed_upstash.py
+"""
+Carga em lote de um corpus de texto + imagem no índice vetorial.
+
+Aceita diretórios, CSV ou JSONL. Cada registro vira um vetor multimodal
+(texto e imagem embutidos juntos pelo `voyage-multimodal-3`; com um modelo
+local só de texto, as imagens ficam apenas nos metadados):
+
+- diretório: cada arquivo .txt/.md é um registro; uma imagem com o mesmo
+  nome (doc1.txt + doc1.jpg) entra no mesmo vetor. Imagens sem texto viram
+  registros só de imagem.
+- CSV: colunas `text` e `image` (ou `image_path`), opcionalmente `id` e
+  `doc_source`; as demais colunas vão para os metadados.
+- JSONL: um objeto por linha com os mesmos campos, mais `metadata` (dict).
+
+Caminhos de imagem relativos são resolvidos a partir do arquivo de origem.
+
+Os embeddings vêm do provedor configurado (EMBEDDING_PROVIDER), pedidos em
+lotes (várias entradas por requisição), e os upserts rodam em paralelo
+enquanto o próximo lote é embutido. Os IDs são determinísticos (coluna
+`id` ou UUID derivado da origem do registro), então rodar de novo
+sobrescreve em vez de duplicar; registros cujo conteúdo não mudou (hash
+gravado nos metadados) são pulados sem nova chamada ao provedor.
+
+O destino segue a configuração da aplicação: Upstash, shards
+(UPSTASH_VECTOR_SHARD_URLS) ou o índice local (VECTOR_BACKEND=local). Um
+índice com vetores de outro modelo de embedding é recusado.
+
+Uso:
+    python scripts/seed_upstash.py corpus/
+    python scripts/seed_upstash.py exemplos.csv --batch-size 16 --upsert-workers 8
+    python scripts/seed_upstash.py dados.jsonl --namespace demo --force
+    python scripts/seed_upstash.py corpus/ --dry-run
+"""
+
+import argparse
+import csv
+import hashlib
+import json
 import os
+import sys
+import threading
+import time
 import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from upstash_vector import Index
+from dotenv import load_dotenv
+from PIL import Image
 
-import sys
-import os
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-from services.embeddings.voyage_embed import embed_doc
-
-index = Index.from_env()
-
-EXAMPLES = [
-    ("doc1.txt", "imgs/doc1.jpg", "Documento 1: explica grafos temporais."),
-    ("doc2.txt", "imgs/doc2.jpg", "Documento 2: descreve indexação vetorial."),
-]
-
-for file, img, text in EXAMPLES:
-    index.upsert(
-        vectors=[
-            (
-                str(uuid.uuid4()),
-                embed_doc(text),
-                {"file": file, "text": text, "image_path": os.path.abspath(img)},
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from services.embeddings.providers import (  # noqa: E402
+    METADATA_FIELD,
+    EmbeddingProvider,
+    ensure_index_model,
+    get_embedding_provider,
+)
+from services.vector.sharding import build_index_from_env  # noqa: E402
+
+TEXT_EXTENSIONS = (".txt", ".md")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+RESERVED_FIELDS = {"id", "text", "image", "image_path", "doc_source", "metadata"}
+
+# A VoyageAI cobra 1 token a cada 560 pixels e limita o total por requisição
+PIXELS_PER_TOKEN = 560
+CHARS_PER_TOKEN = 4
+MAX_BATCH_TOKENS = 300_000
+
+
+@dataclass
+class SeedRecord:
+    id: str
+    doc_source: str
+    text: str = ""
+    image_path: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def content_hash(self, model_id: str) -> str:
+        """Hash do que é embutido: muda o texto, a imagem ou o modelo, muda o hash"""
+        digest = hashlib.sha256(f"{model_id}\0{self.text}\0".encode())
+        if self.image_path:
+            with open(self.image_path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+
+@dataclass
+class SeedStats:
+    records: int = 0
+    skipped: int = 0
+    embedded: int = 0
+    upserted: int = 0
+    embed_s: float = 0.0
+    upsert_s: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **amounts: float) -> None:
+        with self.lock:
+            for name, value in amounts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+
+# =============================================
+# LEITURA DO CORPUS
+# =============================================
+
+
+def stable_id(source: str, key: str) -> str:
+    """ID determinístico do registro: a mesma origem gera sempre o mesmo ID"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{key}"))
+
+
+def _resolve(base_dir: str, path: Optional[str]) -> Optional[str]:
+    if not path:
+        return None
+    return os.path.abspath(path if os.path.isabs(path) else os.path.join(base_dir, path))
+
+
+def _from_fields(row: Dict[str, Any], source: str, key: str, base_dir: str) -> SeedRecord:
+    """Registro de uma linha CSV/JSONL (campos reservados + metadados extras)"""
+    metadata = {k: v for k, v in row.items() if k not in RESERVED_FIELDS and v not in (None, "")}
+    metadata.update(row.get("metadata") or {})
+    record_id = str(row.get("id") or "") or stable_id(source, key)
+    return SeedRecord(
+        id=record_id,
+        doc_source=str(row.get("doc_source") or "") or source,
+        text=str(row.get("text") or ""),
+        image_path=_resolve(base_dir, row.get("image") or row.get("image_path")),
+        metadata=metadata,
+    )
+
+
+def read_directory(root: str) -> Iterator[SeedRecord]:
+    """Um registro por texto (com a imagem de mesmo nome) ou por imagem avulsa"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        by_stem: Dict[str, Dict[str, str]] = {}
+        for filename in sorted(filenames):
+            stem, ext = os.path.splitext(filename)
+            kind = (
+                "text"
+                if ext.lower() in TEXT_EXTENSIONS
+                else "image" if ext.lower() in IMAGE_EXTENSIONS else None
+            )
+            if kind:
+                by_stem.setdefault(stem, {}).setdefault(kind, os.path.join(dirpath, filename))
+        for stem, files in by_stem.items():
+            main_file = files.get("text") or files["image"]
+            source = os.path.relpath(main_file, root).replace(os.sep, "/")
+            text = ""
+            if "text" in files:
+                with open(files["text"], encoding="utf-8") as f:
+                    text = f.read().strip()
+            yield SeedRecord(
+                id=stable_id(os.path.basename(os.path.abspath(root)), source),
+                doc_source=source,
+                text=text,
+                image_path=os.path.abspath(files["image"]) if "image" in files else None,
+            )
+
+
+def read_csv(path: str) -> Iterator[SeedRecord]:
+    source = os.path.basename(path)
+    with open(path, encoding="utf-8", newline="") as f:
+        for number, row in enumerate(csv.DictReader(f), start=1):
+            yield _from_fields(row, source, str(number), os.path.dirname(os.path.abspath(path)))
+
+
+def read_jsonl(path: str) -> Iterator[SeedRecord]:
+    source = os.path.basename(path)
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                yield _from_fields(
+                    json.loads(line), source, str(number), os.path.dirname(os.path.abspath(path))
+                )
+
+
+def read_records(paths: Iterable[str]) -> List[SeedRecord]:
+    records: List[SeedRecord] = []
+    for path in paths:
+        if os.path.isdir(path):
+            records.extend(read_directory(path))
+        elif path.lower().endswith(".csv"):
+            records.extend(read_csv(path))
+        elif path.lower().endswith((".jsonl", ".ndjson")):
+            records.extend(read_jsonl(path))
+        else:
+            raise SystemExit(f"❌ Formato não suportado: {path} (use diretório, .csv ou .jsonl)")
+    for record in records:
+        if not record.text and not record.image_path:
+            raise SystemExit(f"❌ Registro sem texto nem imagem: {record.doc_source} ({record.id})")
+        if record.image_path and not os.path.exists(record.image_path):
+            raise SystemExit(f"❌ Imagem não encontrada: {record.image_path} ({record.doc_source})")
+    return records
+
+
+# =============================================
+# LOTES
+# =============================================
+
+
+def _image_pixels(path: str, max_pixels: int) -> int:
+    with Image.open(path) as image:
+        return min(image.width * image.height, max_pixels)
+
+
+def token_batches(
+    records: List[SeedRecord], batch_size: int, max_pixels: int
+) -> Iterator[List[SeedRecord]]:
+    """Lotes de até batch_size registros sem passar do limite de tokens por requisição"""
+    batch: List[SeedRecord] = []
+    tokens = 0
+    for record in records:
+        cost = len(record.text) // CHARS_PER_TOKEN + 1
+        if record.image_path:
+            cost += _image_pixels(record.image_path, max_pixels) // PIXELS_PER_TOKEN
+        if batch and (len(batch) >= batch_size or tokens + cost > MAX_BATCH_TOKENS):
+            yield batch
+            batch, tokens = [], 0
+        batch.append(record)
+        tokens += cost
+    if batch:
+        yield batch
+
+
+def load_image(path: str, max_pixels: int) -> Image.Image:
+    """Imagem em RGB, reduzida (mantendo a proporção) se passar de max_pixels"""
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+    pixels = image.width * image.height
+    if pixels > max_pixels:
+        scale = (max_pixels / pixels) ** 0.5
+        image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))))
+    return image
+
+
+def existing_hashes(index: Any, ids: List[str], namespace: str) -> Dict[str, str]:
+    """content_hash já gravado para cada ID presente no índice"""
+    found = index.fetch(ids=ids, include_metadata=True, namespace=namespace)
+    return {
+        vector.id: (vector.metadata or {}).get("content_hash", "")
+        for vector in found
+        if vector is not None
+    }
+
+
+def embed_batch(
+    index: Any,
+    provider: EmbeddingProvider,
+    batch: List[SeedRecord],
+    namespace: str,
+    max_pixels: int,
+    force: bool,
+    stats: SeedStats,
+) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+    """Embute os registros novos ou alterados do lote e devolve os vetores prontos"""
+    hashes = {record.id: record.content_hash(provider.model_id) for record in batch}
+    if not force:
+        current = existing_hashes(index, list(hashes), namespace)
+        pending = [record for record in batch if current.get(record.id) != hashes[record.id]]
+    else:
+        pending = batch
+    stats.add(skipped=len(batch) - len(pending))
+    if not pending:
+        return []
+
+    inputs = []
+    for record in pending:
+        parts: List[Any] = [record.text] if record.text else []
+        if record.image_path and provider.multimodal:
+            parts.append(load_image(record.image_path, max_pixels))
+        inputs.append(parts)
+
+    start = time.perf_counter()
+    embeddings = provider.embed_documents(inputs)
+    stats.add(embedded=len(pending), embed_s=time.perf_counter() - start)
+
+    vectors = []
+    for record, embedding in zip(pending, embeddings):
+        metadata = {
+            **record.metadata,
+            "doc_source": record.doc_source,
+            "text": record.text,
+            "content_hash": hashes[record.id],
+            METADATA_FIELD: provider.model_id,
+        }
+        if record.image_path:
+            metadata["image_path"] = record.image_path
+        vectors.append((record.id, embedding, metadata))
+    return vectors
+
+
+# =============================================
+# EXECUÇÃO
+# =============================================
+
+
+def seed(
+    index: Any,
+    records: List[SeedRecord],
+    provider: Optional[EmbeddingProvider] = None,
+    namespace: str = "",
+    batch_size: int = 32,
+    upsert_batch_size: int = 100,
+    embed_workers: int = 2,
+    upsert_workers: int = 4,
+    max_pixels: int = 2_000_000,
+    force: bool = False,
+    progress: bool = True,
+) -> SeedStats:
+    """Embute e grava os registros; embeddings e upserts de lotes diferentes se sobrepõem"""
+    provider = provider or get_embedding_provider()
+    ensure_index_model(index, provider.model_id, namespace=namespace)
+    stats = SeedStats()
+    start = time.perf_counter()
+
+    def upsert(vectors: List[Tuple[str, List[float], Dict[str, Any]]]) -> None:
+        begin = time.perf_counter()
+        index.upsert(vectors=vectors, namespace=namespace)
+        stats.add(upserted=len(vectors), upsert_s=time.perf_counter() - begin)
+
+    def report() -> None:
+        if not progress:
+            return
+        elapsed = time.perf_counter() - start
+        print(
+            f"   {stats.records}/{len(records)} registros | embutidos {stats.embedded} "
+            f"| pulados {stats.skipped} | gravados {stats.upserted} "
+            f"| {stats.records / elapsed if elapsed else 0:.1f} reg/s",
+            flush=True,
+        )
+
+    with (
+        ThreadPoolExecutor(embed_workers) as embed_pool,
+        ThreadPoolExecutor(upsert_workers) as upsert_pool,
+    ):
+        embedding: deque[Tuple[int, Future]] = deque()
+        writes: List[Future] = []
+
+        def drain(size: int, future: Future) -> None:
+            vectors = future.result()
+            for offset in range(0, len(vectors), upsert_batch_size):
+                writes.append(
+                    upsert_pool.submit(upsert, vectors[offset : offset + upsert_batch_size])
+                )
+            stats.add(records=size)
+            # Falhas de upsert interrompem a carga cedo (rodar de novo retoma)
+            for write in [w for w in writes if w.done()]:
+                write.result()
+                writes.remove(write)
+            report()
+
+        # Mantém poucos lotes em voo: memória limitada e backpressure da VoyageAI
+        for batch in token_batches(records, batch_size, max_pixels):
+            embedding.append(
+                (
+                    len(batch),
+                    embed_pool.submit(
+                        embed_batch, index, provider, batch, namespace, max_pixels, force, stats
+                    ),
+                )
             )
-        ]
+            while len(embedding) > embed_workers * 2:
+                drain(*embedding.popleft())
+        while embedding:
+            drain(*embedding.popleft())
+        for write in writes:
+            write.result()
+
+    return stats
+
+
+def main() -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(
+        description="Carga em lote de texto + imagem no índice vetorial"
+    )
+    parser.add_argument("paths", nargs="+", help="diretórios, arquivos .csv ou .jsonl")
+    parser.add_argument("--namespace", default="")
+    parser.add_argument(
+        "--batch-size", type=int, default=32, help="registros por requisição de embedding"
     )
-print("🏁 Upstash populado com", len(EXAMPLES), "vetores.")
+    parser.add_argument("--upsert-batch-size", type=int, default=100, help="vetores por upsert")
+    parser.add_argument(
+        "--embed-workers", type=int, default=2, help="requisições de embedding simultâneas"
+    )
+    parser.add_argument("--upsert-workers", type=int, default=4, help="upserts simultâneos")
+    parser.add_argument(
+        "--max-image-pixels",
+        type=int,
+        default=2_000_000,
+        help="imagens maiores são reduzidas antes do embedding",
+    )
+    parser.add_argument("--force", action="store_true", help="embute de novo mesmo o que não mudou")
+    parser.add_argument("--dry-run", action="store_true", help="só lê e valida o corpus")
+    args = parser.parse_args()
+
+    records = read_records(args.paths)
+    images = sum(1 for record in records if record.image_path)
+    print(f"📚 {len(records)} registros ({images} com imagem) em {len(args.paths)} origem(ns)")
+    duplicated = len(records) - len({record.id for record in records})
+    if duplicated:
+        print(f"⚠️ {duplicated} registro(s) com ID repetido: o último gravado prevalece")
+    provider = get_embedding_provider()
+    image_only = sum(1 for record in records if not record.text)
+    if image_only and not provider.multimodal:
+        print(
+            f"❌ {image_only} registro(s) só com imagem, "
+            f"mas o modelo '{provider.model_id}' é só de texto"
+        )
+        return 1
+    print(f"🧠 Modelo de embedding: {provider.model_id}")
+    if args.dry_run or not records:
+        return 0
+
+    start = time.perf_counter()
+    try:
+        stats = seed(
+            build_index_from_env(),
+            records,
+            provider=provider,
+            namespace=args.namespace,
+            batch_size=args.batch_size,
+            upsert_batch_size=args.upsert_batch_size,
+            embed_workers=args.embed_workers,
+            upsert_workers=args.upsert_workers,
+            max_pixels=args.max_image_pixels,
+            force=args.force,
+        )
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"🏁 {stats.upserted} vetores gravados, {stats.skipped} sem mudança, em {elapsed:.1f}s "
+        f"({len(records) / elapsed if elapsed else 0:.1f} reg/s)"
+    )
+    print(
+        f"   ⏱️ embedding {stats.embed_s:.1f}s | upsert {stats.upsert_s:.1f}s "
+        "(somados entre as threads)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# startup_benchmark.py
+"""
+Benchmark de cold start.
+
+Mede, em processos Python novos, o tempo de import dos módulos de entrada
+do projeto usando `python -X importtime`, lista os imports mais caros e
+anexa o resultado a um histórico JSONL para acompanhar a evolução.
+
+Uso:
+    python scripts/startup_benchmark.py
+    python scripts/startup_benchmark.py --repeat 5 --top 15
+    python scripts/startup_benchmark.py --targets main crew
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SRC = os.path.join(ROOT, "src")
+
+DEFAULT_TARGETS = [
+    "services.embeddings.voyage_embed",
+    "services.vector.upstash_vector_tool",
+    "crew",
+    "main",
+    "indexing.process_pdf",
+]
+DEFAULT_HISTORY = os.path.join(ROOT, "benchmarks", "startup_history.jsonl")
+
+# Credenciais fictícias: o benchmark mede apenas import/inicialização, sem rede
+DUMMY_ENV = {
+    "UPSTASH_VECTOR_REST_URL": "https://example.upstash.io",
+    "UPSTASH_VECTOR_REST_TOKEN": "dummy",
+    "VOYAGE_API_KEY": "dummy",
+}
+
+
+def _run_importtime(module: str) -> tuple[float, list[tuple[str, int, int]]]:
+    """Importa `module` num processo novo; retorna (tempo de parede, linhas do importtime)"""
+    env = {**DUMMY_ENV, **os.environ}
+    env["PYTHONPATH"] = os.pathsep.join([SRC, ROOT, env.get("PYTHONPATH", "")])
+
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ""
+        raise RuntimeError(f"import {module} falhou: {last_line}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        # Formato: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+            entries.append((name.rstrip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return wall, entries
+
+
+def benchmark_module(module: str, repeat: int, top: int) -> dict:
+    """Executa o import `repeat` vezes e agrega os resultados"""
+    walls = []
+    import_totals = []
+    entries: list[tuple[str, int, int]] = []
+
+    for _ in range(repeat):
+        wall, entries = _run_importtime(module)
+        walls.append(wall)
+        own = [e[2] for e in entries if e[0].strip() == module]
+        import_totals.append(own[-1] if own else max((e[2] for e in entries), default=0))
+
+    heaviest = sorted(entries, key=lambda e: e[2], reverse=True)[:top]
+    return {
+        "module": module,
+        "wall_median_s": statistics.median(walls),
+        "wall_min_s": min(walls),
+        "import_cumulative_median_ms": statistics.median(import_totals) / 1000,
+        "heaviest_imports": [
+            {"name": name.strip(), "self_ms": s / 1000, "cumulative_ms": c / 1000}
+            for name, s, c in heaviest
+        ],
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _load_previous(history_path: str) -> dict | None:
+    if not os.path.exists(history_path):
+        return None
+    with open(history_path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de cold start (import time)")
+    parser.add_argument("--targets", nargs="+", default=DEFAULT_TARGETS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="imports mais caros a listar")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true", help="não grava no histórico")
+    args = parser.parse_args()
+
+    previous = _load_previous(args.history)
+    previous_by_module = {r["module"]: r for r in (previous or {}).get("results", [])}
+
+    results = []
+    for module in args.targets:
+        try:
+            result = benchmark_module(module, args.repeat, args.top)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            continue
+        results.append(result)
+
+        delta = ""
+        before = previous_by_module.get(module)
+        if before:
+            diff = result["wall_median_s"] - before["wall_median_s"]
+            delta = f" ({diff:+.3f}s vs {previous.get('git_revision') or 'anterior'})"
+
+        print(f"\n⏱️ {module}: {result['wall_median_s']:.3f}s (mediana){delta}")
+        print(f"   import cumulativo: {result['import_cumulative_median_ms']:.1f} ms")
+        for entry in result["heaviest_imports"]:
+            print(f"   {entry['cumulative_ms']:9.1f} ms  {entry['name']}")
+
+    if args.no_save or not results:
+        return
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"\n💾 Histórico atualizado: {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# vector_index_benchmark.py
+"""
+Benchmark do índice vetorial local quantizado (VECTOR_BACKEND=local).
+
+Compara o `QuantizedIndex` (pré-filtro binário/int8 + rescoring float32
+via memmap) com a busca exata em float32 sobre os mesmos vetores:
+recall@k contra o top-k exato, latência p50/p95/p99 por consulta e a
+memória residente dos códigos versus a matriz float32.
+
+Os vetores são sintéticos (clusters em 1024 dimensões, como os embeddings
+do `voyage-multimodal-3`) ou, com --embeddings-dir, os embeddings reais
+gerados pela ingestão (indexing/assets/embeddings/*.json). As consultas
+são vetores do conjunto com ruído, como perguntas próximas a uma página.
+
+Uso:
+    python scripts/vector_index_benchmark.py
+    python scripts/vector_index_benchmark.py --vectors 200000 --multipliers 5 10 20 40
+    python scripts/vector_index_benchmark.py --embeddings-dir indexing/assets/embeddings --top-k 5
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "src"))
+from services.vector.quantized_index import QUANTIZATIONS, QuantizedIndex  # noqa: E402
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "vector_index_latest.json")
+DEFAULT_HISTORY = os.path.join(ROOT, "benchmarks", "vector_index_history.jsonl")
+
+BATCH_SIZE = 10_000
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Percentil por posição mais próxima (valores já em ms)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p95_ms": round(percentile(samples, 95), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+    }
+
+
+# =============================================
+# DADOS
+# =============================================
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Vetores em clusters (tópicos) com ruído, normalizados"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, BATCH_SIZE):
+        size = min(BATCH_SIZE, count - start)
+        labels = rng.integers(0, clusters, size)
+        vectors[start : start + size] = centers[labels] + 0.8 * rng.standard_normal(
+            (size, dim)
+        ).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_embeddings(directory: str) -> np.ndarray:
+    """Embeddings salvos pela etapa VoyageAI da ingestão"""
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            rows.extend(
+                item["embedding"] for item in json.load(f).get("data", []) if item.get("embedding")
+            )
+    if not rows:
+        raise SystemExit(f"❌ Nenhum embedding encontrado em {directory}")
+    vectors = np.asarray(rows, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(
+    vectors: np.ndarray, count: int, noise: float, rng: np.random.Generator
+) -> np.ndarray:
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    queries = picks + noise * rng.standard_normal(picks.shape).astype(np.float32) / np.sqrt(
+        vectors.shape[1]
+    )
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+# =============================================
+# BUSCAS
+# =============================================
+
+
+def exact_search(
+    vectors: np.ndarray, queries: np.ndarray, top_k: int
+) -> tuple[List[np.ndarray], List[float]]:
+    """Top-k exato por força bruta em float32 (a referência do recall)"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        scores = vectors @ query
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        results.append(top[np.argsort(-scores[top])])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, latencies
+
+
+def build_index(path: str, vectors: np.ndarray, quantization: str) -> tuple[QuantizedIndex, float]:
+    index = QuantizedIndex(path, quantization=quantization)
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), BATCH_SIZE):
+        batch = vectors[offset : offset + BATCH_SIZE]
+        index.upsert([(str(offset + i), row) for i, row in enumerate(batch)])
+    return index, time.perf_counter() - start
+
+
+def run_quantized(
+    index: QuantizedIndex,
+    queries: np.ndarray,
+    exact: List[np.ndarray],
+    top_k: int,
+    multiplier: int,
+) -> Dict[str, Any]:
+    index.rescore_multiplier = multiplier
+    recalls, latencies = [], []
+    for query, expected in zip(queries, exact):
+        start = time.perf_counter()
+        hits = index.query(query, top_k=top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(hit.id) for hit in hits}
+        recalls.append(len(found & set(expected.tolist())) / top_k)
+    return {
+        "quantization": index.quantization,
+        "multiplier": multiplier,
+        "recall": round(float(np.mean(recalls)), 4),
+        **latency_summary(latencies),
+    }
+
+
+# =============================================
+# EXECUÇÃO
+# =============================================
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Recall e latência do índice vetorial local quantizado"
+    )
+    parser.add_argument("--vectors", type=int, default=50_000, help="vetores sintéticos")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument(
+        "--embeddings-dir", help="usa os embeddings reais da ingestão em vez de sintéticos"
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument(
+        "--noise", type=float, default=0.5, help="ruído das consultas em torno dos vetores"
+    )
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--quantizations", nargs="+", default=list(QUANTIZATIONS), choices=QUANTIZATIONS
+    )
+    parser.add_argument("--multipliers", nargs="+", type=int, default=[5, 10, 20])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON do resultado (para diff)")
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true", help="não grava resultado nem histórico")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.embeddings_dir:
+        vectors = load_embeddings(args.embeddings_dir)
+        source = args.embeddings_dir
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim, args.clusters, rng)
+        source = f"sintético ({args.clusters} clusters)"
+    top_k = min(args.top_k, len(vectors))
+    queries = make_queries(vectors, args.queries, args.noise, rng)
+    print(
+        f"🧪 {len(vectors)} vetores × {vectors.shape[1]} dims | {source} "
+        f"| {len(queries)} consultas, top-{top_k}"
+    )
+
+    exact, exact_latencies = exact_search(vectors, queries, top_k)
+    float32_mb = vectors.nbytes / 2**20
+    print(
+        f"\n📏 Exato float32: {float32_mb:.1f} MiB residentes | "
+        + " ".join(f"{k} {v:.2f}" for k, v in latency_summary(exact_latencies).items())
+    )
+
+    results = []
+    for quantization in args.quantizations:
+        work_dir = tempfile.mkdtemp(prefix=f"vector_index_{quantization}_")
+        try:
+            index, build_s = build_index(work_dir, vectors, quantization)
+            resident_mb = (index._codes.view.nbytes + index._scales.view.nbytes) / 2**20
+            print(
+                f"\n🗜️ {quantization}: {resident_mb:.1f} MiB residentes "
+                f"({float32_mb / resident_mb:.0f}x menos) | construção {build_s:.1f}s"
+            )
+            for multiplier in args.multipliers:
+                result = run_quantized(index, queries, exact, top_k, multiplier)
+                result.update(resident_mb=round(resident_mb, 2), build_s=round(build_s, 2))
+                results.append(result)
+                print(
+                    f"   ×{multiplier:<3} recall@{top_k} {result['recall']:.3f} | "
+                    f"p50 {result['p50_ms']:.2f} ms  p95 {result['p95_ms']:.2f} ms  "
+                    f"p99 {result['p99_ms']:.2f} ms"
+                )
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.no_save:
+        return
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "vectors": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "source": source,
+        "queries": len(queries),
+        "top_k": top_k,
+        "exact": {"resident_mb": round(float32_mb, 2), **latency_summary(exact_latencies)},
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + "\n")
+    print(f"\n💾 Resultado: {args.output}")
+    print(f"💾 Histórico atualizado: {args.history}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+# src/answer_cache.py
+"""
+Cache semântico de respostas completas da crew.
+
+Perguntas com redação diferente mas mesmo sentido reaproveitam o relatório
+final (`multimodal_report`) de uma execução anterior, desde que a
+similaridade de cosseno entre os embeddings passe do limiar e o índice de
+documentos não tenha mudado desde então (a versão do índice faz parte da
+chave). Entradas expiram por TTL e as menos usadas são descartadas quando o
+cache enche.
+"""
+
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+EmbedFn = Callable[[str], List[float]]
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def normalize_question(question: str) -> str:
+    """Forma canônica usada para o atalho de igualdade exata (sem embedding)."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.replace("?", " ").replace("!", " ").split())
+
+
+_version_lock = threading.Lock()
+_cached_version: Optional[Tuple[float, str]] = None
+
+
+def _manifest_stamp() -> str:
+    """Quantidade e última modificação dos manifestos da ingestão incremental."""
+    manifest_dir = os.getenv(
+        "INGEST_MANIFEST_DIR", os.path.join(_REPO_ROOT, "indexing", "assets", "vector_manifests")
+    )
+    try:
+        entries = [e for e in os.scandir(manifest_dir) if e.name.endswith(".json")]
+    except OSError:
+        return "0"
+    latest = max((e.stat().st_mtime_ns for e in entries), default=0)
+    return f"{len(entries)}@{latest}"
+
+
+def _file_stamp(path: str) -> str:
+    """Tamanho e última modificação de um arquivo ("0" se não existe)."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "0"
+    return f"{stat.st_size}@{stat.st_mtime_ns}"
+
+
+def _compute_index_version() -> str:
+    # Índice e arquivos direto, sem a fábrica de crews: um acerto não importa o crewAI
+    from services.vector.bm25_index import default_index_path
+    from services.vector.sharding import get_shared_index
+
+    vector_count = get_shared_index().info().vector_count
+    bm25 = _file_stamp(default_index_path())
+    return f"vectors:{vector_count}|manifests:{_manifest_stamp()}|bm25:{bm25}"
+
+
+def embed_question(question: str) -> List[float]:
+    """Embedding padrão: o mesmo provedor da ferramenta de busca, sem montar a crew."""
+    import replay
+    from services.embeddings.providers import get_embedding_provider
+    from services.limits import provider_slot
+    from services.metrics import get_metrics
+
+    provider = get_embedding_provider()
+
+    def embed_query(text: str) -> List[float]:
+        with provider_slot(provider.kind), get_metrics().span(f"{provider.kind}.embed_query"):
+            return list(provider.embed_query(text))
+
+    # Sem a crew, `replay.install()` não roda: a gravação é feita aqui
+    return replay.call_recorded(
+        "answer_cache", embed_query, question, config={"embedding_model": provider.model_id}
+    )
+
+
+def current_index_version() -> str:
+    """
+    Versão dos documentos indexados.
+
+    `INDEX_VERSION` tem prioridade (útil quando a indexação roda em outro
+    lugar e publica a própria versão). Senão combina o número de vetores do
+    índice vetorial, a data dos manifestos da ingestão incremental (pega
+    reindexações que não mudam a contagem) e o tamanho e a data do arquivo
+    do índice BM25. O valor é reaproveitado por ANSWER_CACHE_VERSION_TTL segundos para não
+    consultar o índice a cada pergunta.
+    """
+    global _cached_version
+    env_version = os.getenv("INDEX_VERSION")
+    if env_version:
+        return env_version
+
+    ttl = float(os.getenv("ANSWER_CACHE_VERSION_TTL", "30"))
+    now = time.monotonic()
+    with _version_lock:
+        if _cached_version is not None and now - _cached_version[0] < ttl:
+            return _cached_version[1]
+    version = _compute_index_version()
+    with _version_lock:
+        _cached_version = (now, version)
+    return version
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    embedding: List[float]
+    answer: str
+    index_version: str
+    created_at: float
+    hits: int = 0
+
+
+@dataclass
+class CacheLookup:
+    """Resultado de uma consulta ao cache; `embedding` é reaproveitado em `store`."""
+
+    answer: Optional[str] = None
+    similarity: float = 0.0
+    cached_question: Optional[str] = None
+    embedding: Optional[List[float]] = None
+
+    @property
+    def hit(self) -> bool:
+        return self.answer is not None
+
+
+@dataclass
+class CachedResult:
+    """Resposta servida do cache, com o mesmo atributo `raw` do `CrewOutput`."""
+
+    raw: str
+    similarity: float
+    cached_question: str
+    source: str = field(default="cache")
+
+
+class SemanticAnswerCache:
+    """
+    Cache LRU de respostas com busca por similaridade de cosseno.
+
+    Args:
+        embed_fn: Função de embedding da pergunta (padrão: a mesma da busca)
+        threshold: Similaridade mínima para reaproveitar uma resposta
+        ttl: Validade de cada entrada, em segundos (None = sem expiração)
+        max_entries: Máximo de respostas guardadas (LRU)
+        path: Arquivo JSONL para persistir o cache entre processos (opcional);
+            cada resposta guardada acrescenta uma linha
+    """
+
+    def __init__(
+        self,
+        embed_fn: Optional[EmbedFn] = None,
+        threshold: Optional[float] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        path: Optional[str] = None,
+    ):
+        self._embed_fn = embed_fn
+        self.threshold = threshold or float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+        env_ttl = os.getenv("ANSWER_CACHE_TTL", "86400")
+        self.ttl = ttl if ttl is not None else (float(env_ttl) if float(env_ttl) > 0 else None)
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        # Embeddings normalizados; a linha i é a entrada _matrix_keys[i] (independe da ordem LRU)
+        self._matrix: Any = None
+        self._matrix_keys: List[str] = []
+        self._stats = {"lookups": 0, "hits": 0, "exact_hits": 0, "evictions": 0, "expired": 0}
+        self._logged = 0  # linhas no arquivo, incluindo entradas já substituídas
+
+        if self.path:
+            self._load()
+
+    # ------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                entry = CachedAnswer(**json.loads(line))
+            except (TypeError, ValueError):
+                continue  # linha truncada por uma escrita interrompida
+            key = normalize_question(entry.question)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._logged += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def _append(self, entry: CachedAnswer) -> None:
+        """Acrescenta uma entrada ao log; compacta quando ele cresce demais."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self._logged >= 2 * self.max_entries:
+            self._rewrite()
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry.__dict__, ensure_ascii=False) + "\n")
+        self._logged += 1
+
+    def _rewrite(self) -> None:
+        """Regrava o log só com as entradas vivas (descartadas e substituídas saem)."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry.__dict__, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._logged = len(self._entries)
+
+    # ------------------------------------------------------------------
+    # Operações
+    # ------------------------------------------------------------------
+
+    def _embed(self, question: str) -> List[float]:
+        return list((self._embed_fn or embed_question)(question))
+
+    def _expire(self, now: float) -> None:
+        if self.ttl is None:
+            return
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._stats["expired"] += len(expired)
+            self._matrix_drop(expired)
+
+    @staticmethod
+    def _normalized(embedding: List[float]) -> Any:
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _matrix_put(self, key: str, embedding: List[float]) -> None:
+        """Grava a linha de uma entrada na matriz já montada, sem remontá-la."""
+        if self._matrix is None:
+            return
+        import numpy as np
+
+        row = self._normalized(embedding)
+        try:
+            self._matrix[self._matrix_keys.index(key)] = row
+        except ValueError:
+            self._matrix = np.vstack([self._matrix, row[np.newaxis, :]])
+            self._matrix_keys.append(key)
+
+    def _matrix_drop(self, keys: List[str]) -> None:
+        """Remove da matriz as linhas de entradas descartadas."""
+        if self._matrix is None or not keys:
+            return
+        dropped = set(keys)
+        keep = [i for i, key in enumerate(self._matrix_keys) if key not in dropped]
+        self._matrix = self._matrix[keep]
+        self._matrix_keys = [self._matrix_keys[i] for i in keep]
+
+    def _similarities(self, embedding: List[float]) -> Any:
+        import numpy as np
+
+        if self._matrix is None:
+            vectors = np.array(
+                [entry.embedding for entry in self._entries.values()], dtype=np.float32
+            )
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            self._matrix = vectors / np.where(norms == 0, 1, norms)
+            self._matrix_keys = list(self._entries.keys())
+        return self._matrix @ self._normalized(embedding)
+
+    def lookup(self, question: str, index_version: str) -> CacheLookup:
+        """Procura uma resposta para a pergunta; embeda a pergunta só se preciso."""
+        key = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None and entry.index_version == index_version:
+                # Mesma pergunta: dispensa o embedding
+                entry.hits += 1
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["exact_hits"] += 1
+                return CacheLookup(entry.answer, 1.0, entry.question, entry.embedding)
+            has_candidates = bool(self._entries)
+
+        embedding = self._embed(question)
+        if not has_candidates:
+            return CacheLookup(embedding=embedding)
+
+        with self._lock:
+            if not self._entries:
+                return CacheLookup(embedding=embedding)
+            similarities = self._similarities(embedding)
+            keys = self._matrix_keys
+            best_key, best_similarity = None, 0.0
+            for i in similarities.argsort()[::-1]:
+                candidate = self._entries[keys[i]]
+                if candidate.index_version == index_version:
+                    best_key, best_similarity = keys[i], float(similarities[i])
+                    break
+            if best_key is None or best_similarity < self.threshold:
+                return CacheLookup(similarity=best_similarity, embedding=embedding)
+
+            entry = self._entries[best_key]
+            entry.hits += 1
+            self._entries.move_to_end(best_key)
+            self._stats["hits"] += 1
+            return CacheLookup(entry.answer, best_similarity, entry.question, embedding)
+
+    def store(
+        self,
+        question: str,
+        answer: str,
+        index_version: str,
+        embedding: Optional[List[float]] = None,
+    ) -> None:
+        """Guarda a resposta final de uma execução."""
+        if not answer:
+            return
+        embedding = embedding if embedding is not None else self._embed(question)
+        with self._lock:
+            key = normalize_question(question)
+            entry = CachedAnswer(
+                question=question,
+                embedding=[float(v) for v in embedding],
+                answer=answer,
+                index_version=index_version,
+                created_at=time.time(),
+            )
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+                self._stats["evictions"] += 1
+            self._matrix_put(key, entry.embedding)
+            self._matrix_drop(evicted)
+            self._append(entry)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+            self._rewrite()
+
+    def stats(self) -> Dict[str, Any]:
+        """Métricas de uso: consultas, acertos, taxa de acerto, descartes e tamanho."""
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                **self._stats,
+                "misses": lookups - self._stats["hits"],
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_default_cache: Optional[SemanticAnswerCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def answer_cache_enabled() -> bool:
+    return os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Cache compartilhado pelo processo, persistido em ANSWER_CACHE_PATH."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = SemanticAnswerCache(
+                    path=os.getenv(
+                        "ANSWER_CACHE_PATH",
+                        os.path.join(_REPO_ROOT, "output", "answer_cache.jsonl"),
+                    )
+                )
+    return _default_cache
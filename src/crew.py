@@ -1,8 +1,10 @@
 # src/generic_mm_project/crew.py
 from typing import List
 from crewai import Agent, Crew, Process, Task
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, agent, before_kickoff, crew, task
+from retrieval import NO_PREFETCH_MESSAGE, visual_instructions
 from services.vector.upstash_vector_tool import UpstashVectorSearchTool
+from services.vision.budgeted_image_tool import BudgetedAddImageTool
 
 @CrewBase
 class MultimodalAnalysisCrew:
@@ -24,9 +26,11 @@ class MultimodalAnalysisCrew:
 
     @agent
     def image_analyst(self) -> Agent:
+        # add_image com orçamento de tokens no lugar do AddImageTool padrão do modo multimodal
         return Agent(
             config=self.agents_config['image_analyst'],
-            tools=[UpstashVectorSearchTool()],
+            tools=[UpstashVectorSearchTool(), BudgetedAddImageTool()],
+            multimodal=False,
             verbose=True
         )
 
@@ -57,6 +61,14 @@ class MultimodalAnalysisCrew:
             output_file="output/multimodal_report.md"
         )
 
+    @before_kickoff
+    def fill_default_inputs(self, inputs):
+        # Quem chama kickoff só com {"query": ...} recebe os padrões de build_inputs
+        inputs = dict(inputs or {})
+        inputs.setdefault("prefetched_context", NO_PREFETCH_MESSAGE)
+        inputs.setdefault("visual_instructions", visual_instructions())
+        return inputs
+
     @crew
     def crew(self) -> Crew:
         return Crew(
@@ -0,0 +1,153 @@
+# src/crew_factory.py
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Type
+
+from crewai import Agent, Crew, Task
+
+import replay
+from crew import MultimodalAnalysisCrew
+from retrieval import NO_PREFETCH_MESSAGE, visual_instructions
+
+AGENT_NAMES = ("text_researcher", "image_analyst", "coordinator")
+TASK_NAMES = ("text_analysis_task", "visual_analysis_task", "coordination_task")
+
+
+def build_inputs(
+    question: str, retrieval: Any = None, vision_mode: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Monta os inputs de kickoff da crew.
+
+    Toda execução deve passar por aqui: as tarefas interpolam
+    `{prefetched_context}`, que recebe os resultados de uma busca feita antes
+    dos agentes (`retrieval.RetrievalResult`) ou, sem ela, a instrução de
+    usar a ferramenta de busca, e `{visual_instructions}`, que define se o
+    analista visual usa as descrições geradas na indexação ou carrega as
+    imagens (`vision_mode`, padrão VISION_MODE).
+    """
+    return {
+        "query": question,
+        "prefetched_context": (
+            retrieval.to_context() if retrieval is not None else NO_PREFETCH_MESSAGE
+        ),
+        "visual_instructions": visual_instructions(vision_mode),
+    }
+
+
+def _reset_token_usage(llm: Any) -> None:
+    """Dá à cópia rasa do LLM um contador de tokens próprio, zerado."""
+    usage = getattr(llm, "_token_usage", None)
+    if isinstance(usage, dict):
+        llm._token_usage = {name: 0 for name in usage}
+
+
+@dataclass
+class CrewExecution:
+    """Crew leve para uma única query, com agentes e tarefas acessíveis por nome."""
+
+    crew: Crew
+    agents: Dict[str, Agent]
+    tasks: Dict[str, Task]
+
+
+class CrewFactory:
+    """
+    Fábrica de crews por query a partir de um template montado uma única vez.
+
+    O template lê `config/agents.yaml`/`tasks.yaml` e cria agentes, ferramentas
+    e clientes LLM uma vez. Cada `create()` devolve um `Crew.copy()` do template:
+    agentes e tarefas novos (estado de execução isolado), mas compartilhando as
+    instâncias de ferramentas e a configuração dos LLMs. O `Crew.copy()` faz
+    uma cópia rasa de cada LLM, que ainda aponta para o mesmo contador de
+    tokens do template; cada cópia recebe um contador próprio, para que o
+    `token_usage` do resultado seja o uso desta query e não o total do processo.
+
+    O template nunca é executado, para que suas descrições continuem com os
+    placeholders (`{query}`) intactos.
+    """
+
+    def __init__(self, crew_class: Type = MultimodalAnalysisCrew):
+        self._crew_class = crew_class
+        self._lock = threading.Lock()
+        self._template: Optional[Crew] = None
+        self._agent_index: Dict[str, int] = {}
+        self._task_index: Dict[str, int] = {}
+
+    def _build_template(self) -> Crew:
+        """Monta o template e registra a posição de cada agente/tarefa por nome."""
+        instance = self._crew_class()
+        template = instance.crew()
+
+        # Os métodos @agent/@task são memoizados: a mesma instância aparece na crew
+        for name in AGENT_NAMES:
+            agent = getattr(instance, name)()
+            self._agent_index[name] = next(i for i, a in enumerate(template.agents) if a is agent)
+        for name in TASK_NAMES:
+            task = getattr(instance, name)()
+            self._task_index[name] = next(i for i, t in enumerate(template.tasks) if t is task)
+
+        # Gravação/reprodução de chamadas (REPLAY_MODE); sem efeito quando desligada
+        replay.install(agent.llm for agent in template.agents)
+        return template
+
+    def template(self) -> Crew:
+        """Retorna o template, montando-o na primeira chamada (thread-safe)."""
+        if self._template is None:
+            with self._lock:
+                if self._template is None:
+                    self._template = self._build_template()
+        return self._template
+
+    def warm_up(self) -> None:
+        """Monta o template e os clientes das ferramentas antes do uso (ex.: ao subir o serviço)."""
+        template = self.template()
+        for agent in template.agents:
+            for tool in agent.tools or []:
+                if hasattr(tool, "warm_up"):
+                    tool.warm_up()
+
+    def search_tool(self) -> Any:
+        """Ferramenta de busca do template, para recuperar sem passar por agentes."""
+        agent = self.template().agents[self._agent_index["text_researcher"]]
+        return next(tool for tool in agent.tools if hasattr(tool, "score_threshold"))
+
+    def create(self, include_visual: bool = True) -> CrewExecution:
+        """
+        Cria uma execução nova para uma query a partir do template.
+
+        Com `include_visual=False` o analista visual e sua tarefa ficam de
+        fora da crew, e a coordenação usa só a análise textual como contexto
+        (uma chamada LLM a menos quando a busca não trouxe imagens).
+        """
+        crew = self.template().copy()
+        for agent in crew.agents:
+            _reset_token_usage(agent.llm)
+        execution = CrewExecution(
+            crew=crew,
+            agents={name: crew.agents[i] for name, i in self._agent_index.items()},
+            tasks={name: crew.tasks[i] for name, i in self._task_index.items()},
+        )
+        if not include_visual:
+            visual_agent = execution.agents.pop("image_analyst")
+            visual_task = execution.tasks.pop("visual_analysis_task")
+            crew.agents = [a for a in crew.agents if a is not visual_agent]
+            crew.tasks = [t for t in crew.tasks if t is not visual_task]
+            coordination = execution.tasks["coordination_task"]
+            if isinstance(coordination.context, list):
+                coordination.context = [t for t in coordination.context if t is not visual_task]
+        return execution
+
+
+_default_factory: Optional[CrewFactory] = None
+_default_factory_lock = threading.Lock()
+
+
+def get_crew_factory() -> CrewFactory:
+    """Retorna a fábrica compartilhada pelo processo."""
+    global _default_factory
+    if _default_factory is None:
+        with _default_factory_lock:
+            if _default_factory is None:
+                _default_factory = CrewFactory()
+    return _default_factory
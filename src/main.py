@@ -10,97 +10,404 @@ load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
 
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
-from crew import MultimodalAnalysisCrew
 
-os.makedirs("output", exist_ok=True)
+
+def _get_factory():
+    """
+    Retorna a fábrica de crews compartilhada, importando-a sob demanda.
+
+    Importar crewAI (e as ferramentas) leva segundos; adiar o import até a
+    primeira execução mantém barato importar este módulo ou chamar a CLI.
+    A fábrica lê a configuração e cria agentes/ferramentas uma única vez;
+    cada query recebe uma cópia leve do template.
+    """
+    from crew_factory import get_crew_factory
+
+    os.makedirs("output", exist_ok=True)
+    return get_crew_factory()
+
+
+def _print_image_budget(report) -> None:
+    """Mostra os tokens de imagem enviados e economizados na execução, se houve imagens."""
+    if report.images:
+        print(report.summary())
+
+
+def _print_usage(usage) -> None:
+    """Mostra o uso medido da consulta e o modo de orçamento, se houve consumo."""
+    if usage.amounts or usage.degradation.level != "normal":
+        print(usage.summary())
+
+
+def _lookup_answer_cache(question: str):
+    """
+    Consulta o cache semântico de respostas antes de executar a crew.
+
+    Retorna `(cached_result, pending)`: `cached_result` é a resposta servida
+    do cache (ou None) e `pending` guarda o embedding e a versão do índice
+    para `_store_answer` após a execução. Falhas no cache nunca impedem a
+    execução normal.
+    """
+    from answer_cache import CachedResult, answer_cache_enabled, current_index_version, get_answer_cache
+
+    if not answer_cache_enabled():
+        return None, None
+    try:
+        cache = get_answer_cache()
+        version = current_index_version()
+        lookup = cache.lookup(question, version)
+    except Exception as e:
+        print(f"⚠️ Cache semântico indisponível: {e}")
+        return None, None
+
+    if not lookup.hit:
+        return None, (lookup, version)
+
+    print(
+        f"♻️ Resposta do cache semântico (similaridade {lookup.similarity:.3f} com "
+        f"\"{lookup.cached_question}\") | taxa de acerto: {cache.stats()['hit_rate']:.0%}"
+    )
+    os.makedirs("output", exist_ok=True)
+    with open(os.path.join("output", "multimodal_report.md"), "w", encoding="utf-8") as f:
+        f.write(lookup.answer)
+    return CachedResult(
+        raw=lookup.answer, similarity=lookup.similarity, cached_question=lookup.cached_question
+    ), None
+
+
+def _budget_fallback(question: str):
+    """
+    Orçamento de uso quase esgotado (modo cache_only): só o cache semântico
+    responde; sem resposta em cache, devolve o aviso de orçamento.
+    """
+    from retrieval import DirectResult, RetrievalResult
+    from services.metering import BUDGET_EXHAUSTED_MESSAGE
+
+    cached, _ = _lookup_answer_cache(question)
+    if cached is not None:
+        return cached
+    print("💰 Orçamento de uso quase esgotado e pergunta sem resposta em cache")
+    return DirectResult(
+        raw=BUDGET_EXHAUSTED_MESSAGE, source="budget", retrieval=RetrievalResult(query=question)
+    )
 
 
-async def run_async(question: str):
+def _store_answer(question: str, result, pending) -> None:
+    """Guarda o relatório final no cache semântico (se a consulta foi um miss)."""
+    if pending is None:
+        return
+    from answer_cache import get_answer_cache
+
+    lookup, version = pending
+    try:
+        get_answer_cache().store(question, result.raw, version, embedding=lookup.embedding)
+    except Exception as e:
+        print(f"⚠️ Não foi possível salvar no cache semântico: {e}")
+
+
+async def run_async(question: str, use_cache: bool = True):
     """
     Executa a crew assincronamente com a pergunta fornecida.
+
+    Com `use_cache`, perguntas equivalentes já respondidas (mesma versão do
+    índice) são servidas do cache semântico sem executar os agentes. O uso
+    (tokens, imagens) é medido; perto do orçamento a execução é reduzida e,
+    no limite, só o cache responde.
     """
-    result = await MultimodalAnalysisCrew().crew().kickoff_async(inputs={"query": question})
+    from services.metering import metered_run
+
+    with metered_run(question) as usage:
+        if usage.degradation.cache_only:
+            return await asyncio.to_thread(_budget_fallback, question)
+
+        pending = None
+        if use_cache:
+            cached, pending = await asyncio.to_thread(_lookup_answer_cache, question)
+            if cached is not None:
+                return cached
+
+        # Só um miss paga o import do crewAI e a montagem da crew
+        from crew_factory import build_inputs
+        from services.vision.budgeted_image_tool import track_image_budget
+
+        execution = _get_factory().create()
+        with track_image_budget() as images:
+            result = await execution.crew.kickoff_async(inputs=build_inputs(question))
+        usage.add_result(result)
+    _print_image_budget(images)
+    _print_usage(usage)
+    await asyncio.to_thread(_store_answer, question, result, pending)
     return result
 
-async def run_parallel_agents(question: str):
+async def run_parallel_agents(question: str, prefetch: bool = True):
     """
     Executa análise textual e visual em paralelo, depois coordena.
+
+    Com `prefetch` (padrão), a busca roda uma única vez antes do fan-out e
+    os trechos e caminhos de imagem encontrados entram nos inputs das duas
+    crews, em vez de cada uma embedar e buscar a mesma query.
     """
-    crew_instance = MultimodalAnalysisCrew()
+    from services.metering import metered_run
+
+    with metered_run(question) as usage:
+        if usage.degradation.cache_only:
+            return await asyncio.to_thread(_budget_fallback, question)
+        result = await _run_parallel_crews(question, prefetch, usage)
+    _print_usage(usage)
+    return result
+
+
+async def _run_parallel_crews(question: str, prefetch: bool, usage):
+    """Fan-out texto/visual e coordenação de `run_parallel_agents`."""
+    from crew_factory import build_inputs
+    from retrieval import retrieve
+    from services.vision.budgeted_image_tool import track_image_budget
+
+    execution = _get_factory().create()
+    agents, crew_tasks = execution.agents, execution.tasks
+
+    retrieval = None
+    if prefetch:
+        retrieval = await asyncio.to_thread(retrieve, question)
+        if retrieval.error is not None:
+            print(f"⚠️ Pré-busca falhou ({retrieval.error}); os agentes vão buscar sozinhos")
+        else:
+            print(f"📥 Pré-busca: {len(retrieval.hits)} trechos, {len(retrieval.image_paths)} imagens")
+    inputs = build_inputs(question, retrieval)
     
     # Cria crews separadas para execução paralela
     from crewai import Crew, Process
     
     # Crew só para análise textual
     text_crew = Crew(
-        agents=[crew_instance.text_researcher()],
-        tasks=[crew_instance.text_analysis_task()],
+        agents=[agents["text_researcher"]],
+        tasks=[crew_tasks["text_analysis_task"]],
         process=Process.sequential,
         verbose=True
     )
     
     # Crew só para análise visual  
     visual_crew = Crew(
-        agents=[crew_instance.image_analyst()],
-        tasks=[crew_instance.visual_analysis_task()],
+        agents=[agents["image_analyst"]],
+        tasks=[crew_tasks["visual_analysis_task"]],
         process=Process.sequential,
         verbose=True
     )
     
     # Executa as duas crews em paralelo
     print("🚀 Executando análise textual e visual em paralelo...")
-    text_result, visual_result = await asyncio.gather(
-        text_crew.kickoff_async(inputs={"query": question}),
-        visual_crew.kickoff_async(inputs={"query": question})
-    )
+    with track_image_budget() as images:
+        text_result, visual_result = await asyncio.gather(
+            text_crew.kickoff_async(inputs=inputs),
+            visual_crew.kickoff_async(inputs=inputs)
+        )
+    _print_image_budget(images)
+    usage.add_result(text_result)
+    usage.add_result(visual_result)
     
     # Agora executa a coordenação com os resultados
     coordination_crew = Crew(
-        agents=[crew_instance.coordinator()],
-        tasks=[crew_instance.coordination_task()],
+        agents=[agents["coordinator"]],
+        tasks=[crew_tasks["coordination_task"]],
         process=Process.sequential,
         verbose=True
     )
     
     print("🔄 Integrando resultados...")
     final_result = await coordination_crew.kickoff_async(inputs={
-        "query": question,
+        **inputs,
         "text_analysis": text_result.raw,
         "visual_analysis": visual_result.raw
     })
+    usage.add_result(final_result)
     
     return final_result
 
 
-def run(question: str):
+def run(question: str, use_cache: bool = True):
     """
     Executa a crew sincronamente com a pergunta fornecida.
+
+    Com `use_cache`, perguntas equivalentes já respondidas (mesma versão do
+    índice) são servidas do cache semântico sem executar os agentes.
     """
-    result = MultimodalAnalysisCrew().crew().kickoff(inputs={"query": question})
+    from services.metering import metered_run
+
+    with metered_run(question) as usage:
+        if usage.degradation.cache_only:
+            cached, pending = _budget_fallback(question), None
+        else:
+            cached, pending = _lookup_answer_cache(question) if use_cache else (None, None)
+        if cached is not None:
+            result = cached
+        else:
+            # Só um miss paga o import do crewAI e a montagem da crew
+            from crew_factory import build_inputs
+            from services.vision.budgeted_image_tool import track_image_budget
+
+            with track_image_budget() as images:
+                result = _get_factory().create().crew.kickoff(inputs=build_inputs(question))
+            usage.add_result(result)
+            _store_answer(question, result, pending)
     print("\n=== RESPOSTA FINAL ===\n")
     print(result.raw)
     print("\nRelatório em: output/multimodal_report.md")
+    if cached is None:
+        _print_image_budget(images)
+    _print_usage(usage)
+    return result
+
+
+FAST_PATH_MODES = ("auto", "hits")
+
+
+def _plan_fast_path(question: str, mode: str = "auto"):
+    """
+    Roda a busca antes dos agentes e decide o que executar.
+
+    Retorna `(direct_result, inputs, include_visual)`: se `direct_result` não
+    for None, ele já é a resposta; senão, `inputs` já traz os resultados da
+    busca como contexto pré-carregado e `include_visual` diz se o analista
+    visual é necessário (algum resultado referencia imagem). Se a busca
+    falhar, segue com a crew completa sem contexto pré-carregado.
+    """
+    if mode not in FAST_PATH_MODES:
+        raise ValueError(f"Modo inválido '{mode}'. Use um de: {', '.join(FAST_PATH_MODES)}")
+
+    from crew_factory import build_inputs
+    from retrieval import NO_ANSWER_MESSAGE, DirectResult, retrieve
+
+    _get_factory()
+    retrieval = retrieve(question)
+    if retrieval.error is not None:
+        print(f"⚠️ Busca direta falhou ({retrieval.error}); executando crew completa")
+        return None, build_inputs(question), True
+    if not retrieval.hits:
+        direct = DirectResult(raw=NO_ANSWER_MESSAGE, source="no_answer", retrieval=retrieval)
+        return direct, None, False
+    if mode == "hits":
+        direct = DirectResult(raw=retrieval.to_markdown(), source="retrieval", retrieval=retrieval)
+        return direct, None, False
+    return None, build_inputs(question, retrieval), retrieval.has_images
+
+
+async def run_fast_async(question: str, mode: str = "auto"):
+    """
+    Fast path assíncrono: busca primeiro e só aciona os agentes necessários.
+
+    - nenhum resultado acima do `score_threshold`: resposta "sem resultado", sem LLM
+    - `mode="hits"`: devolve os trechos encontrados, sem LLM
+    - resultados sem imagem: crew sem o analista visual
+    - demais casos: crew completa
+    """
+    from services.metering import metered_run
+    from services.vision.budgeted_image_tool import track_image_budget
+
+    with metered_run(question) as usage:
+        if usage.degradation.cache_only:
+            return await asyncio.to_thread(_budget_fallback, question)
+        direct, inputs, include_visual = await asyncio.to_thread(_plan_fast_path, question, mode)
+        if direct is not None:
+            return direct
+        execution = _get_factory().create(include_visual=include_visual)
+        with track_image_budget() as images:
+            result = await execution.crew.kickoff_async(inputs=inputs)
+        usage.add_result(result)
+    _print_image_budget(images)
+    _print_usage(usage)
+    return result
+
+
+def run_fast(question: str, mode: str = "auto"):
+    """
+    Fast path síncrono (ver `run_fast_async`).
+    """
+    from services.metering import metered_run
+    from services.vision.budgeted_image_tool import track_image_budget
+
+    with metered_run(question) as usage, track_image_budget() as images:
+        if usage.degradation.cache_only:
+            direct = result = _budget_fallback(question)
+        else:
+            direct, inputs, include_visual = _plan_fast_path(question, mode)
+            if direct is not None:
+                result = direct
+            else:
+                execution = _get_factory().create(include_visual=include_visual)
+                result = execution.crew.kickoff(inputs=inputs)
+                usage.add_result(result)
+    print("\n=== RESPOSTA FINAL (FAST PATH) ===\n")
+    print(result.raw)
+    if direct is None:
+        print("\nRelatório em: output/multimodal_report.md")
+    _print_image_budget(images)
+    _print_usage(usage)
     return result
 
 
-async def run_multiple_queries_async(questions: list):
+async def iter_queries_async(
+    questions: list,
+    priorities: list | None = None,
+    max_concurrency: int | None = None,
+    timeout: float | None = None,
+):
     """
-    Executa múltiplas queries de forma assíncrona e paralela.
+    Executa múltiplas queries com o escalonador e entrega cada resultado
+    (`QueryOutcome`) assim que fica pronto.
+
+    No máximo `max_concurrency` crews rodam ao mesmo tempo; prioridades
+    menores são atendidas primeiro.
+    """
+    from scheduler import QueryScheduler
+
+    # Monta o template (e o diretório de saída) antes de disparar as queries
+    _get_factory().warm_up()
+    scheduler = QueryScheduler(max_concurrency=max_concurrency, default_timeout=timeout)
+    for i, question in enumerate(questions):
+        priority = priorities[i] if priorities else 0
+        scheduler.submit(question, priority=priority, query_id=str(i))
+
+    try:
+        async for outcome in scheduler.as_completed():
+            yield outcome
+    finally:
+        await scheduler.close()
+
+
+async def run_multiple_queries_async(
+    questions: list, max_concurrency: int | None = None, timeout: float | None = None
+):
+    """
+    Executa múltiplas queries de forma assíncrona, com concorrência limitada.
+
+    Retorna os resultados na ordem das perguntas; queries que falharam,
+    expiraram ou foram canceladas aparecem como None.
     """
     print(f"\n=== Executando {len(questions)} queries em paralelo ===")
     start_time = time.time()
     
-    # Cria corrotinas para execução concorrente
-    tasks = [
-        MultimodalAnalysisCrew().crew().kickoff_async(inputs={"query": question}) 
-        for question in questions
-    ]
-    
-    # Aguarda todas as crews terminarem
-    results = await asyncio.gather(*tasks)
+    results = [None] * len(questions)
+    failures = 0
+    total_wait = total_exec = 0.0
+    async for outcome in iter_queries_async(
+        questions, max_concurrency=max_concurrency, timeout=timeout
+    ):
+        total_wait += outcome.queue_wait_s
+        total_exec += outcome.execution_s
+        if outcome.status == "ok":
+            results[int(outcome.query_id)] = outcome.result
+        else:
+            failures += 1
+            print(f"⚠️ Query {int(outcome.query_id) + 1} ({outcome.status}): {outcome.error or ''}")
     
     end_time = time.time()
     print(f"\n=== Todas as queries completadas em {end_time - start_time:.2f} segundos ===")
+    if questions:
+        print(
+            f"⏳ Espera média na fila: {total_wait / len(questions):.2f}s | "
+            f"⚙️ Execução média: {total_exec / len(questions):.2f}s | "
+            f"❌ Falhas: {failures}"
+        )
     
     return results
 
@@ -131,11 +438,14 @@ async def demo_async_capabilities():
     
     for i, (question, result) in enumerate(zip(questions, results), 1):
         print(f"\nQuery {i}: {question}")
+        if result is None:
+            print("Resultado: (falhou)")
+            continue
         print(f"Resultado: {result.raw[:150]}..." if len(result.raw) > 150 else result.raw)
 
 
 if __name__ == "__main__":
-    q = " ".join(sys.argv[1:]) or "Resuma o Documento 1 e descreva sua imagem."
+    q = " ".join(a for a in sys.argv[1:] if not a.startswith("--")) or "Resuma o Documento 1 e descreva sua imagem."
     
     # Verifica se deve executar demo assíncrono
     if "--async-demo" in sys.argv:
@@ -149,11 +459,14 @@ if __name__ == "__main__":
         asyncio.run(main())
     elif "--async" in sys.argv:
         async def main():
-            result = await run_async(q)
+            result = await run_async(q, use_cache="--no-cache" not in sys.argv)
             print("\n=== RESPOSTA FINAL (ASYNC) ===\n")
             print(result.raw)
             print("\nRelatório em: output/multimodal_report.md")
         asyncio.run(main())
+    elif "--fast" in sys.argv or "--hits" in sys.argv:
+        # Busca primeiro; "--hits" devolve só as páginas encontradas
+        run_fast(q, mode="hits" if "--hits" in sys.argv else "auto")
     else:
         # Execução síncrona padrão
-        run(q)
+        run(q, use_cache="--no-cache" not in sys.argv)
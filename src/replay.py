@@ -0,0 +1,338 @@
+# src/replay.py
+"""
+Gravação e reprodução determinística de chamadas LLM e de busca.
+
+Com `REPLAY_MODE=record`, cada chamada LLM (`call`/`acall` das classes de
+LLM usadas pela crew), cada busca do `UpstashVectorSearchTool` e cada
+embedding de pergunta do cache semântico é gravada em disco, indexada por um hash do pedido
+exato (modelo, mensagens, ferramentas, argumentos). Com `REPLAY_MODE=replay`,
+as mesmas chamadas são respondidas do disco, sem rede, e um pedido não
+gravado gera `ReplayMissError`, para que mudanças de prompt não passem
+despercebidas. `auto` reproduz o que existe e grava o que falta.
+
+Uso:
+    REPLAY_MODE=record python src/main.py "pergunta" --parallel
+    REPLAY_MODE=replay python src/main.py "pergunta" --parallel
+"""
+
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+REPLAY_MODES = ("off", "record", "replay", "auto")
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_REPLAY_DIR = os.path.join(_REPO_ROOT, "output", "replay")
+
+# Campos da ferramenta de busca que mudam o resultado (além dos argumentos)
+_TOOL_CONFIG_FIELDS = (
+    "namespace",
+    "score_threshold",
+    "search_mode",
+    "rrf_k",
+    "use_mmr",
+    "mmr_lambda",
+    "fetch_multiplier",
+    "max_per_doc",
+    "neighbor_pages",
+    "bm25_index_path",
+)
+
+# Argumentos de `call`/`acall` que definem o pedido LLM
+_LLM_REQUEST_FIELDS = ("messages", "tools", "response_model")
+
+
+class ReplayMissError(RuntimeError):
+    """Pedido sem gravação correspondente em modo replay."""
+
+
+def _stable(value: Any) -> Any:
+    """Converte o pedido em uma estrutura JSON determinística (sem endereços de memória)."""
+    if isinstance(value, dict):
+        return {str(k): _stable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_stable(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    name = getattr(value, "name", None)
+    if isinstance(name, str):
+        # Ferramentas e agentes: o nome identifica o objeto de forma estável
+        return f"{type(value).__name__}:{name}"
+    return type(value).__name__
+
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    payload = json.dumps({"kind": kind, **_stable(request)}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReplayStore:
+    """Armazena respostas em `{directory}/{kind}/{hash[:2]}/{hash}.json`."""
+
+    def __init__(self, mode: str = "off", directory: Optional[str] = None):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"REPLAY_MODE inválido '{mode}'. Use um de: {', '.join(REPLAY_MODES)}")
+        self.mode = mode
+        self.directory = directory or DEFAULT_REPLAY_DIR
+        self._lock = threading.Lock()
+        self._stats = {"replayed": 0, "recorded": 0, "misses": 0}
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, kind, key[:2], f"{key}.json")
+
+    def load(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(kind, key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def encode(response: Any) -> Optional[Dict[str, Any]]:
+        """Resposta em JSON puro; None se o tipo não tem representação segura."""
+        if isinstance(response, str):
+            return {"type": "str", "value": response}
+        model_dump = getattr(response, "model_dump", None)
+        if callable(model_dump):
+            # Saídas estruturadas (response_model) do pydantic
+            cls = type(response)
+            return {
+                "type": "pydantic",
+                "model": f"{cls.__module__}:{cls.__qualname__}",
+                "value": model_dump(mode="json"),
+            }
+        try:
+            return {"type": "json", "value": json.loads(json.dumps(response))}
+        except (TypeError, ValueError):
+            return None
+
+    def save(self, kind: str, key: str, request: Dict[str, Any], response: Any) -> None:
+        encoded = self.encode(response)
+        if encoded is None:
+            return  # resposta não serializável: a chamada simplesmente não é gravada
+        path = self._path(kind, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"kind": kind, "key": key, "request": _stable(request), "response": encoded},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._stats["recorded"] += 1
+
+    @staticmethod
+    def decode(entry: Dict[str, Any]) -> Any:
+        """Reconstrói a resposta; só instancia modelos pydantic, nunca objetos arbitrários."""
+        response = entry["response"]
+        if response["type"] in ("str", "json"):
+            return response["value"]
+        if response["type"] == "pydantic":
+            from pydantic import BaseModel
+
+            module_name, _, qualname = response["model"].partition(":")
+            cls: Any = importlib.import_module(module_name)
+            for part in qualname.split("."):
+                cls = getattr(cls, part)
+            if not (isinstance(cls, type) and issubclass(cls, BaseModel)):
+                raise ValueError(f"Gravação com tipo não suportado: {response['model']}")
+            return cls.model_validate(response["value"])
+        raise ValueError(f"Gravação com tipo não suportado: {response['type']}")
+
+    def lookup(self, kind: str, request: Dict[str, Any]) -> tuple:
+        """Retorna `(key, found, response)` conforme o modo atual."""
+        key = request_key(kind, request)
+        entry = self.load(kind, key) if self.mode in ("replay", "auto") else None
+        if entry is not None:
+            with self._lock:
+                self._stats["replayed"] += 1
+            return key, True, self.decode(entry)
+        if self.mode == "replay":
+            with self._lock:
+                self._stats["misses"] += 1
+            raise ReplayMissError(
+                f"Nenhuma gravação para {kind} ({key[:12]}). Rode com REPLAY_MODE=record ou auto."
+            )
+        return key, False, None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+
+_store: Optional[ReplayStore] = None
+_patched_classes: set = set()
+_install_lock = threading.Lock()
+
+
+def get_replay_store() -> ReplayStore:
+    """Store do processo, configurado por REPLAY_MODE/REPLAY_DIR."""
+    global _store
+    if _store is None:
+        with _install_lock:
+            if _store is None:
+                _store = ReplayStore(
+                    mode=os.getenv("REPLAY_MODE", "off").lower(),
+                    directory=os.getenv("REPLAY_DIR") or None,
+                )
+    return _store
+
+
+def _llm_request(llm: Any, original: Any, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Pedido LLM a partir dos argumentos da chamada, qualquer que seja a assinatura."""
+    try:
+        params = inspect.signature(original).bind(llm, *args, **kwargs).arguments
+    except TypeError:
+        params = dict(zip(_LLM_REQUEST_FIELDS, args))
+    params = {**params, **kwargs}
+    return {
+        "model": getattr(llm, "model", None),
+        "temperature": getattr(llm, "temperature", None),
+        **{name: params.get(name) for name in _LLM_REQUEST_FIELDS},
+    }
+
+
+def _wrap_llm_call(original):
+    @functools.wraps(original)
+    def call(self, *args, **kwargs):
+        store = get_replay_store()
+        if store.mode == "off":
+            return original(self, *args, **kwargs)
+        request = _llm_request(self, original, args, kwargs)
+        key, found, response = store.lookup("llm", request)
+        if found:
+            return response
+        response = original(self, *args, **kwargs)
+        store.save("llm", key, request, response)
+        return response
+
+    return call
+
+
+def _wrap_llm_acall(original):
+    @functools.wraps(original)
+    async def acall(self, *args, **kwargs):
+        store = get_replay_store()
+        if store.mode == "off":
+            return await original(self, *args, **kwargs)
+        request = _llm_request(self, original, args, kwargs)
+        key, found, response = store.lookup("llm", request)
+        if found:
+            return response
+        response = await original(self, *args, **kwargs)
+        store.save("llm", key, request, response)
+        return response
+
+    return acall
+
+
+def _is_tool_error(response: Any) -> bool:
+    """A ferramenta de busca devolve falhas como JSON `{"error": ...}` (indentado)."""
+    if not isinstance(response, str) or not response.lstrip().startswith("{"):
+        return False
+    try:
+        return "error" in json.loads(response)
+    except ValueError:
+        return False
+
+
+def _tool_config(tool: Any) -> Dict[str, Any]:
+    """Configuração da ferramenta que muda o resultado de uma mesma chamada."""
+    from services.metering import current_degradation
+
+    config = {name: getattr(tool, name, None) for name in _TOOL_CONFIG_FIELDS}
+    # Vetores de modelos diferentes não são comparáveis; o orçamento reduz o top_k
+    config["embedding_model"] = (
+        None if getattr(tool, "custom_embedding_fn", None) else tool._get_provider().model_id
+    )
+    config["top_k_factor"] = current_degradation().top_k_factor
+    return config
+
+
+def _wrap_tool_run(original):
+    @functools.wraps(original)
+    def _run(self, *args, **kwargs):
+        store = get_replay_store()
+        if store.mode == "off":
+            return original(self, *args, **kwargs)
+        request = {
+            "tool": type(self).__name__,
+            "method": original.__name__,
+            "args": list(args),
+            "kwargs": kwargs,
+            "config": _tool_config(self),
+        }
+        key, found, response = store.lookup("tool", request)
+        if found:
+            return response
+        response = original(self, *args, **kwargs)
+        # Erros de busca não são gravados: a próxima execução tenta de novo
+        if not _is_tool_error(response):
+            store.save("tool", key, request, response)
+        return response
+
+    return _run
+
+
+def call_recorded(name: str, original, *args, config: Optional[Dict[str, Any]] = None):
+    """
+    Grava/reproduz uma chamada avulsa, fora das classes de `install()`.
+
+    Usado por caminhos que não montam a crew (ex.: o embedding de pergunta
+    do cache semântico), e por isso não passam por `install()`.
+    """
+    store = get_replay_store()
+    if store.mode == "off":
+        return original(*args)
+    request = {
+        "tool": name,
+        "method": original.__name__,
+        "args": list(args),
+        "kwargs": {},
+        "config": config or {},
+    }
+    key, found, response = store.lookup("tool", request)
+    if found:
+        return response
+    response = original(*args)
+    store.save("tool", key, request, response)
+    return response
+
+
+def install(llms: Iterable[Any] = ()) -> Optional[ReplayStore]:
+    """
+    Instala os ganchos de gravação/reprodução (idempotente).
+
+    As classes das LLMs informadas (as das crews montadas) e o
+    `UpstashVectorSearchTool` têm `call`/`acall`/`_run` envolvidos. Com
+    REPLAY_MODE=off nada é alterado.
+    """
+    store = get_replay_store()
+    if store.mode == "off":
+        return None
+
+    from services.vector.upstash_vector_tool import UpstashVectorSearchTool
+
+    with _install_lock:
+        if UpstashVectorSearchTool not in _patched_classes:
+            UpstashVectorSearchTool._run = _wrap_tool_run(UpstashVectorSearchTool._run)
+            _patched_classes.add(UpstashVectorSearchTool)
+        for llm in llms:
+            cls = type(llm)
+            if cls in _patched_classes or not hasattr(cls, "call"):
+                continue
+            cls.call = _wrap_llm_call(cls.call)
+            if hasattr(cls, "acall"):
+                cls.acall = _wrap_llm_acall(cls.acall)
+            _patched_classes.add(cls)
+    return store
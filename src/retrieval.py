@@ -0,0 +1,210 @@
+# src/retrieval.py
+"""
+Recuperação direta (sem agentes) sobre a mesma ferramenta de busca da crew.
+
+Usado pelo fast path de `main.py`: a busca roda uma vez antes de qualquer
+chamada LLM, e o resultado decide se vale a pena acionar os agentes.
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+NO_PREFETCH_MESSAGE = (
+    "Nenhum contexto pré-carregado: use a ferramenta de busca para encontrar os trechos."
+)
+
+NO_ANSWER_MESSAGE = (
+    "Nenhum trecho relevante foi encontrado nos documentos indexados para esta pergunta."
+)
+
+# Como o analista visual obtém o conteúdo das imagens (VISION_MODE):
+# "live" carrega cada imagem no modelo de visão, "cached" usa só as descrições
+# geradas na indexação e "auto" usa as descrições e carrega apenas imagens sem descrição.
+VISION_MODES = ("live", "cached", "auto")
+
+_LIVE_VISION_STEPS = (
+    '1. Use a ferramenta "{add_image}" para carregar a imagem com o caminho completo\n'
+    "2. EXAMINE VISUALMENTE o conteúdo real da imagem carregada\n"
+    "3. Descreva EXATAMENTE o que vê: texto, diagramas, gráficos, tabelas\n"
+    "4. Analise elementos visuais específicos: cores, formas, estruturas, layout\n"
+    "5. Extraia insights baseados no conteúdo visual observado\n"
+    "\n"
+    "IMPORTANTE: Use apenas o que realmente vê na imagem após carregá-la."
+)
+
+_VISUAL_INSTRUCTIONS = {
+    "live": "Para cada imagem referenciada:\n" + _LIVE_VISION_STEPS,
+    "cached": (
+        'Cada imagem já foi descrita na indexação: use os campos "image_description" '
+        '(conteúdo visual) e "image_ocr" (texto na imagem) dos resultados da busca.\n'
+        'NÃO carregue as imagens com a ferramenta "{add_image}". Se uma imagem não '
+        "tiver descrição, registre isso em vez de especular sobre o conteúdo."
+    ),
+    "auto": (
+        'Para imagens com "image_description"/"image_ocr" nos resultados da busca, '
+        "use essas descrições pré-computadas sem carregar a imagem.\n"
+        "Apenas para imagens SEM descrição:\n" + _LIVE_VISION_STEPS
+    ),
+}
+
+
+def get_vision_mode(mode: Optional[str] = None) -> str:
+    """Resolve o modo de visão (argumento, VISION_MODE ou "auto")."""
+    mode = mode or os.getenv("VISION_MODE", "auto")
+    if mode not in VISION_MODES:
+        raise ValueError(f"VISION_MODE inválido '{mode}'. Use um de: {', '.join(VISION_MODES)}")
+    return mode
+
+
+def _add_image_tool_name() -> str:
+    """Nome com que o agente vê o add_image (o do crewAI, mantido pelo BudgetedAddImageTool)."""
+    from services.vision.budgeted_image_tool import BudgetedAddImageTool
+
+    return BudgetedAddImageTool().name
+
+
+def visual_instructions(mode: Optional[str] = None) -> str:
+    """Instruções do analista visual para o modo de visão escolhido."""
+    return _VISUAL_INSTRUCTIONS[get_vision_mode(mode)].format(add_image=_add_image_tool_name())
+
+
+@dataclass
+class RetrievalHit:
+    """Um resultado da busca, com os campos que os agentes usam."""
+
+    id: str
+    score: Optional[float]
+    text: str
+    doc_source: Optional[str] = None
+    page_number: Optional[int] = None
+    image_path: Optional[str] = None
+    image_description: Optional[str] = None
+    image_ocr: Optional[str] = None
+
+    @classmethod
+    def from_tool_result(cls, item: Dict[str, Any]) -> "RetrievalHit":
+        metadata = item.get("metadata") or {}
+        return cls(
+            id=str(item.get("id")),
+            score=item.get("score"),
+            text=item.get("context") or metadata.get("text", ""),
+            doc_source=metadata.get("doc_source") or metadata.get("file"),
+            page_number=metadata.get("page_number"),
+            image_path=metadata.get("image_path"),
+            image_description=metadata.get("image_description"),
+            image_ocr=metadata.get("image_ocr"),
+        )
+
+
+@dataclass
+class RetrievalResult:
+    """Resultado de uma busca direta; `error` indica que a busca falhou."""
+
+    query: str
+    hits: List[RetrievalHit] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def image_paths(self) -> List[str]:
+        paths = []
+        for hit in self.hits:
+            if hit.image_path and hit.image_path not in paths:
+                paths.append(hit.image_path)
+        return paths
+
+    @property
+    def has_images(self) -> bool:
+        return bool(self.image_paths)
+
+    def to_context(self) -> str:
+        """
+        Formata os resultados como contexto pré-carregado para os agentes.
+
+        Mantém o formato dos campos que a ferramenta devolveria (arquivo,
+        trecho e caminho da imagem), para que os agentes possam usá-los
+        sem chamar a busca de novo.
+        """
+        if self.error is not None:
+            return NO_PREFETCH_MESSAGE
+        if not self.hits:
+            return "A busca não encontrou trechos relevantes para a query."
+        payload = {
+            "results": [
+                {
+                    "id": hit.id,
+                    "file": hit.doc_source,
+                    "page_number": hit.page_number,
+                    "score": hit.score,
+                    "text": hit.text,
+                    "image_path": hit.image_path,
+                    **(
+                        {"image_description": hit.image_description, "image_ocr": hit.image_ocr}
+                        if hit.image_description
+                        else {}
+                    ),
+                }
+                for hit in self.hits
+            ],
+            "referenced_images": self.image_paths,
+        }
+        return json.dumps(payload, ensure_ascii=False, indent=2)
+
+    def to_markdown(self) -> str:
+        """Formata os resultados como resposta direta (modo somente páginas)."""
+        if not self.hits:
+            return NO_ANSWER_MESSAGE
+        lines = [f'## Trechos encontrados para "{self.query}"', ""]
+        for i, hit in enumerate(self.hits, 1):
+            source = hit.doc_source or hit.id
+            page = f", página {hit.page_number}" if hit.page_number is not None else ""
+            score = f" (score {hit.score:.3f})" if hit.score is not None else ""
+            lines.append(f"### {i}. {source}{page}{score}")
+            lines.append(hit.text.strip())
+            if hit.image_path:
+                lines.append(f"Imagem: {hit.image_path}")
+            lines.append("")
+        return "\n".join(lines).rstrip() + "\n"
+
+
+def retrieve(question: str, top_k: Optional[int] = None, tool: Any = None) -> RetrievalResult:
+    """
+    Executa a busca uma vez, fora dos agentes.
+
+    Sem `tool`, usa a ferramenta do template da crew (mesmo cliente e
+    configuração que os agentes usariam). `top_k` vem de `FAST_PATH_TOP_K`
+    ou do `limit` da ferramenta.
+    """
+    if tool is None:
+        from crew_factory import get_crew_factory
+
+        tool = get_crew_factory().search_tool()
+    if top_k is None:
+        top_k = int(os.getenv("FAST_PATH_TOP_K", "0")) or tool.limit
+
+    raw = tool._run(query=question, top_k=top_k)
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return RetrievalResult(query=question, error=f"Resposta inválida da busca: {raw!r}")
+
+    if isinstance(data, dict):
+        return RetrievalResult(query=question, error=data.get("error", "Erro desconhecido"))
+    return RetrievalResult(
+        query=question, hits=[RetrievalHit.from_tool_result(item) for item in data]
+    )
+
+
+@dataclass
+class DirectResult:
+    """
+    Resposta do fast path produzida sem agentes.
+
+    Expõe `raw` como o `CrewOutput` do crewAI, para que quem só imprime
+    `result.raw` trate os dois tipos da mesma forma.
+    """
+
+    raw: str
+    source: str  # "no_answer" ou "retrieval"
+    retrieval: RetrievalResult
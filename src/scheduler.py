@@ -0,0 +1,284 @@
+# src/scheduler.py
+"""
+Escalonador limitado e com prioridade para execução de muitas queries.
+
+Substitui o `asyncio.gather` sem limite: no máximo `max_concurrency` crews
+rodam ao mesmo tempo (cada crew faz chamadas LLM sequenciais, então esse é o
+limite efetivo de concorrência no provedor de LLM), enquanto Voyage e Upstash
+têm limites próprios por processo (`services.limits`). Os resultados são
+entregues conforme terminam, com tempo de fila separado do tempo de execução.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from services.limits import build_provider_semaphores, scoped_provider_limits
+
+Runner = Callable[[str], Awaitable[Any]]
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_TIMEOUT = "timeout"
+STATUS_CANCELLED = "cancelled"
+
+
+@dataclass
+class QueryOutcome:
+    """Resultado de uma query escalonada."""
+
+    query_id: str
+    question: str
+    priority: int
+    status: str
+    result: Any = None
+    error: Optional[str] = None
+    queue_wait_s: float = 0.0
+    execution_s: float = 0.0
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    query_id: str = field(compare=False)
+    question: str = field(compare=False)
+    timeout: Optional[float] = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    cancelled: Optional[asyncio.Future] = field(compare=False, default=None)
+    started: bool = field(compare=False, default=False)
+
+
+class QueryCancelledError(RuntimeError):
+    """Interrompe a thread da crew de uma query cancelada ou expirada."""
+
+
+async def run_crew(question: str, on_task: Optional[Callable[[Any], None]] = None) -> Any:
+    """
+    Runner padrão: uma cópia leve da crew por query, com uso medido.
+
+    A crew roda numa thread (`kickoff_async`), que o cancelamento da task não
+    interrompe; por isso, ao ser cancelado, o runner sinaliza a thread, que
+    para ao fim da tarefa em andamento em vez de iniciar as próximas (e
+    chamar o LLM por elas), e só termina quando ela para. `on_task` recebe,
+    na thread da crew, a saída de cada tarefa concluída.
+    """
+    from crew_factory import build_inputs, get_crew_factory
+    from services.metering import BUDGET_EXHAUSTED_MESSAGE, BudgetExceededError, metered_run
+
+    stop = threading.Event()
+
+    def on_task_done(output: Any) -> None:
+        if stop.is_set():
+            raise QueryCancelledError("Query cancelada")
+        if on_task is not None:
+            on_task(output)
+
+    with metered_run(question) as usage:
+        if usage.degradation.cache_only:
+            raise BudgetExceededError(BUDGET_EXHAUSTED_MESSAGE)
+        crew = get_crew_factory().create().crew
+        crew.task_callback = on_task_done
+        kickoff = asyncio.ensure_future(crew.kickoff_async(inputs=build_inputs(question)))
+        try:
+            result = await asyncio.shield(kickoff)
+        except asyncio.CancelledError:
+            stop.set()
+            await asyncio.wait({kickoff})
+            if not kickoff.cancelled():
+                kickoff.exception()  # QueryCancelledError, já esperado
+            # O que a crew gastou antes de parar também é cobrado
+            usage.add(llm_tokens=crew.calculate_usage_metrics().total_tokens)
+            raise
+        usage.add_result(result)
+    return result
+
+
+class QueryScheduler:
+    """
+    Fila de prioridade com N workers assíncronos.
+
+    Prioridades menores são atendidas primeiro; empates seguem a ordem de envio.
+    Timeouts e cancelamentos (de `cancel()` ou do próprio worker, em `close()`)
+    encerram a query imediatamente para quem consome os resultados e cancelam
+    a execução; o worker só pega a próxima query quando ela termina de fato.
+
+    `provider_limits` ({"voyage": 2, ...}) vale só para as queries deste
+    escalonador, no lugar dos limites do processo (`services.limits`).
+
+    Uso:
+        scheduler = QueryScheduler(max_concurrency=4)
+        for q in perguntas:
+            scheduler.submit(q)
+        async for outcome in scheduler.as_completed():
+            ...
+    """
+
+    def __init__(
+        self,
+        runner: Optional[Runner] = None,
+        max_concurrency: Optional[int] = None,
+        default_timeout: Optional[float] = None,
+        provider_limits: Optional[Dict[str, Optional[int]]] = None,
+    ):
+        self._runner = runner or run_crew
+        self.max_concurrency = max_concurrency or int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "4"))
+        env_timeout = os.getenv("SCHEDULER_QUERY_TIMEOUT")
+        self.default_timeout = default_timeout or (float(env_timeout) if env_timeout else None)
+
+        self._provider_semaphores = build_provider_semaphores(provider_limits or {})
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._outcomes: Optional[asyncio.Queue] = None
+        self._workers: list = []
+        self._jobs: Dict[str, _Job] = {}
+        self._seq = itertools.count()
+        self._submitted = 0
+        self._finished = 0
+
+    def _ensure_started(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._outcomes = asyncio.Queue()
+        if not self._workers:
+            self._workers = [
+                asyncio.ensure_future(self._worker()) for _ in range(self.max_concurrency)
+            ]
+
+    def submit(
+        self,
+        question: str,
+        priority: int = 0,
+        timeout: Optional[float] = None,
+        query_id: Optional[str] = None,
+    ) -> str:
+        """Enfileira uma query; retorna seu ID."""
+        self._ensure_started()
+        seq = next(self._seq)
+        query_id = query_id or f"q{seq}"
+        job = _Job(
+            priority=priority,
+            seq=seq,
+            query_id=query_id,
+            question=question,
+            timeout=timeout or self.default_timeout,
+            enqueued_at=time.perf_counter(),
+            cancelled=asyncio.get_running_loop().create_future(),
+        )
+        self._jobs[query_id] = job
+        self._submitted += 1
+        self._queue.put_nowait(job)
+        return query_id
+
+    def cancel(self, query_id: str) -> bool:
+        """Cancela uma query na fila ou em execução; retorna False se já terminou."""
+        job = self._jobs.get(query_id)
+        if job is None or job.cancelled.done():
+            return False
+        job.cancelled.set_result(True)
+        if not job.started:
+            # Ainda na fila: entrega o cancelamento já; o worker descarta o job ao retirá-lo
+            self._finish(
+                job,
+                QueryOutcome(
+                    query_id=job.query_id,
+                    question=job.question,
+                    priority=job.priority,
+                    status=STATUS_CANCELLED,
+                    queue_wait_s=time.perf_counter() - job.enqueued_at,
+                ),
+            )
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _finish(self, job: _Job, outcome: QueryOutcome) -> None:
+        self._jobs.pop(job.query_id, None)
+        self._finished += 1
+        self._outcomes.put_nowait(outcome)
+
+    async def _execute(self, job: _Job) -> None:
+        if job.cancelled.done():
+            return  # cancelado enquanto estava na fila (já entregue por cancel())
+
+        job.started = True
+        started_at = time.perf_counter()
+        outcome = QueryOutcome(
+            query_id=job.query_id,
+            question=job.question,
+            priority=job.priority,
+            status=STATUS_CANCELLED,
+            queue_wait_s=started_at - job.enqueued_at,
+        )
+
+        work = asyncio.ensure_future(self._run(job.question))
+        try:
+            done, _ = await asyncio.wait(
+                {work, job.cancelled}, timeout=job.timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        except asyncio.CancelledError:
+            # Worker encerrado: a execução não continua sem ninguém para entregar o resultado
+            await self._stop(work)
+            raise
+        outcome.execution_s = time.perf_counter() - started_at
+
+        if work in done:
+            if work.exception() is not None:
+                outcome.status = STATUS_ERROR
+                outcome.error = str(work.exception())
+            else:
+                outcome.status = STATUS_OK
+                outcome.result = work.result()
+        elif job.cancelled in done:
+            outcome.status = STATUS_CANCELLED
+        else:
+            outcome.status = STATUS_TIMEOUT
+            outcome.error = f"Timeout após {job.timeout}s"
+
+        self._finish(job, outcome)
+        # Mantém o slot ocupado até a execução cancelada terminar de fato
+        await self._stop(work)
+
+    @staticmethod
+    async def _stop(work: asyncio.Future) -> None:
+        """Cancela a execução, se ainda roda, e espera ela terminar de fato."""
+        work.cancel()
+        try:
+            await asyncio.wait({work})
+        except asyncio.CancelledError:
+            # Worker encerrado por close() durante a espera: ainda espera a execução parar
+            await asyncio.wait({work})
+            raise
+        finally:
+            if work.done() and not work.cancelled():
+                work.exception()  # evita "exception was never retrieved"
+
+    async def _run(self, question: str) -> Any:
+        with scoped_provider_limits(self._provider_semaphores):
+            return await self._runner(question)
+
+    async def as_completed(self) -> AsyncIterator[QueryOutcome]:
+        """Entrega os resultados conforme terminam, até esgotar as queries enviadas."""
+        self._ensure_started()
+        while self._finished < self._submitted or not self._outcomes.empty():
+            yield await self._outcomes.get()
+
+    async def close(self) -> None:
+        """
+        Encerra os workers: queries ainda na fila são descartadas e as em
+        execução são canceladas (close espera elas pararem).
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
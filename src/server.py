@@ -0,0 +1,455 @@
+# src/server.py
+"""
+Serviço HTTP assíncrono e persistente na frente da crew multimodal.
+
+Mantém o template da crew e os clientes (LLM, Upstash, Voyage) aquecidos
+entre requisições, aplica controle de admissão (concorrência limitada +
+fila limitada, 429 quando saturado) e timeout por requisição, e transmite
+os resultados em NDJSON (`application/x-ndjson`, chunked) conforme cada
+tarefa da crew termina.
+
+Implementado só com a stdlib (asyncio), para rodar atrás de um load balancer
+sem dependências extras.
+
+Uso:
+    python src/server.py --port 8080 --max-concurrency 4 --max-queue 16
+
+Endpoints:
+    POST /query   {"query": "...", "timeout": 120}  → stream NDJSON
+    GET  /health  estado do serviço e da fila
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# runner(question, on_task) → resultado da crew (com `.raw`)
+Runner = Callable[[str, Callable[[Any], None]], Awaitable[Any]]
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADER_LINES = 100
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    500: "Internal Server Error",
+}
+
+
+class ServiceConfig:
+    """Configuração do serviço (variáveis de ambiente SERVICE_*)."""
+
+    def __init__(self):
+        self.host = os.getenv("SERVICE_HOST", "127.0.0.1")
+        self.port = int(os.getenv("SERVICE_PORT", "8080"))
+        self.max_concurrency = int(os.getenv("SERVICE_MAX_CONCURRENCY", "4"))
+        self.max_queue = int(os.getenv("SERVICE_MAX_QUEUE", "16"))
+        self.request_timeout = float(os.getenv("SERVICE_REQUEST_TIMEOUT", "300"))
+        self.retry_after = int(os.getenv("SERVICE_RETRY_AFTER", "5"))
+
+
+class QueryService:
+    """
+    Executa queries na crew com controle de admissão.
+
+    Uma requisição é admitida enquanto `em execução + na fila` couber em
+    `max_concurrency + max_queue`; caso contrário o chamador responde 429.
+    Um timeout encerra a resposta ao cliente e cancela a execução: a thread
+    da crew para ao fim da tarefa em andamento (ver `scheduler.run_crew`).
+    O slot de concorrência só é liberado quando ela para de fato, então a
+    capacidade não é liberada antes da hora.
+
+    `runner(question, on_task)` executa a query (padrão: `scheduler.run_crew`)
+    e chama `on_task` na thread da crew a cada tarefa concluída.
+    """
+
+    def __init__(self, config: ServiceConfig, runner: Optional[Runner] = None):
+        self.config = config
+        self._runner = runner
+        self._slots = asyncio.Semaphore(config.max_concurrency)
+        self._admitted = 0
+        self._running = 0
+        self._ids = itertools.count(1)
+        self.stats = {"accepted": 0, "rejected": 0, "completed": 0, "failed": 0, "timed_out": 0}
+
+    @property
+    def capacity(self) -> int:
+        return self.config.max_concurrency + self.config.max_queue
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "running": self._running,
+            "queued": self._admitted - self._running,
+            "max_concurrency": self.config.max_concurrency,
+            "max_queue": self.config.max_queue,
+            **self.stats,
+        }
+
+    def try_admit(self) -> Optional[int]:
+        """Reserva um lugar na fila; retorna o ID da requisição ou None se saturado."""
+        if self._admitted >= self.capacity:
+            self.stats["rejected"] += 1
+            return None
+        self._admitted += 1
+        self.stats["accepted"] += 1
+        return next(self._ids)
+
+    async def warm_up(self) -> None:
+        """Monta o template da crew e os clientes antes de aceitar tráfego."""
+        from crew_factory import get_crew_factory
+
+        os.makedirs("output", exist_ok=True)
+        await asyncio.to_thread(get_crew_factory().warm_up)
+
+    async def _kickoff(self, question: str, emit: Callable[[Dict[str, Any]], None]) -> Any:
+        """Executa a query, emitindo um evento por tarefa concluída."""
+        from scheduler import run_crew
+
+        loop = asyncio.get_running_loop()
+
+        def on_task_done(output: Any) -> None:
+            # Chamado na thread da crew; repassa ao event loop
+            event = {
+                "event": "task",
+                "agent": getattr(output, "agent", None),
+                "task": getattr(output, "name", None) or getattr(output, "description", "")[:80],
+                "output": getattr(output, "raw", str(output)),
+            }
+            loop.call_soon_threadsafe(emit, event)
+
+        return await (self._runner or run_crew)(question, on_task_done)
+
+    async def execute(
+        self,
+        request_id: int,
+        question: str,
+        timeout: float,
+        emit: Callable[[Dict[str, Any]], None],
+    ) -> None:
+        """Aguarda um slot, executa a query e emite os eventos até o resultado final."""
+        enqueued_at = time.perf_counter()
+        released = False
+
+        def release(work: asyncio.Future) -> None:
+            nonlocal released
+            if not work.cancelled():
+                work.exception()  # após um timeout ninguém mais aguarda o resultado
+            if not released:
+                released = True
+                self._running -= 1
+                self._admitted -= 1
+                self._slots.release()
+
+        try:
+            await self._slots.acquire()
+        except asyncio.CancelledError:
+            self._admitted -= 1
+            raise
+
+        self._running += 1
+        started_at = time.perf_counter()
+        emit(
+            {"event": "started", "request_id": request_id, "queue_wait_s": started_at - enqueued_at}
+        )
+
+        work = asyncio.ensure_future(self._kickoff(question, emit))
+        work.add_done_callback(release)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(work), timeout=timeout)
+        except asyncio.CancelledError:
+            work.cancel()
+            raise
+        except asyncio.TimeoutError:
+            # O slot continua ocupado até a crew parar (ver `release`)
+            work.cancel()
+            self.stats["timed_out"] += 1
+            emit({"event": "timeout", "request_id": request_id, "timeout_s": timeout})
+            return
+        except Exception as e:
+            self.stats["failed"] += 1
+            emit({"event": "error", "request_id": request_id, "error": str(e)})
+            return
+
+        self.stats["completed"] += 1
+        emit(
+            {
+                "event": "result",
+                "request_id": request_id,
+                "raw": result.raw,
+                "queue_wait_s": started_at - enqueued_at,
+                "execution_s": time.perf_counter() - started_at,
+            }
+        )
+
+
+# =============================================
+# HTTP (HTTP/1.1 mínimo sobre asyncio streams)
+# =============================================
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _parse_timeout(value: Any, limit: float) -> float:
+    """Timeout pedido pelo cliente, limitado ao do serviço (ausente → o do serviço)."""
+    if value is None:
+        return limit
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise HTTPError(400, "Campo 'timeout' deve ser um número de segundos")
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise HTTPError(400, "Campo 'timeout' deve ser um número de segundos")
+    if not math.isfinite(timeout) or timeout <= 0:
+        raise HTTPError(400, "Campo 'timeout' deve ser maior que zero")
+    return min(timeout, limit)
+
+
+async def _read_request(
+    reader: asyncio.StreamReader,
+) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """Lê uma requisição; retorna None se a conexão foi encerrada pelo cliente."""
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, target, _version = request_line.decode("latin-1").strip().split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Linha de requisição inválida")
+
+    headers: Dict[str, str] = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HTTPError(400, "Cabeçalhos demais")
+
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Corpo da requisição grande demais")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def _response_head(status: int, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def _send_json(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: Dict[str, Any],
+    keep_alive: bool,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> None:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json; charset=utf-8",
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+        **(extra_headers or {}),
+    }
+    writer.write(_response_head(status, headers) + body)
+    await writer.drain()
+
+
+class NDJSONStream:
+    """Resposta chunked onde cada evento é uma linha JSON."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self._writer = writer
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        self._queue.put_nowait(event)
+
+    async def start(self, keep_alive: bool) -> None:
+        headers = {
+            "Content-Type": "application/x-ndjson; charset=utf-8",
+            "Transfer-Encoding": "chunked",
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        self._writer.write(_response_head(200, headers))
+        await self._writer.drain()
+
+    async def _write_chunk(self, data: bytes) -> None:
+        if self.closed:
+            return
+        try:
+            self._writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            await self._writer.drain()
+        except (ConnectionError, RuntimeError):
+            # Cliente desconectou: o trabalho continua, mas não há mais para onde escrever
+            self.closed = True
+
+    async def pump(self, producer: Awaitable[None]) -> None:
+        """Escreve os eventos conforme chegam até o produtor terminar."""
+        task = asyncio.ensure_future(producer)
+        while True:
+            getter = asyncio.ensure_future(self._queue.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                event = getter.result()
+                line = json.dumps(event, ensure_ascii=False, default=str) + "\n"
+                await self._write_chunk(line.encode("utf-8"))
+                continue
+            getter.cancel()
+            # Drena eventos emitidos antes do produtor encerrar
+            while not self._queue.empty():
+                line = json.dumps(self._queue.get_nowait(), ensure_ascii=False, default=str) + "\n"
+                await self._write_chunk(line.encode("utf-8"))
+            break
+        await task
+        await self._write_chunk(b"")
+
+
+class QueryServer:
+    """Servidor HTTP que encaminha requisições ao QueryService."""
+
+    def __init__(self, service: QueryService):
+        self.service = service
+
+    async def _handle_query(
+        self, writer: asyncio.StreamWriter, body: bytes, keep_alive: bool
+    ) -> None:
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HTTPError(400, "JSON inválido")
+        question = payload.get("query") if isinstance(payload, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise HTTPError(400, "Campo 'query' é obrigatório")
+
+        timeout = _parse_timeout(payload.get("timeout"), self.service.config.request_timeout)
+
+        request_id = self.service.try_admit()
+        if request_id is None:
+            await _send_json(
+                writer,
+                429,
+                {"error": "Serviço saturado, tente novamente", **self.service.health()},
+                keep_alive,
+                {"Retry-After": str(self.service.config.retry_after)},
+            )
+            return
+
+        stream = NDJSONStream(writer)
+        await stream.start(keep_alive)
+        stream.emit({"event": "accepted", "request_id": request_id})
+        await stream.pump(self.service.execute(request_id, question, timeout, stream.emit))
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HTTPError as e:
+                    await _send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                except (asyncio.IncompleteReadError, ValueError):
+                    await _send_json(
+                        writer, 400, {"error": "Requisição inválida"}, keep_alive=False
+                    )
+                    break
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                try:
+                    if path == "/health":
+                        if method != "GET":
+                            raise HTTPError(405, "Use GET")
+                        await _send_json(writer, 200, self.service.health(), keep_alive)
+                    elif path == "/query":
+                        if method != "POST":
+                            raise HTTPError(405, "Use POST")
+                        await self._handle_query(writer, body, keep_alive)
+                    else:
+                        raise HTTPError(404, "Rota não encontrada")
+                except HTTPError as e:
+                    await _send_json(writer, e.status, {"error": e.message}, keep_alive)
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"🚀 Serviço ouvindo em http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+async def serve(config: ServiceConfig, warm: bool = True) -> None:
+    """Aquece a crew/clientes e inicia o servidor."""
+    service = QueryService(config)
+    if warm:
+        print("🔥 Aquecendo crew e clientes...")
+        start = time.perf_counter()
+        await service.warm_up()
+        print(f"✅ Pronto em {time.perf_counter() - start:.2f}s")
+    await QueryServer(service).serve(config.host, config.port)
+
+
+if __name__ == "__main__":
+    config = ServiceConfig()
+    parser = argparse.ArgumentParser(description="Serviço HTTP da crew multimodal")
+    parser.add_argument("--host", default=config.host)
+    parser.add_argument("--port", type=int, default=config.port)
+    parser.add_argument("--max-concurrency", type=int, default=config.max_concurrency)
+    parser.add_argument("--max-queue", type=int, default=config.max_queue)
+    parser.add_argument("--request-timeout", type=float, default=config.request_timeout)
+    parser.add_argument("--no-warm-up", action="store_true")
+    args = parser.parse_args()
+
+    config.host = args.host
+    config.port = args.port
+    config.max_concurrency = args.max_concurrency
+    config.max_queue = args.max_queue
+    config.request_timeout = args.request_timeout
+    try:
+        asyncio.run(serve(config, warm=not args.no_warm_up))
+    except KeyboardInterrupt:
+        print("\n👋 Serviço encerrado")
@@ -0,0 +1,321 @@
+# src/services/embeddings/providers.py
+"""
+Provedores de embedding intercambiáveis (EMBEDDING_PROVIDER).
+
+- "voyage" (padrão): `voyage-multimodal-3` na VoyageAI, texto + imagem.
+- "onnx": modelo de texto local em CPU (onnxruntime + tokenizers), sem rede.
+
+A ingestão e a busca usam o mesmo provedor, e cada vetor grava nos
+metadados o `model_id` que o gerou (`embedding_model`): um índice nunca
+mistura vetores de modelos diferentes sem que isso seja detectado.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from ..metering import record_current
+from .voyage_embed import get_client
+
+PROVIDERS = ("voyage", "onnx")
+DTYPES = ("float", "int8")
+
+# Vetores gravados antes do campo embedding_model vieram todos deste modelo
+LEGACY_MODEL = "voyage-multimodal-3"
+METADATA_FIELD = "embedding_model"
+
+
+class EmbeddingProvider:
+    """
+    Interface comum dos provedores de embedding.
+
+    Cada documento é uma lista de partes (textos e imagens PIL) que vira um
+    só vetor. `dimension` trunca a saída (modelos Matryoshka) e `dtype`
+    "int8" quantiza os componentes em [-127, 127]; os dois entram no
+    `model_id`, já que vetores de saídas diferentes não são comparáveis.
+    """
+
+    kind = ""
+    multimodal = False
+
+    def __init__(
+        self,
+        model: str,
+        dimension: Optional[int] = None,
+        dtype: str = "float",
+        batch_size: int = 32,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype inválido '{dtype}'. Use um de: {', '.join(DTYPES)}")
+        self.model = model
+        self.dimension = dimension
+        self.dtype = dtype
+        self.batch_size = max(1, batch_size)
+
+    @property
+    def model_id(self) -> str:
+        """Identifica o espaço vetorial: modelo, dimensão e tipo da saída"""
+        model_id = self.model
+        if self.dimension:
+            model_id += f"@{self.dimension}"
+        if self.dtype != "float":
+            model_id += f":{self.dtype}"
+        return model_id
+
+    def warmup(self) -> None:
+        """Cria clientes ou carrega o modelo antes da primeira chamada"""
+
+    def embed_documents(self, inputs: Sequence[Sequence[Any]]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_queries(self, texts: Sequence[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def _batches(self, items: Sequence[Any]) -> List[Sequence[Any]]:
+        return [items[i : i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+
+class VoyageEmbeddingProvider(EmbeddingProvider):
+    """VoyageAI multimodal: dimensão e tipo da saída são pedidos à própria API"""
+
+    kind = "voyage"
+    multimodal = True
+
+    def warmup(self) -> None:
+        get_client()
+
+    def _options(self) -> dict:
+        options: dict = {}
+        if self.dimension:
+            options["output_dimension"] = self.dimension
+        if self.dtype != "float":
+            options["output_dtype"] = self.dtype
+        return options
+
+    def _embed(self, inputs: Sequence[Sequence[Any]], input_type: str) -> List[List[float]]:
+        embeddings: List[List[float]] = []
+        for batch in self._batches(inputs):
+            response = get_client().multimodal_embed(
+                inputs=[list(parts) for parts in batch],
+                model=self.model,
+                input_type=input_type,
+                **self._options(),
+            )
+            if input_type == "query":
+                record_current(embed_tokens=response.total_tokens)
+            embeddings.extend(response.embeddings)
+        return embeddings
+
+    def embed_documents(self, inputs: Sequence[Sequence[Any]]) -> List[List[float]]:
+        return self._embed(inputs, "document")
+
+    def embed_queries(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embeddings de consultas; os tokens entram no uso da consulta em andamento"""
+        return self._embed([[text] for text in texts], "query")
+
+
+class OnnxEmbeddingProvider(EmbeddingProvider):
+    """
+    Modelo de texto local exportado para ONNX (ex.: bge-small, e5, MiniLM).
+
+    O diretório do modelo traz `model.onnx` (ou `onnx/model.onnx`) e o
+    `tokenizer.json` do Hugging Face. Os lotes rodam em paralelo num pool de
+    threads (`workers`), cada um com `threads` threads do onnxruntime; com
+    1 thread por lote, `workers` ≈ núcleos da máquina aproveita a CPU toda.
+    Só texto: as imagens de um documento são ignoradas.
+    """
+
+    kind = "onnx"
+    multimodal = False
+
+    def __init__(
+        self,
+        model_dir: str,
+        dimension: Optional[int] = None,
+        dtype: str = "float",
+        batch_size: int = 32,
+        max_length: int = 512,
+        pooling: str = "mean",
+        workers: Optional[int] = None,
+        threads: int = 1,
+        query_prefix: str = "",
+        document_prefix: str = "",
+    ):
+        if pooling not in ("mean", "cls"):
+            raise ValueError(f"pooling inválido '{pooling}'. Use 'mean' ou 'cls'")
+        super().__init__(
+            "onnx:" + os.path.basename(os.path.normpath(model_dir)),
+            dimension=dimension,
+            dtype=dtype,
+            batch_size=batch_size,
+        )
+        self.model_dir = model_dir
+        self.max_length = max_length
+        self.pooling = pooling
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self._session: Any = None
+        self._tokenizer: Any = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _model_path(self) -> str:
+        for candidate in ("model.onnx", os.path.join("onnx", "model.onnx")):
+            path = os.path.join(self.model_dir, candidate)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"model.onnx não encontrado em {self.model_dir}")
+
+    def warmup(self) -> None:
+        """Carrega sessão e tokenizer uma vez (importa onnxruntime só aqui)"""
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            if tokenizer.padding is None:
+                tokenizer.enable_padding()
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            session = onnxruntime.InferenceSession(
+                self._model_path(), options, providers=["CPUExecutionProvider"]
+            )
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="onnx-embed"
+            )
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def _run(self, texts: Sequence[str]) -> np.ndarray:
+        """Um lote: tokeniza, roda o modelo e faz o pooling pela máscara de atenção"""
+        encodings = self._tokenizer.encode_batch(list(texts))
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        names = [model_input.name for model_input in self._session.get_inputs()]
+        output = self._session.run(None, {name: feeds[name] for name in names if name in feeds})[0]
+        if output.ndim == 2:
+            # O modelo já devolve o embedding da frase
+            return output.astype(np.float32)
+        if self.pooling == "cls":
+            return output[:, 0].astype(np.float32)
+        weights = mask[:, :, None].astype(np.float32)
+        return (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+
+    def _embed(self, texts: Sequence[str]) -> List[List[float]]:
+        self.warmup()
+        batches = self._batches(texts)
+        if len(batches) == 1:
+            parts = [self._run(batches[0])]
+        else:
+            parts = list(self._executor.map(self._run, batches))
+        if not parts:
+            return []
+        vectors = np.concatenate(parts)
+        if self.dimension:
+            vectors = vectors[:, : self.dimension]
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        if self.dtype == "int8":
+            vectors = np.clip(np.round(vectors * 127), -127, 127)
+        return vectors.tolist()
+
+    def embed_documents(self, inputs: Sequence[Sequence[Any]]) -> List[List[float]]:
+        texts = [
+            self.document_prefix + "\n".join(part for part in parts if isinstance(part, str))
+            for parts in inputs
+        ]
+        return self._embed(texts)
+
+    def embed_queries(self, texts: Sequence[str]) -> List[List[float]]:
+        return self._embed([self.query_prefix + text for text in texts])
+
+
+def embedding_provider_from_env() -> EmbeddingProvider:
+    """Provedor descrito pelas variáveis EMBEDDING_* (sem cache)"""
+    kind = os.getenv("EMBEDDING_PROVIDER", "voyage")
+    if kind not in PROVIDERS:
+        raise ValueError(f"EMBEDDING_PROVIDER inválido '{kind}'. Use um de: {', '.join(PROVIDERS)}")
+    dimension = int(os.getenv("EMBEDDING_DIMENSION", "0")) or None
+    dtype = os.getenv("EMBEDDING_DTYPE", "float")
+    if kind == "onnx":
+        model_dir = os.getenv("EMBEDDING_ONNX_MODEL_DIR")
+        if not model_dir:
+            raise ValueError("EMBEDDING_PROVIDER=onnx exige EMBEDDING_ONNX_MODEL_DIR")
+        return OnnxEmbeddingProvider(
+            model_dir,
+            dimension=dimension,
+            dtype=dtype,
+            batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+            max_length=int(os.getenv("EMBEDDING_MAX_LENGTH", "512")),
+            pooling=os.getenv("EMBEDDING_POOLING", "mean"),
+            workers=int(os.getenv("EMBEDDING_WORKERS", "0")) or None,
+            threads=int(os.getenv("EMBEDDING_ONNX_THREADS", "1")),
+            query_prefix=os.getenv("EMBEDDING_QUERY_PREFIX", ""),
+            document_prefix=os.getenv("EMBEDDING_DOCUMENT_PREFIX", ""),
+        )
+    return VoyageEmbeddingProvider(
+        os.getenv("VOYAGE_MODEL_NAME", LEGACY_MODEL),
+        dimension=dimension,
+        dtype=dtype,
+        # A API multimodal aceita até 1000 entradas por requisição
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "128")),
+    )
+
+
+_provider: Optional[EmbeddingProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Provedor compartilhado pelo processo, criado no primeiro uso"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = embedding_provider_from_env()
+    return _provider
+
+
+def index_embedding_model(index: Any, namespace: str = "") -> Optional[str]:
+    """
+    Modelo dos vetores já gravados no índice (None se o índice está vazio).
+
+    Lê o primeiro vetor encontrado: como a ingestão recusa misturar modelos,
+    ele representa o índice inteiro. Segue o cursor enquanto as páginas vêm
+    vazias, então um `ShardedIndex` com o primeiro shard vazio também é lido.
+    """
+    cursor = ""
+    while True:
+        result = index.range(cursor=cursor, limit=1, include_metadata=True, namespace=namespace)
+        if result.vectors:
+            return (result.vectors[0].metadata or {}).get(METADATA_FIELD, LEGACY_MODEL)
+        cursor = result.next_cursor
+        if not cursor:
+            return None
+
+
+def ensure_index_model(index: Any, model_id: str, namespace: str = "") -> None:
+    """Falha se o índice já tem vetores de outro modelo de embedding"""
+    current = index_embedding_model(index, namespace)
+    if current is not None and current != model_id:
+        raise ValueError(
+            f"O índice contém vetores de '{current}', mas o provedor configurado gera '{model_id}'. "
+            "Use outro índice/namespace ou reindexe tudo com o mesmo modelo."
+        )
@@ -1,24 +1,59 @@
 # src/generic_mm_project/voyage_embed.py
 import os
+import threading
 
-from voyageai import Client as Voyage
+from ..metering import record_current
 
-voyage = Voyage(api_key=os.getenv("VOYAGE_API_KEY"))
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Retorna o cliente Voyage, criado sob demanda no primeiro uso.
+
+    Importar o SDK e instanciar o cliente custa tempo de inicialização;
+    adiar para a primeira chamada mantém o import deste módulo barato.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from voyageai import Client as Voyage
+
+                _client = Voyage(api_key=os.getenv("VOYAGE_API_KEY"))
+    return _client
+
+
+def __getattr__(name: str):
+    # Compatibilidade: `voyage_embed.voyage` continua disponível, mas criado sob demanda
+    if name == "voyage":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def embed_doc(text: str):
     """Embedding para documentos (indexação)."""
-    return voyage.multimodal_embed(
-        inputs=[[text]],  # Lista de inputs, cada um é uma lista de texto/imagem
+    return embed_docs([[text]])[0]
+
+
+def embed_docs(inputs: list):
+    """Embeddings de vários documentos numa única requisição (indexação em lote).
+
+    Cada input é uma lista de textos e imagens PIL, embutidos juntos num só vetor.
+    """
+    return get_client().multimodal_embed(
+        inputs=inputs,
         model="voyage-multimodal-3",
         input_type="document",
-    ).embeddings[0]
+    ).embeddings
 
 
 def embed_query(text: str):
-    """Embedding para consultas (busca)."""
-    return voyage.multimodal_embed(
+    """Embedding para consultas (busca); os tokens entram no uso da consulta em andamento."""
+    response = get_client().multimodal_embed(
         inputs=[[text]],  # Lista de inputs, cada um é uma lista de texto/imagem
         model="voyage-multimodal-3",
         input_type="query",
-    ).embeddings[0]
+    )
+    record_current(embed_tokens=response.total_tokens)
+    return response.embeddings[0]
@@ -0,0 +1,90 @@
+# src/services/limits.py
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+# Variáveis de ambiente com o limite padrão de chamadas simultâneas por provedor
+PROVIDER_LIMIT_ENV = {
+    "voyage": "VOYAGE_MAX_CONCURRENCY",
+    "upstash": "UPSTASH_MAX_CONCURRENCY",
+}
+
+# Limites sem a variável definida (0 na variável = sem limite)
+PROVIDER_DEFAULT_LIMITS = {
+    "voyage": 8,
+    "upstash": 16,
+}
+
+_semaphores: Dict[str, Optional[threading.BoundedSemaphore]] = {}
+_lock = threading.Lock()
+
+# Limites de um chamador (ex.: um QueryScheduler) no lugar dos do processo
+_scoped_semaphores: ContextVar[Optional[Dict[str, Optional[threading.BoundedSemaphore]]]] = (
+    ContextVar("provider_semaphores", default=None)
+)
+
+
+def configure_provider_limit(provider: str, limit: Optional[int]) -> None:
+    """Define o máximo de chamadas simultâneas a um provedor (None = sem limite)."""
+    with _lock:
+        _semaphores[provider] = threading.BoundedSemaphore(limit) if limit else None
+
+
+def build_provider_semaphores(
+    limits: Dict[str, Optional[int]],
+) -> Dict[str, Optional[threading.BoundedSemaphore]]:
+    """Semáforos próprios para `limits` (None ou 0 = sem limite), para `scoped_provider_limits`."""
+    return {
+        provider: threading.BoundedSemaphore(limit) if limit else None
+        for provider, limit in limits.items()
+    }
+
+
+@contextmanager
+def scoped_provider_limits(
+    semaphores: Dict[str, Optional[threading.BoundedSemaphore]],
+) -> Iterator[None]:
+    """
+    Usa estes semáforos no lugar dos limites do processo durante o bloco.
+
+    Vale para as tasks e threads criadas dentro do bloco (que herdam o
+    contexto, como `asyncio.to_thread`); os demais chamadores continuam com
+    os limites do processo.
+    """
+    token = _scoped_semaphores.set({**(_scoped_semaphores.get() or {}), **semaphores})
+    try:
+        yield
+    finally:
+        _scoped_semaphores.reset(token)
+
+
+def _get_semaphore(provider: str) -> Optional[threading.BoundedSemaphore]:
+    scoped = _scoped_semaphores.get()
+    if scoped is not None and provider in scoped:
+        return scoped[provider]
+    if provider not in _semaphores:
+        env_var = PROVIDER_LIMIT_ENV.get(provider)
+        default = PROVIDER_DEFAULT_LIMITS.get(provider, 0)
+        limit = int(os.getenv(env_var, str(default))) if env_var else default
+        with _lock:
+            if provider not in _semaphores:
+                _semaphores[provider] = threading.BoundedSemaphore(limit) if limit > 0 else None
+    return _semaphores[provider]
+
+
+@contextmanager
+def provider_slot(provider: str) -> Iterator[None]:
+    """
+    Ocupa um slot de concorrência do provedor durante o bloco.
+
+    Os limites são por processo e valem para todas as crews em execução,
+    já que as ferramentas rodam nas threads do crewAI.
+    """
+    semaphore = _get_semaphore(provider)
+    if semaphore is None:
+        yield
+        return
+    with semaphore:
+        yield
@@ -0,0 +1,375 @@
+# src/services/metering.py
+"""
+Medição de uso (tokens, páginas, pixels) e degradação perto do orçamento.
+
+Cada consumo é um lançamento `{tenant, document|query, quantidades}` num
+livro-razão JSONL (USAGE_PATH), gravado só com orçamentos (USAGE_BUDGETS)
+ou USAGE_METERING=true; sem isso o uso fica apenas na memória do processo.
+A indexação e as consultas, mesmo em processos diferentes, escrevem no
+mesmo arquivo; cada processo relê só as linhas novas antes de decidir o
+nível de degradação, então o orçamento é compartilhado. O livro-razão gira
+a cada período do orçamento (`usage-<período>.jsonl`): um processo novo lê
+apenas o período atual.
+
+Orçamentos por tenant e por período (USAGE_BUDGETS, USAGE_BUDGET_PERIOD):
+- abaixo de USAGE_DEGRADE_AT: normal
+- a partir de USAGE_DEGRADE_AT: `reduced` — top_k menor e menos imagens
+  para o analista visual
+- a partir de USAGE_CACHE_ONLY_AT: `cache_only` — só respostas do cache
+
+Quantidades medidas:
+    llm_tokens, embed_tokens, embed_text_tokens, embed_image_pixels,
+    parse_pages, vision_images, images, image_tokens, image_pixels
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+LEVELS = ("normal", "reduced", "cache_only")
+DEFAULT_TENANT = "default"
+
+BUDGET_EXHAUSTED_MESSAGE = (
+    "O orçamento de uso deste período está quase esgotado: só perguntas já "
+    "respondidas (cache) estão disponíveis até o próximo período."
+)
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+class BudgetExceededError(RuntimeError):
+    """Orçamento do tenant esgotado e sem resposta em cache."""
+
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """Lê "llm_tokens=2000000,parse_pages=500" em um dicionário."""
+    budgets: Dict[str, float] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        try:
+            budgets[name.strip()] = float(value)
+        except ValueError as e:
+            raise ValueError(f"USAGE_BUDGETS inválido em '{item}': use nome=valor") from e
+    return budgets
+
+
+def current_tenant() -> str:
+    return os.getenv("USAGE_TENANT") or DEFAULT_TENANT
+
+
+@dataclass(frozen=True)
+class Degradation:
+    """O que uma execução pode gastar, conforme o uso do orçamento."""
+
+    level: str = "normal"
+    usage_fraction: float = 0.0
+    top_k_factor: float = 1.0
+    max_images: Optional[int] = None
+
+    @property
+    def cache_only(self) -> bool:
+        return self.level == "cache_only"
+
+    def top_k(self, requested: int) -> int:
+        if self.top_k_factor >= 1.0:
+            return requested
+        return max(1, int(requested * self.top_k_factor))
+
+
+NO_DEGRADATION = Degradation()
+
+
+class UsageMeter:
+    """
+    Agrega o uso por tenant (no período atual), por documento e por consulta.
+
+    Args:
+        budgets: Limite por quantidade e por tenant no período (vazio = sem limite)
+        period: Duração do período do orçamento, em segundos
+        degrade_at: Fração do orçamento a partir da qual a execução é reduzida
+        cache_only_at: Fração a partir da qual só o cache responde
+        path: Livro-razão JSONL compartilhado entre processos (None = só memória);
+            cada período grava em `<nome>-<período>.jsonl`
+        max_queries: Consultas mantidas no agregado por consulta (LRU)
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, float]] = None,
+        period: Optional[float] = None,
+        degrade_at: Optional[float] = None,
+        cache_only_at: Optional[float] = None,
+        path: Optional[str] = None,
+        max_queries: int = 1000,
+    ):
+        self.budgets = (
+            budgets if budgets is not None else parse_budgets(os.getenv("USAGE_BUDGETS", ""))
+        )
+        self.period = period or float(os.getenv("USAGE_BUDGET_PERIOD", "86400"))
+        self.degrade_at = degrade_at or float(os.getenv("USAGE_DEGRADE_AT", "0.8"))
+        self.cache_only_at = cache_only_at or float(os.getenv("USAGE_CACHE_ONLY_AT", "0.95"))
+        self.reduced_top_k_factor = float(os.getenv("USAGE_REDUCED_TOP_K_FACTOR", "0.5"))
+        self.reduced_max_images = int(os.getenv("USAGE_REDUCED_MAX_IMAGES", "1"))
+        self.path = path
+        self.max_queries = max_queries
+
+        self._lock = threading.Lock()
+        self._current_period: Optional[int] = None
+        self._offset = 0
+        self._tenants: Dict[tuple, Dict[str, float]] = {}  # (tenant, período) → totais
+        self._documents: Dict[str, Dict[str, float]] = {}
+        self._queries: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Livro-razão
+    # ------------------------------------------------------------------
+
+    def _period_of(self, timestamp: float) -> int:
+        return int(timestamp // self.period)
+
+    def ledger_path(self, period: int) -> Optional[str]:
+        """Arquivo do livro-razão de um período (None sem livro-razão)."""
+        if not self.path:
+            return None
+        root, ext = os.path.splitext(self.path)
+        return f"{root}-{period}{ext or '.jsonl'}"
+
+    def _roll_period(self, now: float) -> int:
+        """Ao virar o período, descarta os totais antigos e passa a ler o novo arquivo."""
+        period = self._period_of(now)
+        if period != self._current_period:
+            if self._current_period is not None:
+                self._tenants = {key: v for key, v in self._tenants.items() if key[1] >= period}
+                self._documents.clear()
+                self._queries.clear()
+            self._current_period = period
+            self._offset = 0
+        return period
+
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        amounts = entry.get("amounts", {})
+        targets = [
+            self._tenants.setdefault(
+                (entry.get("tenant") or DEFAULT_TENANT, self._period_of(entry.get("time", 0))), {}
+            )
+        ]
+        if entry.get("document"):
+            targets.append(self._documents.setdefault(entry["document"], {}))
+        if entry.get("query"):
+            targets.append(self._queries.setdefault(entry["query"], {}))
+            self._queries.move_to_end(entry["query"])
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        for totals in targets:
+            for name, value in amounts.items():
+                totals[name] = totals.get(name, 0.0) + value
+
+    def _sync(self) -> None:
+        """Aplica as linhas gravadas (por este ou outros processos) desde a última leitura."""
+        path = self.ledger_path(self._roll_period(time.time()))
+        if path is None or not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        complete = data[: data.rfind(b"\n") + 1]  # ignora uma linha ainda sendo escrita
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                self._apply(json.loads(line))
+            except ValueError:
+                continue
+
+    def record(
+        self,
+        tenant: Optional[str] = None,
+        document: Optional[str] = None,
+        query: Optional[str] = None,
+        **amounts: float,
+    ) -> None:
+        """Lança um consumo; quantidades zeradas são ignoradas."""
+        amounts = {name: float(value) for name, value in amounts.items() if value}
+        if not amounts:
+            return
+        entry = {
+            "time": time.time(),
+            "tenant": tenant or current_tenant(),
+            "document": document,
+            "query": query,
+            "amounts": amounts,
+        }
+        with self._lock:
+            path = self.ledger_path(self._roll_period(entry["time"]))
+            if path is None:
+                self._apply(entry)
+                return
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Uma linha curta por write em modo append: sem intercalação entre processos
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._sync()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def tenant_usage(self, tenant: Optional[str] = None) -> Dict[str, float]:
+        """Uso do tenant no período atual."""
+        with self._lock:
+            self._sync()
+            key = (tenant or current_tenant(), self._period_of(time.time()))
+            return dict(self._tenants.get(key, {}))
+
+    def document_usage(self, document: str) -> Dict[str, float]:
+        """Uso do documento no período atual."""
+        with self._lock:
+            self._sync()
+            return dict(self._documents.get(document, {}))
+
+    def query_usage(self, query: str) -> Dict[str, float]:
+        with self._lock:
+            self._sync()
+            return dict(self._queries.get(query, {}))
+
+    def budget_fraction(self, tenant: Optional[str] = None) -> float:
+        """Maior fração consumida entre as quantidades com orçamento."""
+        if not self.budgets:
+            return 0.0
+        usage = self.tenant_usage(tenant)
+        return max(
+            (usage.get(name, 0.0) / limit for name, limit in self.budgets.items() if limit > 0),
+            default=0.0,
+        )
+
+    def degradation(self, tenant: Optional[str] = None) -> Degradation:
+        """Nível de degradação do tenant agora."""
+        fraction = self.budget_fraction(tenant)
+        if fraction >= self.cache_only_at:
+            return Degradation("cache_only", fraction, 0.0, 0)
+        if fraction >= self.degrade_at:
+            return Degradation(
+                "reduced", fraction, self.reduced_top_k_factor, self.reduced_max_images
+            )
+        return Degradation("normal", fraction)
+
+    def report(self, tenant: Optional[str] = None) -> Dict[str, Any]:
+        """Uso do tenant no período, orçamentos e nível atual."""
+        usage = self.tenant_usage(tenant)
+        degradation = self.degradation(tenant)
+        return {
+            "tenant": tenant or current_tenant(),
+            "usage": usage,
+            "budgets": dict(self.budgets),
+            "usage_fraction": round(degradation.usage_fraction, 4),
+            "level": degradation.level,
+        }
+
+
+_meter: Optional[UsageMeter] = None
+_meter_lock = threading.Lock()
+
+
+def metering_enabled(budgets: Optional[Dict[str, float]] = None) -> bool:
+    """Livro-razão em disco: com orçamentos definidos ou USAGE_METERING=true."""
+    if budgets is None:
+        budgets = parse_budgets(os.getenv("USAGE_BUDGETS", ""))
+    return bool(budgets) or os.getenv("USAGE_METERING", "false").lower() == "true"
+
+
+def get_usage_meter() -> UsageMeter:
+    """Medidor do processo; o livro-razão fica em USAGE_PATH (padrão output/usage.jsonl)."""
+    global _meter
+    if _meter is None:
+        with _meter_lock:
+            if _meter is None:
+                path = None
+                if metering_enabled():
+                    path = os.getenv("USAGE_PATH") or os.path.join(
+                        _REPO_ROOT, "output", "usage.jsonl"
+                    )
+                _meter = UsageMeter(path=path)
+    return _meter
+
+
+# ----------------------------------------------------------------------
+# Execução medida (uma consulta)
+# ----------------------------------------------------------------------
+
+
+@dataclass
+class MeteredRun:
+    """Uso acumulado por uma consulta; propagado por contexto às threads do crewAI."""
+
+    query: str
+    tenant: str
+    degradation: Degradation
+    amounts: Dict[str, float] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **amounts: float) -> None:
+        with self._lock:
+            for name, value in amounts.items():
+                self.amounts[name] = self.amounts.get(name, 0.0) + (value or 0)
+
+    def add_result(self, result: Any) -> None:
+        """
+        Soma os tokens de LLM de um `CrewOutput` (outros resultados não têm uso).
+
+        O `token_usage` só é o uso desta consulta porque cada crew de
+        `CrewFactory.create()` tem contadores de tokens próprios.
+        """
+        usage = getattr(result, "token_usage", None)
+        self.add(llm_tokens=getattr(usage, "total_tokens", 0) or 0)
+
+    def summary(self) -> str:
+        parts = ", ".join(f"{name}={value:g}" for name, value in sorted(self.amounts.items()))
+        level = "" if self.degradation.level == "normal" else f" | modo {self.degradation.level}"
+        fraction = self.degradation.usage_fraction
+        return f"💰 Uso: {parts or 'nenhum'}{level} ({fraction:.0%} do orçamento)"
+
+
+_current_run: ContextVar[Optional[MeteredRun]] = ContextVar("metered_run", default=None)
+
+
+@contextmanager
+def metered_run(query: str, tenant: Optional[str] = None) -> Iterator[MeteredRun]:
+    """
+    Mede uma consulta: decide a degradação na entrada e lança o uso na saída.
+
+    Dentro do bloco, `current_degradation()` devolve o nível decidido (a
+    ferramenta de busca reduz o top_k e o add_image limita as imagens) e
+    `record_current()` acumula consumo na consulta.
+    """
+    meter = get_usage_meter()
+    tenant = tenant or current_tenant()
+    run = MeteredRun(query=query, tenant=tenant, degradation=meter.degradation(tenant))
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+        meter.record(tenant=tenant, query=query, **run.amounts)
+
+
+def current_run() -> Optional[MeteredRun]:
+    return _current_run.get()
+
+
+def current_degradation() -> Degradation:
+    run = _current_run.get()
+    return run.degradation if run is not None else NO_DEGRADATION
+
+
+def record_current(**amounts: float) -> None:
+    """Acumula consumo na consulta em andamento (sem consulta medida, não faz nada)."""
+    run = _current_run.get()
+    if run is not None:
+        run.add(**amounts)
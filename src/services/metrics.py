@@ -0,0 +1,432 @@
+# src/services/metrics.py
+"""
+Métricas de processo: spans, contadores e histogramas de latência.
+
+Desligado por padrão (METRICS_ENABLED=false): `span()` devolve um contexto
+nulo compartilhado e `inc()`/`observe()` retornam na primeira linha, então
+a instrumentação pode ficar nos caminhos quentes. Ligado, cada span alimenta
+o histograma `span_duration_seconds{span=...}` e, no exportador JSONL, vira
+um evento com duração, span pai e atributos.
+
+Exportadores (METRICS_EXPORTER):
+- `prometheus`: arquivo de texto no formato de exposição do Prometheus
+  (reescrito a cada `flush`, para o textfile collector do node_exporter)
+- `jsonl`: eventos de span e um snapshot das métricas por `flush`, em JSON lines
+
+Cada processo grava o próprio arquivo (`metrics-<pid>.prom`, com o rótulo
+`pid` em toda série), então workers e filhos de fork não sobrescrevem uns aos
+outros. O `flush` roda a cada METRICS_FLUSH_INTERVAL segundos numa thread
+daemon e na saída do processo; filhos de `multiprocessing` saem sem atexit e
+chamam `flush()` por conta própria.
+"""
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+EXPORTERS = ("prometheus", "jsonl")
+
+# Limites dos buckets de latência, em segundos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+@dataclass
+class Histogram:
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    counts: List[int] = field(default_factory=list)
+    total: float = 0.0
+    count: int = 0
+
+    def __post_init__(self) -> None:
+        if not self.counts:
+            self.counts = [0] * len(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[int]:
+        running, result = 0, []
+        for c in self.counts:
+            running += c
+            result.append(running)
+        return result
+
+
+@dataclass
+class SpanRecord:
+    """Span concluído, entregue aos listeners e ao exportador JSONL."""
+
+    name: str
+    start: float
+    duration: float
+    parent: Optional[str]
+    attributes: Dict[str, Any]
+    error: Optional[str] = None
+
+
+class Span:
+    """Mede um bloco; atributos podem ser acrescentados durante a execução."""
+
+    __slots__ = ("_registry", "name", "attributes", "_start", "_wall_start", "_token")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, attributes: Dict[str, Any]):
+        self._registry = registry
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self.name)
+        self._wall_start = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        self._registry._finish_span(
+            SpanRecord(
+                name=self.name,
+                start=self._wall_start,
+                duration=duration,
+                parent=_current_span.get(),
+                attributes=self.attributes,
+                error=exc_type.__name__ if exc_type else None,
+            )
+        )
+
+
+class _NoopSpan:
+    """Span usado com as métricas desligadas: não mede nem aloca nada."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[str]] = ContextVar("metrics_span", default=None)
+
+
+class MetricsRegistry:
+    """
+    Registro de contadores e histogramas do processo.
+
+    Args:
+        enabled: Liga a coleta (desligado, toda chamada é no-op)
+        exporter: "prometheus" ou "jsonl"
+        path: Arquivo de saída do exportador
+        buckets: Limites dos histogramas, em segundos
+        per_process: Acrescenta o pid ao nome do arquivo (e o rótulo `pid` no Prometheus)
+        flush_interval: Segundos entre gravações periódicas (0 = só `flush()` e atexit)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        exporter: str = "prometheus",
+        path: Optional[str] = None,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        per_process: bool = True,
+        flush_interval: float = 0.0,
+    ):
+        if exporter not in EXPORTERS:
+            raise ValueError(
+                f"METRICS_EXPORTER inválido '{exporter}'. Use um de: {', '.join(EXPORTERS)}"
+            )
+        self.enabled = enabled
+        self.exporter = exporter
+        extension = "prom" if exporter == "prometheus" else "jsonl"
+        self.path = path or os.path.join(_REPO_ROOT, "output", f"metrics.{extension}")
+        self.buckets = buckets
+        self.per_process = per_process
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_flusher = threading.Event()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._pending_spans: List[SpanRecord] = []
+        self._listeners: List[Callable[[SpanRecord], None]] = []
+
+    # ------------------------------------------------------------------
+    # Coleta
+    # ------------------------------------------------------------------
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def span(self, name: str, **attributes: Any) -> Any:
+        """Contexto que mede o bloco como `span_duration_seconds{span=name}`."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def add_span_listener(self, listener: Callable[[SpanRecord], None]) -> None:
+        """Recebe cada span concluído (ex.: benchmarks que querem percentis exatos)."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _finish_span(self, record: SpanRecord) -> None:
+        self.observe("span_duration_seconds", record.duration, span=record.name)
+        if record.error:
+            self.inc("span_errors_total", span=record.name, error=record.error)
+        with self._lock:
+            if self.exporter == "jsonl":
+                self._pending_spans.append(record)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(record)
+
+    # ------------------------------------------------------------------
+    # Exportação
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado atual de contadores e histogramas, serializável em JSON."""
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self._counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            "count": h.count,
+                            "sum": h.total,
+                            "buckets": dict(zip([str(b) for b in h.buckets], h.cumulative())),
+                        }
+                        for key, h in series.items()
+                    ]
+                    for name, series in self._histograms.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Métricas no formato de exposição de texto do Prometheus."""
+        lines: List[str] = []
+        process: LabelKey = (("pid", str(os.getpid())),) if self.per_process else ()
+        with self._lock:
+            for name in sorted(self._counters):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(process + key)} {value:g}")
+            for name in sorted(self._histograms):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(self._histograms[name].items()):
+                    labels = process + key
+                    for bound, cumulative in zip(h.buckets, h.cumulative()):
+                        bucket = _format_labels(labels, ("le", f"{bound:g}"))
+                        lines.append(f"{name}_bucket{bucket} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {h.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {h.total:.6f}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def output_path(self) -> str:
+        """Arquivo deste processo: com `per_process`, `metrics.prom` vira `metrics-<pid>.prom`."""
+        if not self.per_process:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}-{os.getpid()}{ext}"
+
+    def flush(self) -> None:
+        """Grava as métricas no arquivo do exportador (sem efeito se desligado ou vazio)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if not (self._counters or self._histograms or self._pending_spans):
+                return
+        path = self.output_path()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if self.exporter == "prometheus":
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+            return
+
+        with self._lock:
+            spans, self._pending_spans = self._pending_spans, []
+        with open(path, "a", encoding="utf-8") as f:
+            for record in spans:
+                event = {"type": "span", "pid": os.getpid(), **record.__dict__}
+                f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+            f.write(json.dumps({"type": "snapshot", "time": time.time(), **self.snapshot()}) + "\n")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._pending_spans.clear()
+
+    def start_periodic_flush(self) -> None:
+        """Grava a cada `flush_interval` segundos numa thread daemon (processos longos)."""
+        if not self.enabled or self.flush_interval <= 0:
+            return
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._stop_flusher = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+        self._flusher.start()
+
+    def stop_periodic_flush(self) -> None:
+        self._stop_flusher.set()
+
+    def _flush_loop(self) -> None:
+        stop = self._stop_flusher
+        while not stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️ Falha ao gravar métricas em {self.output_path()}: {e}")
+
+    def _after_fork(self) -> None:
+        """No filho: descarta a cópia das métricas do pai e religa a gravação periódica."""
+        self._lock = threading.Lock()
+        self._flusher = None
+        self.reset()
+        self.start_periodic_flush()
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def configure(
+    enabled: Optional[bool] = None,
+    exporter: Optional[str] = None,
+    path: Optional[str] = None,
+    flush_interval: Optional[float] = None,
+) -> MetricsRegistry:
+    """Recria o registro do processo; argumentos ausentes vêm de METRICS_*."""
+    global _registry
+    if enabled is None:
+        enabled = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+    if flush_interval is None:
+        flush_interval = float(os.getenv("METRICS_FLUSH_INTERVAL", "60"))
+    registry = MetricsRegistry(
+        enabled=enabled,
+        exporter=(exporter or os.getenv("METRICS_EXPORTER", "prometheus")).lower(),
+        path=path or os.getenv("METRICS_PATH") or None,
+        per_process=os.getenv("METRICS_PER_PROCESS", "true").lower() == "true",
+        flush_interval=flush_interval,
+    )
+    if _registry is not None:
+        _registry.stop_periodic_flush()
+    _registry = registry
+    registry.start_periodic_flush()
+    return registry
+
+
+def get_metrics() -> MetricsRegistry:
+    """Registro do processo, configurado por METRICS_ENABLED/METRICS_EXPORTER/METRICS_PATH."""
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                configure()
+    return _registry
+
+
+@atexit.register
+def _flush_on_exit() -> None:
+    if _registry is not None:
+        _registry.flush()
+
+
+def _after_fork_in_child() -> None:
+    if _registry is not None:
+        _registry._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def span(name: str, **attributes: Any) -> Any:
+    return get_metrics().span(name, **attributes)
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    get_metrics().inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    get_metrics().observe(name, value, **labels)
+
+
+def flush() -> None:
+    get_metrics().flush()
+
+
+def timed(name: str, **attributes: Any) -> Callable:
+    """Decorador: mede cada chamada da função como um span."""
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            registry = get_metrics()
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            with registry.span(name, **dict(attributes)):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
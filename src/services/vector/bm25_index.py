@@ -0,0 +1,257 @@
+# src/services/vector/bm25_index.py
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None  # type: ignore[assignment]
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+DEFAULT_INDEX_PATH = os.path.join(_REPO_ROOT, "indexing", "assets", "bm25_index.json")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def default_index_path() -> str:
+    """Return the BM25 index path, honouring the BM25_INDEX_PATH override."""
+    return os.getenv("BM25_INDEX_PATH") or DEFAULT_INDEX_PATH
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip accents and split text into word tokens.
+
+    Numbers are kept as tokens so exact identifiers such as "Documento 1"
+    or table codes still match.
+    """
+    normalized = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(c for c in normalized if not unicodedata.combining(c))
+    return _TOKEN_RE.findall(stripped)
+
+
+class BM25Index:
+    """Local BM25 inverted index over page markdown.
+
+    Entries are keyed by the same vector IDs used in Upstash so lexical and
+    vector hits can be fused. Documents are updated incrementally: calling
+    ``update_document`` replaces only the postings of that ``doc_source``.
+
+    The index is persisted as JSON and reloaded transparently when the file
+    changes on disk, so a long-lived search tool sees new ingestions.
+    Updates hold an exclusive lock on ``<path>.lock`` and reload the file
+    before modifying it, so several ingestion processes can write safely.
+
+    Attributes:
+        path: JSON file backing the index
+        k1: Term frequency saturation parameter
+        b: Length normalization parameter
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path or default_index_path()
+        self.k1 = k1
+        self.b = b
+        self.version = 0
+
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._doc_sources: Dict[str, List[str]] = defaultdict(list)
+        self._total_length = 0
+        self._loaded_stamp: Optional[Tuple[int, int, int]] = None
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _file_stamp(self) -> Optional[Tuple[int, int, int]]:
+        """Modification time, size and inode of the backing file (None if missing).
+
+        ``save`` replaces the file, so a write from another process changes the
+        inode or the size even when it lands in the same mtime tick.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    @contextmanager
+    def _interprocess_lock(self) -> Iterator[None]:
+        """Hold an exclusive lock shared by every process writing this index."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def reload_if_changed(self, force: bool = False) -> None:
+        """Reload the index from disk if the backing file changed.
+
+        A change is detected from the file's mtime, size and inode together.
+        ``force`` reloads even when they look unchanged (writers use it under
+        the lock, where reading a stale index would drop another writer's
+        documents).
+        """
+        stamp = self._file_stamp()
+        if stamp is None or (stamp == self._loaded_stamp and not force):
+            return
+        with self._lock:
+            if stamp == self._loaded_stamp and not force:
+                return
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._reset()
+            self.version = data.get("version", 0)
+            for vector_id, entry in data.get("docs", {}).items():
+                self._add_entry(vector_id, entry)
+            self._loaded_stamp = stamp
+
+    def save(self) -> None:
+        """Atomically write the index to disk."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"version": self.version, "docs": self._docs},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.path)
+            self._loaded_stamp = self._file_stamp()
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def _reset(self) -> None:
+        self._docs = {}
+        self._postings = defaultdict(dict)
+        self._doc_sources = defaultdict(list)
+        self._total_length = 0
+
+    def _add_entry(self, vector_id: str, entry: Dict[str, Any]) -> None:
+        self._docs[vector_id] = entry
+        self._doc_sources[entry.get("doc_source", "")].append(vector_id)
+        self._total_length += entry["length"]
+        for term, tf in entry["tf"].items():
+            self._postings[term][vector_id] = tf
+
+    def _remove_doc_source(self, doc_source: str) -> int:
+        removed = 0
+        for vector_id in self._doc_sources.pop(doc_source, []):
+            entry = self._docs.pop(vector_id, None)
+            if entry is None:
+                continue
+            self._total_length -= entry["length"]
+            for term in entry["tf"]:
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(vector_id, None)
+                    if not postings:
+                        del self._postings[term]
+            removed += 1
+        return removed
+
+    def update_document(
+        self, doc_source: str, pages: Iterable[Dict[str, Any]], persist: bool = True
+    ) -> int:
+        """Replace every entry of ``doc_source`` with the given pages.
+
+        Args:
+            doc_source: Document identifier shared by all its vectors
+            pages: Dicts with ``id``, ``text`` and optional ``metadata``
+            persist: Write the index to disk after updating
+
+        Returns:
+            Number of pages indexed for the document
+        """
+        with self._lock, self._interprocess_lock():
+            self.reload_if_changed(force=True)
+            self._remove_doc_source(doc_source)
+
+            indexed = 0
+            for page in pages:
+                tokens = tokenize(page.get("text") or "")
+                if not tokens:
+                    continue
+                self._add_entry(
+                    page["id"],
+                    {
+                        "doc_source": doc_source,
+                        "length": len(tokens),
+                        "tf": dict(Counter(tokens)),
+                        "metadata": page.get("metadata") or {},
+                    },
+                )
+                indexed += 1
+
+            self.version += 1
+            if persist:
+                self.save()
+            return indexed
+
+    def remove_document(self, doc_source: str, persist: bool = True) -> int:
+        """Remove every entry of ``doc_source``. Returns the number removed."""
+        with self._lock, self._interprocess_lock():
+            self.reload_if_changed(force=True)
+            removed = self._remove_doc_source(doc_source)
+            if removed:
+                self.version += 1
+                if persist:
+                    self.save()
+            return removed
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def get_metadata(self, vector_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored metadata for a vector ID, if indexed."""
+        entry = self._docs.get(vector_id)
+        return entry["metadata"] if entry else None
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[str, float]]:
+        """Score indexed pages against ``query`` with Okapi BM25.
+
+        Returns:
+            ``(vector_id, score)`` pairs sorted by descending score
+        """
+        self.reload_if_changed()
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for vector_id, tf in postings.items():
+                    length = self._docs[vector_id]["length"]
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[vector_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
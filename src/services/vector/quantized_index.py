@@ -0,0 +1,582 @@
+# src/services/vector/quantized_index.py
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .sharding import (
+    END_CURSOR,
+    DeleteCount,
+    IndexStats,
+    RangePage,
+    VectorRecord,
+    _as_record,
+    _matches,
+    _parse_filter,
+)
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+DEFAULT_LOCAL_INDEX_PATH = os.path.join(_REPO_ROOT, "indexing", "assets", "vector_index")
+
+QUANTIZATIONS = ("binary", "int8")
+VECTOR_BACKENDS = ("upstash", "local")
+
+# Rows scored per step of the prefilter (bounds the temporary arrays)
+_SCAN_CHUNK = 1 << 16
+# int8 rows are widened to float32 per step: small steps stay in cache
+_INT8_CHUNK = 1 << 10
+
+
+class _GrowableArray:
+    """Row-appendable numpy array with amortized O(1) appends."""
+
+    def __init__(self, dtype: Any, width: Optional[int] = None):
+        self.dtype = dtype
+        self.width = width
+        self.size = 0
+        shape = (0, width) if width is not None else (0,)
+        self._data = np.empty(shape, dtype=dtype)
+
+    def extend(self, rows: np.ndarray) -> None:
+        needed = self.size + len(rows)
+        if needed > len(self._data):
+            capacity = max(needed, 2 * len(self._data), 1024)
+            shape = (capacity, self.width) if self.width is not None else (capacity,)
+            grown = np.empty(shape, dtype=self.dtype)
+            grown[: self.size] = self._data[: self.size]
+            self._data = grown
+        self._data[self.size : needed] = rows
+        self.size = needed
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[: self.size]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class QuantizedIndex:
+    """Local vector index: quantized codes in RAM, float32 rows on disk.
+
+    Brute-force float32 cosine keeps 4 KB per 1024-dim vector in memory.
+    Here only a compact code per vector stays resident: the sign bits
+    (``binary``, 128 bytes at 1024 dims, scored by Hamming distance) or an
+    int8 code with a per-vector scale (``int8``, 1 KB, scored by an
+    approximate dot product). A query scores every code, keeps the best
+    ``top_k * rescore_multiplier`` candidates and rescores only those with
+    the normalized float32 vectors read from a memory-mapped file, so the
+    returned scores are exact cosine scores in Upstash's ``(1 + cos) / 2``
+    form.
+
+    The index lives in a directory with four append-only files:
+    ``vectors.f32`` and ``codes.bin`` (one row per stored vector),
+    ``scales.f32`` (int8 only) and ``records.jsonl``, which holds the ID,
+    metadata, data and namespace of each row plus delete markers. A record
+    line is written last, so it is the commit point for its row. Overwrites
+    and deletes leave dead rows behind until ``compact()`` rewrites the
+    files. One process writes at a time; readers in other processes see
+    the files as they were when they opened the index.
+
+    It implements the same subset of the Upstash SDK as ``InMemoryIndex``
+    (upsert, query, range, fetch, delete, info, reset), so ingestion, the
+    sharding layer and ``UpstashVectorSearchTool`` use it unchanged.
+    Metadata filters support the equality subset of the Upstash syntax and
+    are applied after rescoring; the shortlist grows until enough matches
+    are found.
+
+    Attributes:
+        path: Directory holding the index files
+        quantization: ``"binary"`` or ``"int8"``
+        rescore_multiplier: Candidates rescored per requested result
+        name: Label used as the shard name when this index is a shard
+    """
+
+    def __init__(
+        self,
+        path: str,
+        quantization: str = "binary",
+        rescore_multiplier: int = 20,
+        name: Optional[str] = None,
+    ):
+        self.path = path
+        self.rescore_multiplier = max(int(rescore_multiplier), 1)
+        self.name = name or f"local:{path}"
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        settings = self._read_settings()
+        # An existing index keeps the scheme its codes were written with
+        self.quantization = settings.get("quantization", quantization)
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Invalid quantization '{self.quantization}'. "
+                f"Expected one of: {', '.join(QUANTIZATIONS)}"
+            )
+        self.dimension: Optional[int] = settings.get("dimension")
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_settings(self) -> Dict[str, Any]:
+        try:
+            with open(self._file("index.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_settings(self) -> None:
+        with open(self._file("index.json"), "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "quantization": self.quantization}, f)
+
+    @property
+    def _code_width(self) -> int:
+        assert self.dimension is not None
+        return -(-self.dimension // 8) if self.quantization == "binary" else self.dimension
+
+    def _reset_state(self) -> None:
+        width = self._code_width if self.dimension else 1
+        self._codes = _GrowableArray(np.uint8 if self.quantization == "binary" else np.int8, width)
+        self._scales = _GrowableArray(np.float32)
+        self._alive = _GrowableArray(np.bool_)
+        self._namespace_ids = _GrowableArray(np.int32)
+        self._offsets = _GrowableArray(np.int64)
+        self._ids: List[str] = []
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self._namespaces: Dict[str, int] = {}
+        self._mapped: Optional[np.memmap] = None
+
+    def _load(self) -> None:
+        """Rebuild the in-memory state from the files (IDs, codes, tombstones)."""
+        self._reset_state()
+        records_path = self._file("records.jsonl")
+        if self.dimension is None or not os.path.exists(records_path):
+            return
+
+        rows: List[Tuple[str, str, int]] = []
+        deleted: List[int] = []
+        committed = 0
+        with open(records_path, "rb") as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # empty (end of file) or torn by an interrupted write
+                entry = json.loads(line)
+                if "delete" in entry:
+                    deleted.append(entry["delete"])
+                else:
+                    rows.append((entry["id"], entry.get("namespace", ""), offset))
+                committed = f.tell()
+        if committed != os.path.getsize(records_path):
+            with open(records_path, "r+b") as f:
+                f.truncate(committed)
+
+        count = len(rows)
+        codes = np.fromfile(self._file("codes.bin"), dtype=self._codes.dtype)
+        self._codes.extend(codes[: count * self._code_width].reshape(-1, self._code_width))
+        if self.quantization == "int8":
+            self._scales.extend(np.fromfile(self._file("scales.f32"), dtype=np.float32)[:count])
+        self._truncate_rows(count)
+
+        alive = np.ones(count, dtype=np.bool_)
+        alive[[row for row in deleted if row < count]] = False
+        self._alive.extend(alive)
+        namespace_ids = np.empty(count, dtype=np.int32)
+        offsets = np.empty(count, dtype=np.int64)
+        for row, (vector_id, namespace, offset) in enumerate(rows):
+            namespace_ids[row] = self._namespaces.setdefault(namespace, len(self._namespaces))
+            offsets[row] = offset
+            self._ids.append(vector_id)
+            if alive[row]:
+                self._rows[(namespace, vector_id)] = row
+        self._namespace_ids.extend(namespace_ids)
+        self._offsets.extend(offsets)
+
+    def _truncate_rows(self, count: int) -> None:
+        """Drop row data beyond the last committed record (interrupted appends)."""
+        sizes = {"vectors.f32": count * self.dimension * 4, "codes.bin": count * self._code_width}
+        if self.quantization == "int8":
+            sizes["scales.f32"] = count * 4
+        for name, size in sizes.items():
+            path = self._file(name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+    def _vectors(self) -> np.ndarray:
+        """Memory-mapped float32 rows, remapped when the file has grown."""
+        rows = len(self._ids)
+        if self._mapped is None or self._mapped.shape[0] != rows:
+            if rows == 0:
+                return np.empty((0, self.dimension or 0), dtype=np.float32)
+            self._mapped = np.memmap(
+                self._file("vectors.f32"), dtype=np.float32, mode="r", shape=(rows, self.dimension)
+            )
+        return self._mapped
+
+    def _read_records(self, rows: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+        with open(self._file("records.jsonl"), "rb") as f:
+            records = {}
+            for row in sorted(set(rows)):
+                f.seek(int(self._offsets.view[row]))
+                records[row] = json.loads(f.readline())
+        return records
+
+    # ------------------------------------------------------------------
+    # Quantization
+    # ------------------------------------------------------------------
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the codes (and int8 scales) of normalized vectors."""
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1), np.empty(0, dtype=np.float32)
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales
+
+    def _prefilter_scores(self, query: np.ndarray) -> np.ndarray:
+        """Approximate similarity of the query to every row (higher is closer)."""
+        codes = self._codes.view
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.quantization == "binary":
+            packed = np.packbits(query > 0)
+            if packed.size % 8 == 0:
+                # Popcount over 64-bit words is ~8x fewer operations than over bytes
+                codes, packed = codes.view(np.uint64), packed.view(np.uint64)
+            for start in range(0, len(codes), _SCAN_CHUNK):
+                chunk = codes[start : start + _SCAN_CHUNK]
+                distance = np.bitwise_count(chunk ^ packed).sum(axis=1, dtype=np.int32)
+                scores[start : start + len(chunk)] = -distance
+        else:
+            scales = self._scales.view
+            for start in range(0, len(codes), _INT8_CHUNK):
+                chunk = codes[start : start + _INT8_CHUNK].astype(np.float32)
+                scores[start : start + len(chunk)] = (chunk @ query) * scales[
+                    start : start + len(chunk)
+                ]
+        return scores
+
+    # ------------------------------------------------------------------
+    # SDK-compatible operations
+    # ------------------------------------------------------------------
+
+    def upsert(self, vectors: Sequence[Any], namespace: str = "") -> str:
+        records = [_as_record(vector) for vector in vectors]
+        records = [record for record in records if record.vector is not None]
+        if not records:
+            return "Success"
+        matrix = np.asarray([record.vector for record in records], dtype=np.float32)
+        namespace = namespace or ""
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = matrix.shape[1]
+                self._write_settings()
+                self._reset_state()
+            if matrix.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Vector dimension {matrix.shape[1]} does not match "
+                    f"the index dimension {self.dimension}"
+                )
+            matrix = _normalize(matrix)
+            codes, scales = self._encode(matrix)
+
+            # Row data first, records last: a record line commits its row
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self._file("codes.bin"), "ab") as f:
+                f.write(codes.tobytes())
+            if self.quantization == "int8":
+                with open(self._file("scales.f32"), "ab") as f:
+                    f.write(scales.tobytes())
+
+            first_row = len(self._ids)
+            replaced = []
+            offsets = np.empty(len(records), dtype=np.int64)
+            with open(self._file("records.jsonl"), "ab") as f:
+                for i, record in enumerate(records):
+                    previous = self._rows.get((namespace, record.id))
+                    if previous is not None:
+                        f.write(json.dumps({"delete": previous}).encode("utf-8") + b"\n")
+                        replaced.append(previous)
+                    offsets[i] = f.tell()
+                    line = {
+                        "id": record.id,
+                        "namespace": namespace,
+                        "metadata": record.metadata,
+                        "data": record.data,
+                    }
+                    f.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self._rows[(namespace, record.id)] = first_row + i
+
+            self._alive.view[replaced] = False
+            self._codes.extend(codes)
+            if self.quantization == "int8":
+                self._scales.extend(scales)
+            self._alive.extend(np.ones(len(records), dtype=np.bool_))
+            namespace_id = self._namespaces.setdefault(namespace, len(self._namespaces))
+            self._namespace_ids.extend(np.full(len(records), namespace_id, dtype=np.int32))
+            self._offsets.extend(offsets)
+            self._ids.extend(record.id for record in records)
+        return "Success"
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        filter: str = "",
+        namespace: str = "",
+        include_data: bool = False,
+        score_threshold: Optional[float] = None,
+        **_: Any,
+    ) -> List[VectorRecord]:
+        clauses = _parse_filter(filter) if filter else []
+        with self._lock:
+            namespace_id = self._namespaces.get(namespace or "")
+            if self.dimension is None or namespace_id is None or top_k <= 0:
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1.0)
+
+            scores = self._prefilter_scores(query)
+            eligible = self._alive.view & (self._namespace_ids.view == namespace_id)
+            scores[~eligible] = -np.inf
+            available = int(eligible.sum())
+            vectors = self._vectors()
+
+            shortlist_size = min(available, top_k * self.rescore_multiplier)
+            while True:
+                if shortlist_size < available:
+                    shortlist = np.argpartition(-scores, shortlist_size - 1)[:shortlist_size]
+                else:
+                    shortlist = np.flatnonzero(eligible)
+                # Sorted rows read the memory-mapped file sequentially
+                shortlist = np.sort(shortlist)
+                cosine = vectors[shortlist] @ query
+                ranked = [
+                    (int(shortlist[i]), float((1.0 + cosine[i]) / 2.0))
+                    for i in np.argsort(-cosine, kind="stable")
+                ]
+                if score_threshold is not None:
+                    ranked = [(row, score) for row, score in ranked if score >= score_threshold]
+                if not clauses:
+                    hits = ranked[:top_k]
+                    break
+                records = self._read_records([row for row, _ in ranked])
+                hits = [
+                    (row, score)
+                    for row, score in ranked
+                    if _matches(records[row].get("metadata"), clauses)
+                ][:top_k]
+                if len(hits) >= top_k or shortlist_size >= available:
+                    break
+                shortlist_size = min(available, shortlist_size * 4)
+
+            return self._views(hits, include_vectors, include_metadata, include_data)
+
+    def _views(
+        self,
+        hits: Sequence[Tuple[int, Optional[float]]],
+        include_vectors: bool,
+        include_metadata: bool,
+        include_data: bool,
+    ) -> List[VectorRecord]:
+        records = (
+            self._read_records([row for row, _ in hits]) if include_metadata or include_data else {}
+        )
+        vectors = self._vectors() if include_vectors else None
+        views = []
+        for row, score in hits:
+            record = records.get(row, {})
+            views.append(
+                VectorRecord(
+                    id=self._ids[row],
+                    vector=vectors[row].tolist() if vectors is not None else None,
+                    metadata=(
+                        dict(record["metadata"])
+                        if include_metadata and record.get("metadata")
+                        else None
+                    ),
+                    data=record.get("data") if include_data else None,
+                    score=score,
+                )
+            )
+        return views
+
+    def range(
+        self,
+        cursor: str = END_CURSOR,
+        limit: int = 1,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        namespace: str = "",
+        include_data: bool = False,
+        prefix: Optional[str] = None,
+    ) -> RangePage:
+        with self._lock:
+            namespace = namespace or ""
+            ids = sorted(
+                vector_id
+                for (ns, vector_id) in self._rows
+                if ns == namespace and (prefix is None or vector_id.startswith(prefix))
+            )
+            start = int(cursor or 0)
+            rows = [self._rows[(namespace, vector_id)] for vector_id in ids[start : start + limit]]
+            views = self._views(
+                [(row, None) for row in rows], include_vectors, include_metadata, include_data
+            )
+        next_cursor = str(start + limit) if start + limit < len(ids) else END_CURSOR
+        return RangePage(next_cursor=next_cursor, vectors=views)
+
+    def fetch(
+        self,
+        ids: Any = None,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        namespace: str = "",
+        include_data: bool = False,
+        **_: Any,
+    ) -> List[Optional[VectorRecord]]:
+        ids = [ids] if isinstance(ids, str) else list(ids or [])
+        with self._lock:
+            rows = [self._rows.get((namespace or "", str(vector_id))) for vector_id in ids]
+            found = self._views(
+                [(row, None) for row in rows if row is not None],
+                include_vectors,
+                include_metadata,
+                include_data,
+            )
+        views = iter(found)
+        return [next(views) if row is not None else None for row in rows]
+
+    def delete(self, ids: Any = None, namespace: str = "", **_: Any) -> DeleteCount:
+        ids = [ids] if isinstance(ids, str) else list(ids or [])
+        with self._lock:
+            rows = [
+                row
+                for row in (
+                    self._rows.pop((namespace or "", str(vector_id)), None) for vector_id in ids
+                )
+                if row is not None
+            ]
+            self._mark_deleted(rows)
+        return DeleteCount(deleted=len(rows))
+
+    def _mark_deleted(self, rows: Sequence[int]) -> None:
+        if not rows:
+            return
+        with open(self._file("records.jsonl"), "ab") as f:
+            f.write(b"".join(json.dumps({"delete": row}).encode("utf-8") + b"\n" for row in rows))
+        self._alive.view[list(rows)] = False
+
+    def info(self) -> IndexStats:
+        with self._lock:
+            return IndexStats(vector_count=len(self._rows))
+
+    def reset(self, namespace: str = "", all: bool = False) -> str:
+        with self._lock:
+            if all:
+                for name in ("vectors.f32", "codes.bin", "scales.f32", "records.jsonl"):
+                    if os.path.exists(self._file(name)):
+                        os.remove(self._file(name))
+                self._reset_state()
+            else:
+                namespace = namespace or ""
+                keys = [key for key in self._rows if key[0] == namespace]
+                self._mark_deleted([self._rows.pop(key) for key in keys])
+        return "Success"
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def compact(self) -> int:
+        """Rewrite the files without dead rows; returns the number of rows dropped."""
+        with self._lock:
+            live = np.flatnonzero(self._alive.view)
+            dropped = len(self._ids) - len(live)
+            if dropped == 0:
+                return 0
+            vectors = self._vectors()
+            records = self._read_records(live.tolist()) if len(live) else {}
+            suffix = ".compact"
+            with open(self._file("vectors.f32" + suffix), "wb") as f:
+                for start in range(0, len(live), _SCAN_CHUNK):
+                    f.write(
+                        np.ascontiguousarray(vectors[live[start : start + _SCAN_CHUNK]]).tobytes()
+                    )
+            with open(self._file("codes.bin" + suffix), "wb") as f:
+                f.write(self._codes.view[live].tobytes())
+            if self.quantization == "int8":
+                with open(self._file("scales.f32" + suffix), "wb") as f:
+                    f.write(self._scales.view[live].tobytes())
+            with open(self._file("records.jsonl" + suffix), "wb") as f:
+                for row in live.tolist():
+                    f.write(json.dumps(records[row], ensure_ascii=False).encode("utf-8") + b"\n")
+
+            self._mapped = None
+            names = ["vectors.f32", "codes.bin", "records.jsonl"]
+            if self.quantization == "int8":
+                names.append("scales.f32")
+            # records.jsonl last: until it is replaced, the old rows stay consistent
+            for name in names:
+                os.replace(self._file(name + suffix), self._file(name))
+            self._load()
+            return dropped
+
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+
+
+def vector_backend_from_env() -> str:
+    """Vector store selected by VECTOR_BACKEND: ``upstash`` (default) or ``local``."""
+    backend = os.getenv("VECTOR_BACKEND", "upstash").lower()
+    if backend not in VECTOR_BACKENDS:
+        raise ValueError(
+            f"Invalid VECTOR_BACKEND '{backend}'. Expected one of: {', '.join(VECTOR_BACKENDS)}"
+        )
+    return backend
+
+
+def local_index_path() -> str:
+    """Return the local index directory, honouring the LOCAL_VECTOR_INDEX_PATH override."""
+    return os.getenv("LOCAL_VECTOR_INDEX_PATH") or DEFAULT_LOCAL_INDEX_PATH
+
+
+_local_indexes: Dict[str, QuantizedIndex] = {}
+_local_lock = threading.Lock()
+
+
+def local_index_from_env() -> QuantizedIndex:
+    """Return the process-wide local index configured by the environment.
+
+    LOCAL_VECTOR_QUANTIZATION (``binary`` or ``int8``) only applies when the
+    index is created; LOCAL_VECTOR_RESCORE_MULTIPLIER sets the shortlist size.
+    """
+    path = local_index_path()
+    with _local_lock:
+        index = _local_indexes.get(path)
+        if index is None:
+            index = QuantizedIndex(
+                path,
+                quantization=os.getenv("LOCAL_VECTOR_QUANTIZATION", "binary").lower(),
+                rescore_multiplier=int(os.getenv("LOCAL_VECTOR_RESCORE_MULTIPLIER", "20")),
+            )
+            _local_indexes[path] = index
+    return index
@@ -0,0 +1,103 @@
+# src/services/vector/ranking.py
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    k: int = 60,
+    weights: Optional[Sequence[float]] = None,
+) -> List[Tuple[str, float]]:
+    """Fuse several ranked ID lists with reciprocal rank fusion.
+
+    Each list contributes ``weight / (k + rank)`` to every ID it contains,
+    so items ranked well by any retriever float to the top without having
+    to calibrate BM25 scores against cosine similarities.
+
+    Args:
+        rankings: Ranked lists of IDs, best first
+        k: Rank smoothing constant (60 is the value from the original paper)
+        weights: Optional per-ranking weights (defaults to 1.0 each)
+
+    Returns:
+        ``(id, fused_score)`` pairs sorted by descending score
+    """
+    if weights is None:
+        weights = [1.0] * len(rankings)
+
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += weight / (k + rank)
+
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def maximal_marginal_relevance(
+    query_vector: Sequence[float],
+    candidate_vectors: Sequence[Sequence[float]],
+    lambda_mult: float = 0.5,
+    k: Optional[int] = None,
+) -> List[int]:
+    """Order candidates by maximal marginal relevance.
+
+    Greedily picks the candidate maximizing
+    ``lambda * sim(query, c) - (1 - lambda) * max(sim(c, selected))``.
+    Similarities are computed once as matrices and the running redundancy
+    term is updated with a vectorized ``np.maximum`` per pick.
+
+    Args:
+        query_vector: Query embedding
+        candidate_vectors: Candidate embeddings, one per row
+        lambda_mult: 1.0 ranks purely by relevance, 0.0 purely by diversity
+        k: Number of candidates to select (defaults to all)
+
+    Returns:
+        Indices into ``candidate_vectors`` in selection order
+    """
+    if len(candidate_vectors) == 0:
+        return []
+
+    # Imported lazily: NumPy is only needed when MMR is enabled
+    import numpy as np
+
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    n = len(candidates)
+    k = n if k is None else min(k, n)
+
+    selected: List[int] = []
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    for _ in range(k):
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, pairwise[best])
+
+    return selected
+
+
+def cap_per_group(items: Sequence[Any], key: Callable[[Any], Any], max_per_group: int) -> List[Any]:
+    """Keep at most ``max_per_group`` items per key, preserving order."""
+    counts: Dict[Any, int] = defaultdict(int)
+    kept = []
+    for item in items:
+        group = key(item)
+        if counts[group] < max_per_group:
+            counts[group] += 1
+            kept.append(item)
+    return kept
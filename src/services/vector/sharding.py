@@ -0,0 +1,600 @@
+# src/services/vector/sharding.py
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Empty cursor returned by range() once a scan is complete (same as the Upstash SDK)
+END_CURSOR = ""
+
+_FILTER_CLAUSE_RE = re.compile(
+    r"^\s*([\w.]+)\s*=\s*(?:'([^']*)'|\"([^\"]*)\"|(-?\d+(?:\.\d+)?))\s*$"
+)
+
+
+@dataclass
+class VectorRecord:
+    """A stored vector, shaped like the SDK's QueryResult/FetchResult."""
+
+    id: str
+    vector: Optional[List[float]] = None
+    metadata: Optional[Dict[str, Any]] = None
+    data: Optional[str] = None
+    score: Optional[float] = None
+
+
+@dataclass
+class RangePage:
+    """One page of a range() scan (``next_cursor`` is empty when done)."""
+
+    next_cursor: str
+    vectors: List[VectorRecord] = field(default_factory=list)
+
+
+@dataclass
+class DeleteCount:
+    deleted: int
+
+
+@dataclass
+class IndexStats:
+    vector_count: int
+
+
+def routing_key(metadata: Optional[Dict[str, Any]], vector_id: Any) -> str:
+    """Return the key a vector is routed by: its document, else its ID.
+
+    Every page of a document lands on the same shard, so re-ingestion only
+    has to scan and delete on that shard.
+    """
+    metadata = metadata or {}
+    return str(metadata.get("doc_source") or metadata.get("file") or vector_id)
+
+
+def _as_record(vector: Any) -> VectorRecord:
+    """Normalize the upsert shapes accepted by the SDK (Vector, tuple, dict)."""
+    if isinstance(vector, dict):
+        return VectorRecord(
+            id=str(vector["id"]),
+            vector=vector.get("vector"),
+            metadata=vector.get("metadata"),
+            data=vector.get("data"),
+        )
+    if isinstance(vector, (tuple, list)):
+        padded = list(vector) + [None] * (4 - len(vector))
+        return VectorRecord(id=str(padded[0]), vector=padded[1], metadata=padded[2], data=padded[3])
+    return VectorRecord(
+        id=str(vector.id),
+        vector=getattr(vector, "vector", None),
+        metadata=getattr(vector, "metadata", None),
+        data=getattr(vector, "data", None),
+    )
+
+
+def _parse_filter(expression: str) -> List[Tuple[str, Any]]:
+    """Parse the equality subset of the Upstash filter syntax (``a = 'x' AND b = 2``)."""
+    clauses = []
+    for clause in re.split(r"\s+AND\s+", expression.strip(), flags=re.IGNORECASE):
+        match = _FILTER_CLAUSE_RE.match(clause)
+        if not match:
+            raise ValueError(
+                f"InMemoryIndex only supports equality filters joined by AND, got: {expression!r}"
+            )
+        key, single, double, number = match.groups()
+        if number is not None:
+            value: Any = float(number) if "." in number else int(number)
+        else:
+            value = single if single is not None else double
+        clauses.append((key, value))
+    return clauses
+
+
+def _matches(metadata: Optional[Dict[str, Any]], clauses: List[Tuple[str, Any]]) -> bool:
+    for key, expected in clauses:
+        value: Any = metadata or {}
+        for part in key.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        if value != expected:
+            return False
+    return True
+
+
+class InMemoryIndex:
+    """Local stand-in for an Upstash index (cosine similarity, one process).
+
+    Implements the subset of the SDK used by ingestion and search (upsert,
+    query, range, fetch, delete, info, reset), so sharding, rebalancing and
+    the search tool can be exercised without a network. Scores follow
+    Upstash's cosine normalization, ``(1 + cos) / 2``.
+
+    Attributes:
+        name: Label used as the shard name when this index is a shard
+    """
+
+    def __init__(self, name: str = "memory"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, Dict[str, VectorRecord]] = {}
+
+    def _store(self, namespace: str) -> Dict[str, VectorRecord]:
+        return self._namespaces.setdefault(namespace or "", {})
+
+    def upsert(self, vectors: Sequence[Any], namespace: str = "") -> str:
+        records = [_as_record(vector) for vector in vectors]
+        with self._lock:
+            store = self._store(namespace)
+            for record in records:
+                if record.vector is not None:
+                    record.vector = [float(x) for x in record.vector]
+                store[record.id] = record
+        return "Success"
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        filter: str = "",
+        namespace: str = "",
+        include_data: bool = False,
+        **_: Any,
+    ) -> List[VectorRecord]:
+        clauses = _parse_filter(filter) if filter else []
+        with self._lock:
+            candidates = [
+                record
+                for record in self._store(namespace).values()
+                if record.vector is not None and _matches(record.metadata, clauses)
+            ]
+        if not candidates:
+            return []
+
+        matrix = np.asarray([record.vector for record in candidates], dtype=np.float32)
+        query = np.asarray(vector, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        cosine = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+        scores = (1.0 + cosine) / 2.0
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [
+            self._view(
+                candidates[i], include_vectors, include_metadata, include_data, float(scores[i])
+            )
+            for i in order
+        ]
+
+    def range(
+        self,
+        cursor: str = END_CURSOR,
+        limit: int = 1,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        namespace: str = "",
+        include_data: bool = False,
+        prefix: Optional[str] = None,
+    ) -> RangePage:
+        with self._lock:
+            ids = sorted(
+                vector_id
+                for vector_id in self._store(namespace)
+                if prefix is None or vector_id.startswith(prefix)
+            )
+            start = int(cursor or 0)
+            page = [self._store(namespace)[vector_id] for vector_id in ids[start : start + limit]]
+        next_cursor = str(start + limit) if start + limit < len(ids) else END_CURSOR
+        return RangePage(
+            next_cursor=next_cursor,
+            vectors=[self._view(r, include_vectors, include_metadata, include_data) for r in page],
+        )
+
+    def fetch(
+        self,
+        ids: Any = None,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        namespace: str = "",
+        include_data: bool = False,
+        **_: Any,
+    ) -> List[Optional[VectorRecord]]:
+        ids = [ids] if isinstance(ids, str) else list(ids or [])
+        with self._lock:
+            store = self._store(namespace)
+            found = [store.get(str(vector_id)) for vector_id in ids]
+        return [
+            self._view(r, include_vectors, include_metadata, include_data) if r else None
+            for r in found
+        ]
+
+    def delete(self, ids: Any = None, namespace: str = "", **_: Any) -> DeleteCount:
+        ids = [ids] if isinstance(ids, str) else list(ids or [])
+        with self._lock:
+            store = self._store(namespace)
+            deleted = sum(store.pop(str(vector_id), None) is not None for vector_id in ids)
+        return DeleteCount(deleted=deleted)
+
+    def info(self) -> IndexStats:
+        with self._lock:
+            return IndexStats(vector_count=sum(len(s) for s in self._namespaces.values()))
+
+    def reset(self, namespace: str = "", all: bool = False) -> str:
+        with self._lock:
+            if all:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace or "", None)
+        return "Success"
+
+    @staticmethod
+    def _view(
+        record: VectorRecord,
+        include_vectors: bool,
+        include_metadata: bool,
+        include_data: bool,
+        score: Optional[float] = None,
+    ) -> VectorRecord:
+        return VectorRecord(
+            id=record.id,
+            vector=list(record.vector) if include_vectors and record.vector is not None else None,
+            metadata=dict(record.metadata) if include_metadata and record.metadata else None,
+            data=record.data if include_data else None,
+            score=score,
+        )
+
+
+def gather_results(
+    shard_results: Sequence[Sequence[Any]],
+    top_k: int,
+    score_threshold: Optional[float] = None,
+) -> List[Any]:
+    """Merge per-shard query results into one global top-k.
+
+    Each shard already returns its own best ``top_k``, so the global best
+    ``top_k`` is always among them. Ties keep shard order, which makes the
+    merge deterministic.
+    """
+    merged = [result for results in shard_results for result in results]
+    if score_threshold is not None:
+        merged = [result for result in merged if result.score >= score_threshold]
+    merged.sort(key=lambda result: result.score, reverse=True)
+    return merged[:top_k]
+
+
+class ShardedIndex:
+    """Upstash-compatible index that spreads vectors over several indexes.
+
+    Vectors are routed by document (``doc_source``, or ``file`` for seeded
+    examples) with rendezvous hashing over the shard names: adding a shard
+    moves only the documents that now hash to it, and reordering the shard
+    list moves nothing. Queries scatter to every shard concurrently and
+    gather with a global top-k merge. Deletes and fetches by ID go to every
+    shard, since IDs alone do not say which document they belong to.
+
+    The object exposes the SDK methods used in this repo, so it can be
+    passed wherever an ``upstash_vector.Index`` is expected.
+
+    Attributes:
+        shards: Underlying indexes (SDK clients or InMemoryIndex stand-ins)
+        names: Stable shard names used for routing (URLs for Upstash shards)
+    """
+
+    def __init__(self, shards: Sequence[Any], names: Optional[Sequence[str]] = None):
+        if not shards:
+            raise ValueError("ShardedIndex needs at least one shard")
+        self.shards = list(shards)
+        self.names = (
+            list(names)
+            if names is not None
+            else [
+                getattr(shard, "name", None) or f"shard-{i}" for i, shard in enumerate(self.shards)
+            ]
+        )
+        if len(self.names) != len(self.shards) or len(set(self.names)) != len(self.names):
+            raise ValueError("Shard names must be unique and match the number of shards")
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(self.shards), thread_name_prefix="vector-shard"
+        )
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def shard_index_for(self, key: str) -> int:
+        """Return the position of the shard owning ``key`` (highest random weight)."""
+        weights = [
+            hashlib.sha1(f"{name}\x00{key}".encode("utf-8")).digest()[:8] for name in self.names
+        ]
+        return max(range(len(weights)), key=weights.__getitem__)
+
+    def shard_for(self, doc_source: str) -> Any:
+        """Return the index that stores the vectors of ``doc_source``."""
+        return self.shards[self.shard_index_for(doc_source)]
+
+    def _scatter(self, call: Any) -> List[Any]:
+        """Run ``call(shard)`` on every shard concurrently, in shard order."""
+        if len(self.shards) == 1:
+            return [call(self.shards[0])]
+        return list(self._executor.map(call, self.shards))
+
+    # ------------------------------------------------------------------
+    # SDK-compatible operations
+    # ------------------------------------------------------------------
+
+    def upsert(self, vectors: Sequence[Any], namespace: str = "") -> str:
+        groups: Dict[int, List[Any]] = {}
+        for vector in vectors:
+            record = _as_record(vector)
+            position = self.shard_index_for(routing_key(record.metadata, record.id))
+            groups.setdefault(position, []).append(vector)
+
+        def write(item: Tuple[int, List[Any]]) -> Any:
+            position, batch = item
+            return self.shards[position].upsert(vectors=batch, namespace=namespace)
+
+        list(self._executor.map(write, groups.items()))
+        return "Success"
+
+    def query(
+        self,
+        vector: Sequence[float],
+        top_k: int = 10,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        filter: str = "",
+        namespace: str = "",
+        include_data: bool = False,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[Any]:
+        params = {
+            "vector": vector,
+            "top_k": top_k,
+            "include_vectors": include_vectors,
+            "include_metadata": include_metadata,
+            "filter": filter,
+            "namespace": namespace,
+            "include_data": include_data,
+            **kwargs,
+        }
+        results = self._scatter(lambda shard: shard.query(**params))
+        return gather_results(results, top_k, score_threshold)
+
+    def fetch(self, ids: Any = None, namespace: str = "", **kwargs: Any) -> List[Optional[Any]]:
+        ids = [ids] if isinstance(ids, str) else list(ids or [])
+        per_shard = self._scatter(lambda shard: shard.fetch(ids=ids, namespace=namespace, **kwargs))
+        # Each ID lives on one shard: keep the first hit per position
+        return [
+            next((found[i] for found in per_shard if found[i] is not None), None)
+            for i in range(len(ids))
+        ]
+
+    def delete(self, ids: Any = None, namespace: str = "", **kwargs: Any) -> DeleteCount:
+        results = self._scatter(lambda shard: shard.delete(ids=ids, namespace=namespace, **kwargs))
+        return DeleteCount(deleted=sum(result.deleted for result in results))
+
+    def range(
+        self,
+        cursor: str = END_CURSOR,
+        limit: int = 1,
+        include_vectors: bool = False,
+        include_metadata: bool = False,
+        namespace: str = "",
+        include_data: bool = False,
+        prefix: Optional[str] = None,
+    ) -> RangePage:
+        """Scan shard by shard; the cursor is ``"<shard position>:<shard cursor>"``."""
+        position, _, inner = (cursor or "0:").partition(":")
+        position = int(position)
+        page = self.shards[position].range(
+            cursor=inner,
+            limit=limit,
+            include_vectors=include_vectors,
+            include_metadata=include_metadata,
+            namespace=namespace,
+            include_data=include_data,
+            prefix=prefix,
+        )
+        if page.next_cursor:
+            next_cursor = f"{position}:{page.next_cursor}"
+        elif position + 1 < len(self.shards):
+            next_cursor = f"{position + 1}:"
+        else:
+            next_cursor = END_CURSOR
+        return RangePage(next_cursor=next_cursor, vectors=list(page.vectors))
+
+    def info(self) -> IndexStats:
+        return IndexStats(
+            vector_count=sum(info.vector_count for info in self._scatter(lambda s: s.info()))
+        )
+
+    def reset(self, namespace: str = "", all: bool = False) -> str:
+        self._scatter(lambda shard: shard.reset(namespace=namespace, all=all))
+        return "Success"
+
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+
+
+def shard_urls_from_env() -> List[str]:
+    """Shard URLs from UPSTASH_VECTOR_SHARD_URLS (comma separated, empty = no sharding)."""
+    return [
+        url.strip() for url in os.getenv("UPSTASH_VECTOR_SHARD_URLS", "").split(",") if url.strip()
+    ]
+
+
+def sharding_configured() -> bool:
+    return bool(shard_urls_from_env())
+
+
+def _shard_tokens(urls: Sequence[str], tokens: Optional[str]) -> List[str]:
+    """One token per shard, or a single token shared by all of them."""
+    values = [t.strip() for t in (tokens or "").split(",") if t.strip()]
+    if len(values) == 1:
+        return values * len(urls)
+    if len(values) != len(urls):
+        raise ValueError(
+            "UPSTASH_VECTOR_SHARD_TOKENS must hold one token per shard URL, "
+            "or a single shared token"
+        )
+    return values
+
+
+def build_sharded_index(urls: Sequence[str], tokens: Optional[str] = None) -> ShardedIndex:
+    """Build a ShardedIndex of Upstash clients; shards are named by URL."""
+    from upstash_vector import Index
+
+    tokens = (
+        tokens
+        if tokens is not None
+        else (os.getenv("UPSTASH_VECTOR_SHARD_TOKENS") or os.getenv("UPSTASH_VECTOR_REST_TOKEN"))
+    )
+    shards = [Index(url=url, token=token) for url, token in zip(urls, _shard_tokens(urls, tokens))]
+    return ShardedIndex(shards, names=list(urls))
+
+
+def build_index_from_env() -> Any:
+    """Return the configured vector index.
+
+    With VECTOR_BACKEND=local this is the on-disk QuantizedIndex; with
+    UPSTASH_VECTOR_SHARD_URLS set, a ShardedIndex over those indexes;
+    otherwise the single index from UPSTASH_VECTOR_REST_URL.
+    """
+    from .quantized_index import local_index_from_env, vector_backend_from_env
+
+    if vector_backend_from_env() == "local":
+        return local_index_from_env()
+    urls = shard_urls_from_env()
+    if urls:
+        return build_sharded_index(urls)
+    from upstash_vector import Index
+
+    return Index.from_env()
+
+
+# Clients shared by every caller in the process, keyed by credentials
+_index_cache: Dict[Tuple[Optional[str], Optional[str]], Any] = {}
+_index_lock = threading.Lock()
+
+
+def get_shared_index(url: Optional[str] = None, token: Optional[str] = None) -> Any:
+    """Return a process-wide Upstash Index for the given credentials.
+
+    The client is created on first use and reused by every search tool and
+    by the answer cache, so building crews does not pay for one client per
+    agent. Without explicit credentials the index comes from the
+    environment (see ``build_index_from_env``).
+    """
+    key = (url, token)
+    index = _index_cache.get(key)
+    if index is None:
+        with _index_lock:
+            index = _index_cache.get(key)
+            if index is None:
+                if url is None and token is None:
+                    index = build_index_from_env()
+                else:
+                    from upstash_vector import Index
+
+                    index = Index(url=url, token=token)
+                _index_cache[key] = index
+    return index
+
+
+# ----------------------------------------------------------------------
+# Rebalancing
+# ----------------------------------------------------------------------
+
+
+@dataclass
+class RebalanceReport:
+    scanned: int = 0
+    moved: int = 0
+    moves: Dict[Tuple[str, str], int] = field(default_factory=dict)
+
+
+def _misplaced(
+    target: ShardedIndex, source_name: str, source: Any, namespace: str, batch_size: int
+) -> Tuple[int, Dict[int, List[str]]]:
+    """Scan ``source`` and return its size and the IDs owned by other shards."""
+    scanned = 0
+    outgoing: Dict[int, List[str]] = {}
+    cursor = END_CURSOR
+    while True:
+        page = source.range(
+            cursor=cursor, limit=batch_size, include_metadata=True, namespace=namespace
+        )
+        scanned += len(page.vectors)
+        for item in page.vectors:
+            position = target.shard_index_for(routing_key(item.metadata, item.id))
+            if target.names[position] != source_name:
+                outgoing.setdefault(position, []).append(item.id)
+        cursor = page.next_cursor
+        if not cursor:
+            return scanned, outgoing
+
+
+def rebalance(
+    target: ShardedIndex,
+    drain: Sequence[Tuple[str, Any]] = (),
+    namespace: str = "",
+    batch_size: int = 100,
+    dry_run: bool = False,
+) -> RebalanceReport:
+    """Move every vector to the shard that owns it under ``target``'s routing.
+
+    Run it after changing the shard list. Each shard is scanned first (IDs
+    and metadata only), then misplaced vectors are fetched, copied to their
+    owner and deleted from the old shard, batch by batch. Deleting only
+    after the scan keeps range cursors valid; copying before deleting means
+    an interrupted run leaves duplicates (removed by the next run) rather
+    than losing data.
+
+    Args:
+        target: Sharded index with the new shard list
+        drain: ``(name, index)`` pairs of shards being removed; all their vectors move
+        namespace: Namespace to rebalance
+        batch_size: Vectors per range/fetch/upsert/delete request
+        dry_run: Only count the moves
+
+    Returns:
+        Counts of scanned and moved vectors, per ``(from, to)`` shard pair
+    """
+    report = RebalanceReport()
+    sources = list(zip(target.names, target.shards)) + list(drain)
+    for source_name, source in sources:
+        scanned, outgoing = _misplaced(target, source_name, source, namespace, batch_size)
+        report.scanned += scanned
+        for position, ids in outgoing.items():
+            key = (source_name, target.names[position])
+            report.moves[key] = len(ids)
+            report.moved += len(ids)
+            if dry_run:
+                continue
+            for i in range(0, len(ids), batch_size):
+                fetched = source.fetch(
+                    ids=ids[i : i + batch_size],
+                    include_vectors=True,
+                    include_metadata=True,
+                    include_data=True,
+                    namespace=namespace,
+                )
+                vectors = [
+                    {
+                        "id": item.id,
+                        "vector": item.vector,
+                        "metadata": item.metadata,
+                        "data": item.data,
+                    }
+                    for item in fetched
+                    if item is not None
+                ]
+                if vectors:
+                    target.shards[position].upsert(vectors=vectors, namespace=namespace)
+                    source.delete(ids=[v["id"] for v in vectors], namespace=namespace)
+    return report
@@ -1,19 +1,63 @@
 # src/services/vector/upstash_vector_tool.py
+import importlib.util
 import json
+import logging
 import os
-from typing import Any, List, Optional, Type, Callable
-
-try:
-    from upstash_vector import Index
-    UPSTASH_AVAILABLE = True
-except ImportError:
-    UPSTASH_AVAILABLE = False
-    Index = Any  # type placeholder
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
 from crewai.tools import BaseTool
 from pydantic import BaseModel, Field
 
-from ..embeddings.voyage_embed import embed_query
+from ..embeddings.providers import EmbeddingProvider, ensure_index_model, get_embedding_provider
+from ..limits import provider_slot
+from ..metering import current_degradation
+from ..metrics import get_metrics
+from .bm25_index import BM25Index
+from .quantized_index import vector_backend_from_env
+from .ranking import cap_per_group, maximal_marginal_relevance, reciprocal_rank_fusion
+from .sharding import get_shared_index
+
+# Only check availability here; the SDK itself is imported when the first client is built
+UPSTASH_AVAILABLE = importlib.util.find_spec("upstash_vector") is not None
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+logger = logging.getLogger(__name__)
+
+# Shared pool used to run the lexical and vector legs of a hybrid search concurrently
+_search_executor: Optional[ThreadPoolExecutor] = None
+
+
+# Embedding model check per (index, namespace, model): None when compatible, else the error
+_model_checks: Dict[Tuple[int, str, str], Optional[str]] = {}
+
+
+def _get_search_executor() -> ThreadPoolExecutor:
+    global _search_executor
+    if _search_executor is None:
+        _search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="upstash-search")
+    return _search_executor
+
+
+def _doc_source_of(metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Return the document a hit belongs to (PDF ingestion or seed script metadata)."""
+    metadata = metadata or {}
+    return metadata.get("doc_source") or metadata.get("file")
+
+
+def _page_ref(result: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    """Return (doc_source, page index) for a PDF page vector ID ``{doc_source}_{i}``.
+
+    IDs that do not follow the ingestion scheme (e.g. seeded records) have
+    no neighbors and return None.
+    """
+    doc_source = _doc_source_of(result.get("metadata"))
+    prefix, _, index = str(result.get("id", "")).rpartition("_")
+    if not doc_source or prefix != doc_source or not index.isdigit():
+        return None
+    return doc_source, int(index)
 
 
 class UpstashToolSchema(BaseModel):
@@ -46,13 +90,27 @@ class UpstashToolSchema(BaseModel):
         default=None,
         description="Metadata filter string (e.g., 'category = \"tech\"')"
     )
+    search_mode: Optional[str] = Field(
+        default=None,
+        description=(
+            "Retrieval mode: 'vector', 'lexical' (BM25 over page text) or 'hybrid'. "
+            "Use 'hybrid' or 'lexical' when the query names exact identifiers or codes."
+        )
+    )
+    neighbor_pages: Optional[int] = Field(
+        default=None,
+        description=(
+            "Expand each hit with this many pages before and after it, merged into one passage. "
+            "Use 1 or 2 when an answer may continue on the adjacent pages."
+        )
+    )
 
 
 class UpstashVectorSearchTool(BaseTool):
     """Tool for semantic search using Upstash Vector database.
     
     This tool enables vector similarity search on documents stored in Upstash Vector,
-    using Voyage AI embeddings for high-quality semantic matching.
+    using Voyage AI embeddings (or the configured embedding provider) for semantic matching.
     
     Attributes:
         name: Tool identifier
@@ -63,7 +121,17 @@ class UpstashVectorSearchTool(BaseTool):
         namespace: Default namespace for searches
         limit: Default number of results
         score_threshold: Minimum similarity score
-        custom_embedding_fn: Custom embedding function (defaults to Voyage)
+        custom_embedding_fn: Custom embedding function (takes precedence over the provider)
+        embedding_provider: Embedding provider for queries (defaults to EMBEDDING_PROVIDER)
+        search_mode: Default retrieval mode ("vector", "lexical" or "hybrid")
+        bm25_index_path: Path of the local BM25 index built during ingestion
+        rrf_k: Rank smoothing constant for reciprocal rank fusion
+        use_mmr: Re-rank over-fetched candidates with maximal marginal relevance
+        mmr_lambda: MMR trade-off between relevance (1.0) and diversity (0.0)
+        fetch_multiplier: Candidates fetched per requested result when re-ranking
+        max_per_doc: Optional cap on results sharing the same doc_source
+        prefetch_images: Warm the shared image rendition cache with returned image paths
+        neighbor_pages: Default number of adjacent pages merged into each hit's passage
     """
     
     model_config = {"arbitrary_types_allowed": True}
@@ -95,7 +163,49 @@ class UpstashVectorSearchTool(BaseTool):
     )
     custom_embedding_fn: Optional[Callable[[str], List[float]]] = Field(
         default=None,
-        description="Custom embedding function (defaults to Voyage AI)"
+        description="Custom embedding function (defaults to the embedding provider)"
+    )
+    embedding_provider: Optional[EmbeddingProvider] = Field(
+        default=None,
+        description=(
+            "Embedding provider for queries (defaults to the process-wide EMBEDDING_PROVIDER)"
+        ),
+    )
+    search_mode: Optional[str] = Field(
+        default=None,
+        description="Default retrieval mode (falls back to UPSTASH_SEARCH_MODE, then 'vector')"
+    )
+    bm25_index_path: Optional[str] = Field(
+        default=None,
+        description="Path of the local BM25 index (falls back to BM25_INDEX_PATH)"
+    )
+    rrf_k: int = Field(
+        default=60,
+        description="Rank smoothing constant for reciprocal rank fusion in hybrid mode"
+    )
+    use_mmr: bool = Field(
+        default=False,
+        description="Diversify results with maximal marginal relevance over over-fetched candidates"
+    )
+    mmr_lambda: float = Field(
+        default=0.5,
+        description="MMR trade-off: 1.0 ranks purely by relevance, 0.0 purely by diversity"
+    )
+    fetch_multiplier: int = Field(
+        default=4,
+        description="Candidates fetched per requested result when re-ranking or capping per doc"
+    )
+    max_per_doc: Optional[int] = Field(
+        default=None,
+        description="Maximum results per doc_source, applied before score_threshold"
+    )
+    neighbor_pages: int = Field(
+        default_factory=lambda: int(os.getenv("UPSTASH_NEIGHBOR_PAGES", "0")),
+        description="Pages before and after each hit merged into its passage (0 disables)"
+    )
+    prefetch_images: bool = Field(
+        default_factory=lambda: os.getenv("IMAGE_PREFETCH", "true").lower() == "true",
+        description="Prepare the images of returned hits in the background for the vision agent"
     )
     
     # Package dependencies for auto-installation
@@ -103,6 +213,7 @@ class UpstashVectorSearchTool(BaseTool):
     
     # Private attributes
     _index: Optional[Any] = None
+    _bm25: Optional[BM25Index] = None
 
     def __init__(self, namespace: Optional[str] = None, **kwargs):
         """Initialize UpstashVectorSearchTool.
@@ -116,7 +227,18 @@ class UpstashVectorSearchTool(BaseTool):
             kwargs['namespace'] = namespace
             
         super().__init__(**kwargs)
-        
+
+        self.search_mode = self.search_mode or os.getenv("UPSTASH_SEARCH_MODE", "vector")
+        if self.search_mode not in SEARCH_MODES:
+            raise ValueError(
+                f"Invalid search_mode '{self.search_mode}'. "
+                f"Expected one of: {', '.join(SEARCH_MODES)}"
+            )
+
+        # The local quantized index needs neither credentials nor the Upstash SDK
+        if vector_backend_from_env() == "local" and not self.upstash_url and not self.upstash_token:
+            return
+
         # Get credentials from parameters or environment
         url = self.upstash_url or os.getenv("UPSTASH_VECTOR_REST_URL")
         token = self.upstash_token or os.getenv("UPSTASH_VECTOR_REST_TOKEN")
@@ -132,15 +254,9 @@ class UpstashVectorSearchTool(BaseTool):
                 "Upstash Vector token is required. Set UPSTASH_VECTOR_REST_TOKEN environment variable "
                 "or pass upstash_token parameter."
             )
-        
-        # Initialize Upstash client
-        if UPSTASH_AVAILABLE:
-            # Use from_env() if no explicit credentials provided
-            if not self.upstash_url and not self.upstash_token:
-                self._index = Index.from_env()
-            else:
-                self._index = Index(url=url, token=token)
-        else:
+
+        # The Upstash client itself is created lazily on first search (see _get_index)
+        if not UPSTASH_AVAILABLE:
             self._handle_missing_dependency()
     
     def _handle_missing_dependency(self):
@@ -153,14 +269,9 @@ class UpstashVectorSearchTool(BaseTool):
             ):
                 import subprocess
                 subprocess.run(["uv", "add", "upstash-vector"], check=True)
-                # Re-import after installation
-                global Index, UPSTASH_AVAILABLE
-                from upstash_vector import Index
+                # The client is built lazily, so only the availability flag needs updating
+                global UPSTASH_AVAILABLE
                 UPSTASH_AVAILABLE = True
-                # Re-initialize with credentials
-                url = self.upstash_url or os.getenv("UPSTASH_VECTOR_REST_URL")
-                token = self.upstash_token or os.getenv("UPSTASH_VECTOR_REST_TOKEN")
-                self._index = Index(url=url, token=token)
             else:
                 raise ImportError(
                     "The 'upstash-vector' package is required. Install it with: uv add upstash-vector"
@@ -170,6 +281,352 @@ class UpstashVectorSearchTool(BaseTool):
                 "The 'upstash-vector' package is required. Install it with: uv add upstash-vector"
             )
 
+    def _get_index(self) -> Any:
+        """Return the Upstash client, creating (or reusing) it on first use."""
+        if self._index is None:
+            if not self.upstash_url and not self.upstash_token:
+                # Use from_env() if no explicit credentials provided
+                self._index = get_shared_index()
+            else:
+                self._index = get_shared_index(
+                    self.upstash_url or os.getenv("UPSTASH_VECTOR_REST_URL"),
+                    self.upstash_token or os.getenv("UPSTASH_VECTOR_REST_TOKEN"),
+                )
+        return self._index
+
+    def warm_up(self) -> None:
+        """Create the Upstash and embedding clients ahead of the first search.
+
+        Long-running services call this at startup so the first request does
+        not pay for client construction.
+        """
+        self._get_index()
+        if not self.custom_embedding_fn:
+            self._get_provider().warmup()
+
+    def _get_bm25(self) -> BM25Index:
+        """Return the local BM25 index, loading it on first use."""
+        if self._bm25 is None:
+            self._bm25 = BM25Index(path=self.bm25_index_path)
+        return self._bm25
+
+    def _get_provider(self) -> EmbeddingProvider:
+        return self.embedding_provider or get_embedding_provider()
+
+    def _embed(self, query: str) -> List[float]:
+        """Vectorize the query with the custom embedding function or the embedding provider."""
+        if self.custom_embedding_fn:
+            return self.custom_embedding_fn(query)
+        provider = self._get_provider()
+        with provider_slot(provider.kind), get_metrics().span(f"{provider.kind}.embed_query"):
+            return provider.embed_query(query)
+
+    def _check_embedding_model(self, namespace: str) -> None:
+        """Refuse to search an index whose vectors come from another embedding model.
+
+        Checked once per index, namespace and model; skipped with a custom
+        embedding function, whose model is unknown.
+        """
+        if self.custom_embedding_fn:
+            return
+        index = self._get_index()
+        model_id = self._get_provider().model_id
+        key = (id(index), namespace, model_id)
+        if key not in _model_checks:
+            try:
+                ensure_index_model(index, model_id, namespace=namespace)
+                _model_checks[key] = None
+            except ValueError as exc:
+                _model_checks[key] = str(exc)
+        if _model_checks[key]:
+            raise ValueError(_model_checks[key])
+
+    def _vector_search(
+        self,
+        query: str,
+        top_k: int,
+        namespace: Optional[str],
+        include_vectors: bool,
+        include_metadata: bool,
+        include_data: bool,
+        filter: Optional[str],
+    ) -> Tuple[List[float], List[Any]]:
+        """Embed the query and run a similarity search.
+
+        Returns:
+            The query vector and the raw SDK results
+        """
+        self._check_embedding_model(namespace or "")
+        vector = self._embed(query)
+
+        # Prepare query parameters according to Upstash SDK
+        query_params = {
+            "vector": vector,
+            "top_k": top_k,
+            "include_vectors": include_vectors,
+            "include_metadata": include_metadata,
+            "include_data": include_data
+        }
+
+        # Add optional parameters
+        if namespace:
+            query_params["namespace"] = namespace
+        if filter:
+            query_params["filter"] = filter
+
+        # Perform vector search using official Upstash SDK method
+        with provider_slot("upstash"), get_metrics().span("upstash.query", top_k=top_k):
+            return vector, self._get_index().query(**query_params)
+
+    def _lexical_search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Run a BM25 search over the local inverted index."""
+        bm25 = self._get_bm25()
+        hits = []
+        for vector_id, score in bm25.search(query, top_k=top_k):
+            metadata = bm25.get_metadata(vector_id) or {}
+            hits.append({
+                "id": vector_id,
+                "lexical_score": score,
+                "context": metadata.get("text", ""),
+                "metadata": metadata,
+            })
+        return hits
+
+    def _finish(
+        self, results: List[Dict[str, Any]], namespace: Optional[str], neighbor_pages: int
+    ) -> str:
+        """Expand neighbors, start image prefetch and serialize the final results."""
+        if neighbor_pages > 0:
+            results = self._expand_neighbors(results, namespace, neighbor_pages)
+        self._prefetch_images(results)
+        return json.dumps(results, indent=2)
+
+    def _expand_neighbors(
+        self, results: List[Dict[str, Any]], namespace: Optional[str], neighbor_pages: int
+    ) -> List[Dict[str, Any]]:
+        """Widen each page hit to ``neighbor_pages`` pages on either side.
+
+        Windows are built in rank order; a hit whose window overlaps or
+        touches an earlier one of the same document is folded into it (listed
+        in ``merged_ids``), so no page appears twice. Missing neighbors are
+        fetched in a single batched ``fetch``, and each passage's ``context``
+        becomes the page texts in page order.
+        """
+        groups: List[Dict[str, Any]] = []
+        expanded: List[Dict[str, Any]] = []
+        for result in results:
+            ref = _page_ref(result)
+            if ref is None:
+                expanded.append(result)
+                continue
+            doc_source, index = ref
+            start, end = max(0, index - neighbor_pages), index + neighbor_pages
+            group = next(
+                (
+                    g
+                    for g in groups
+                    if g["doc_source"] == doc_source
+                    and start <= g["end"] + 1
+                    and g["start"] <= end + 1
+                ),
+                None,
+            )
+            if group is None:
+                group = {
+                    "doc_source": doc_source,
+                    "start": start,
+                    "end": end,
+                    "hits": {},
+                    "result": result,
+                }
+                groups.append(group)
+                expanded.append(result)
+            else:
+                group["start"], group["end"] = min(group["start"], start), max(group["end"], end)
+            group["hits"][index] = result
+
+        # Widened windows can now touch each other: fold them into the earlier one
+        merged = True
+        while merged:
+            merged = False
+            for i, first in enumerate(groups):
+                for second in groups[i + 1:]:
+                    if first["doc_source"] == second["doc_source"] and (
+                        second["start"] <= first["end"] + 1 and first["start"] <= second["end"] + 1
+                    ):
+                        first["start"] = min(first["start"], second["start"])
+                        first["end"] = max(first["end"], second["end"])
+                        first["hits"].update(second["hits"])
+                        groups.remove(second)
+                        expanded = [r for r in expanded if r is not second["result"]]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        missing = [
+            f"{group['doc_source']}_{index}"
+            for group in groups
+            for index in range(group["start"], group["end"] + 1)
+            if index not in group["hits"]
+        ]
+        fetched: Dict[str, Any] = {}
+        if missing:
+            span = get_metrics().span("upstash.fetch", vectors=len(missing))
+            with provider_slot("upstash"), span:
+                found = self._get_index().fetch(
+                    ids=missing, include_metadata=True, namespace=namespace or ""
+                )
+            fetched = {vector.id: vector for vector in found if vector is not None}
+
+        for group in groups:
+            passage, pages, merged_ids = [], [], []
+            for index in range(group["start"], group["end"] + 1):
+                hit = group["hits"].get(index)
+                if hit is not None:
+                    text = hit.get("context") or (hit.get("metadata") or {}).get("text", "")
+                    if hit is not group["result"]:
+                        merged_ids.append(hit["id"])
+                else:
+                    vector = fetched.get(f"{group['doc_source']}_{index}")
+                    if vector is None:
+                        continue
+                    text = (vector.metadata or {}).get("text", "")
+                pages.append(index + 1)
+                if text:
+                    passage.append(text)
+            result = group["result"]
+            result["context"] = "\n\n".join(passage)
+            result["passage_pages"] = pages
+            if merged_ids:
+                result["merged_ids"] = merged_ids
+        return expanded
+
+    def _prefetch_images(self, results: List[Dict[str, Any]]) -> None:
+        """Start preparing the images of these hits before the vision agent loads them.
+
+        Follows VISION_MODE: nothing is loaded in "cached" mode, and in "auto"
+        only images without a precomputed description are.
+        """
+        if not self.prefetch_images:
+            return
+        vision_mode = os.getenv("VISION_MODE", "auto")
+        if vision_mode == "cached":
+            return
+        paths = []
+        for item in results:
+            metadata = item.get("metadata") or {}
+            if not metadata.get("image_path"):
+                continue
+            if vision_mode == "auto" and metadata.get("image_description"):
+                continue
+            paths.append(metadata["image_path"])
+        if paths:
+            # Imported here: the vision stack is not needed for text-only searches
+            from ..vision.budgeted_image_tool import prefetch_images
+
+            prefetch_images(paths)
+
+    def _format_result(
+        self, result: Any, include_vectors: bool, include_data: bool
+    ) -> Dict[str, Any]:
+        """Convert an Upstash query result into the tool's JSON shape."""
+        formatted_result = {
+            "id": result.id,
+            "score": result.score,
+            "distance": 1 - result.score,  # Convert score to distance for compatibility
+            "context": "",  # Will be filled from metadata or data
+            "metadata": result.metadata or {},
+        }
+
+        # Add vector if requested
+        if include_vectors and hasattr(result, 'vector') and result.vector:
+            formatted_result["vector"] = result.vector
+
+        # Add data if available
+        if include_data and hasattr(result, 'data') and result.data:
+            formatted_result["data"] = result.data
+            # Use data as context if available
+            formatted_result["context"] = result.data
+
+        # Fallback to metadata text field for context
+        if not formatted_result["context"] and result.metadata:
+            formatted_result["context"] = result.metadata.get("text", "")
+
+        return formatted_result
+
+    def _rerank_candidates(self, query_vector: List[float], candidates: List[Any]) -> List[Any]:
+        """Apply MMR and the per-document cap to over-fetched vector results.
+
+        MMR needs candidate vectors; if any is missing the relevance order is kept.
+        """
+        if self.use_mmr and candidates and all(
+            getattr(result, "vector", None) for result in candidates
+        ):
+            order = maximal_marginal_relevance(
+                query_vector,
+                [result.vector for result in candidates],
+                lambda_mult=self.mmr_lambda,
+            )
+            candidates = [candidates[i] for i in order]
+
+        if self.max_per_doc:
+            candidates = cap_per_group(
+                candidates, lambda result: _doc_source_of(result.metadata), self.max_per_doc
+            )
+        return candidates
+
+    def _cap_formatted(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply the per-document cap to already formatted results."""
+        if not self.max_per_doc:
+            return results
+        return cap_per_group(
+            results, lambda item: _doc_source_of(item.get("metadata")), self.max_per_doc
+        )
+
+    def _fuse_hybrid(
+        self,
+        vector_results: List[Any],
+        lexical_hits: List[Dict[str, Any]],
+        include_vectors: bool,
+        include_data: bool,
+    ) -> List[Dict[str, Any]]:
+        """Merge vector and lexical hits with reciprocal rank fusion.
+
+        Vector hits below ``score_threshold`` only survive when BM25 also
+        matched them; lexical-only hits are kept since an exact term match
+        is evidence on its own.
+        """
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for result in vector_results:
+            by_id[result.id] = self._format_result(result, include_vectors, include_data)
+        for hit in lexical_hits:
+            if hit["id"] in by_id:
+                by_id[hit["id"]]["lexical_score"] = hit["lexical_score"]
+            else:
+                by_id[hit["id"]] = {
+                    **hit,
+                    "score": None,
+                    "distance": None,
+                }
+
+        fused = reciprocal_rank_fusion(
+            [[result.id for result in vector_results], [hit["id"] for hit in lexical_hits]],
+            k=self.rrf_k,
+        )
+
+        results = []
+        for item_id, fused_score in fused:
+            item = by_id[item_id]
+            vector_score = item.get("score")
+            if "lexical_score" not in item and (
+                vector_score is None or vector_score < self.score_threshold
+            ):
+                continue
+            item["fused_score"] = fused_score
+            results.append(item)
+        return results
+
     def _run(
         self, 
         query: str, 
@@ -178,9 +635,26 @@ class UpstashVectorSearchTool(BaseTool):
         include_vectors: bool = False,
         include_metadata: bool = True,
         include_data: bool = True,
-        filter: Optional[str] = None
+        filter: Optional[str] = None,
+        search_mode: Optional[str] = None,
+        neighbor_pages: Optional[int] = None
     ) -> str:
         """Execute vector similarity search on Upstash Vector.
+
+        In hybrid mode the lexical (BM25) and vector legs run concurrently and
+        are fused with reciprocal rank fusion. The local BM25 index covers the
+        default namespace only and cannot evaluate Upstash filter expressions:
+        with a ``filter`` or a namespace, hybrid mode falls back to vector-only
+        (logged at INFO) and lexical mode returns an error.
+
+        When ``use_mmr`` or ``max_per_doc`` is enabled, ``top_k * fetch_multiplier``
+        candidates are fetched; vector mode re-ranks them with MMR (using the
+        returned vectors), then caps hits per doc_source before ``score_threshold``
+        and truncation to ``top_k``.
+
+        With ``neighbor_pages`` > 0, each PDF page hit is widened to the
+        surrounding pages, fetched by ID in one batch; hits whose windows
+        overlap are merged into a single passage.
         
         Args:
             query: Search query to vectorize and match
@@ -190,6 +664,8 @@ class UpstashVectorSearchTool(BaseTool):
             include_metadata: Include metadata in response
             include_data: Include data field in response
             filter: Metadata filter string (e.g., 'category = "tech"')
+            search_mode: Override the default retrieval mode for this call
+            neighbor_pages: Override the default neighbor expansion for this call
             
         Returns:
             JSON string containing search results with metadata and scores
@@ -199,68 +675,93 @@ class UpstashVectorSearchTool(BaseTool):
             ValueError: If Upstash credentials are missing
             Exception: If search operation fails
         """
-        if not self._index:
-            raise ValueError("Upstash Vector client not initialized")
-        
+        mode = search_mode or self.search_mode
+        neighbors = self.neighbor_pages if neighbor_pages is None else neighbor_pages
+        # Near the usage budget, fewer results (and less context for the LLM)
+        top_k = current_degradation().top_k(top_k)
+        metrics = get_metrics()
+        start = time.perf_counter() if metrics.enabled else 0.0
         try:
-            # Use custom embedding function or default Voyage AI
-            if self.custom_embedding_fn:
-                vector = self.custom_embedding_fn(query)
-            else:
-                vector = embed_query(query)
-            
-            # Use provided namespace or default
-            search_namespace = namespace or self.namespace
-            
-            # Prepare query parameters according to Upstash SDK
-            query_params = {
-                "vector": vector,
-                "top_k": top_k,
-                "include_vectors": include_vectors,
-                "include_metadata": include_metadata,
-                "include_data": include_data
-            }
-            
-            # Add optional parameters
-            if search_namespace:
-                query_params["namespace"] = search_namespace
-            if filter:
-                query_params["filter"] = filter
-            
-            # Perform vector search using official Upstash SDK method
-            search_results = self._index.query(**query_params)
-            
-            # Format results for compatibility
-            results = []
-            for result in search_results:
-                # Apply score threshold filter
-                if result.score >= self.score_threshold:
-                    formatted_result = {
-                        "id": result.id,
-                        "score": result.score,
-                        "distance": 1 - result.score,  # Convert score to distance for compatibility
-                        "context": "",  # Will be filled from metadata or data
-                        "metadata": result.metadata or {},
-                    }
-                    
-                    # Add vector if requested
-                    if include_vectors and hasattr(result, 'vector') and result.vector:
-                        formatted_result["vector"] = result.vector
-                    
-                    # Add data if available
-                    if include_data and hasattr(result, 'data') and result.data:
-                        formatted_result["data"] = result.data
-                        # Use data as context if available
-                        formatted_result["context"] = result.data
-                    
-                    # Fallback to metadata text field for context
-                    if not formatted_result["context"] and result.metadata:
-                        formatted_result["context"] = result.metadata.get("text", "")
-                    
-                    results.append(formatted_result)
-            
-            return json.dumps(results, indent=2)
-            
+            output = self._search(
+                query, top_k, namespace, include_vectors, include_metadata,
+                include_data, filter, mode, neighbors
+            )
+            status = "ok"
         except Exception as e:
-            error_msg = f"Upstash Vector search failed: {str(e)}"
-            return json.dumps({"error": error_msg}, indent=2)
\ No newline at end of file
+            output = json.dumps({"error": f"Upstash Vector search failed: {str(e)}"}, indent=2)
+            status = "error"
+        if metrics.enabled:
+            metrics.observe("search_latency_seconds", time.perf_counter() - start, mode=mode)
+            metrics.inc("search_requests_total", mode=mode, status=status)
+        return output
+
+    def _search(
+        self,
+        query: str,
+        top_k: int,
+        namespace: Optional[str],
+        include_vectors: bool,
+        include_metadata: bool,
+        include_data: bool,
+        filter: Optional[str],
+        mode: str,
+        neighbor_pages: int = 0,
+    ) -> str:
+        """Run the search described in ``_run``; ``_run`` turns exceptions into JSON errors."""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Invalid search_mode '{mode}'")
+
+        # Use provided namespace or default
+        search_namespace = namespace or self.namespace
+        lexical_scope = bool(filter) or bool(search_namespace)
+        if mode == "lexical" and lexical_scope:
+            raise ValueError(
+                "lexical search_mode does not support filter or namespace; "
+                "use vector or hybrid mode"
+            )
+        if mode == "hybrid" and lexical_scope:
+            logger.info(
+                "Hybrid search with a filter or namespace (%r): BM25 leg skipped, vector-only",
+                search_namespace,
+            )
+            mode = "vector"
+
+        # Over-fetch when a re-ranking stage will discard or reorder candidates
+        rerank = self.use_mmr or bool(self.max_per_doc)
+        fetch_k = top_k * max(self.fetch_multiplier, 1) if rerank else top_k
+
+        if mode == "lexical":
+            results = self._lexical_search(query, fetch_k)
+            results = self._cap_formatted(results)[:top_k]
+            return self._finish(results, search_namespace, neighbor_pages)
+
+        if mode == "hybrid":
+            # Over-fetch both legs so fusion has candidates to reorder
+            fetch_k = max(fetch_k, top_k * 2, top_k + 5)
+            executor = _get_search_executor()
+            vector_future = executor.submit(
+                self._vector_search, query, fetch_k, search_namespace,
+                include_vectors, include_metadata, include_data, filter
+            )
+            lexical_future = executor.submit(self._lexical_search, query, fetch_k)
+            _, vector_results = vector_future.result()
+            results = self._fuse_hybrid(
+                vector_results, lexical_future.result(), include_vectors, include_data
+            )
+            results = self._cap_formatted(results)[:top_k]
+            return self._finish(results, search_namespace, neighbor_pages)
+
+        query_vector, search_results = self._vector_search(
+            query, fetch_k, search_namespace,
+            include_vectors or self.use_mmr, include_metadata, include_data, filter
+        )
+        candidates = self._rerank_candidates(query_vector, list(search_results))
+        
+        # Format results for compatibility
+        results = []
+        for result in candidates:
+            # Apply score threshold filter
+            if result.score >= self.score_threshold:
+                results.append(self._format_result(result, include_vectors, include_data))
+
+        return self._finish(results[:top_k], search_namespace, neighbor_pages)
@@ -0,0 +1,194 @@
+# src/services/vision/budgeted_image_tool.py
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, Optional
+
+from crewai.tools.agent_tools.add_image_tool import AddImageTool
+from pydantic import Field
+
+from ..metering import current_run
+from .image_prep import BASE_TOKENS, PreparedImage, default_images_dir, get_rendition_cache
+
+# Returned instead of an image once a budget-degraded run has used its image allowance
+IMAGE_LIMIT_MESSAGE = (
+    "Limite de imagens desta consulta atingido (orçamento de uso quase esgotado). "
+    "Continue a análise com as imagens já carregadas e os textos e descrições da busca."
+)
+
+
+@dataclass
+class ImageBudgetReport:
+    """Image tokens spent by one run, against what the untouched files would cost."""
+
+    run_budget: Optional[int] = None
+    images: int = 0
+    tokens_sent: int = 0
+    tokens_original: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_original - self.tokens_sent)
+
+    def budget_for_next(self, per_image_budget: int) -> int:
+        """Per-image budget, shrunk to what is left of the run budget."""
+        if self.run_budget is None:
+            return per_image_budget
+        with self._lock:
+            remaining = self.run_budget - self.tokens_sent
+        return max(BASE_TOKENS, min(per_image_budget, remaining))
+
+    def record(self, prepared: PreparedImage) -> None:
+        with self._lock:
+            self.images += 1
+            self.tokens_sent += prepared.tokens
+            self.tokens_original += prepared.original_tokens
+
+    def summary(self) -> str:
+        return (
+            f"🖼️ Imagens: {self.images} | tokens de imagem enviados: {self.tokens_sent} "
+            f"| economizados: {self.tokens_saved} (de {self.tokens_original})"
+        )
+
+
+_current_report: ContextVar[Optional[ImageBudgetReport]] = ContextVar(
+    "image_budget_report", default=None
+)
+
+
+@contextmanager
+def track_image_budget(run_budget: Optional[int] = None) -> Iterator[ImageBudgetReport]:
+    """Collect the image-token usage of every add_image call made inside the block.
+
+    The report is propagated with the context, so crews started with
+    ``kickoff_async`` (which runs in a worker thread) are counted too.
+    ``run_budget`` defaults to IMAGE_RUN_TOKEN_BUDGET (unset = no run limit).
+    """
+    if run_budget is None and os.getenv("IMAGE_RUN_TOKEN_BUDGET"):
+        run_budget = int(os.getenv("IMAGE_RUN_TOKEN_BUDGET"))
+    report = ImageBudgetReport(run_budget=run_budget)
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+
+
+def _default_token_budget() -> int:
+    return int(os.getenv("IMAGE_TOKEN_BUDGET", "425"))
+
+
+def _default_max_tiles() -> int:
+    return int(os.getenv("IMAGE_MAX_TILES", "2"))
+
+
+def _default_crop_margins() -> bool:
+    return os.getenv("IMAGE_CROP_MARGINS", "true").lower() == "true"
+
+
+def resolve_image_path(image_url: str, images_dir: Optional[str] = None) -> Optional[str]:
+    """Map an image reference to a local file, if there is one."""
+    if image_url.startswith(("http://", "https://", "data:")):
+        return None
+    path = image_url[len("file://") :] if image_url.startswith("file://") else image_url
+    if os.path.isfile(path):
+        return path
+    # Task prompts may carry paths from another checkout; fall back to the file name
+    candidate = os.path.join(images_dir or default_images_dir(), os.path.basename(path))
+    return candidate if os.path.isfile(candidate) else None
+
+
+def prefetch_images(image_urls: Iterable[str], images_dir: Optional[str] = None) -> int:
+    """Warm the shared rendition cache for images the vision agent is likely to load.
+
+    Uses the default tool settings (IMAGE_TOKEN_BUDGET, IMAGE_MAX_TILES,
+    IMAGE_CROP_MARGINS), so the renditions match what ``add_image`` asks for
+    unless a run budget has already shrunk the per-image budget. Returns the
+    number of images scheduled.
+    """
+    paths = [path for path in (resolve_image_path(url, images_dir) for url in image_urls) if path]
+    return get_rendition_cache().prefetch(
+        paths,
+        _default_token_budget(),
+        crop=_default_crop_margins(),
+        max_tiles=_default_max_tiles(),
+    )
+
+
+class BudgetedAddImageTool(AddImageTool):
+    """AddImageTool that sends budget-sized renditions instead of full page renders.
+
+    Local paths (or bare file names under the page images directory) are
+    margin-cropped, downscaled and, for tall pages, tiled so the estimated
+    image tokens stay under ``image_token_budget``; renditions come from a
+    shared LRU cache, often already warmed by ``prefetch_images``. Remote
+    and data URLs are passed through unchanged. The tool keeps the
+    ``add_image`` name, so the agent executor still attaches the result as
+    an image message. When the usage budget is nearly spent (see
+    services.metering), a run may load only a few images; further calls get
+    a text notice instead.
+    """
+
+    image_token_budget: int = Field(
+        default_factory=_default_token_budget,
+        description="Maximum estimated image tokens per loaded image",
+    )
+    max_tiles: int = Field(
+        default_factory=_default_max_tiles,
+        description="Maximum bands a tall or wide image is split into",
+    )
+    crop_margins: bool = Field(
+        default_factory=_default_crop_margins,
+        description="Trim uniform page margins before resizing",
+    )
+    images_dir: Optional[str] = Field(
+        default=None,
+        description=(
+            "Fallback directory for image names (defaults to LLAMA_IMAGES_DIR or pdf_images/)"
+        ),
+    )
+
+    def _resolve_path(self, image_url: str) -> Optional[str]:
+        """Map the agent's image reference to a local file, if there is one."""
+        return resolve_image_path(image_url, self.images_dir)
+
+    def _run(self, image_url: str, action: Optional[str] = None, **kwargs: Any) -> Any:
+        run = current_run()
+        max_images = run.degradation.max_images if run is not None else None
+        if max_images is not None and run.amounts.get("images", 0) >= max_images:
+            return IMAGE_LIMIT_MESSAGE
+
+        path = self._resolve_path(image_url)
+        if path is None:
+            if run is not None:
+                run.add(images=1)
+            return super()._run(image_url, action, **kwargs)
+
+        report = _current_report.get()
+        budget = (
+            report.budget_for_next(self.image_token_budget) if report else self.image_token_budget
+        )
+        prepared = get_rendition_cache().get(
+            path, budget, crop=self.crop_margins, max_tiles=self.max_tiles
+        )
+        if report is not None:
+            report.record(prepared)
+        if run is not None:
+            run.add(
+                images=1,
+                image_tokens=prepared.tokens,
+                image_pixels=sum(width * height for width, height in prepared.sizes),
+            )
+
+        message = super()._run(prepared.data_urls[0], action, **kwargs)
+        image_part = next(part for part in message["content"] if part.get("type") == "image_url")
+        image_part["image_url"]["detail"] = prepared.detail
+        # Further bands of a tiled page follow as extra image parts, top to bottom
+        for data_url in prepared.data_urls[1:]:
+            message["content"].append(
+                {"type": "image_url", "image_url": {"url": data_url, "detail": prepared.detail}}
+            )
+        return message
@@ -0,0 +1,325 @@
+# src/services/vision/image_prep.py
+import base64
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+# OpenAI-style image accounting: a fixed cost per image plus a cost per 512px tile
+# after the image is fit into 2048x2048 and its short side scaled to 768px.
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+TILE_SIZE = 512
+MAX_LONG_SIDE = 2048
+MAX_SHORT_SIDE = 768
+
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+
+def default_images_dir() -> str:
+    """Return the directory page renders are written to during ingestion."""
+    return os.getenv("LLAMA_IMAGES_DIR") or os.path.join(_REPO_ROOT, "pdf_images")
+
+
+def _provider_size(width: int, height: int) -> Tuple[int, int]:
+    """Size the provider actually bills for after its own downscaling."""
+    scale = min(1.0, MAX_LONG_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, MAX_SHORT_SIDE / min(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """Estimate the prompt tokens an image of the given size costs."""
+    if detail == "low":
+        return BASE_TOKENS
+    width, height = _provider_size(width, height)
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return BASE_TOKENS + TILE_TOKENS * tiles
+
+
+def fit_to_budget(width: int, height: int, budget: int) -> Tuple[int, int]:
+    """Largest size with the original aspect ratio whose estimated cost fits ``budget``.
+
+    Sizes already under budget are only reduced to what the provider would
+    bill anyway, so no detail is lost. Otherwise every tile grid the budget
+    pays for (1x2 and 2x1 at the default 425 tokens) is tried against both
+    dimensions and the one that keeps the image largest wins; a budget below
+    one tile returns a single-tile (low detail) rendition.
+    """
+    width, height = _provider_size(width, height)
+    if estimate_image_tokens(width, height) <= budget:
+        return width, height
+
+    max_tiles = max(1, (budget - BASE_TOKENS) // TILE_TOKENS)
+    columns, rows, scale = 1, 1, 0.0
+    for grid_columns in range(1, max_tiles + 1):
+        grid_rows = max_tiles // grid_columns
+        grid_scale = min(grid_columns * TILE_SIZE / width, grid_rows * TILE_SIZE / height)
+        if grid_scale > scale:
+            columns, rows, scale = grid_columns, grid_rows, grid_scale
+    # Rounding never pushes a side past its grid
+    return (
+        max(1, min(columns * TILE_SIZE, round(width * scale))),
+        max(1, min(rows * TILE_SIZE, round(height * scale))),
+    )
+
+
+def crop_margins(image: Image.Image, tolerance: int = 12, padding: int = 8) -> Image.Image:
+    """Trim uniform page margins (the colour of the top-left pixel), keeping a small padding."""
+    rgb = image.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    diff = ImageChops.difference(rgb, background).convert("L")
+    mask = diff.point(lambda value: 255 if value > tolerance else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop(
+        (
+            max(0, left - padding),
+            max(0, top - padding),
+            min(image.width, right + padding),
+            min(image.height, bottom + padding),
+        )
+    )
+
+
+def split_tiles(image: Image.Image, tiles: int) -> List[Image.Image]:
+    """Split an image into ``tiles`` bands along its long side (slightly overlapping)."""
+    if tiles <= 1:
+        return [image]
+    vertical = image.height >= image.width
+    length = image.height if vertical else image.width
+    step = length / tiles
+    overlap = int(step * 0.05)
+    bands = []
+    for i in range(tiles):
+        start = max(0, int(i * step) - overlap)
+        end = min(length, int((i + 1) * step) + overlap)
+        box = (0, start, image.width, end) if vertical else (start, 0, end, image.height)
+        bands.append(image.crop(box))
+    return bands
+
+
+def _encode(image: Image.Image, quality: int) -> str:
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+@dataclass
+class PreparedImage:
+    """Renditions of one image sent to the vision model, with their estimated cost."""
+
+    source: str
+    data_urls: List[str]
+    sizes: List[Tuple[int, int]]
+    tokens: int
+    original_tokens: int
+    detail: str = "high"
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.original_tokens - self.tokens)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the encoded renditions."""
+        return sum(len(data_url) for data_url in self.data_urls)
+
+
+def prepare_image(
+    path: str,
+    budget: int,
+    crop: bool = True,
+    max_tiles: int = 1,
+    quality: int = 85,
+) -> PreparedImage:
+    """Build the renditions of ``path`` that fit an image-token ``budget``.
+
+    Margins are cropped first. Tall or wide images (aspect ratio of 2 or
+    more) are split into up to ``max_tiles`` bands that share the budget,
+    which keeps text legible where a single downscaled page would not be.
+    A budget below one high-detail tile yields a single low-detail
+    rendition. ``original_tokens`` is what sending the untouched file would cost.
+    """
+    min_high = BASE_TOKENS + TILE_TOKENS
+    with Image.open(path) as source:
+        source.load()
+        image = source
+        original_tokens = estimate_image_tokens(*image.size)
+        if crop:
+            image = crop_margins(image)
+
+        detail = "high" if budget >= min_high else "low"
+        aspect = max(image.size) / max(1, min(image.size))
+        tiles = max(1, min(max_tiles, int(aspect), budget // min_high))
+
+        data_urls, sizes, tokens = [], [], 0
+        for band in split_tiles(image, tiles):
+            if detail == "low":
+                # Low detail is billed flat and seen at 512px at most
+                size = fit_to_budget(band.width, band.height, min_high)
+            else:
+                size = fit_to_budget(band.width, band.height, budget // tiles)
+            rendition = band.resize(size, Image.LANCZOS) if size != band.size else band
+            data_urls.append(_encode(rendition, quality))
+            sizes.append(size)
+            tokens += estimate_image_tokens(*size, detail=detail)
+
+    return PreparedImage(
+        source=path,
+        data_urls=data_urls,
+        sizes=sizes,
+        tokens=tokens,
+        original_tokens=original_tokens,
+        detail=detail,
+    )
+
+
+class RenditionCache:
+    """Thread-safe LRU of prepared renditions, bounded by encoded size.
+
+    Entries are keyed by path, modification time and preparation settings,
+    so a re-rendered page is never served stale. Concurrent requests for the
+    same key share one preparation, and ``prefetch`` prepares renditions on
+    background threads before anyone asks for them.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 2**20,
+        max_entries: Optional[int] = None,
+        prefetch_workers: int = 2,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.prefetch_workers = prefetch_workers
+        self._entries: "OrderedDict[tuple, PreparedImage]" = OrderedDict()
+        self._pending: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+    @staticmethod
+    def _key(path: str, budget: int, crop: bool, max_tiles: int) -> tuple:
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, budget, crop, max_tiles)
+
+    def get(self, path: str, budget: int, crop: bool = True, max_tiles: int = 1) -> PreparedImage:
+        """Return the rendition for ``path``, preparing it on a miss."""
+        key = self._key(path, budget, crop, max_tiles)
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prepared
+            pending = self._pending.get(key)
+            if pending is None:
+                self.misses += 1
+                pending = self._pending[key] = Future()
+                waiting = False
+            else:
+                # Already being prepared (usually by a prefetch): wait for it
+                self.hits += 1
+                waiting = True
+        if waiting:
+            return pending.result()
+
+        # Prepared outside the lock: resizing is the slow part
+        try:
+            prepared = prepare_image(path, budget, crop=crop, max_tiles=max_tiles)
+        except BaseException as exc:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.set_exception(exc)
+            raise
+        with self._lock:
+            self._pending.pop(key, None)
+            self._store(key, prepared)
+        pending.set_result(prepared)
+        return prepared
+
+    def _store(self, key: tuple, prepared: PreparedImage) -> None:
+        """Insert under the lock and evict least recently used entries past the bounds."""
+        if prepared.nbytes > self.max_bytes:
+            return
+        self._entries[key] = prepared
+        self.nbytes += prepared.nbytes
+        while self.nbytes > self.max_bytes or (
+            self.max_entries is not None and len(self._entries) > self.max_entries
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def prefetch(
+        self, paths: Iterable[str], budget: int, crop: bool = True, max_tiles: int = 1
+    ) -> int:
+        """Prepare renditions of ``paths`` in the background; returns how many were scheduled.
+
+        Best effort: missing files are skipped and preparation errors are left
+        for the eventual ``get`` to raise.
+        """
+        scheduled = 0
+        for path in paths:
+            try:
+                key = self._key(path, budget, crop, max_tiles)
+            except OSError:
+                continue
+            with self._lock:
+                if key in self._entries or key in self._pending:
+                    continue
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.prefetch_workers, thread_name_prefix="image-prefetch"
+                    )
+                self.prefetched += 1
+            self._executor.submit(self._prefetch_one, path, budget, crop, max_tiles)
+            scheduled += 1
+        return scheduled
+
+    def _prefetch_one(self, path: str, budget: int, crop: bool, max_tiles: int) -> None:
+        try:
+            self.get(path, budget, crop=crop, max_tiles=max_tiles)
+        except Exception:
+            pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+_default_cache: Optional[RenditionCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_rendition_cache() -> RenditionCache:
+    """Return the process-wide rendition cache.
+
+    Bounded by IMAGE_RENDITION_CACHE_BYTES (default 64 MiB of encoded
+    renditions) and, if set, IMAGE_RENDITION_CACHE_SIZE entries;
+    IMAGE_PREFETCH_WORKERS threads serve ``prefetch``.
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                max_entries = os.getenv("IMAGE_RENDITION_CACHE_SIZE")
+                _default_cache = RenditionCache(
+                    max_bytes=int(os.getenv("IMAGE_RENDITION_CACHE_BYTES", str(64 * 2**20))),
+                    max_entries=int(max_entries) if max_entries else None,
+                    prefetch_workers=int(os.getenv("IMAGE_PREFETCH_WORKERS", "2")),
+                )
+    return _default_cache
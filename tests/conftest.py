@@ -0,0 +1,72 @@
+# tests/conftest.py
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Mesmo layout dos scripts: pacotes de src/ e o pacote indexing/ importáveis
+sys.path.insert(0, os.path.join(_ROOT, "src"))
+sys.path.insert(0, _ROOT)
+
+
+@pytest.fixture
+def fake_crews(monkeypatch):
+    """
+    Troca a fábrica de crews do processo por uma com LLM local.
+
+    Cada chamada ao LLM gasta 100 tokens, espera `delay` segundos e já dá a
+    resposta final. Retorna o estado compartilhado (`calls`, `delay`).
+    """
+    from crewai import Agent, Crew, Task
+    from crewai.llms.base_llm import BaseLLM
+
+    import crew_factory
+
+    state = SimpleNamespace(calls=0, delay=0.0)
+    lock = threading.Lock()
+
+    class FakeLLM(BaseLLM):
+        def call(self, messages, *args, **kwargs):
+            with lock:
+                state.calls += 1
+            time.sleep(state.delay)
+            self._track_token_usage_internal(
+                {"prompt_tokens": 60, "completion_tokens": 40, "total_tokens": 100}
+            )
+            return "Thought: pronto\nFinal Answer: ok"
+
+    class FakeCrew:
+        """Mesma interface que a fábrica usa de `MultimodalAnalysisCrew`, com um LLM só."""
+
+        def __init__(self):
+            llm = FakeLLM(model="fake")
+            self._agents = {
+                name: Agent(
+                    role=name, goal="responder", backstory="teste", llm=llm, max_retry_limit=0
+                )
+                for name in crew_factory.AGENT_NAMES
+            }
+            self._tasks = {
+                name: Task(description=f"{name}: {{query}}", expected_output="ok", agent=agent)
+                for name, agent in zip(crew_factory.TASK_NAMES, self._agents.values())
+            }
+
+        def __getattr__(self, name):
+            if name in crew_factory.AGENT_NAMES:
+                return lambda: self._agents[name]
+            if name in crew_factory.TASK_NAMES:
+                return lambda: self._tasks[name]
+            raise AttributeError(name)
+
+        def crew(self):
+            return Crew(agents=list(self._agents.values()), tasks=list(self._tasks.values()))
+
+    monkeypatch.setattr(
+        crew_factory, "_default_factory", crew_factory.CrewFactory(crew_class=FakeCrew)
+    )
+    return state
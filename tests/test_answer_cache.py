@@ -0,0 +1,129 @@
+# tests/test_answer_cache.py
+import asyncio
+import json
+
+import pytest
+
+from answer_cache import SemanticAnswerCache
+
+
+def _embed(question):
+    # Embedding determinístico: perguntas sobre "preço" ficam próximas
+    return [1.0, 0.1] if "preço" in question else [0.0, 1.0]
+
+
+def test_store_appends_one_line_and_reloads(tmp_path):
+    path = str(tmp_path / "cache.jsonl")
+    cache = SemanticAnswerCache(embed_fn=_embed, threshold=0.9, path=path)
+    cache.store("Qual o preço?", "R$ 10", "v1")
+    cache.store("Quem é o autor?", "Fulano", "v1")
+
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["answer"] for line in f] == ["R$ 10", "Fulano"]
+
+    reloaded = SemanticAnswerCache(embed_fn=_embed, threshold=0.9, path=path)
+    assert reloaded.lookup("qual o preço", "v1").answer == "R$ 10"
+    assert reloaded.lookup("e o preço do item?", "v1").answer == "R$ 10"
+    assert not reloaded.lookup("Qual o preço?", "v2").hit
+
+
+def test_log_is_compacted_and_ignores_truncated_lines(tmp_path):
+    path = str(tmp_path / "cache.jsonl")
+    cache = SemanticAnswerCache(embed_fn=_embed, max_entries=2, path=path)
+    for i in range(5):
+        cache.store("Qual o preço?", f"R$ {i}", "v1")
+
+    with open(path, encoding="utf-8") as f:
+        lines = f.readlines()
+    assert len(lines) <= 4
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"question": "corta')
+
+    reloaded = SemanticAnswerCache(embed_fn=_embed, path=path)
+    assert reloaded.lookup("Qual o preço?", "v1").answer == "R$ 4"
+    assert reloaded.stats()["entries"] == 1
+
+
+def test_clear_empties_the_file(tmp_path):
+    path = str(tmp_path / "cache.jsonl")
+    cache = SemanticAnswerCache(embed_fn=_embed, path=path)
+    cache.store("Qual o preço?", "R$ 10", "v1")
+    cache.clear()
+    assert SemanticAnswerCache(embed_fn=_embed, path=path).stats()["entries"] == 0
+
+
+def test_similar_hit_keeps_the_matrix_and_store_updates_it(tmp_path):
+    cache = SemanticAnswerCache(embed_fn=_embed, threshold=0.9, max_entries=2)
+    cache.store("Qual o preço?", "R$ 10", "v1")
+    cache.store("Quem é o autor?", "Fulano", "v1")
+
+    assert cache.lookup("e o preço do item?", "v1").answer == "R$ 10"
+    matrix = cache._matrix
+    assert cache.lookup("preço final", "v1").answer == "R$ 10"
+    assert cache._matrix is matrix
+
+    # "Quem é o autor?" é a menos usada e sai; a linha dela sai da matriz
+    cache.store("Qual o preço hoje?", "R$ 12", "v2")
+    assert cache._matrix.shape[0] == 2
+    assert cache.lookup("e o preço do item?", "v2").answer == "R$ 12"
+    assert cache.lookup("Quem escreveu?", "v1").similarity < 0.9
+
+
+def test_hit_never_builds_the_crew(tmp_path, monkeypatch):
+    import answer_cache
+    import crew_factory
+    import main
+    from services.vector import quantized_index, sharding
+
+    def fail(*args, **kwargs):
+        raise AssertionError("a crew não deveria ser montada num acerto do cache")
+
+    monkeypatch.setattr(main, "_get_factory", fail)
+    monkeypatch.setattr(crew_factory, "get_crew_factory", fail)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("INDEX_VERSION", raising=False)
+    monkeypatch.setenv("VECTOR_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_VECTOR_INDEX_PATH", str(tmp_path / "vectors"))
+    monkeypatch.setenv("BM25_INDEX_PATH", str(tmp_path / "bm25.json"))
+    monkeypatch.setenv("INGEST_MANIFEST_DIR", str(tmp_path / "manifests"))
+    monkeypatch.setattr(sharding, "_index_cache", {})
+    monkeypatch.setattr(quantized_index, "_local_indexes", {})
+    monkeypatch.setattr(answer_cache, "_cached_version", None)
+    # Sem embed_fn: a pergunta idêntica é servida sem embedding
+    cache = SemanticAnswerCache()
+    monkeypatch.setattr(answer_cache, "_default_cache", cache)
+
+    version = answer_cache.current_index_version()
+    assert version.startswith("vectors:0|")
+    cache.store("Resuma o Documento 1", "Resumo", version, embedding=[1.0, 0.0])
+
+    assert main.run("Resuma o Documento 1").raw == "Resumo"
+    assert asyncio.run(main.run_async("resuma o documento 1")).raw == "Resumo"
+    assert cache.stats()["hits"] == 2
+
+
+def test_question_embedding_is_recorded_and_replayed(tmp_path, monkeypatch):
+    import answer_cache
+    import replay
+    from services.embeddings import providers
+
+    calls = []
+
+    class FakeProvider:
+        kind = "fake"
+        model_id = "fake-1"
+
+        def embed_query(self, text):
+            calls.append(text)
+            return [1.0, 0.0]
+
+    monkeypatch.setattr(providers, "_provider", FakeProvider())
+    monkeypatch.setattr(replay, "_store", replay.ReplayStore("record", str(tmp_path)))
+    assert answer_cache.embed_question("pergunta") == [1.0, 0.0]
+
+    # Em replay a pergunta gravada não chama o provedor; a não gravada falha
+    monkeypatch.setattr(replay, "_store", replay.ReplayStore("replay", str(tmp_path)))
+    assert answer_cache.embed_question("pergunta") == [1.0, 0.0]
+    assert calls == ["pergunta"]
+    with pytest.raises(replay.ReplayMissError):
+        answer_cache.embed_question("outra")
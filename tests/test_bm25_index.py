@@ -0,0 +1,21 @@
+# tests/test_bm25_index.py
+import os
+
+from services.vector.bm25_index import BM25Index
+
+
+def test_reader_sees_a_write_made_in_the_same_mtime_tick(tmp_path):
+    path = str(tmp_path / "bm25.json")
+    writer = BM25Index(path=path)
+    writer.update_document("doc1", [{"id": "doc1_0", "text": "tabela de preços"}])
+
+    reader = BM25Index(path=path)
+    reader.reload_if_changed()
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    writer.update_document("doc2", [{"id": "doc2_0", "text": "manual de instalação"}])
+    # Sistemas de arquivos com resolução grosseira: a escrita cai no mesmo tick
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    reader.reload_if_changed()
+    assert [vector_id for vector_id, _ in reader.search("instalação")] == ["doc2_0"]
@@ -0,0 +1,33 @@
+# tests/test_crew.py
+import pytest
+
+from crew import MultimodalAnalysisCrew
+from retrieval import NO_PREFETCH_MESSAGE
+
+
+@pytest.fixture
+def crew(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("UPSTASH_VECTOR_REST_URL", "http://upstash.invalid")
+    monkeypatch.setenv("UPSTASH_VECTOR_REST_TOKEN", "token")
+    return MultimodalAnalysisCrew().crew()
+
+
+def _before_kickoff(crew, inputs):
+    for callback in crew.before_kickoff_callbacks:
+        inputs = callback(inputs)
+    return inputs
+
+
+def test_kickoff_with_only_the_query_fills_the_other_placeholders(crew):
+    inputs = _before_kickoff(crew, {"query": "Resuma o Documento 1"})
+    crew._interpolate_inputs(inputs)  # KeyError se faltar algum placeholder
+
+    visual_task = crew.tasks[1].description
+    assert NO_PREFETCH_MESSAGE in visual_task
+    assert "{visual_instructions}" not in visual_task
+
+
+def test_inputs_from_build_inputs_are_kept(crew):
+    inputs = {"query": "q", "prefetched_context": "contexto", "visual_instructions": "olhe"}
+    assert _before_kickoff(crew, dict(inputs)) == inputs
@@ -0,0 +1,32 @@
+# tests/test_embedding_providers.py
+import pytest
+
+from services.embeddings.providers import (
+    LEGACY_MODEL,
+    METADATA_FIELD,
+    ensure_index_model,
+    index_embedding_model,
+)
+from services.vector.sharding import InMemoryIndex, ShardedIndex
+
+
+def test_index_model_of_empty_index_is_none():
+    shards = [InMemoryIndex(f"shard-{i}") for i in range(2)]
+    assert index_embedding_model(ShardedIndex(shards)) is None
+
+
+def test_index_model_scans_past_empty_shards():
+    shards = [InMemoryIndex(f"shard-{i}") for i in range(3)]
+    shards[2].upsert(vectors=[("doc_0", [1.0, 0.0], {METADATA_FIELD: "onnx:bge-small"})])
+
+    assert index_embedding_model(ShardedIndex(shards)) == "onnx:bge-small"
+
+
+def test_vectors_without_model_field_are_legacy():
+    index = InMemoryIndex()
+    index.upsert(vectors=[("doc_0", [1.0, 0.0], {"doc_source": "doc"})])
+
+    assert index_embedding_model(index) == LEGACY_MODEL
+    ensure_index_model(index, LEGACY_MODEL)
+    with pytest.raises(ValueError):
+        ensure_index_model(index, "onnx:bge-small")
@@ -0,0 +1,45 @@
+# tests/test_image_prep.py
+from crewai.tools.agent_tools.add_image_tool import AddImageTool
+from PIL import Image
+
+from services.vision.budgeted_image_tool import BudgetedAddImageTool
+from services.vision.image_prep import estimate_image_tokens, fit_to_budget
+
+
+def test_two_tile_page_survives_the_default_budget():
+    # Página carta a 150 dpi: 768x993 depois do redimensionamento do provedor (4 tiles)
+    width, height = fit_to_budget(1275, 1650, 425)
+    assert (width, height) == (512, 663)
+    assert estimate_image_tokens(width, height) == 425
+
+    # Deitada, a grade 2x1 vence
+    assert fit_to_budget(1650, 1275, 425) == (663, 512)
+
+
+def test_budget_below_one_tile_returns_a_single_tile():
+    width, height = fit_to_budget(1275, 1650, 200)
+    assert max(width, height) == 512
+    assert estimate_image_tokens(width, height) == 255
+
+
+def test_detail_goes_on_the_image_part_wherever_it_is(tmp_path, monkeypatch):
+    path = tmp_path / "doc_page_1.jpg"
+    Image.new("RGB", (600, 1800), "white").save(path)
+
+    def image_first(self, image_url, action=None, **kwargs):
+        return {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": image_url}},
+                {"type": "text", "text": action},
+            ],
+        }
+
+    monkeypatch.setattr(AddImageTool, "_run", image_first)
+    tool = BudgetedAddImageTool(image_token_budget=1000, max_tiles=2, crop_margins=False)
+    message = tool._run(str(path), "descreva")
+
+    images = [part for part in message["content"] if part["type"] == "image_url"]
+    assert len(images) == 2
+    assert all(part["image_url"]["detail"] == "high" for part in images)
+    assert message["content"][1] == {"type": "text", "text": "descreva"}
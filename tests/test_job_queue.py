@@ -0,0 +1,116 @@
+# tests/test_job_queue.py
+import time
+
+import pytest
+
+from indexing.job_queue import (
+    DEAD,
+    DONE,
+    LEASED,
+    PENDING,
+    InMemoryJobQueue,
+    SQLiteJobQueue,
+    open_queue,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def queue(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryJobQueue()
+    return SQLiteJobQueue(str(tmp_path / "queue.db"))
+
+
+def test_enqueue_deduplicates_active_jobs(queue):
+    first = queue.enqueue("https://x/a.pdf", "a")
+    assert queue.enqueue("https://x/a.pdf", "a") == first
+    assert queue.enqueue("https://x/b.pdf", "b") != first
+    assert queue.stats()[PENDING] == 2
+
+
+def test_claim_leases_oldest_job_once(queue):
+    first = queue.enqueue("https://x/a.pdf", "a")
+    queue.enqueue("https://x/b.pdf", "b")
+
+    job = queue.claim("w1", lease_seconds=60)
+    assert job.id == first
+    assert job.status == LEASED and job.lease_owner == "w1" and job.attempts == 1
+
+    other = queue.claim("w2", lease_seconds=60)
+    assert other.id != first
+    assert queue.claim("w3", lease_seconds=60) is None
+
+
+def test_complete_requires_lease_owner(queue):
+    job_id = queue.enqueue("https://x/a.pdf", "a")
+    queue.claim("w1", lease_seconds=60)
+
+    assert not queue.complete(job_id, "w2", {"ok": True})
+    assert queue.heartbeat(job_id, "w1", lease_seconds=60)
+    assert queue.complete(job_id, "w1", {"ok": True})
+
+    job = queue.get(job_id)
+    assert job.status == DONE and job.result == {"ok": True}
+    assert not queue.heartbeat(job_id, "w1", lease_seconds=60)
+
+
+def test_expired_lease_is_reclaimed_by_another_worker(queue):
+    job_id = queue.enqueue("https://x/a.pdf", "a")
+    queue.claim("w1", lease_seconds=0.01)
+    time.sleep(0.05)
+
+    job = queue.claim("w2", lease_seconds=60)
+    assert job.id == job_id and job.lease_owner == "w2" and job.attempts == 2
+    # O worker antigo perdeu o lease e não consegue concluir nem falhar
+    assert not queue.complete(job_id, "w1")
+    assert not queue.fail(job_id, "w1", "atrasado")
+    assert queue.complete(job_id, "w2")
+
+
+def test_expired_lease_without_attempts_left_goes_dead(queue):
+    job_id = queue.enqueue("https://x/a.pdf", "a", max_attempts=1)
+    queue.claim("w1", lease_seconds=0.01)
+    time.sleep(0.05)
+
+    assert queue.claim("w2", lease_seconds=60) is None
+    assert queue.get(job_id).status == DEAD
+
+
+def test_fail_retries_with_delay_then_goes_dead(queue):
+    job_id = queue.enqueue("https://x/a.pdf", "a", max_attempts=2)
+
+    queue.claim("w1", lease_seconds=60)
+    assert queue.fail(job_id, "w1", "erro 1", delay=0.05)
+    job = queue.get(job_id)
+    assert job.status == PENDING and job.last_error == "erro 1"
+    # Ainda no backoff
+    assert queue.claim("w1", lease_seconds=60) is None
+
+    time.sleep(0.1)
+    assert queue.claim("w1", lease_seconds=60).attempts == 2
+    assert queue.fail(job_id, "w1", "erro 2", delay=0)
+    assert queue.get(job_id).status == DEAD
+    assert queue.stats()[DEAD] == 1
+
+
+def test_requeue_dead_resets_attempts(queue):
+    job_id = queue.enqueue("https://x/a.pdf", "a", max_attempts=1)
+    queue.claim("w1", lease_seconds=60)
+    queue.fail(job_id, "w1", "erro", delay=0)
+
+    assert queue.requeue_dead() == 1
+    job = queue.get(job_id)
+    assert job.status == PENDING and job.attempts == 0
+    assert queue.claim("w1", lease_seconds=60).id == job_id
+    assert queue.requeue_dead() == 0
+
+
+def test_sqlite_queue_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "queue.db")
+    producer = open_queue(f"sqlite:///{path}")
+    consumer = open_queue(f"sqlite:///{path}")
+
+    job_id = producer.enqueue("https://x/a.pdf", "a")
+    assert consumer.claim("w1", lease_seconds=60).id == job_id
+    assert consumer.complete(job_id, "w1")
+    assert producer.get(job_id).status == DONE
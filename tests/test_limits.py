@@ -0,0 +1,25 @@
+# tests/test_limits.py
+import pytest
+
+from services import limits
+
+
+@pytest.fixture(autouse=True)
+def fresh_semaphores(monkeypatch):
+    monkeypatch.setattr(limits, "_semaphores", {})
+
+
+def test_providers_are_limited_by_default(monkeypatch):
+    monkeypatch.delenv("VOYAGE_MAX_CONCURRENCY", raising=False)
+    monkeypatch.delenv("UPSTASH_MAX_CONCURRENCY", raising=False)
+    for provider, default in limits.PROVIDER_DEFAULT_LIMITS.items():
+        assert default > 0
+        assert limits._get_semaphore(provider)._initial_value == default
+    assert limits._get_semaphore("onnx") is None
+
+
+def test_zero_disables_the_limit(monkeypatch):
+    monkeypatch.setenv("VOYAGE_MAX_CONCURRENCY", "0")
+    assert limits._get_semaphore("voyage") is None
+    with limits.provider_slot("voyage"):
+        pass
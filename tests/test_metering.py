@@ -0,0 +1,58 @@
+# tests/test_metering.py
+import asyncio
+import os
+
+from services import metering
+from services.metering import UsageMeter, metering_enabled
+
+
+def test_ledger_is_written_only_when_enabled(monkeypatch):
+    monkeypatch.delenv("USAGE_BUDGETS", raising=False)
+    monkeypatch.delenv("USAGE_METERING", raising=False)
+    assert not metering_enabled()
+    assert metering_enabled({"llm_tokens": 10})
+    monkeypatch.setenv("USAGE_METERING", "true")
+    assert metering_enabled()
+
+
+def test_ledger_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "usage.jsonl")
+    writer = UsageMeter(budgets={"llm_tokens": 100}, path=path)
+    reader = UsageMeter(budgets={"llm_tokens": 100}, path=path)
+
+    writer.record(tenant="t", query="q", llm_tokens=85)
+    assert reader.tenant_usage("t") == {"llm_tokens": 85.0}
+    assert reader.degradation("t").level == "reduced"
+
+
+def test_ledger_rotates_per_period(tmp_path, monkeypatch):
+    path = str(tmp_path / "usage.jsonl")
+    now = [1000.0]
+    monkeypatch.setattr(metering.time, "time", lambda: now[0])
+    meter = UsageMeter(period=100, path=path)
+
+    meter.record(tenant="t", document="a.pdf", parse_pages=3)
+    now[0] = 1100.0
+    meter.record(tenant="t", document="a.pdf", parse_pages=2)
+
+    assert sorted(os.listdir(tmp_path)) == ["usage-10.jsonl", "usage-11.jsonl"]
+    assert meter.tenant_usage("t") == {"parse_pages": 2.0}
+    assert meter.document_usage("a.pdf") == {"parse_pages": 2.0}
+    # Um processo novo relê só o período atual
+    assert UsageMeter(period=100, path=path).tenant_usage("t") == {"parse_pages": 2.0}
+
+
+def test_each_query_is_charged_only_for_its_own_tokens(tmp_path, monkeypatch, fake_crews):
+    import main
+
+    monkeypatch.chdir(tmp_path)
+    meter = UsageMeter(budgets={"llm_tokens": 10_000})
+    monkeypatch.setattr(metering, "_meter", meter)
+
+    asyncio.run(main.run_async("primeira", use_cache=False))
+    asyncio.run(main.run_async("segunda", use_cache=False))
+
+    # Três agentes, uma chamada de 100 tokens cada, por consulta
+    assert meter.query_usage("primeira") == {"llm_tokens": 300.0}
+    assert meter.query_usage("segunda") == {"llm_tokens": 300.0}
+    assert meter.tenant_usage() == {"llm_tokens": 600.0}
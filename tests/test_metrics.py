@@ -0,0 +1,38 @@
+# tests/test_metrics.py
+import os
+
+from services.metrics import MetricsRegistry
+
+
+def test_flush_writes_one_file_per_process(tmp_path):
+    registry = MetricsRegistry(enabled=True, path=str(tmp_path / "metrics.prom"))
+    registry.flush()
+    assert os.listdir(tmp_path) == []  # nada coletado, nada gravado
+
+    registry.inc("search_requests_total", mode="hybrid")
+    registry.flush()
+
+    path = tmp_path / f"metrics-{os.getpid()}.prom"
+    assert registry.output_path() == str(path)
+    assert f'search_requests_total{{pid="{os.getpid()}",mode="hybrid"}} 1' in path.read_text()
+
+
+def test_single_file_without_per_process(tmp_path):
+    registry = MetricsRegistry(enabled=True, path=str(tmp_path / "m.prom"), per_process=False)
+    registry.observe("search_latency_seconds", 0.02, mode="vector")
+    registry.flush()
+
+    text = (tmp_path / "m.prom").read_text()
+    assert 'search_latency_seconds_count{mode="vector"} 1' in text
+    assert "pid=" not in text
+
+
+def test_periodic_flush(tmp_path):
+    registry = MetricsRegistry(enabled=True, path=str(tmp_path / "m.prom"), flush_interval=0.01)
+    registry.inc("ingest_pages_total", 3)
+    registry.start_periodic_flush()
+    try:
+        registry._flusher.join(0.2)
+        assert os.path.exists(registry.output_path())
+    finally:
+        registry.stop_periodic_flush()
@@ -0,0 +1,223 @@
+# tests/test_process_pdf.py
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from indexing import process_pdf
+from indexing.process_pdf import PDFProcessor
+
+
+def _pdf_bytes(colors):
+    # Uma página por cor: páginas diferentes têm impressões digitais diferentes
+    pages = [Image.new("RGB", (200, 200), color) for color in colors]
+    buffer = io.BytesIO()
+    pages[0].save(buffer, format="PDF", save_all=True, append_images=pages[1:])
+    return buffer.getvalue()
+
+
+class _Unseekable(io.RawIOBase):
+    """Arquivo que só pode ser lido uma vez, como um pipe"""
+
+    def __init__(self, data):
+        self._buffer = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._buffer.readinto(b)
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    for name, folder in [
+        ("LLAMA_IMAGES_DIR", "images"),
+        ("LLAMA_PAYLOAD_DIR", "payloads"),
+        ("VOYAGE_EMBEDDINGS_DIR", "embeddings"),
+        ("VISION_DESCRIPTIONS_DIR", "descriptions"),
+        ("INGEST_MANIFEST_DIR", "manifests"),
+    ]:
+        monkeypatch.setenv(name, str(tmp_path / folder))
+    monkeypatch.setenv("BM25_INDEX_PATH", str(tmp_path / "bm25.json"))
+    monkeypatch.setenv("LLAMA_VERBOSE", "false")
+    monkeypatch.setenv("PARSER_BACKEND", "local")
+    monkeypatch.setattr(process_pdf.tempfile, "tempdir", str(tmp_path))
+    return PDFProcessor(embedding_provider=object())
+
+
+def test_unseekable_source_is_parsed_from_a_temp_file(processor, tmp_path):
+    result = processor.process_llama(_Unseekable(_pdf_bytes(["red", "green", "blue"])), "doc")
+
+    assert result["parser"] == "local"
+    assert result["page_numbers"] == [1, 2, 3]
+    with open(result["payload_path"], encoding="utf-8") as f:
+        assert len(json.load(f)["page_fingerprints"]["pages"]) == 3
+    # A cópia em disco é apagada ao fim da ingestão
+    assert not list(tmp_path.glob("*.pdf"))
+
+
+def test_url_is_streamed_to_disk_in_chunks(processor, tmp_path):
+    data = _pdf_bytes(["red", "green"])
+
+    class Response:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            return (data[i : i + 1000] for i in range(0, len(data), 1000))
+
+    requested = []
+
+    class Session:
+        def get(self, url, **kwargs):
+            requested.append(kwargs)
+            return Response()
+
+    processor.http = Session()
+    result = processor.process_llama("https://example.com/doc.pdf")
+
+    assert requested[0]["stream"] is True
+    assert result["pdf_name"] == "doc"
+    assert result["page_numbers"] == [1, 2]
+    assert not list(tmp_path.glob("*.pdf"))
+
+
+def _write_payload(processor, name, images):
+    inputs = [
+        {
+            "content": [
+                {"type": "text", "text": f"página {page}"},
+                {"type": "image_base64", "image_base64": image},
+            ]
+        }
+        for page, image in enumerate(images, start=1)
+    ]
+    payload = {"inputs": inputs, "page_numbers": list(range(1, len(images) + 1))}
+    with open(f"{processor.llama_config.payload_dir}/{name}.json", "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+
+
+class _Describer:
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def __call__(self, image_url):
+        self.calls.append(image_url)
+        if image_url in self.fail:
+            raise RuntimeError("modelo indisponível")
+        return {"description": f"descrição de {image_url}", "ocr": ""}
+
+
+def test_vision_describes_each_image_once(processor):
+    processor.image_describer = describer = _Describer()
+    _write_payload(processor, "doc", ["data:a", "data:b", "data:a"])
+
+    result = processor.process_vision("doc")
+
+    assert sorted(describer.calls) == ["data:a", "data:b"]
+    assert result["total_described"] == 2
+    with open(result["output_file"], encoding="utf-8") as f:
+        pages = json.load(f)["pages"]
+    assert pages["1"] == pages["3"]
+    assert pages["2"]["description"] == "descrição de data:b"
+
+
+def test_vision_rerun_reuses_descriptions_by_sha256(processor):
+    processor.image_describer = describer = _Describer()
+    _write_payload(processor, "doc", ["data:a", "data:b"])
+    processor.process_vision("doc")
+
+    # Página nova no início: as imagens antigas mudam de posição, mas o hash é o mesmo
+    _write_payload(processor, "doc", ["data:c", "data:a", "data:b"])
+    describer.calls.clear()
+    result = processor.process_vision("doc")
+
+    assert describer.calls == ["data:c"]
+    assert (result["total_described"], result["total_reused"]) == (1, 2)
+
+
+def test_vision_records_errors_without_aborting(processor):
+    processor.image_describer = describer = _Describer(fail={"data:b"})
+    _write_payload(processor, "doc", ["data:a", "data:b", "data:c"])
+
+    result = processor.process_vision("doc")
+
+    assert sorted(describer.calls) == ["data:a", "data:b", "data:c"]
+    assert result["errors"] == {"2": "modelo indisponível"}
+    assert result["total_described"] == 2
+    with open(result["output_file"], encoding="utf-8") as f:
+        assert sorted(json.load(f)["pages"]) == ["1", "3"]
+
+    # A imagem que falhou é tentada de novo na próxima execução
+    processor.image_describer = retry = _Describer()
+    assert processor.process_vision("doc")["total_described"] == 1
+    assert retry.calls == ["data:b"]
+
+
+class _Response:
+    def __init__(self, payload):
+        self.status_code = 200
+        self.text = json.dumps(payload)
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+class _FakeLlamaParse:
+    """Sessão HTTP que responde como a LlamaParse, com a numeração escolhida pelo teste"""
+
+    def __init__(self):
+        self.uploads = []
+        self.result_pages = []
+
+    def post(self, url, data=None, **kwargs):
+        self.uploads.append(data.read() if hasattr(data, "read") else data)
+        return _Response({"id": "job-1"})
+
+    def get(self, url, **kwargs):
+        if url.endswith("/result/json"):
+            pages = [{"page": page, "md": text, "images": []} for page, text in self.result_pages]
+            return _Response({"pages": pages})
+        return _Response({"status": "SUCCESS"})
+
+
+@pytest.mark.parametrize("numbering", ["document", "relative"])
+def test_partial_reparse_of_non_contiguous_pages(processor, tmp_path, numbering):
+    processor.parser_config.backend = "llama"
+    processor.http = llama = _FakeLlamaParse()
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(_pdf_bytes(["red", "green", "blue", "white", "black"]))
+    llama.result_pages = [(page, f"página {page}") for page in range(1, 6)]
+    processor.process_llama(str(path))
+
+    # Páginas 2 e 4 mudam; a LlamaParse recebe só essas (0-based em target_pages)
+    path.write_bytes(_pdf_bytes(["red", "yellow", "blue", "gray", "black"]))
+    numbers = [2, 4] if numbering == "document" else [1, 2]
+    llama.result_pages = [(numbers[0], "nova página 2"), (numbers[1], "nova página 4")]
+    result = processor.process_llama(str(path))
+
+    assert b'name="target_pages"\r\n\r\n1,3\r\n' in llama.uploads[-1]
+    assert result["update"] == {"mode": "partial", "parsed_pages": [2, 4], "reused_pages": 3}
+    texts = [entry["content"][0]["text"] for entry in result["voyage_inputs"]]
+    assert texts == ["página 1", "nova página 2", "página 3", "nova página 4", "página 5"]
+
+
+def test_target_page_numbers_are_checked_against_the_request():
+    # Página sem conteúdo omitida: a posição, não a ordem de chegada, decide
+    assert PDFProcessor._target_page_numbers([1, 3], [6, 2, 4]) == [2, 6]
+    assert PDFProcessor._target_page_numbers([4, 6], [2, 4, 6]) == [4, 6]
+    with pytest.raises(ValueError):
+        PDFProcessor._target_page_numbers([3, 7], [2, 4])
@@ -0,0 +1,83 @@
+# tests/test_quantized_index.py
+import numpy as np
+import pytest
+
+from services.vector.quantized_index import QuantizedIndex
+from services.vector.sharding import InMemoryIndex
+
+DIMENSION = 128
+CORPUS = 2000
+QUERIES = 20
+TOP_K = 10
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(42)
+    # Embeddings reais se agrupam por tema: centros + ruído, não ruído puro
+    centers = rng.normal(size=(40, DIMENSION))
+    vectors = centers[rng.integers(0, len(centers), CORPUS)] + rng.normal(
+        scale=0.6, size=(CORPUS, DIMENSION)
+    )
+    queries = centers[rng.integers(0, len(centers), QUERIES)] + rng.normal(
+        scale=0.6, size=(QUERIES, DIMENSION)
+    )
+    items = [
+        {
+            "id": f"doc-{i % 50}_{i}",
+            "vector": vector.tolist(),
+            "metadata": {"doc_source": f"doc-{i % 50}"},
+        }
+        for i, vector in enumerate(vectors)
+    ]
+    return items, queries
+
+
+def _recall(index, reference, queries):
+    hits = 0
+    for query in queries:
+        expected = {item.id for item in reference.query(query.tolist(), top_k=TOP_K)}
+        found = {item.id for item in index.query(query.tolist(), top_k=TOP_K)}
+        hits += len(expected & found)
+    return hits / (TOP_K * len(queries))
+
+
+@pytest.mark.parametrize("quantization, minimum", [("int8", 0.98), ("binary", 0.9)])
+def test_recall_against_exact_search(tmp_path, corpus, quantization, minimum):
+    items, queries = corpus
+    reference = InMemoryIndex()
+    reference.upsert(vectors=items)
+    index = QuantizedIndex(str(tmp_path), quantization=quantization)
+    for i in range(0, len(items), 500):
+        index.upsert(vectors=items[i : i + 500])
+
+    assert _recall(index, reference, queries) >= minimum
+
+
+def test_rescoring_orders_by_exact_score(tmp_path, corpus):
+    items, queries = corpus
+    reference = InMemoryIndex()
+    reference.upsert(vectors=items)
+    index = QuantizedIndex(str(tmp_path), quantization="binary")
+    index.upsert(vectors=items)
+
+    found = index.query(queries[0].tolist(), top_k=TOP_K)
+    scores = [item.score for item in found]
+    assert scores == sorted(scores, reverse=True)
+    exact = {item.id: item.score for item in reference.query(queries[0].tolist(), top_k=CORPUS)}
+    assert all(item.score == pytest.approx(exact[item.id], abs=1e-4) for item in found)
+
+
+def test_reopen_keeps_vectors_and_settings(tmp_path, corpus):
+    items, queries = corpus
+    index = QuantizedIndex(str(tmp_path), quantization="int8")
+    index.upsert(vectors=items[:100])
+    index.delete(ids=[items[0]["id"], "missing"])
+
+    reopened = QuantizedIndex(str(tmp_path))
+    assert reopened.quantization == "int8"
+    assert reopened.info().vector_count == 99
+    query = queries[0].tolist()
+    assert [r.id for r in reopened.query(query, top_k=5)] == [
+        r.id for r in index.query(query, top_k=5)
+    ]
@@ -0,0 +1,18 @@
+# tests/test_retrieval.py
+import pytest
+
+from retrieval import visual_instructions
+from services.vision.budgeted_image_tool import BudgetedAddImageTool
+
+
+@pytest.mark.parametrize("mode", ["live", "cached", "auto"])
+def test_visual_instructions_name_the_registered_image_tool(mode):
+    text = visual_instructions(mode)
+    assert f'"{BudgetedAddImageTool().name}"' in text
+    assert "AddImageTool" not in text
+
+
+def test_default_image_budget_is_below_a_full_page(monkeypatch):
+    monkeypatch.delenv("IMAGE_TOKEN_BUDGET", raising=False)
+    # Uma página carta inteira em alta resolução custa 765 tokens
+    assert BudgetedAddImageTool().image_token_budget < 765
@@ -0,0 +1,120 @@
+# tests/test_scheduler.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import STATUS_CANCELLED, STATUS_OK, STATUS_TIMEOUT, QueryScheduler
+from services import limits, metering
+from services.metering import UsageMeter
+
+
+class _SlowRunner:
+    """Runner que só termina se não for cancelado antes de `seconds`."""
+
+    def __init__(self, seconds: float = 10.0):
+        self.seconds = seconds
+        self.started = asyncio.Event()
+        self.cancelled = 0
+
+    async def __call__(self, question):
+        self.started.set()
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return question
+
+
+def test_timeout_cancels_the_running_query():
+    async def scenario():
+        runner = _SlowRunner()
+        scheduler = QueryScheduler(runner=runner, max_concurrency=1, default_timeout=0.05)
+        scheduler.submit("q")
+        outcomes = [outcome async for outcome in scheduler.as_completed()]
+        await scheduler.close()
+        return runner, outcomes
+
+    runner, outcomes = asyncio.run(scenario())
+    assert [outcome.status for outcome in outcomes] == [STATUS_TIMEOUT]
+    assert runner.cancelled == 1
+
+
+def test_cancel_and_close_cancel_the_running_query():
+    async def scenario():
+        runner = _SlowRunner()
+        scheduler = QueryScheduler(runner=runner, max_concurrency=1)
+        query_id = scheduler.submit("q")
+        await runner.started.wait()
+        assert scheduler.cancel(query_id)
+        outcome = await scheduler.as_completed().__anext__()
+
+        closing = _SlowRunner()
+        scheduler._runner = closing
+        scheduler.submit("r")
+        await closing.started.wait()
+        await scheduler.close()
+        return outcome, runner, closing
+
+    outcome, runner, closing = asyncio.run(scenario())
+    assert outcome.status == STATUS_CANCELLED
+    assert runner.cancelled == 1
+    assert closing.cancelled == 1
+
+
+def test_provider_limits_apply_only_to_the_scheduler(monkeypatch):
+    monkeypatch.setattr(limits, "_semaphores", {})
+    monkeypatch.delenv("VOYAGE_MAX_CONCURRENCY", raising=False)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def call_voyage():
+        with limits.provider_slot("voyage"):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+
+    async def runner(question):
+        await asyncio.to_thread(call_voyage)
+        return question
+
+    async def scenario():
+        scheduler = QueryScheduler(runner=runner, max_concurrency=3, provider_limits={"voyage": 1})
+        for i in range(3):
+            scheduler.submit(str(i))
+        outcomes = [outcome async for outcome in scheduler.as_completed()]
+        await scheduler.close()
+        return outcomes
+
+    outcomes = asyncio.run(scenario())
+    assert {outcome.status for outcome in outcomes} == {STATUS_OK}
+    assert peak[0] == 1
+    # Os limites do processo continuam os padrões
+    assert (
+        limits._get_semaphore("voyage")._initial_value == limits.PROVIDER_DEFAULT_LIMITS["voyage"]
+    )
+
+
+@pytest.mark.parametrize("timeout, expected_calls", [(None, 3), (0.1, 1)])
+def test_default_runner_stops_the_crew_thread(fake_crews, monkeypatch, timeout, expected_calls):
+    meter = UsageMeter()
+    monkeypatch.setattr(metering, "_meter", meter)
+    fake_crews.delay = 0.3
+
+    async def scenario():
+        scheduler = QueryScheduler(max_concurrency=1, default_timeout=timeout)
+        scheduler.submit("pergunta")
+        outcomes = [outcome async for outcome in scheduler.as_completed()]
+        await scheduler.close()
+        return outcomes
+
+    outcomes = asyncio.run(scenario())
+    assert outcomes[0].status == (STATUS_OK if timeout is None else STATUS_TIMEOUT)
+    # Expirada, a crew termina a tarefa em andamento e não inicia as dos outros agentes
+    assert fake_crews.calls == expected_calls
+    assert meter.query_usage("pergunta") == {"llm_tokens": 100.0 * expected_calls}
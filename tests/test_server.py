@@ -0,0 +1,99 @@
+# tests/test_server.py
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from server import HTTPError, QueryServer, QueryService, ServiceConfig, _parse_timeout
+
+
+@pytest.mark.parametrize("value, expected", [(None, 300), (5, 5.0), ("7.5", 7.5), (900, 300)])
+def test_parse_timeout_accepts_positive_numbers(value, expected):
+    assert _parse_timeout(value, 300) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", 0, -1, True, [1], "nan", "inf"])
+def test_parse_timeout_rejects_invalid_values(value):
+    with pytest.raises(HTTPError) as exc:
+        _parse_timeout(value, 300)
+    assert exc.value.status == 400
+
+
+async def _post_query(port, payload):
+    """POST /query e decodifica o corpo chunked em eventos NDJSON."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode()
+    writer.write(
+        b"POST /query HTTP/1.1\r\nHost: test\r\nConnection: close\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    head, _, rest = (await reader.read()).partition(b"\r\n\r\n")
+    writer.close()
+    assert head.startswith(b"HTTP/1.1 200")
+    assert b"application/x-ndjson" in head
+
+    data = b""
+    while True:
+        size, _, rest = rest.partition(b"\r\n")
+        if int(size, 16) == 0:
+            break
+        data += rest[: int(size, 16)]
+        rest = rest[int(size, 16) + 2 :]
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+def _serve(runner, scenario):
+    async def main():
+        service = QueryService(ServiceConfig(), runner=runner)
+        server = await asyncio.start_server(QueryServer(service).handle_connection, "127.0.0.1", 0)
+        async with server:
+            return await scenario(service, server.sockets[0].getsockname()[1])
+
+    return asyncio.run(main())
+
+
+def test_query_streams_task_events_and_the_result():
+    async def runner(question, on_task):
+        on_task(SimpleNamespace(agent="Pesquisador", name="buscar", raw="trechos"))
+        return SimpleNamespace(raw=f"resposta para {question}")
+
+    async def scenario(service, port):
+        return await _post_query(port, {"query": "preço"})
+
+    events = _serve(runner, scenario)
+
+    assert [event["event"] for event in events] == ["accepted", "started", "task", "result"]
+    assert events[2]["agent"] == "Pesquisador" and events[2]["output"] == "trechos"
+    assert events[3]["raw"] == "resposta para preço"
+
+
+def test_timeout_cancels_the_run_and_frees_the_slot_when_it_stops():
+    state = SimpleNamespace(cancelled=False)
+
+    async def runner(question, on_task):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # Como a crew: termina a tarefa em andamento antes de parar
+            await asyncio.sleep(0.05)
+            state.cancelled = True
+            raise RuntimeError("crew interrompida")
+
+    async def scenario(service, port):
+        events = await _post_query(port, {"query": "preço", "timeout": 0.05})
+        running_after_response = service.health()["running"]
+        for _ in range(100):
+            if service.health()["running"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        return events, running_after_response, service.health()
+
+    events, running_after_response, health = _serve(runner, scenario)
+
+    assert [event["event"] for event in events] == ["accepted", "started", "timeout"]
+    assert running_after_response == 1
+    assert state.cancelled
+    assert (health["running"], health["queued"], health["timed_out"]) == (0, 0, 1)
@@ -0,0 +1,98 @@
+# tests/test_sharding.py
+import random
+
+from services.vector.sharding import InMemoryIndex, ShardedIndex, rebalance, routing_key
+
+DOCS = [f"doc-{i}" for i in range(200)]
+
+
+def _shards(*names):
+    return [InMemoryIndex(name) for name in names]
+
+
+def _vectors(docs, pages=3):
+    rng = random.Random(7)
+    return [
+        (f"{doc}_{page}", [rng.random(), rng.random()], {"doc_source": doc, "page_number": page})
+        for doc in docs
+        for page in range(pages)
+    ]
+
+
+def _owners(index):
+    return {doc: index.names[index.shard_index_for(doc)] for doc in DOCS}
+
+
+def test_routing_ignores_shard_order():
+    forward = ShardedIndex(_shards("a", "b", "c"))
+    backward = ShardedIndex(_shards("c", "b", "a"))
+    assert _owners(forward) == _owners(backward)
+
+
+def test_adding_a_shard_only_moves_documents_to_it():
+    before = _owners(ShardedIndex(_shards("a", "b", "c")))
+    after = _owners(ShardedIndex(_shards("a", "b", "c", "d")))
+
+    moved = {doc for doc in DOCS if before[doc] != after[doc]}
+    assert moved and all(after[doc] == "d" for doc in moved)
+    # Rendezvous: cerca de 1/4 dos documentos vai para o shard novo
+    assert 25 <= len(moved) <= 75
+    # Todos os shards recebem documentos
+    assert set(after.values()) == {"a", "b", "c", "d"}
+
+
+def test_pages_of_a_document_share_a_shard():
+    index = ShardedIndex(_shards("a", "b", "c"))
+    index.upsert(vectors=_vectors(DOCS[:20]))
+    for doc in DOCS[:20]:
+        owner = index.shard_for(doc)
+        assert len(owner.fetch(ids=[f"{doc}_{page}" for page in range(3)])) == 3
+        assert all(owner.fetch(ids=[f"{doc}_{page}" for page in range(3)]))
+    assert routing_key({"file": "x.png"}, "id-1") == "x.png"
+    assert routing_key(None, "id-1") == "id-1"
+
+
+def test_fetch_gathers_from_every_shard_in_order():
+    index = ShardedIndex(_shards("a", "b", "c"))
+    index.upsert(vectors=_vectors(DOCS[:30], pages=1))
+    ids = ["doc-29_0", "missing", "doc-0_0", "doc-15_0"]
+
+    found = index.fetch(ids=ids, include_metadata=True)
+    assert [item.id if item else None for item in found] == [
+        "doc-29_0",
+        None,
+        "doc-0_0",
+        "doc-15_0",
+    ]
+    assert found[0].metadata["doc_source"] == "doc-29"
+
+
+def test_rebalance_moves_vectors_to_their_new_owner():
+    a, b, c = _shards("a", "b", "c")
+    ShardedIndex([a, b]).upsert(vectors=_vectors(DOCS[:60]))
+    total = sum(shard.info().vector_count for shard in (a, b))
+
+    grown = ShardedIndex([a, b, c])
+    planned = rebalance(grown, dry_run=True)
+    assert planned.moved > 0 and c.info().vector_count == 0
+
+    report = rebalance(grown, batch_size=7)
+    assert report.scanned >= total
+    assert report.moved == planned.moved == c.info().vector_count
+    assert set(report.moves) <= {("a", "c"), ("b", "c")}
+    for doc in DOCS[:60]:
+        assert all(grown.shard_for(doc).fetch(ids=[f"{doc}_{page}" for page in range(3)]))
+    assert grown.info().vector_count == total
+    assert rebalance(grown).moved == 0
+
+
+def test_rebalance_drains_removed_shards():
+    a, b, c = _shards("a", "b", "c")
+    ShardedIndex([a, b, c]).upsert(vectors=_vectors(DOCS[:40]))
+    drained = c.info().vector_count
+
+    shrunk = ShardedIndex([a, b])
+    report = rebalance(shrunk, drain=[("c", c)])
+    assert report.moved == drained
+    assert c.info().vector_count == 0
+    assert shrunk.info().vector_count == 40 * 3
@@ -0,0 +1,45 @@
+# tests/test_upstash_vector_tool.py
+import json
+
+import pytest
+
+from services.vector.sharding import InMemoryIndex
+from services.vector.upstash_vector_tool import UpstashVectorSearchTool
+
+
+@pytest.fixture
+def tool(tmp_path, monkeypatch):
+    monkeypatch.setenv("UPSTASH_VECTOR_REST_URL", "http://upstash.invalid")
+    monkeypatch.setenv("UPSTASH_VECTOR_REST_TOKEN", "token")
+    index = InMemoryIndex()
+    index.upsert(
+        vectors=[
+            ("doc_0", [1.0, 0.0], {"doc_source": "doc", "page_number": 1}, "alpha beta"),
+            ("doc_1", [0.0, 1.0], {"doc_source": "doc", "page_number": 2}, "gamma delta"),
+        ]
+    )
+    search = UpstashVectorSearchTool(
+        custom_embedding_fn=lambda query: [1.0, 0.0],
+        bm25_index_path=str(tmp_path / "bm25.json"),
+    )
+    search._index = index
+    return search
+
+
+@pytest.mark.parametrize("arguments", [{"filter": 'doc_source = "doc"'}, {"namespace": "ns"}])
+def test_lexical_mode_rejects_filter_and_namespace(tool, arguments):
+    output = json.loads(tool._run("alpha", search_mode="lexical", **arguments))
+    assert "does not support filter or namespace" in output["error"]
+
+
+def test_hybrid_mode_with_filter_runs_vector_only(tool, caplog):
+    with caplog.at_level("INFO"):
+        output = json.loads(
+            tool._run("alpha", top_k=1, search_mode="hybrid", filter="page_number = 1")
+        )
+    assert [hit["id"] for hit in output] == ["doc_0"]
+    assert "BM25 leg skipped" in caplog.text
+
+
+def test_invalid_mode_is_reported_as_error(tool):
+    assert "Invalid search_mode" in json.loads(tool._run("alpha", search_mode="bogus"))["error"]